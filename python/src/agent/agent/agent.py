@@ -43,13 +43,18 @@ import common.file_util
 from common.datastore_tags import DatastoreTags
 from common.exclusive_set import ExclusiveSet
 from common.mode import Mode
+from common.photon_thrift.connection_pool import ConnectionPool
 from common.plugin import load_plugins, thrift_services
 from common.request_id import RequestIdExecutor
 from common.service_name import ServiceName
 from common.state import State
+from common.thread import Periodic
 from pthrift.multiplex import TMultiplexedProcessor
 from tserver.thrift_server import TNonblockingServer
 
+# Interval in seconds between the logs of the connection pool stats.
+CONNECTION_POOL_STATS_INTERVAL = 300
+
 
 class Agent:
     def __init__(self):
@@ -84,6 +89,12 @@ class Agent:
         self._logger.info("Starting the bootstrap config poll thread")
         BootstrapPoller(self._config).start()
 
+        # Log the connection pool stats periodically.
+        stats_logger = Periodic(self._log_connection_pool_stats,
+                                CONNECTION_POOL_STATS_INTERVAL)
+        stats_logger.daemon = True
+        stats_logger.start()
+
         # Enable thrift non blocking server to serve requests.
         self._start_thrift_service()
 
@@ -165,6 +176,9 @@ class Agent:
     def _register_services(self):
         common.services.register(ServiceName.AGENT_CONFIG, self._config)
         common.services.register(ServiceName.LOCKED_VMS, ExclusiveSet())
+        self._connection_pool = ConnectionPool()
+        common.services.register(ServiceName.CONNECTION_POOL,
+                                 self._connection_pool)
 
         threadpool = RequestIdExecutor(
             ThreadPoolExecutor(self._config.workers))
@@ -188,6 +202,10 @@ class Agent:
         ds_tags.on_change(self._registrant.trigger_chairman_update)
         common.services.register(ServiceName.DATASTORE_TAGS, ds_tags)
 
+    def _log_connection_pool_stats(self):
+        self._logger.info("Connection pool stats: %s",
+                          self._connection_pool.stats())
+
     def _dump_threads(self, signum, frame):
         result = []
         for thread_id, stack in sys._current_frames().items():
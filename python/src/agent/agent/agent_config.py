@@ -365,6 +365,21 @@ class AgentConfig(object):
     def utilization_transfer_ratio(self):
         return self._options.utilization_transfer_ratio
 
+    @property
+    @locked
+    def place_strategy(self):
+        return self._options.place_strategy
+
+    @property
+    @locked
+    def image_transfer_compression_level(self):
+        return self._options.image_transfer_compression_level
+
+    @property
+    @locked
+    def image_transfer_block_size(self):
+        return self._options.image_transfer_block_size_kb * 1024
+
     @property
     @locked
     def management_only(self):
@@ -519,6 +534,23 @@ class AgentConfig(object):
                           default=9, help="Utilization to transfer ratio "
                                           "when calculating place score")
 
+        parser.add_option("--place-strategy", dest="place_strategy",
+                          type="choice", choices=["random", "latency_aware"],
+                          default="random",
+                          help="Strategy picking the hosts a leaf scheduler "
+                               "sends place requests to")
+
+        parser.add_option("--image-transfer-compression-level",
+                          dest="image_transfer_compression_level",
+                          type="int", default=0,
+                          help="zlib level of the compression of the images "
+                               "transferred to other hosts, 0 disables it")
+        parser.add_option("--image-transfer-block-size-kb",
+                          dest="image_transfer_block_size_kb",
+                          type="int", default=1024,
+                          help="Size of the blocks the images transferred "
+                               "to other hosts are compressed in")
+
         parser.add_option("--management-only", dest="management_only",
                           action="store_true",
                           default=False, help="Management only host")
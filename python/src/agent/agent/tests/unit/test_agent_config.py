@@ -86,7 +86,10 @@ class TestUnitAgent(unittest.TestCase):
                                    "--datastore", ["datastore1"],
                                    "--in-uwsim",
                                    "--config-path", self.agent_conf_dir,
-                                   "--utilization-transfer-ratio", "0.5"])
+                                   "--utilization-transfer-ratio", "0.5",
+                                   "--place-strategy", "latency_aware",
+                                   "--image-transfer-compression-level", "6",
+                                   "--image-transfer-block-size-kb", "256"])
 
         self.assertEqual(self.agent.chairman_list,
                          [ServerAddress("h1", 13000),
@@ -94,6 +97,9 @@ class TestUnitAgent(unittest.TestCase):
         self.assertEqual(self.agent.memory_overcommit, 1.5)
         self.assertEqual(self.agent.in_uwsim, True)
         self.assertEqual(self.agent.utilization_transfer_ratio, 0.5)
+        self.assertEqual(self.agent.place_strategy, "latency_aware")
+        self.assertEqual(self.agent.image_transfer_compression_level, 6)
+        self.assertEqual(self.agent.image_transfer_block_size, 256 * 1024)
         self.agent._persist_config()
 
         # Simulate an agent restart.
@@ -103,6 +109,8 @@ class TestUnitAgent(unittest.TestCase):
         self.assertEqual(new_agent.memory_overcommit, 1.5)
         self.assertEqual(new_agent.in_uwsim, True)
         self.assertEqual(self.agent.utilization_transfer_ratio, 0.5)
+        self.assertEqual(new_agent.place_strategy, "latency_aware")
+        self.assertEqual(new_agent.image_transfer_compression_level, 6)
 
     def test_property_accessors(self):
         self.agent._parse_options(["--config-path", self.agent_conf_dir,
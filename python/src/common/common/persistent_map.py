@@ -0,0 +1,154 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+_EMPTY = {}
+
+
+class PersistentMap(object):
+    """ Immutable map, where a change returns a new map sharing most of its
+    content with the old one.
+
+    The entries are spread over a fixed number of buckets by key hash. A
+    change copies the bucket list and the buckets it touches, so it costs
+    O(BUCKETS + len / BUCKETS) instead of copying the whole map. Since a map
+    never changes once built, it can be read by any number of threads without
+    locking.
+
+    Use evolver() to make a batch of changes, it copies each bucket at most
+    once for the whole batch:
+
+        evolver = m.evolver()
+        evolver["a"] = 1
+        del evolver["b"]
+        m2 = evolver.persistent()
+    """
+
+    BUCKETS = 64
+
+    __slots__ = ("_buckets", "_len")
+
+    def __init__(self, buckets=None, length=0):
+        self._buckets = buckets or (_EMPTY,) * self.BUCKETS
+        self._len = length
+
+    def _bucket(self, key):
+        return self._buckets[hash(key) % self.BUCKETS]
+
+    def get(self, key, default=None):
+        return self._bucket(key).get(key, default)
+
+    def __getitem__(self, key):
+        return self._bucket(key)[key]
+
+    def __contains__(self, key):
+        return key in self._bucket(key)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            for key in bucket:
+                yield key
+
+    def iteritems(self):
+        for bucket in self._buckets:
+            for item in bucket.iteritems():
+                yield item
+
+    def itervalues(self):
+        for bucket in self._buckets:
+            for value in bucket.itervalues():
+                yield value
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def set(self, key, value):
+        """Get a map with key set to value."""
+        evolver = self.evolver()
+        evolver[key] = value
+        return evolver.persistent()
+
+    def remove(self, key):
+        """Get a map without key.
+
+        :raise KeyError if the key is not in the map
+        """
+        evolver = self.evolver()
+        del evolver[key]
+        return evolver.persistent()
+
+    def evolver(self):
+        return PersistentMapEvolver(self)
+
+    def __repr__(self):
+        return "PersistentMap(%s)" % dict(self.iteritems())
+
+
+class PersistentMapEvolver(object):
+    """ Batch of changes to a PersistentMap. Not thread safe. """
+
+    def __init__(self, persistent_map):
+        self._map = persistent_map
+        self._buckets = list(persistent_map._buckets)
+        self._len = len(persistent_map)
+        # indexes of the buckets copied since the last persistent()
+        self._copied = set()
+
+    def _index(self, key):
+        return hash(key) % PersistentMap.BUCKETS
+
+    def _writable_bucket(self, index):
+        if index not in self._copied:
+            self._buckets[index] = dict(self._buckets[index])
+            self._copied.add(index)
+        return self._buckets[index]
+
+    def get(self, key, default=None):
+        return self._buckets[self._index(key)].get(key, default)
+
+    def __getitem__(self, key):
+        return self._buckets[self._index(key)][key]
+
+    def __contains__(self, key):
+        return key in self._buckets[self._index(key)]
+
+    def __len__(self):
+        return self._len
+
+    def __setitem__(self, key, value):
+        bucket = self._writable_bucket(self._index(key))
+        if key not in bucket:
+            self._len += 1
+        bucket[key] = value
+
+    def __delitem__(self, key):
+        index = self._index(key)
+        if key not in self._buckets[index]:
+            raise KeyError(key)
+        del self._writable_bucket(index)[key]
+        self._len -= 1
+
+    def persistent(self):
+        """Get the map with the changes made so far. The evolver can keep
+        making changes, they don't affect the returned map.
+
+        :rtype: PersistentMap
+        """
+        if self._copied:
+            self._map = PersistentMap(tuple(self._buckets), self._len)
+            self._copied = set()
+        return self._map
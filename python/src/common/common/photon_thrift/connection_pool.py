@@ -0,0 +1,209 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import collections
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import common
+from common.photon_thrift.direct_client import DirectClient
+from common.service_name import ServiceName
+from common.stats import Counters
+from common.stats import LatencyStats
+
+
+DEFAULT_MAX_IDLE_PER_KEY = 8
+DEFAULT_MAX_IDLE_SEC = 60
+
+
+def get_connection_pool():
+    """Get the shared connection pool.
+
+    :rtype: ConnectionPool or None if no pool has been registered
+    """
+    try:
+        return common.services.get(ServiceName.CONNECTION_POOL)
+    except ValueError:
+        return None
+
+
+class ConnectionPool(object):
+    """A pool of idle DirectClient connections.
+
+    Connections are keyed by (service name, host, port), so that a connection
+    is only reused for the same multiplexed service on the same agent. Idle
+    connections are validated before they are handed out, and evicted once
+    they have been idle for longer than max_idle_sec.
+
+    A connection must be released back to the pool once the caller is done
+    with it. Connections that saw an error must be released with
+    reusable=False, since the state of the thrift transport is unknown.
+    """
+
+    def __init__(self, max_idle_per_key=DEFAULT_MAX_IDLE_PER_KEY,
+                 max_idle_sec=DEFAULT_MAX_IDLE_SEC,
+                 client_factory=DirectClient):
+        """
+        :param max_idle_per_key: max number of idle connections per key
+        :param max_idle_sec: idle connections older than this are evicted
+        :param client_factory: callable creating a DirectClient
+        """
+        self._logger = logging.getLogger(__name__)
+        self._max_idle_per_key = max_idle_per_key
+        self._max_idle_sec = max_idle_sec
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+
+        # Idle connections, key -> deque of (client, last used time)
+        self._idle = collections.defaultdict(collections.deque)
+
+        # Connections handed out, client -> key
+        self._in_use = {}
+
+        self._last_eviction = time.time()
+
+        self._counters = Counters()
+        self._connect_latency = LatencyStats()
+
+    def acquire(self, service_name, client_cls, host, port,
+                client_timeout=None):
+        """Get a connected client, reusing an idle one if possible.
+
+        :type service_name: str
+        :type client_cls: Thrift service Client
+        :type host: str
+        :type port: int
+        :type client_timeout: float, seconds
+        :rtype: DirectClient
+        """
+        self._maybe_evict_idle()
+
+        key = (service_name, host, port)
+        client = self._get_idle(key)
+        if client is not None:
+            self._counters.increment("hit")
+            client.set_timeout(client_timeout)
+        else:
+            self._counters.increment("miss")
+            client = self._client_factory(service_name, client_cls, host,
+                                          port, client_timeout=client_timeout)
+            start = time.time()
+            client.connect()
+            self._connect_latency.record(time.time() - start)
+
+        with self._lock:
+            self._in_use[client] = key
+        return client
+
+    def release(self, client, reusable=True):
+        """Return a client to the pool.
+
+        :param client: a client returned by acquire
+        :param reusable: False if the client must be closed instead of being
+                         kept for reuse.
+        """
+        with self._lock:
+            key = self._in_use.pop(client, None)
+            if key is not None and reusable and \
+                    len(self._idle[key]) < self._max_idle_per_key:
+                self._idle[key].append((client, time.time()))
+                return
+
+        self._close(client)
+
+    @contextmanager
+    def connection(self, service_name, client_cls, host, port,
+                   client_timeout=None):
+        """Context manager acquiring and releasing a client.
+
+        The client is closed rather than pooled if the body raises.
+        """
+        client = self.acquire(service_name, client_cls, host, port,
+                              client_timeout)
+        reusable = False
+        try:
+            yield client
+            reusable = True
+        finally:
+            self.release(client, reusable)
+
+    def evict_idle(self):
+        """Close all the idle connections that have expired."""
+        expired = []
+        now = time.time()
+        with self._lock:
+            for key, entries in self._idle.items():
+                while entries and now - entries[0][1] > self._max_idle_sec:
+                    expired.append(entries.popleft()[0])
+                if not entries:
+                    del self._idle[key]
+
+        self._counters.increment("evicted", len(expired))
+        for client in expired:
+            self._close(client)
+
+    def close(self):
+        """Close all the idle connections."""
+        with self._lock:
+            idle = self._idle
+            self._idle = collections.defaultdict(collections.deque)
+
+        for entries in idle.itervalues():
+            for client, _ in entries:
+                self._close(client)
+
+    def stats(self):
+        """Get pool hit/miss counters and connect latency percentiles.
+
+        :rtype: dict
+        """
+        stats = self._counters.snapshot()
+        with self._lock:
+            stats["idle"] = sum(len(e) for e in self._idle.itervalues())
+            stats["in_use"] = len(self._in_use)
+        stats["connect_latency"] = self._connect_latency.snapshot()
+        return stats
+
+    def _maybe_evict_idle(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_eviction < self._max_idle_sec:
+                return
+            self._last_eviction = now
+        self.evict_idle()
+
+    def _get_idle(self, key):
+        """Pop the most recently used healthy idle client for key."""
+        while True:
+            with self._lock:
+                entries = self._idle.get(key)
+                if not entries:
+                    return None
+                client, last_used = entries.pop()
+
+            if time.time() - last_used > self._max_idle_sec:
+                self._counters.increment("evicted")
+                self._close(client)
+            elif not client.is_healthy():
+                self._counters.increment("unhealthy")
+                self._close(client)
+            else:
+                return client
+
+    def _close(self, client):
+        try:
+            client.close()
+        except Exception:
+            self._logger.warning("Failed to close connection",
+                                 exc_info=True)
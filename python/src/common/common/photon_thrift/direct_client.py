@@ -11,6 +11,8 @@
 # under the License.
 
 import logging
+import select
+import socket
 
 from pthrift.multiplex import TMultiplexedProtocol
 from thrift.protocol import TCompactProtocol
@@ -36,6 +38,7 @@ class DirectClient(object):
         self._client_cls = client_cls
         self._host = host
         self._port = port
+        self._socket = None
         self._transport = None
         self._client = None
         self._client_timeout = client_timeout
@@ -46,6 +49,7 @@ class DirectClient(object):
         sock = TSocket.TSocket(self._host, self._port)
         if self._client_timeout:
             sock.setTimeout(self._client_timeout * 1000)
+        self._socket = sock
         self._transport = TTransport.TFramedTransport(sock)
         protocol = TCompactProtocol.TCompactProtocol(self._transport)
         mux_protocol = TMultiplexedProtocol(protocol, self._service_name)
@@ -60,21 +64,58 @@ class DirectClient(object):
                           (self._host, self._port))
         self._transport.close()
 
+    def set_timeout(self, client_timeout):
+        """Change the socket timeout of an open connection.
+
+        :param client_timeout: timeout in seconds, or None for no timeout.
+        """
+        self._client_timeout = client_timeout
+        if client_timeout:
+            self._socket.setTimeout(client_timeout * 1000)
+        else:
+            self._socket.setTimeout(None)
+
+    @property
+    def request_log_level(self):
+        return self._request_log_level
+
+    @request_log_level.setter
+    def request_log_level(self, value):
+        """Sets log level for request/response bodies, INFO by default."""
+        self._request_log_level = value
+
+    def is_healthy(self):
+        """Check whether an idle connection can be reused.
+
+        An idle connection should never have anything to read. If the socket
+        is readable, the server either closed the connection or sent
+        unexpected data, and the connection can't be used anymore.
+        """
+        if self._transport is None or not self._transport.isOpen():
+            return False
+        try:
+            readable, _, _ = select.select([self._socket.handle], [], [], 0)
+        except (select.error, socket.error, TypeError, ValueError):
+            return False
+        return not readable
+
     def __getattr__(self, name):
         def _missing(*args, **kwargs):
             method = getattr(self._client, name)
             try:
+                # The bodies are only formatted if the level is enabled,
+                # requests can carry large binary data.
                 self._logger.log(self._request_log_level,
-                                 "Sending request: %s to: %s:%s", str(args),
+                                 "Sending request: %s to: %s:%s", args,
                                  self._host, self._port)
                 response = method(*args, **kwargs)
                 self._logger.log(self._request_log_level,
                                  "Received response: %s from: %s:%s",
-                                 str(response), self._host, self._port)
+                                 response, self._host, self._port)
                 return response
             except:
                 self._logger.warning("Error calling %s on: %s:%s" %
-                                     (str(args), self._host, self._port),
+                                     (name, self._host, self._port),
                                      exc_info=True)
                 raise
 
@@ -0,0 +1,154 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+"""Thrift requests serialized once and sent to many servers."""
+
+import copy
+import threading
+import uuid
+
+from thrift.protocol import TCompactProtocol
+from thrift.transport import TTransport
+
+
+# Subclass of each thrift struct class sent as copies, built on first use.
+_encoded_classes = {}
+_encoded_classes_lock = threading.Lock()
+
+
+def _encoded_class(base):
+    """Get the subclass of a thrift struct class that writes pre-encoded
+    copies.
+
+    Its instances keep the EncodedRequest they were copied from in a slot,
+    out of the __dict__ that the generated __eq__ and __repr__ look at.
+    """
+    with _encoded_classes_lock:
+        if base not in _encoded_classes:
+            class Encoded(base):
+                __slots__ = ("_encoded",)
+                thrift_class = base
+
+                def write(self, oprot):
+                    self._encoded._write(self, oprot)
+
+                # Equal to the plain structs with the same fields, like the
+                # generated __eq__ of thrift structs.
+                def __eq__(self, other):
+                    return isinstance(other, base) and \
+                        self.__dict__ == other.__dict__
+
+                def __ne__(self, other):
+                    return not self == other
+
+            Encoded.__name__ = base.__name__
+            _encoded_classes[base] = Encoded
+        return _encoded_classes[base]
+
+
+class EncodedRequest(object):
+    """A thrift request serialized once for a fan-out to many servers.
+
+    The copies returned by copy() only differ in one string field. They are
+    instances of a subclass of the request class, so they can be passed to
+    local handlers as is, and they serialize themselves by writing the
+    pre-encoded request with their field value spliced in, instead of walking
+    the whole struct again.
+
+    The request is serialized at most once, when the first copy is written
+    to a remote server. The copies are shallow: they share the nested structs
+    of the request, and must not be modified except for the spliced field.
+    Only the compact protocol, which all the photon thrift clients use, is
+    pre-encoded; the copies are serialized as usual with other protocols.
+    """
+
+    def __init__(self, request, field=None):
+        """
+        :param request: thrift struct to send
+        :param field: name of the string field that differs between copies,
+                      or None if the copies are identical
+        :type field: str
+        """
+        # The request may itself be a copy made by another EncodedRequest.
+        base = getattr(request.__class__, "thrift_class", request.__class__)
+        self._request = request
+        self._field = field
+        self._base = base
+        self._class = _encoded_class(base)
+        self._lock = threading.Lock()
+        self._encoded = None
+
+    def copy(self, value=None):
+        """Get a copy of the request to send to one server.
+
+        :param value: value of the field given to the constructor
+        :type value: str
+        :return: shallow copy of the request
+        """
+        request = self._class.__new__(self._class)
+        request.__dict__.update(self._request.__dict__)
+        request._encoded = self
+        if self._field is not None:
+            setattr(request, self._field, value)
+        return request
+
+    def _write(self, request, oprot):
+        # TMultiplexedProtocol decorates the protocol actually writing.
+        protocol = getattr(oprot, "protocol", oprot)
+        value = None
+        if self._field is not None:
+            value = getattr(request, self._field)
+
+        if (not isinstance(protocol, TCompactProtocol.TCompactProtocol) or
+                (self._field is not None and not isinstance(value, str))):
+            self._base.write(request, oprot)
+            return
+
+        # The compact protocol keeps no state while a struct value is
+        # written, so the encoded fields can go straight to the transport.
+        prefix, suffix = self._encode()
+        trans = protocol.trans
+        trans.write(prefix)
+        if self._field is not None:
+            trans.write(self._encode_string(value))
+            trans.write(suffix)
+
+    def _encode(self):
+        """Serialize the request on the first remote write.
+
+        :return: the encoded request before and after the field value
+        :rtype: (str, str)
+        """
+        with self._lock:
+            if self._encoded is None:
+                template = copy.copy(self._request)
+                if self._field is None:
+                    self._encoded = (self._serialize(template), "")
+                else:
+                    placeholder = uuid.uuid4().hex
+                    setattr(template, self._field, placeholder)
+                    data = self._serialize(template)
+                    self._encoded = tuple(data.split(
+                        self._encode_string(placeholder), 1))
+            return self._encoded
+
+    def _serialize(self, struct):
+        buf = TTransport.TMemoryBuffer()
+        self._base.write(struct, TCompactProtocol.TCompactProtocol(buf))
+        return buf.getvalue()
+
+    @staticmethod
+    def _encode_string(value):
+        buf = TTransport.TMemoryBuffer()
+        TCompactProtocol.writeVarint(buf, len(value))
+        buf.write(value)
+        return buf.getvalue()
@@ -16,6 +16,7 @@ from contextlib import contextmanager
 import logging
 
 import common
+from common.photon_thrift.connection_pool import get_connection_pool
 from common.photon_thrift.direct_client import DirectClient
 from common.service_name import ServiceName
 
@@ -67,8 +68,13 @@ class RpcClient(object):
         # back to the node who had the branch scheduler to get that
         # individual Host's response.
         local_agent_id = common.services.get(ServiceName.AGENT_CONFIG).host_id
+        pool = get_connection_pool()
         if server_id == local_agent_id:
             yield self._handler
+        elif pool:
+            with pool.connection(self._service_name, self._client_klass,
+                                 host, port, client_timeout) as client:
+                yield client
         else:
             client = None
             try:
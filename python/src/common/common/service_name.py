@@ -26,3 +26,4 @@ class ServiceName(Enum):
     HYPERVISOR = 8
     REGISTRANT = 9
     VIM_CLIENT = 10
+    CONNECTION_POOL = 11
@@ -0,0 +1,100 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import collections
+import math
+import threading
+
+
+DEFAULT_WINDOW_SIZE = 1024
+
+
+class LatencyStats(object):
+    """
+    Keeps a sliding window of the most recent latency samples and reports
+    percentiles over it. Samples are in seconds.
+    """
+
+    def __init__(self, window_size=DEFAULT_WINDOW_SIZE):
+        self._samples = collections.deque(maxlen=window_size)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """ Record a single latency sample in seconds """
+        with self._lock:
+            self._samples.append(latency)
+            self._count += 1
+
+    @property
+    def count(self):
+        """ Total number of samples recorded, including evicted ones. """
+        with self._lock:
+            return self._count
+
+    def percentile(self, percent):
+        """ Get the given percentile over the current window.
+
+        :param percent: percentile in the range [0, 100]
+        :rtype: float or None if no samples have been recorded
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        return self._percentile(samples, percent)
+
+    def snapshot(self):
+        """ Get a summary of the current window.
+
+        :rtype: dict
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self._count
+        return {
+            "count": count,
+            "p50": self._percentile(samples, 50),
+            "p95": self._percentile(samples, 95),
+            "p99": self._percentile(samples, 99),
+            "max": samples[-1] if samples else None,
+        }
+
+    @staticmethod
+    def _percentile(samples, percent):
+        if not samples:
+            return None
+        # nearest-rank percentile
+        rank = int(math.ceil(percent / 100.0 * len(samples)))
+        return samples[max(rank, 1) - 1]
+
+
+class Counters(object):
+    """ A thread-safe set of named counters. """
+
+    def __init__(self):
+        self._counters = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """ Get a copy of all the counters.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._counters)
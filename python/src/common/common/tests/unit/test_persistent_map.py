@@ -0,0 +1,68 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+
+from common.persistent_map import PersistentMap
+
+
+class TestPersistentMap(unittest.TestCase):
+
+    def test_set_remove(self):
+        m0 = PersistentMap()
+        m1 = m0.set("a", 1)
+        m2 = m1.set("b", 2).set("a", 3)
+        m3 = m2.remove("b")
+
+        assert_that(len(m0), is_(0))
+        assert_that(dict(m1.iteritems()), is_({"a": 1}))
+        assert_that(dict(m2.iteritems()), is_({"a": 3, "b": 2}))
+        assert_that(dict(m3.iteritems()), is_({"a": 3}))
+        assert_that(m2["b"], is_(2))
+        assert_that(m3.get("b"), is_(None))
+        assert_that("b" in m3, is_(False))
+        self.assertRaises(KeyError, m3.remove, "b")
+        self.assertRaises(KeyError, m3.__getitem__, "b")
+
+    def test_evolver(self):
+        expected = dict((i, str(i)) for i in range(1000))
+        evolver = PersistentMap().evolver()
+        for key, value in expected.iteritems():
+            evolver[key] = value
+        m1 = evolver.persistent()
+        assert_that(dict(m1.iteritems()), is_(expected))
+        assert_that(len(m1), is_(1000))
+        assert_that(sorted(m1.keys()), is_(range(1000)))
+
+        # changes after persistent() don't affect the map it returned
+        evolver[0] = "x"
+        del evolver[1]
+        assert_that(len(evolver), is_(999))
+        m2 = evolver.persistent()
+        assert_that(m1[0], is_("0"))
+        assert_that(m1[1], is_("1"))
+        assert_that(m2[0], is_("x"))
+        assert_that(1 in m2, is_(False))
+        assert_that(len(m2), is_(999))
+
+        # buckets that didn't change are shared
+        shared = [b1 is b2 for b1, b2 in zip(m1._buckets, m2._buckets)]
+        assert_that(shared.count(False), is_(2))
+
+        # a batch without changes returns the same map
+        assert_that(m2.evolver().persistent(), same_instance(m2))
+
+
+if __name__ == '__main__':
+    unittest.main()
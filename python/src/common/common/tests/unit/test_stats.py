@@ -0,0 +1,59 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+
+from common.stats import Counters
+from common.stats import LatencyStats
+
+
+class LatencyStatsTestCase(unittest.TestCase):
+
+    def test_empty(self):
+        stats = LatencyStats()
+        assert_that(stats.percentile(95), is_(None))
+        assert_that(stats.snapshot()["count"], is_(0))
+
+    def test_percentiles(self):
+        stats = LatencyStats()
+        for i in range(1, 101):
+            stats.record(i / 100.0)
+
+        assert_that(stats.percentile(50), is_(0.5))
+        assert_that(stats.percentile(95), is_(0.95))
+        snapshot = stats.snapshot()
+        assert_that(snapshot["count"], is_(100))
+        assert_that(snapshot["p99"], is_(0.99))
+        assert_that(snapshot["max"], is_(1.0))
+
+    def test_window(self):
+        stats = LatencyStats(window_size=2)
+        stats.record(10)
+        stats.record(1)
+        stats.record(2)
+
+        assert_that(stats.count, is_(3))
+        assert_that(stats.snapshot()["max"], is_(2))
+
+
+class CountersTestCase(unittest.TestCase):
+
+    def test_increment(self):
+        counters = Counters()
+        counters.increment("hit")
+        counters.increment("hit", 2)
+
+        assert_that(counters.get("hit"), is_(3))
+        assert_that(counters.get("miss"), is_(0))
+        assert_that(counters.snapshot(), is_({"hit": 3}))
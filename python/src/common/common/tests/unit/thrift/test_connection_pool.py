@@ -0,0 +1,120 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+from mock import MagicMock
+from mock import patch
+
+from common.photon_thrift.connection_pool import ConnectionPool
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.clients = []
+        self.pool = ConnectionPool(max_idle_per_key=2, max_idle_sec=10,
+                                   client_factory=self._create_client)
+
+    def _create_client(self, service_name, client_cls, host, port,
+                       client_timeout=None):
+        client = MagicMock()
+        client.is_healthy.return_value = True
+        self.clients.append(client)
+        return client
+
+    def test_reuse(self):
+        client = self.pool.acquire("Host", None, "host1", 8835)
+        client.connect.assert_called_once_with()
+        self.pool.release(client)
+
+        assert_that(self.pool.acquire("Host", None, "host1", 8835),
+                    is_(same_instance(client)))
+        client.set_timeout.assert_called_once_with(None)
+        assert_that(self.clients, has_length(1))
+
+        stats = self.pool.stats()
+        assert_that(stats["hit"], is_(1))
+        assert_that(stats["miss"], is_(1))
+        assert_that(stats["in_use"], is_(1))
+        assert_that(stats["connect_latency"]["count"], is_(1))
+
+    def test_keyed(self):
+        client = self.pool.acquire("Host", None, "host1", 8835)
+        self.pool.release(client)
+
+        other = self.pool.acquire("AgentControl", None, "host1", 8835)
+        assert_that(other, is_not(same_instance(client)))
+        other = self.pool.acquire("Host", None, "host2", 8835)
+        assert_that(other, is_not(same_instance(client)))
+
+    def test_not_reusable(self):
+        client = self.pool.acquire("Host", None, "host1", 8835)
+        self.pool.release(client, reusable=False)
+        client.close.assert_called_once_with()
+
+        other = self.pool.acquire("Host", None, "host1", 8835)
+        assert_that(other, is_not(same_instance(client)))
+
+    def test_connection_error(self):
+        try:
+            with self.pool.connection("Host", None, "host1", 8835):
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.clients[0].close.assert_called_once_with()
+        assert_that(self.pool.stats()["idle"], is_(0))
+
+    def test_unhealthy(self):
+        client = self.pool.acquire("Host", None, "host1", 8835)
+        self.pool.release(client)
+        client.is_healthy.return_value = False
+
+        other = self.pool.acquire("Host", None, "host1", 8835)
+        assert_that(other, is_not(same_instance(client)))
+        client.close.assert_called_once_with()
+        assert_that(self.pool.stats()["unhealthy"], is_(1))
+
+    def test_max_idle_per_key(self):
+        clients = [self.pool.acquire("Host", None, "host1", 8835)
+                   for _ in range(3)]
+        for client in clients:
+            self.pool.release(client)
+
+        assert_that(self.pool.stats()["idle"], is_(2))
+        clients[2].close.assert_called_once_with()
+
+    @patch("time.time")
+    def test_evict_idle(self, time_fn):
+        time_fn.return_value = 100
+        client = self.pool.acquire("Host", None, "host1", 8835)
+        self.pool.release(client)
+
+        time_fn.return_value = 111
+        self.pool.evict_idle()
+        client.close.assert_called_once_with()
+        assert_that(self.pool.stats()["idle"], is_(0))
+        assert_that(self.pool.stats()["evicted"], is_(1))
+
+    def test_close(self):
+        client = self.pool.acquire("Host", None, "host1", 8835)
+        self.pool.release(client)
+        self.pool.close()
+
+        client.close.assert_called_once_with()
+        assert_that(self.pool.stats()["idle"], is_(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
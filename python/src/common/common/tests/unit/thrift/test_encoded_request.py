@@ -0,0 +1,155 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+
+from common.photon_thrift.encoded_request import EncodedRequest
+from pthrift.multiplex import TMultiplexedProtocol
+from thrift.Thrift import TType
+from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
+from thrift.transport import TTransport
+
+
+class Struct(object):
+    """Minimal thrift struct, serialized like the generated ones."""
+    thrift_spec = None
+
+    def __init__(self, **kwargs):
+        for spec in self.thrift_spec[1:]:
+            setattr(self, spec[2], kwargs.get(spec[2]))
+
+    def read(self, iprot):
+        iprot.readStruct(self, self.thrift_spec)
+
+    def write(self, oprot):
+        oprot.writeStruct(self, self.thrift_spec)
+
+    def __eq__(self, other):
+        return isinstance(other, self.__class__) and \
+            self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class Resource(Struct):
+    thrift_spec = (
+        None,
+        (1, TType.STRING, "id", None, None),
+        (2, TType.LIST, "disks", (TType.STRING, None), None),
+    )
+
+
+class Request(Struct):
+    thrift_spec = (
+        None,
+        (1, TType.STRUCT, "resource", (Resource, Resource.thrift_spec), None),
+        (2, TType.STRING, "scheduler_id", None, None),
+        (3, TType.I32, "timeout", None, None),
+        (4, TType.STRING, "tracing_id", None, None),
+    )
+
+
+class Args(Struct):
+    thrift_spec = (
+        None,
+        (1, TType.STRUCT, "request", (Request, Request.thrift_spec), None),
+    )
+
+
+def serialize(struct, protocol_class=TCompactProtocol.TCompactProtocol):
+    buf = TTransport.TMemoryBuffer()
+    protocol = TMultiplexedProtocol(protocol_class(buf), "Scheduler")
+    protocol.writeMessageBegin("place", 1, 0)
+    struct.write(protocol)
+    protocol.writeMessageEnd()
+    return buf.getvalue()
+
+
+class EncodedRequestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.request = Request(resource=Resource(id="vm", disks=["a", "b"]),
+                               timeout=10, tracing_id="trace")
+
+    def _expected(self, scheduler_id):
+        request = Request(**self.request.__dict__)
+        request.scheduler_id = scheduler_id
+        return request
+
+    def test_copy(self):
+        encoded = EncodedRequest(self.request, "scheduler_id")
+        copy = encoded.copy("child_1")
+
+        assert_that(isinstance(copy, Request), is_(True))
+        assert_that(copy.resource, is_(same_instance(self.request.resource)))
+        assert_that(copy, equal_to(self._expected("child_1")))
+        assert_that(self._expected("child_1"), equal_to(copy))
+        assert_that(copy, is_not(equal_to(self._expected("child_2"))))
+        assert_that(self.request.scheduler_id, is_(none()))
+
+    def test_copy_class(self):
+        copy_1 = EncodedRequest(self.request, "scheduler_id").copy("child_1")
+        copy_2 = EncodedRequest(copy_1, "scheduler_id").copy("child_2")
+
+        # One subclass per request class, the encoded request is not a field
+        assert_that(copy_2.__class__, is_(same_instance(copy_1.__class__)))
+        assert_that(copy_1.__class__.__name__, is_("Request"))
+        assert_that(copy_1.__dict__, is_not(has_key("_encoded")))
+        assert_that(copy_2, equal_to(self._expected("child_2")))
+
+    def test_write(self):
+        encoded = EncodedRequest(self.request, "scheduler_id")
+        for scheduler_id in ["child_1", "c", "x" * 300]:
+            data = serialize(Args(request=encoded.copy(scheduler_id)))
+            assert_that(data, equal_to(
+                serialize(Args(request=self._expected(scheduler_id)))))
+
+            protocol = TCompactProtocol.TCompactProtocol(
+                TTransport.TMemoryBuffer(data))
+            protocol.readMessageBegin()
+            args = Args()
+            args.read(protocol)
+            assert_that(args.request, equal_to(self._expected(scheduler_id)))
+
+    def test_write_identical_copies(self):
+        encoded = EncodedRequest(self.request)
+        assert_that(serialize(Args(request=encoded.copy())),
+                    equal_to(serialize(Args(request=self.request))))
+
+    def test_write_fallback(self):
+        encoded = EncodedRequest(self.request, "scheduler_id")
+
+        # unset field
+        assert_that(serialize(Args(request=encoded.copy())),
+                    equal_to(serialize(Args(request=self.request))))
+
+        # other protocols
+        assert_that(
+            serialize(Args(request=encoded.copy("child_1")),
+                      TBinaryProtocol.TBinaryProtocol),
+            equal_to(serialize(Args(request=self._expected("child_1")),
+                               TBinaryProtocol.TBinaryProtocol)))
+
+    def test_encode_copy(self):
+        copy = EncodedRequest(self.request, "scheduler_id").copy("child_1")
+        copy.scheduler_id = None
+        encoded = EncodedRequest(copy)
+        assert_that(serialize(Args(request=encoded.copy())),
+                    equal_to(serialize(Args(request=self.request))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -67,6 +67,7 @@ from gen.host.ttypes import EnterMaintenanceResponse
 from gen.host.ttypes import EnterMaintenanceResultCode
 from gen.host.ttypes import ExitMaintenanceResponse
 from gen.host.ttypes import ExitMaintenanceResultCode
+from gen.host.ttypes import FinishImageUploadResponse
 from gen.host.ttypes import GetConfigResponse
 from gen.host.ttypes import GetConfigResultCode
 from gen.host.ttypes import GetDatastoresResponse
@@ -89,6 +90,7 @@ from gen.host.ttypes import HttpTicketResponse
 from gen.host.ttypes import HttpTicketResultCode
 from gen.host.ttypes import ImageInfoResponse
 from gen.host.ttypes import ImageInfoResultCode
+from gen.host.ttypes import ImageUploadResultCode
 from gen.host.ttypes import LoadResponse
 from gen.host.ttypes import LoadResultCode
 from gen.host.ttypes import MksTicketResponse
@@ -113,6 +115,7 @@ from gen.host.ttypes import SetResourceTagsResultCode
 from gen.host.ttypes import StartImageOperationResultCode
 from gen.host.ttypes import StartImageScanResponse
 from gen.host.ttypes import StartImageSweepResponse
+from gen.host.ttypes import StartImageUploadResponse
 from gen.host.ttypes import StopImageOperationResultCode
 from gen.host.ttypes import StopImageOperationResponse
 from gen.host.ttypes import TransferImageResponse
@@ -121,6 +124,7 @@ from gen.host.ttypes import UnregisterVmResponse
 from gen.host.ttypes import UnregisterVmResultCode
 from gen.host.ttypes import VmDisksOpResponse
 from gen.host.ttypes import VmDiskOpResultCode
+from gen.host.ttypes import WriteImageDataResponse
 
 from gen.resource.ttypes import CloneType
 from gen.resource.ttypes import Datastore
@@ -132,6 +136,9 @@ from gen.scheduler.ttypes import ConfigureResponse
 from gen.scheduler.ttypes import ConfigureResultCode
 from gen.scheduler.ttypes import FindResponse
 from gen.scheduler.ttypes import FindResultCode
+from gen.scheduler.ttypes import HostSummaryResponse
+from gen.scheduler.ttypes import HostSummaryResultCode
+from gen.scheduler.ttypes import PlaceBatchResponse
 from gen.scheduler.ttypes import PlaceResponse
 from gen.scheduler.ttypes import PlaceResultCode
 from gen.scheduler.ttypes import Score
@@ -142,6 +149,7 @@ from host.hypervisor.image_scanner import DatastoreImageScanner
 from host.hypervisor.image_sweeper import DatastoreImageSweeper
 from host.hypervisor.image_manager import DirectoryNotFound
 from host.hypervisor.image_manager import ImageNotFoundException
+from host.hypervisor.image_manager import ImageUploadNotFound
 from host.hypervisor.placement_manager import InvalidReservationException
 from host.hypervisor.placement_manager import NoSuchResourceException
 from host.hypervisor.placement_manager import NotEnoughMemoryResourceException
@@ -179,6 +187,15 @@ class HostHandler(Host.Iface):
 
     GENERATION_GAP = 10
 
+    PLACE_ERRORS = {
+        NoSuchResourceException: PlaceResultCode.NO_SUCH_RESOURCE,
+        NotEnoughMemoryResourceException:
+            PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE,
+        NotEnoughCpuResourceException: PlaceResultCode.NOT_ENOUGH_CPU_RESOURCE,
+        NotEnoughDatastoreCapacityException:
+            PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY,
+    }
+
     VMINFO_TENANT_KEY = "tenant"
     VMINFO_PROJECT_KEY = "project"
 
@@ -1588,6 +1605,28 @@ class HostHandler(Host.Iface):
 
         return FindResponse(FindResultCode.NOT_FOUND)
 
+    @log_request
+    @error_handler(HostSummaryResponse, HostSummaryResultCode)
+    def summary(self, request):
+        """Summarize the resources available for placement.
+
+        :type request: HostSummaryRequest
+        :rtype: HostSummaryResponse
+        """
+        mode = common.services.get(ServiceName.MODE).get_mode()
+        if mode != MODE.NORMAL:
+            return HostSummaryResponse(HostSummaryResultCode.INVALID_STATE,
+                                       error="Host in %s mode" % mode)
+
+        # Read the generation first, so that the summary is never newer than
+        # the generation it is reported with.
+        generation = self._generation
+        summary = self.hypervisor.placement_manager.summary()
+        thrift_summary = summary.to_thrift(self._agent_id, generation)
+        thrift_summary.vm_ids = self.hypervisor.vm_manager.get_resource_ids()
+        return HostSummaryResponse(HostSummaryResultCode.OK,
+                                   summary=thrift_summary)
+
     @log_request
     @error_handler(PlaceResponse, PlaceResultCode)
     def place(self, request):
@@ -1607,17 +1646,7 @@ class HostHandler(Host.Iface):
             disks, vm = self._parse_resource_request(request.resource)
             score, placement_list = \
                 self.hypervisor.placement_manager.place(vm, disks)
-            thrift_score = Score(score.utilization, score.transfer)
-            placement_list = \
-                AgentResourcePlacementList(placement_list)
-            thrift_placement_list = placement_list.to_thrift()
-
-            return PlaceResponse(PlaceResultCode.OK,
-                                 agent_id=self._agent_id,
-                                 score=thrift_score,
-                                 generation=self._generation,
-                                 placementList=thrift_placement_list,
-                                 address=self._address)
+            return self._place_response(score, placement_list)
         except NoSuchResourceException as e:
             self._logger.warning(
                 "NoSuchResourceException during place(). {0}".format(e))
@@ -1647,6 +1676,100 @@ class HostHandler(Host.Iface):
                                  error="Unknown flavor",
                                  agent_id=self._agent_id)
 
+    @log_request
+    @error_handler(PlaceBatchResponse, PlaceResultCode)
+    def place_batch(self, request):
+        """Place a batch of requested resources.
+
+        :type request: PlaceBatchRequest
+        :rtype: PlaceBatchResponse
+        """
+        mode = common.services.get(ServiceName.MODE).get_mode()
+        if mode != MODE.NORMAL:
+            self._logger.info("return INVALID_STATE when agent in %s" %
+                              mode)
+            return PlaceBatchResponse(PlaceResultCode.INVALID_STATE,
+                                      error="Host in %s mode" % mode)
+
+        resources = self._parse_resource_requests(request.resources)
+        results = self.hypervisor.placement_manager.place_batch(resources)
+        responses = self._place_responses(results)
+
+        failed = [response.result for response in responses
+                  if response.result != PlaceResultCode.OK]
+        if failed:
+            return PlaceBatchResponse(failed[0], responses=responses)
+        return PlaceBatchResponse(PlaceResultCode.OK, responses=responses)
+
+    @log_request
+    @error_handler(PlaceBatchResponse, PlaceResultCode)
+    def evaluate_placement(self, request):
+        """Score alternative resources against the same host state.
+
+        :type request: PlaceBatchRequest
+        :rtype: PlaceBatchResponse
+        """
+        mode = common.services.get(ServiceName.MODE).get_mode()
+        if mode != MODE.NORMAL:
+            self._logger.info("return INVALID_STATE when agent in %s" %
+                              mode)
+            return PlaceBatchResponse(PlaceResultCode.INVALID_STATE,
+                                      error="Host in %s mode" % mode)
+
+        resources = self._parse_resource_requests(request.resources)
+        results = self.hypervisor.placement_manager.evaluate(resources)
+        return PlaceBatchResponse(PlaceResultCode.OK,
+                                  responses=self._place_responses(results))
+
+    def _parse_resource_requests(self, resources):
+        """Parse the resources of a batch request.
+
+        :type resources: list of Resource
+        :rtype: list of (Vm, list of Disk)
+        """
+        result = []
+        for resource in resources:
+            disks, vm = self._parse_resource_request(resource)
+            result.append((vm, disks))
+        return result
+
+    def _place_responses(self, results):
+        """Build the responses to a batch of placements.
+
+        :param results: (score, placement list) tuples or exceptions
+        :rtype: list of PlaceResponse
+        """
+        responses = []
+        for result in results:
+            if isinstance(result, Exception):
+                self._logger.info("%s during placement" %
+                                  result.__class__.__name__)
+                code = self.PLACE_ERRORS.get(type(result),
+                                             PlaceResultCode.SYSTEM_ERROR)
+                responses.append(PlaceResponse(code, agent_id=self._agent_id))
+            else:
+                responses.append(self._place_response(*result))
+        return responses
+
+    def _place_response(self, score, placement_list):
+        """Build the response to a successful placement.
+
+        :type score: AgentPlacementScore
+        :type placement_list: list of AgentResourcePlacement
+        :rtype: PlaceResponse
+        """
+        thrift_score = Score(score.utilization, score.transfer)
+        placement_list = \
+            AgentResourcePlacementList(placement_list)
+        thrift_placement_list = placement_list.to_thrift()
+
+        return PlaceResponse(PlaceResultCode.OK,
+                             agent_id=self._agent_id,
+                             score=thrift_score,
+                             generation=self._generation,
+                             placementList=thrift_placement_list,
+                             address=self._address)
+
     def _error_response(self, code, error, response):
         """Attach error information to response.
 
@@ -2045,6 +2168,64 @@ class HostHandler(Host.Iface):
 
         return ReceiveImageResponse(ReceiveImageResultCode.OK)
 
+    @log_request
+    @error_handler(StartImageUploadResponse, ImageUploadResultCode)
+    def start_image_upload(self, request):
+        """ Start uploading an image disk sent in blocks by another host. """
+        try:
+            upload_id = self.hypervisor.start_image_upload(request.url,
+                                                           request.size)
+        except:
+            return self._error_response(
+                ImageUploadResultCode.SYSTEM_ERROR,
+                str(sys.exc_info()[1]),
+                StartImageUploadResponse())
+
+        return StartImageUploadResponse(ImageUploadResultCode.OK,
+                                        upload_id=upload_id)
+
+    # Not logged, the requests carry the image data.
+    @error_handler(WriteImageDataResponse, ImageUploadResultCode)
+    def write_image_data(self, request):
+        """ Add a block to an image upload. """
+        try:
+            self.hypervisor.write_image_data(request.upload_id, request.data,
+                                             request.compressed)
+        except ImageUploadNotFound:
+            return self._error_response(
+                ImageUploadResultCode.UPLOAD_NOT_FOUND,
+                "Upload %s not found" % request.upload_id,
+                WriteImageDataResponse())
+        except:
+            self._logger.info("Image upload %s failed" % request.upload_id,
+                              exc_info=True)
+            return self._error_response(
+                ImageUploadResultCode.SYSTEM_ERROR,
+                str(sys.exc_info()[1]),
+                WriteImageDataResponse())
+
+        return WriteImageDataResponse(ImageUploadResultCode.OK)
+
+    @log_request
+    @error_handler(FinishImageUploadResponse, ImageUploadResultCode)
+    def finish_image_upload(self, request):
+        """ Wait for an image upload to complete, or abort it. """
+        try:
+            self.hypervisor.finish_image_upload(request.upload_id,
+                                                bool(request.abort))
+        except ImageUploadNotFound:
+            return self._error_response(
+                ImageUploadResultCode.UPLOAD_NOT_FOUND,
+                "Upload %s not found" % request.upload_id,
+                FinishImageUploadResponse())
+        except:
+            return self._error_response(
+                ImageUploadResultCode.SYSTEM_ERROR,
+                str(sys.exc_info()[1]),
+                FinishImageUploadResponse())
+
+        return FinishImageUploadResponse(ImageUploadResultCode.OK)
+
     @log_request
     @error_handler(CreateImageFromVmResponse, CreateImageFromVmResultCode)
     @lock_vm
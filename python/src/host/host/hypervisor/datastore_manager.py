@@ -51,6 +51,14 @@ class DatastoreManager(object):
         """
         pass
 
+    def datastore_infos(self, datastore_ids):
+        """ Get datastore info of several datastores
+        :type datastore_ids: list of str
+        :return: dict of datastore id to host.hypervisor.system.DatastoreInfo
+        """
+        return dict((datastore_id, self.datastore_info(datastore_id))
+                    for datastore_id in datastore_ids)
+
     @abc.abstractmethod
     def datastore_nfc_ticket(self, datastore_name):
         """ Get nfc ticket of a datastore
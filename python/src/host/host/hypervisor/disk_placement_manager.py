@@ -11,8 +11,10 @@
 # under the License.
 
 import abc
+import bisect
 from enum import enum, Enum
 import copy
+import heapq
 import logging
 import random
 
@@ -66,34 +68,68 @@ class DisksPlacement(object):
         self.selector = selector
         self.placement_list = []
 
+    def copy(self):
+        """Copy the placement, so that an engine can try to place disks
+        without modifying it. The disks and placements are shared, the
+        selector is copied on write.
+        """
+        placement = DisksPlacement(list(self.disks), self.selector.copy())
+        placement.placement_list = list(self.placement_list)
+        return placement
+
 
 class DatastoreSelector(object):
     """DatastoreSelector tracks free space for all available datastores. It
     tries to offer the best suitable datastores, reserve disk space when
     placement happens, and calculating free space ratio.
+
+    The datastores are kept in a max-heap of free space, so the datastore
+    with the most free space is found without scanning all of them. Copies
+    share the datastores until one of them consumes space.
     """
 
     def __init__(self):
         self.datastore_free = {}
         self.datastore_total = {}
+        self._free_space = 0
+        self._total_space = 0
+
+        # Heap of (-free space, datastore id). Entries whose free space
+        # doesn't match datastore_free are stale, and dropped when they
+        # reach the top.
+        self._heap = []
+
+        # True if the dicts and the heap may be shared with a copy
+        self._shared = False
 
     @staticmethod
-    def init_datastore_selector(datastore_manager, datastores):
+    def init_datastore_selector(datastore_manager, datastores, infos=None):
         if len(datastores) == 0:
             raise NoDatastoresException()
 
         selector = DatastoreSelector()
+        if infos is None:
+            infos = datastore_manager.datastore_infos(datastores)
         for datastore_id in datastores:
-            info = datastore_manager.datastore_info(datastore_id)
+            info = infos[datastore_id]
             selector.add_datastore(datastore_id, info.total - info.used,
                                    info.total)
         return selector
 
+    def copy(self):
+        """Get a copy of the selector in constant time."""
+        selector = copy.copy(self)
+        selector._shared = self._shared = True
+        return selector
+
     def get_datastore(self):
         """Get datastore with max free space"""
-
-        return max(self.datastore_free,
-                   key=lambda x: self.datastore_free[x])
+        # Dropping stale entries doesn't change the selector, so it's fine
+        # even if the heap is shared.
+        heap = self._heap
+        while -heap[0][0] != self.datastore_free[heap[0][1]]:
+            heapq.heappop(heap)
+        return heap[0][1]
 
     def consume_datastore_space(self, datastore_id, consumed_space):
         assert datastore_id in self.datastore_free
@@ -101,10 +137,12 @@ class DatastoreSelector(object):
         if self.datastore_free[datastore_id] < consumed_space:
             raise NotEnoughSpaceException()
 
-        self.datastore_free[datastore_id] -= consumed_space
+        self._set_free(datastore_id,
+                       self.datastore_free[datastore_id] - consumed_space)
 
     def add_datastore(self, datastore_id, free, total):
-        self.datastore_free[datastore_id] = free
+        self._total_space += total - self.datastore_total.get(datastore_id, 0)
+        self._set_free(datastore_id, free)
         self.datastore_total[datastore_id] = total
 
     def free_space(self, datastore_id):
@@ -112,22 +150,34 @@ class DatastoreSelector(object):
         return self.datastore_free[datastore_id]
 
     def total_free_space(self):
-        if not self.datastore_free:
-            return 0
-        return sum(self.datastore_free.values())
+        return self._free_space
 
     def total_space(self):
-        if not self.datastore_total:
-            return 0
-        return sum(self.datastore_total.values())
+        return self._total_space
 
     def ratio(self):
-        if not self.datastore_free or not self.datastore_total:
+        if not self._total_space:
             return 0
 
-        free = sum(self.datastore_free.values())
-        total = sum(self.datastore_total.values())
-        return float(total - free) / total
+        return float(self._total_space - self._free_space) / \
+            self._total_space
+
+    def _set_free(self, datastore_id, free):
+        if self._shared:
+            self.datastore_free = dict(self.datastore_free)
+            self.datastore_total = dict(self.datastore_total)
+            self._heap = list(self._heap)
+            self._shared = False
+
+        self._free_space += free - self.datastore_free.get(datastore_id, 0)
+        self.datastore_free[datastore_id] = free
+        heapq.heappush(self._heap, (-free, datastore_id))
+
+        # Rebuild the heap if stale entries pile up
+        if len(self._heap) > 2 * len(self.datastore_free) + 16:
+            self._heap = [(-f, ds) for ds, f in
+                          self.datastore_free.iteritems()]
+            heapq.heapify(self._heap)
 
     def __repr__(self):
         return "free: %s, total: %s" % (self.datastore_free,
@@ -269,7 +319,7 @@ class BestEffortPlaceEngine(BaseDiskPlacementEngine):
         super(BestEffortPlaceEngine, self).__init__(datastore_manager, option)
 
     def place(self, disks_placement):
-        disks_placement = copy.deepcopy(disks_placement)
+        disks_placement = disks_placement.copy()
         selector = disks_placement.selector
 
         optimal_datastore = selector.get_datastore()
@@ -297,6 +347,48 @@ class BestEffortPlaceEngine(BaseDiskPlacementEngine):
                                disks_placement=disks_placement)
 
 
+class BinPackingPlaceEngine(BaseDiskPlacementEngine):
+    """Place disks from the biggest to the smallest, each one in the
+    datastore with the least free space that can fit it (best fit
+    decreasing). This keeps the datastores with the most free space for the
+    big disks, so it can place disks that BestEffortPlaceEngine fails to
+    place when the datastores are fragmented.
+    """
+    def __init__(self, datastore_manager, option):
+        super(BinPackingPlaceEngine, self).__init__(datastore_manager, option)
+
+    def place(self, disks_placement):
+        disks_placement = disks_placement.copy()
+        selector = disks_placement.selector
+
+        # (free space, datastore id) sorted by free space
+        datastores = sorted((free, datastore_id) for datastore_id, free
+                            in selector.datastore_free.iteritems())
+
+        disks = sorted(disks_placement.disks,
+                       key=lambda d: self.disk_util.disk_capacity(d),
+                       reverse=True)
+
+        for disk in disks:
+            disk_capacity_gb = self.disk_util.disk_capacity(disk)
+            index = bisect.bisect_left(datastores, (disk_capacity_gb,))
+            if index == len(datastores):
+                return DiskPlaceResult(
+                    result=PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY,
+                    disks_placement=disks_placement)
+
+            free, datastore_id = datastores.pop(index)
+            selector.consume_datastore_space(datastore_id, disk_capacity_gb)
+            bisect.insort(datastores,
+                          (free - disk_capacity_gb, datastore_id))
+            disks_placement.placement_list.append(
+                AgentResourcePlacement(AgentResourcePlacement.DISK,
+                                       disk.id, datastore_id))
+
+        return DiskPlaceResult(result=PlaceResultCode.OK,
+                               disks_placement=disks_placement)
+
+
 class ConstraintDiskPlaceEngine(BaseDiskPlacementEngine):
     """Place disks with constraints
     """
@@ -305,7 +397,7 @@ class ConstraintDiskPlaceEngine(BaseDiskPlacementEngine):
                                                         option)
 
     def place(self, disks_placement):
-        disks_placement = copy.deepcopy(disks_placement)
+        disks_placement = disks_placement.copy()
 
         unplaced_disks = []
         for disk in disks_placement.disks:
@@ -0,0 +1,205 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+"""Block compression of image transfers.
+
+A stream is cut in blocks that are compressed independently, so they are
+compressed and decompressed by thread pools while the stream is transferred,
+and blocks that don't compress are sent as is.
+"""
+
+import collections
+import threading
+import time
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_LEVEL = 1
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_WORKERS = 2
+
+# Larger blocks are rejected by the decompressor.
+MAX_BLOCK_SIZE = 16 * 1024 * 1024
+
+# A block is sent as is unless compression saves at least 10%. A prefix of
+# the block is compressed first to skip incompressible blocks cheaply.
+MAX_RATIO = 0.9
+SAMPLE_SIZE = 4096
+
+
+class BlockCodecError(Exception):
+    """A compressed block is corrupted."""
+    pass
+
+
+class CodecStats(object):
+    """ Numbers of a compressed or decompressed stream. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.blocks = 0
+        self.raw_blocks = 0
+        # Plain and compressed bytes
+        self.plain_bytes = 0
+        self.encoded_bytes = 0
+        # Time spent compressing or decompressing, over all the threads
+        self.cpu_seconds = 0.0
+
+    def add(self, plain, encoded, raw, seconds):
+        with self._lock:
+            self.blocks += 1
+            self.raw_blocks += 1 if raw else 0
+            self.plain_bytes += plain
+            self.encoded_bytes += encoded
+            self.cpu_seconds += seconds
+
+    @property
+    def saved_bytes(self):
+        return self.plain_bytes - self.encoded_bytes
+
+    def __str__(self):
+        return ("%d bytes as %d (%d saved), %d of %d blocks raw, %.2fs cpu" %
+                (self.plain_bytes, self.encoded_bytes, self.saved_bytes,
+                 self.raw_blocks, self.blocks, self.cpu_seconds))
+
+
+class BlockCompressor(object):
+    """ Cuts a stream in blocks and compresses them in a thread pool.
+
+    Up to 2 * workers blocks are compressed ahead of the consumer, so the
+    sender doesn't wait for the compression as long as it keeps up.
+    """
+
+    def __init__(self, level=DEFAULT_LEVEL, block_size=DEFAULT_BLOCK_SIZE,
+                 workers=DEFAULT_WORKERS):
+        if not 0 < block_size <= MAX_BLOCK_SIZE:
+            raise ValueError("Invalid block size %d" % block_size)
+        self._level = level
+        self._block_size = block_size
+        self._workers = workers
+        self.stats = CodecStats()
+
+    def blocks(self, source):
+        """ Read a file-like object to the end and compress it.
+
+        :return: generator of (data, compressed) of the blocks, in order
+        """
+        executor = ThreadPoolExecutor(self._workers)
+        pending = collections.deque()
+        eof = False
+        try:
+            while True:
+                while not eof and len(pending) < 2 * self._workers:
+                    block = self._read_block(source)
+                    if block:
+                        pending.append(executor.submit(self.compress, block))
+                    else:
+                        eof = True
+                if not pending:
+                    return
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(wait=False)
+
+    def compress(self, block):
+        """
+        :return: (data, compressed), data is the block itself if it doesn't
+                 compress
+        """
+        start = time.time()
+        deflated = None
+        sample = block[:SAMPLE_SIZE]
+        if len(zlib.compress(sample, self._level)) < len(sample) * MAX_RATIO:
+            deflated = zlib.compress(block, self._level)
+            if len(deflated) >= len(block) * MAX_RATIO:
+                deflated = None
+        if deflated is None:
+            self.stats.add(len(block), len(block), True, time.time() - start)
+            return block, False
+        self.stats.add(len(block), len(deflated), False, time.time() - start)
+        return deflated, True
+
+    def _read_block(self, source):
+        block = ""
+        # Sources like sockets return less than asked for
+        while len(block) < self._block_size:
+            data = source.read(self._block_size - len(block))
+            if not data:
+                break
+            block += data
+        return block
+
+
+class BlockDecompressor(object):
+    """ Decompresses blocks in a thread pool and writes them in order.
+
+    Up to 2 * workers blocks are decompressed in the background, write()
+    waits for the oldest ones beyond that.
+    """
+
+    def __init__(self, sink, workers=DEFAULT_WORKERS):
+        """
+        :param sink: function called with the data of each block, in order
+        :type sink: function
+        """
+        self._sink = sink
+        self._executor = ThreadPoolExecutor(workers)
+        self._max_pending = 2 * workers
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self.stats = CodecStats()
+
+    def write(self, data, compressed):
+        """
+        :raise BlockCodecError: if a block is corrupted
+        """
+        with self._lock:
+            self._pending.append(
+                self._executor.submit(self.decompress, data, compressed))
+            self._flush(self._max_pending)
+
+    def close(self, flush=True):
+        """ Write the pending blocks, unless flush is False, and stop the
+        thread pool.
+        """
+        with self._lock:
+            try:
+                if flush:
+                    self._flush(0)
+            finally:
+                self._pending.clear()
+                self._executor.shutdown(wait=False)
+
+    def decompress(self, data, compressed):
+        if not compressed:
+            self.stats.add(len(data), len(data), True, 0.0)
+            return data
+        start = time.time()
+        decompressor = zlib.decompressobj()
+        try:
+            block = decompressor.decompress(data, MAX_BLOCK_SIZE)
+        except zlib.error, e:
+            raise BlockCodecError(str(e))
+        if decompressor.unconsumed_tail:
+            raise BlockCodecError("Block larger than %d bytes" %
+                                  MAX_BLOCK_SIZE)
+        self.stats.add(len(block), len(data), False, time.time() - start)
+        return block
+
+    def _flush(self, max_pending):
+        # Write the blocks that are done, and the oldest ones beyond
+        # max_pending once they are.
+        while self._pending and (self._pending[0].done() or
+                                 len(self._pending) > max_pending):
+            self._sink(self._pending.popleft().result())
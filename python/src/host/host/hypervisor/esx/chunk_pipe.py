@@ -0,0 +1,102 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import collections
+import threading
+
+
+class PipeClosed(Exception):
+    """The reader end of a ChunkPipe was closed."""
+    pass
+
+
+class PipeError(Exception):
+    """The writer end of a ChunkPipe failed."""
+    pass
+
+
+class ChunkPipe(object):
+    """Bounded buffer of chunks between a writer and a reader thread.
+
+    The writer blocks once max_chunks chunks are buffered, so the memory used
+    is bounded no matter how far the reader falls behind. The reader end is a
+    file-like read(), so it can be passed where a file is expected.
+    """
+
+    def __init__(self, max_chunks):
+        self._max_chunks = max_chunks
+        self._chunks = collections.deque()
+        self._cond = threading.Condition()
+        # Unread part of the chunk being read
+        self._partial = ""
+        self._eof = False
+        self._error = None
+        self._reader_closed = False
+        self.buffered = 0
+        self.peak_buffered = 0
+        self.bytes_written = 0
+
+    def write(self, data):
+        """Add a chunk, blocking while the buffer is full.
+
+        :type data: str
+        :raise PipeClosed if the reader is gone
+        """
+        with self._cond:
+            while len(self._chunks) >= self._max_chunks and \
+                    not self._reader_closed:
+                self._cond.wait()
+            if self._reader_closed:
+                raise PipeClosed()
+            self._chunks.append(data)
+            self.buffered += len(data)
+            self.bytes_written += len(data)
+            self.peak_buffered = max(self.peak_buffered, self.buffered)
+            self._cond.notify_all()
+
+    def close(self, error=None):
+        """Close the writer end. Reads return the buffered data then "", or
+        raise PipeError if error is set.
+        """
+        with self._cond:
+            self._eof = True
+            self._error = error
+            self._cond.notify_all()
+
+    def close_reader(self):
+        """Close the reader end, so that the writer stops."""
+        with self._cond:
+            self._reader_closed = True
+            self._chunks.clear()
+            self.buffered = 0
+            self._cond.notify_all()
+
+    def read(self, size):
+        """Read up to size bytes, blocking until some are available.
+
+        :return: the data, "" at the end of the stream
+        :raise PipeError if the writer failed
+        """
+        if not self._partial:
+            with self._cond:
+                while not self._chunks and not self._eof:
+                    self._cond.wait()
+                if not self._chunks:
+                    if self._error is not None:
+                        raise PipeError(self._error)
+                    return ""
+                self._partial = self._chunks.popleft()
+                self.buffered -= len(self._partial)
+                self._cond.notify_all()
+        data = self._partial[:size]
+        self._partial = self._partial[size:]
+        return data
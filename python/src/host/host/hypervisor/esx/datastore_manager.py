@@ -123,6 +123,15 @@ class EsxDatastoreManager(DatastoreManager, UpdateListener):
         return self._hypervisor.system.datastore_info(
             self._datastore_id_to_name_map[datastore_id])
 
+    def datastore_infos(self, datastore_ids):
+        with self.lock:
+            names = dict((datastore_id,
+                          self._datastore_id_to_name_map[datastore_id])
+                         for datastore_id in datastore_ids)
+        infos = self._hypervisor.system.datastore_infos(names.values())
+        return dict((datastore_id, infos[name])
+                    for datastore_id, name in names.iteritems())
+
     def _to_thrift_datastore(self, ds):
         """ From vim.Datastore to gen.resource.ttypes.Datastore
         """
@@ -12,35 +12,68 @@
 
 import httplib
 import logging
+import mmap
 import os
 import re
-import socket
 import threading
 import time
 import uuid
 
+from common.photon_thrift.connection_pool import get_connection_pool
 from common.photon_thrift.direct_client import DirectClient
 from common.lock import lock_non_blocking
 from gen.host import Host
 from gen.host.ttypes import HttpTicketRequest
 from gen.host.ttypes import HttpTicketResultCode
 from gen.host.ttypes import HttpOp
+from gen.host.ttypes import FinishImageUploadRequest
+from gen.host.ttypes import ImageUploadResultCode
 from gen.host.ttypes import ReceiveImageRequest
 from gen.host.ttypes import ReceiveImageResultCode
 from gen.host.ttypes import ServiceTicketRequest
 from gen.host.ttypes import ServiceTicketResultCode
 from gen.host.ttypes import ServiceType
+from gen.host.ttypes import StartImageUploadRequest
+from gen.host.ttypes import WriteImageDataRequest
+from host.hypervisor.esx.block_codec import BlockCompressor
+from host.hypervisor.esx.block_codec import BlockDecompressor
+from host.hypervisor.esx.block_codec import DEFAULT_BLOCK_SIZE
+from host.hypervisor.esx.chunk_pipe import ChunkPipe
+from host.hypervisor.esx.chunk_pipe import PipeClosed
+from host.hypervisor.esx.chunk_pipe import PipeError
 from host.hypervisor.esx.folder import IMAGE_FOLDER_NAME
+from host.hypervisor.esx.ranged_transfer import RangedDownloader
+from host.hypervisor.esx.ranged_transfer import RangesNotSupported
+from host.hypervisor.esx.ranged_transfer import TransferStats
 from host.hypervisor.esx.vim_client import VimClient
 from host.hypervisor.esx.vm_config import EsxVmConfig
 from host.hypervisor.esx.vm_config import os_image_manifest_path
 from host.hypervisor.esx.vm_config import os_metadata_path
 from host.hypervisor.esx.vm_manager import EsxVmManager
+from host.hypervisor.image_manager import ImageUploadNotFound
 from pyVmomi import vim
 
+try:
+    from sendfile import sendfile
+except ImportError:
+    sendfile = getattr(os, "sendfile", None)
+
 
 CHUNK_SIZE = 65536
 
+# Bytes sent per system call by uploads
+UPLOAD_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Chunks buffered between the download and the upload of a streamed transfer
+STREAM_BUFFER_CHUNKS = 64
+
+# Decompressed blocks buffered by an upload of blocks received from an agent
+UPLOAD_BUFFER_BLOCKS = 8
+
+# An upload of blocks received from an agent is aborted if no block came for
+# that long, e.g. because the sending agent died.
+UPLOAD_IDLE_TIMEOUT = 600
+
 
 class TransferException(Exception):
     def __init__(self, error):
@@ -83,12 +116,31 @@ class ReceiveImageException(Exception):
             self.error_code, self.error)
 
 
+class _BlockUpload(object):
+    """ Upload of blocks received from an agent, decompressed in order into
+    a pipe that a thread uploads from.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.pipe = ChunkPipe(UPLOAD_BUFFER_BLOCKS)
+        self.decompressor = BlockDecompressor(self.pipe.write)
+        self.thread = None
+        self.error = None
+        self.start = self.last_write = time.time()
+
+
 class HttpTransferer(object):
     """ Class for handling HTTP-based data transfers between ESX hosts. """
 
-    def __init__(self, vim_client):
+    def __init__(self, vim_client, upload_buffer_size=UPLOAD_BUFFER_SIZE):
         self._logger = logging.getLogger(__name__)
         self._vim_client = vim_client
+        self._ranged_downloader = RangedDownloader(chunk_size=CHUNK_SIZE)
+        self._upload_buffer_size = upload_buffer_size
+        # upload id -> _BlockUpload
+        self._uploads = {}
+        self._uploads_lock = threading.Lock()
 
     def _open_connection(self, host, protocol):
         if protocol == "http":
@@ -116,44 +168,72 @@ class HttpTransferer(object):
                     CHUNK_SIZE * counter / 1024))
             data = src.read(CHUNK_SIZE)
 
+    def _get_agent_client(self, host, port):
+        """ Get a Host client, from the shared connection pool if any. """
+        pool = get_connection_pool()
+        if pool:
+            return pool.acquire("Host", Host.Client, host, port)
+        agent_client = DirectClient("Host", Host.Client, host, port)
+        agent_client.connect()
+        return agent_client
+
+    def _release_agent_client(self, agent_client, reusable=True):
+        pool = get_connection_pool()
+        if pool:
+            pool.release(agent_client, reusable)
+        else:
+            agent_client.close()
+
     def _get_cgi_ticket(self, host, port, url, http_op=HttpOp.GET):
-        client = DirectClient("Host", Host.Client, host, port)
-        client.connect()
-        request = HttpTicketRequest(op=http_op, url="%s" % url)
-        response = client.get_http_ticket(request)
+        client = self._get_agent_client(host, port)
+        reusable = False
+        try:
+            request = HttpTicketRequest(op=http_op, url="%s" % url)
+            response = client.get_http_ticket(request)
+            reusable = True
+        finally:
+            self._release_agent_client(client, reusable)
         if response.result != HttpTicketResultCode.OK:
             raise ValueError("No ticket")
         return response.ticket
 
     def upload_stream(self, source_file_obj, file_size, url,
                       ticket):
+        """ Upload the content of a file-like object.
+
+        The content of a file over plain HTTP is sent by the kernel with
+        sendfile, or from a mmap of the file where sendfile is missing,
+        instead of being read into strings.
+
+        :param file_size: size of the content, None if unknown, in which
+                          case the content is sent with chunked transfer
+                          encoding.
+        """
         protocol, host, selector = self._split_url(url)
-        self._logger.debug("Upload file of size: %d\nTo URL:\n%s://%s%s\n" %
+        self._logger.debug("Upload file of size: %s\nTo URL:\n%s://%s%s\n" %
                            (file_size, protocol, host, selector))
         conn = self._open_connection(host, protocol)
 
         req_type = "PUT"
         conn.putrequest(req_type, selector)
 
-        conn.putheader("Content-Length", file_size)
+        chunked = file_size is None
+        if chunked:
+            conn.putheader("Transfer-Encoding", "chunked")
+        else:
+            conn.putheader("Content-Length", file_size)
         conn.putheader("Overwrite", "t")
         if ticket:
             conn.putheader("Cookie", "vmware_cgi_ticket=%s" % ticket)
         conn.endheaders()
 
-        counter = 0
         try:
-            while True:
-                data = source_file_obj.read(CHUNK_SIZE)
-                if len(data) == 0:
-                    break
-
-                conn.send(data)
-                counter += 1
-                if counter % 100 == 0:
-                    self._logger.debug("Sent %d kB." % (
-                        CHUNK_SIZE * counter / 1024))
-        except socket.error, e:
+            if not chunked and protocol == "http" and file_size > 0 and \
+                    isinstance(source_file_obj, file):
+                self._send_file(conn.sock, source_file_obj, file_size)
+            else:
+                self._send_stream(conn, source_file_obj, chunked)
+        except EnvironmentError, e:
             err_str = str(e)
             self._logger.info("Upload failed: %s" % err_str)
             raise TransferException(err_str)
@@ -166,6 +246,54 @@ class HttpTransferer(object):
 
         self._logger.debug("Upload of %s completed." % selector)
 
+    def _send_stream(self, conn, source_file_obj, chunked):
+        sent = 0
+        while True:
+            data = source_file_obj.read(self._upload_buffer_size)
+            if len(data) == 0:
+                break
+
+            if chunked:
+                conn.send("%x\r\n%s\r\n" % (len(data), data))
+            else:
+                conn.send(data)
+            sent += len(data)
+            self._logger.debug("Sent %d kB." % (sent / 1024))
+        if chunked:
+            conn.send("0\r\n\r\n")
+
+    def _send_file(self, sock, file_obj, length):
+        """ Send length bytes of a file from its current position, without
+        copying them to user space if sendfile is available.
+        """
+        offset = file_obj.tell()
+        end = offset + length
+        # sendfile doesn't wait for a socket with a timeout to be writable
+        if sendfile and sock.gettimeout() is None:
+            while offset < end:
+                sent = sendfile(sock.fileno(), file_obj.fileno(), offset,
+                                min(end - offset, self._upload_buffer_size))
+                if sent == 0:
+                    raise TransferException("File shorter than %d bytes" %
+                                            end)
+                offset += sent
+            return
+
+        if os.fstat(file_obj.fileno()).st_size < end:
+            raise TransferException("File shorter than %d bytes" % end)
+        # Map a window of the file at a time, files can be larger than the
+        # address space. Windows start at a multiple of the granularity.
+        while offset < end:
+            start = offset - offset % mmap.ALLOCATIONGRANULARITY
+            length = min(end, offset + self._upload_buffer_size) - start
+            window = mmap.mmap(file_obj.fileno(), length,
+                               access=mmap.ACCESS_READ, offset=start)
+            try:
+                sock.sendall(buffer(window, offset - start))
+            finally:
+                window.close()
+            offset = start + length
+
     def upload_file(self, file_path, url, ticket=None):
         with open(file_path, "rb") as read_fp:
             file_size = os.stat(file_path).st_size
@@ -190,11 +318,151 @@ class HttpTransferer(object):
         return resp
 
     def download_file(self, url, path, ticket=None):
+        """ Download to a file. If the server serves byte ranges, they are
+        downloaded over several connections, and a download interrupted
+        resumes when it is retried to the same path.
+        """
+        try:
+            self._ranged_downloader.download(url, path, ticket)
+            return
+        except RangesNotSupported, e:
+            self._logger.debug("Downloading %s in one stream: %s" % (url, e))
+
         read_fp = self.get_download_stream(url, ticket)
         with open(path, "wb") as file:
             for data in self._get_response_data(read_fp):
                 file.write(data)
 
+    def transfer_stream(self, src_url, dst_url, src_ticket=None,
+                        dst_ticket=None, buffer_chunks=STREAM_BUFFER_CHUNKS):
+        """ Upload the content downloaded from src_url to dst_url, without
+        storing it.
+
+        The download runs in another thread and hands the data to the upload
+        through a pipe of at most buffer_chunks chunks, so the transfer takes
+        as long as the slower side and uses bounded memory.
+
+        :rtype: TransferStats
+        """
+        start = time.time()
+        src = self.get_download_stream(src_url, src_ticket)
+        length = src.getheader("Content-Length")
+        pipe = ChunkPipe(buffer_chunks)
+        downloader = threading.Thread(target=self._download_to_pipe,
+                                      args=(src, pipe))
+        downloader.daemon = True
+        downloader.start()
+        try:
+            self.upload_stream(pipe, int(length) if length else None,
+                               dst_url, dst_ticket)
+        except PipeError, e:
+            raise TransferException(str(e))
+        finally:
+            # Stops the download if the upload failed
+            pipe.close_reader()
+            downloader.join()
+
+        stats = TransferStats(pipe.bytes_written, time.time() - start,
+                              pipe.peak_buffered)
+        self._logger.info("Streamed %s to %s: %s" % (src_url, dst_url, stats))
+        return stats
+
+    def _download_to_pipe(self, src, pipe):
+        try:
+            for data in self._get_response_data(src):
+                pipe.write(data)
+        except Exception, e:
+            self._logger.info("Download failed: %s" % e)
+            pipe.close(error=str(e))
+        else:
+            pipe.close()
+
+    def start_upload(self, url, size=None):
+        """ Start uploading to url the blocks then passed to write_upload,
+        e.g. by an agent sending an image to this host.
+
+        :param size: size of the decompressed content, None if unknown
+        :return: upload id
+        """
+        self._abort_idle_uploads()
+        upload = _BlockUpload(url)
+        upload.thread = threading.Thread(target=self._upload_from_pipe,
+                                         args=(upload, size))
+        upload.thread.daemon = True
+        upload_id = str(uuid.uuid4())
+        with self._uploads_lock:
+            self._uploads[upload_id] = upload
+        upload.thread.start()
+        return upload_id
+
+    def write_upload(self, upload_id, data, compressed):
+        """ Add the next block of an upload.
+
+        :raise ImageUploadNotFound: if no upload has the id
+        :raise TransferException: if the upload failed
+        """
+        with self._uploads_lock:
+            upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise ImageUploadNotFound(upload_id)
+        upload.last_write = time.time()
+        try:
+            upload.decompressor.write(data, compressed)
+        except PipeClosed:
+            raise TransferException(upload.error or "Upload stopped")
+
+    def finish_upload(self, upload_id, abort=False):
+        """ Wait for an upload to complete, or stop it if abort is set.
+
+        :rtype: CodecStats of the decompression
+        :raise ImageUploadNotFound: if no upload has the id
+        :raise TransferException: if the upload failed
+        """
+        with self._uploads_lock:
+            upload = self._uploads.pop(upload_id, None)
+        if upload is None:
+            raise ImageUploadNotFound(upload_id)
+        self._close_upload(upload, "Upload aborted" if abort else None)
+        if abort:
+            self._logger.info("Aborted upload to %s" % upload.url)
+        elif upload.error:
+            raise TransferException(upload.error)
+        else:
+            self._logger.info("Uploaded to %s in %.1fs: %s" %
+                              (upload.url, time.time() - upload.start,
+                               upload.decompressor.stats))
+        return upload.decompressor.stats
+
+    def _close_upload(self, upload, error):
+        try:
+            upload.decompressor.close(flush=error is None)
+        except Exception, e:
+            error = str(e) or "Upload stopped"
+        upload.pipe.close(error=error)
+        upload.thread.join()
+        if error and not upload.error:
+            upload.error = error
+
+    def _upload_from_pipe(self, upload, size):
+        try:
+            self.upload_stream(upload.pipe, size, upload.url, None)
+        except Exception, e:
+            self._logger.info("Upload to %s failed: %s" % (upload.url, e))
+            upload.error = str(e)
+        finally:
+            # Stops the writes if the upload ended early
+            upload.pipe.close_reader()
+
+    def _abort_idle_uploads(self):
+        expired = time.time() - UPLOAD_IDLE_TIMEOUT
+        with self._uploads_lock:
+            idle = [upload_id for upload_id, upload in
+                    self._uploads.iteritems() if upload.last_write < expired]
+            idle = [self._uploads.pop(upload_id) for upload_id in idle]
+        for upload in idle:
+            self._logger.info("Aborting idle upload to %s" % upload.url)
+            self._close_upload(upload, "Upload idle")
+
 
 class HttpNfcTransferer(HttpTransferer):
     """ Class for handling HTTP-based disk transfers between ESX hosts.
@@ -204,13 +472,28 @@ class HttpNfcTransferer(HttpTransferer):
     initial export of the VMDK into the stream optimized format needed by
     ImportVApp.
 
+    If a compression level is set, the disk is sent compressed to the agent
+    of the destination host, which uploads it to the import url, instead of
+    being uploaded to the url directly.
+
     """
 
     LEASE_INITIALIZATION_WAIT_SECS = 10
 
-    def __init__(self, vim_client, image_datastores, host_name="localhost"):
+    def __init__(self, vim_client, image_datastores, host_name="localhost",
+                 streaming=True, compression_level=0,
+                 compression_block_size=DEFAULT_BLOCK_SIZE):
+        """
+        :param compression_level: zlib level of the compression of the
+                                  transferred disks, 0 to disable it
+        :param compression_block_size: size of the blocks compressed
+                                       independently
+        """
         super(HttpNfcTransferer, self).__init__(vim_client)
         self.lock = threading.Lock()
+        self._streaming = streaming
+        self._compression_level = compression_level
+        self._compression_block_size = compression_block_size
         self._shadow_vm_id = "shadow_%s" % self._vim_client.host_uuid
         self._lease_url_host_name = host_name
         self._image_datastores = image_datastores
@@ -218,13 +501,17 @@ class HttpNfcTransferer(HttpTransferer):
         self._vm_manager = EsxVmManager(self._vim_client, None)
 
     def _get_remote_connections(self, host, port):
-        agent_client = DirectClient("Host", Host.Client, host, port)
-        agent_client.connect()
-        request = ServiceTicketRequest(service_type=ServiceType.VIM)
-        response = agent_client.get_service_ticket(request)
+        agent_client = self._get_agent_client(host, port)
+        try:
+            request = ServiceTicketRequest(service_type=ServiceType.VIM)
+            response = agent_client.get_service_ticket(request)
+        except Exception:
+            self._release_agent_client(agent_client, reusable=False)
+            raise
         if response.result != ServiceTicketResultCode.OK:
             self._logger.info("Get service ticket failed. Response = %s" %
                               str(response))
+            self._release_agent_client(agent_client)
             raise ValueError("No ticket")
         vim_client = VimClient(
             host=host, ticket=response.vim_ticket, auto_sync=False)
@@ -397,43 +684,72 @@ class HttpNfcTransferer(HttpTransferer):
     def send_image_to_host(self, image_id, image_datastore,
                            destination_image_id, destination_datastore,
                            host, port, intermediate_file_path=None):
+        """ Transfer an image to a datastore of another host.
+
+        The stream-optimized disk exported from the shadow vm is uploaded to
+        the destination as it is downloaded. If streaming is disabled, or an
+        intermediate_file_path is given, the disk is downloaded to the file
+        first, then uploaded.
+        """
         manifest, metadata = self._read_metadata(image_datastore, image_id)
 
         read_lease, disk_url = self._get_image_stream_from_shadow_vm(
             image_id, image_datastore)
 
-        # Save stream-optimized disk to a unique path locally for now.
-        # TODO(vui): Switch to chunked transfers to handle not knowing content
-        # length in the full streaming mode.
-
-        if intermediate_file_path:
-            tmp_path = intermediate_file_path
-        else:
-            tmp_path = "/vmfs/volumes/%s/%s_transfer.vmdk" % (
-                self._get_shadow_vm_datastore(),
-                self._shadow_vm_id)
+        streaming = self._streaming and not intermediate_file_path
+        src_url = tmp_path = None
         try:
-            self.download_file(disk_url, tmp_path)
-        finally:
-            read_lease.Complete()
+            if streaming:
+                src_url = disk_url
+            else:
+                # Save stream-optimized disk to a unique path locally.
+                if intermediate_file_path:
+                    tmp_path = intermediate_file_path
+                else:
+                    tmp_path = "/vmfs/volumes/%s/%s_transfer.vmdk" % (
+                        self._get_shadow_vm_datastore(),
+                        self._shadow_vm_id)
+                try:
+                    self.download_file(disk_url, tmp_path)
+                finally:
+                    read_lease.Complete()
 
-        if destination_image_id is None:
-            destination_image_id = image_id
+            return self._import_image_at_host(
+                src_url, tmp_path, destination_image_id or image_id,
+                destination_datastore, host, port, metadata, manifest)
+        finally:
+            if streaming:
+                read_lease.Complete()
+
+    def _import_image_at_host(self, src_url, tmp_path, destination_image_id,
+                              destination_datastore, host, port, metadata,
+                              manifest):
+        """ Upload the disk from src_url, or from tmp_path if src_url is
+        None, into a vm imported at the host, and register it as an image.
+        """
         spec = self._create_import_vm_spec(
             destination_image_id, destination_datastore)
 
         agent_client, vim_client = self._get_remote_connections(host, port)
+        reusable = False
         try:
             write_lease, disk_url = self._get_url_from_import_vm(vim_client,
                                                                  spec)
             try:
-                self.upload_file(tmp_path, disk_url)
+                if self._compression_level:
+                    self._upload_through_agent(agent_client, src_url,
+                                               tmp_path, disk_url)
+                elif src_url:
+                    self.transfer_stream(src_url, disk_url)
+                else:
+                    self.upload_file(tmp_path, disk_url)
             finally:
                 write_lease.Complete()
-                try:
-                    os.unlink(tmp_path)
-                except OSError:
-                    pass
+                if tmp_path:
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
 
             # TODO(vui): imported vm name should be made unique to remove
             # ambiguity during subsequent lookup
@@ -442,9 +758,70 @@ class HttpNfcTransferer(HttpTransferer):
             self._register_imported_image_at_host(
                 agent_client, destination_image_id, destination_datastore,
                 imported_vm_name, metadata, manifest)
+            reusable = True
 
         finally:
-            agent_client.close()
+            self._release_agent_client(agent_client, reusable)
             vim_client.disconnect()
 
         return imported_vm_name
+
+    def _upload_through_agent(self, agent_client, src_url, tmp_path, url):
+        """ Send the disk from src_url, or from tmp_path if src_url is None,
+        compressed to the agent of the destination host, which uploads it
+        to url.
+
+        :rtype: CodecStats of the compression
+        """
+        start = time.time()
+        if src_url:
+            source = self.get_download_stream(src_url, None)
+            size = source.getheader("Content-Length")
+        else:
+            source = open(tmp_path, "rb")
+            size = os.fstat(source.fileno()).st_size
+        try:
+            response = agent_client.start_image_upload(
+                StartImageUploadRequest(url=url,
+                                        size=int(size) if size else None))
+            if response.result != ImageUploadResultCode.OK:
+                raise TransferException(response.error)
+            upload_id = response.upload_id
+
+            compressor = BlockCompressor(self._compression_level,
+                                         self._compression_block_size)
+            # Don't log the blocks
+            agent_client.request_log_level = logging.DEBUG
+            try:
+                for data, compressed in compressor.blocks(source):
+                    response = agent_client.write_image_data(
+                        WriteImageDataRequest(upload_id=upload_id, data=data,
+                                              compressed=compressed))
+                    if response.result != ImageUploadResultCode.OK:
+                        raise TransferException(response.error)
+            except:
+                self._abort_agent_upload(agent_client, upload_id)
+                raise
+            finally:
+                agent_client.request_log_level = logging.INFO
+
+            response = agent_client.finish_image_upload(
+                FinishImageUploadRequest(upload_id=upload_id))
+            if response.result != ImageUploadResultCode.OK:
+                raise TransferException(response.error)
+        finally:
+            source.close()
+
+        stats = compressor.stats
+        self._logger.info("Sent %s to %s in %.1fs: %s" %
+                          (src_url or tmp_path, url, time.time() - start,
+                           stats))
+        return stats
+
+    def _abort_agent_upload(self, agent_client, upload_id):
+        try:
+            agent_client.finish_image_upload(
+                FinishImageUploadRequest(upload_id=upload_id, abort=True))
+        except Exception:
+            self._logger.info("Failed to abort upload %s" % upload_id,
+                              exc_info=True)
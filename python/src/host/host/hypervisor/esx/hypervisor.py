@@ -13,7 +13,6 @@
 """Module to manage ESX modules"""
 
 import atexit
-import copy
 import logging
 
 from thrift import TSerialization
@@ -60,8 +59,11 @@ class EsxHypervisor(object):
                                                  agent_config.networks)
         self.system = EsxSystem(self.vim_client)
         self.image_manager.monitor_for_cleanup()
-        self.image_transferer = HttpNfcTransferer(self.vim_client,
-                                                  image_datastores)
+        self.image_manager.monitor_images()
+        self.image_transferer = HttpNfcTransferer(
+            self.vim_client, image_datastores,
+            compression_level=agent_config.image_transfer_compression_level,
+            compression_block_size=agent_config.image_transfer_block_size)
         atexit.register(self.image_manager.cleanup)
 
     @property
@@ -81,10 +83,11 @@ class EsxHypervisor(object):
         # get average cpu load percentage in past 20 seconds
         # since hostd takes a sample in every 20 seconds
         # we use the min 20secs here to get the latest
-        # CPU active average over 1 minute
-        host_stats = copy.copy(self.vim_client.get_perf_manager_stats(20))
+        # CPU active average over 1 minute. The samples are in memory, no
+        # need to query hostd.
+        host_stats = self.vim_client.get_perf_manager_stats(20)
 
-        cpu_load = host_stats['rescpu.actav1'] / 100
+        cpu_load = host_stats.get('rescpu.actav1', 0) / 100
 
         return max(memory_load, cpu_load)
 
@@ -117,6 +120,15 @@ class EsxHypervisor(object):
         self.image_manager.receive_image(
             image_id, datastore, imported_vm_name, metadata, manifest)
 
+    def start_image_upload(self, url, size):
+        return self.image_transferer.start_upload(url, size)
+
+    def write_image_data(self, upload_id, data, compressed):
+        self.image_transferer.write_upload(upload_id, data, compressed)
+
+    def finish_image_upload(self, upload_id, abort):
+        self.image_transferer.finish_upload(upload_id, abort)
+
     def set_memory_overcommit(self, memory_overcommit):
         # Enable/Disable large page support. If this host is removed
         # from the deployment, large page support will need to be
@@ -47,6 +47,7 @@ from host.hypervisor.esx.vm_config import os_vmdk_path
 from host.hypervisor.esx.vm_config import tmp_image_path
 from host.hypervisor.esx.vm_config import tmp_image_folder_os_path
 from host.hypervisor.esx.vm_config import vmdk_path
+from host.hypervisor.image_catalog import ImageCatalog
 from host.hypervisor.image_manager import DirectoryNotFound
 from host.hypervisor.image_manager import ImageManager
 from host.hypervisor.image_manager import ImageInUse
@@ -65,6 +66,7 @@ GC_IMAGE_FOLDER = "deleted_images"
 class EsxImageManager(ImageManager):
     NUM_MAKEDIRS_ATTEMPTS = 10
     DEFAULT_TMP_IMAGES_CLEANUP_INTERVAL = 600.0
+    DEFAULT_IMAGE_CATALOG_REFRESH_INTERVAL = 60.0
     IMAGE_TOMBSTONE_FILE_NAME = "image_tombstone.txt"
     IMAGE_MARKER_FILE_NAME = "unused_image_marker.txt"
     IMAGE_TIMESTAMP_FILE_NAME = "image_timestamp.txt"
@@ -76,6 +78,8 @@ class EsxImageManager(ImageManager):
         self._vim_client = vim_client
         self._ds_manager = ds_manager
         self._image_reaper = None
+        self._catalog_refresher = None
+        self._catalog = ImageCatalog(self._list_images)
         self._uwsim_nas_exist = None
         agent_config = services.get(ServiceName.AGENT_CONFIG)
         self._in_uwsim = agent_config.in_uwsim
@@ -86,9 +90,33 @@ class EsxImageManager(ImageManager):
         self._image_reaper.daemon = True
         self._image_reaper.start()
 
+    def monitor_images(
+            self, refresh_interval=DEFAULT_IMAGE_CATALOG_REFRESH_INTERVAL):
+        self._catalog_refresher = Periodic(self.refresh_images,
+                                           refresh_interval)
+        self._catalog_refresher.daemon = True
+        self._catalog_refresher.start()
+
     def cleanup(self):
         if self._image_reaper is not None:
             self._image_reaper.stop()
+        if self._catalog_refresher is not None:
+            self._catalog_refresher.stop()
+
+    def refresh_images(self):
+        """ Relist the images on the datastores to pick up the images
+        created or deleted by other hosts sharing the datastores.
+        """
+        datastores = [ds.id for ds in self._ds_manager.get_datastores()]
+        self._catalog.refresh(datastores)
+
+    def has_image(self, image_id, datastore):
+        return self._catalog.has_image(image_id, datastore)
+
+    def datastores_with_image(self, image_id, datastores):
+        if image_id is None:
+            return []
+        return self._catalog.datastores_with_image(image_id, datastores)
 
     @log_duration
     def check_image(self, image_id, datastore):
@@ -219,6 +247,9 @@ class EsxImageManager(ImageManager):
         return os_vmdk_path(datastore_id, image_id, IMAGE_FOLDER_NAME)
 
     def image_size(self, image_id):
+        return self._catalog.size(image_id, self._image_size)
+
+    def _image_size(self, image_id):
         # TODO(mmutsuzaki) We should iterate over all the image datastores
         # until we find one that has the image.
         image_ds = list(self._ds_manager.image_datastores())[0]
@@ -390,8 +421,10 @@ class EsxImageManager(ImageManager):
             raise
         except DiskAlreadyExistException:
             self._logger.info("Image %s already copied" % image_id)
+            self._catalog.add(datastore, image_id)
             rm_rf(tmp_dir)
             raise
+        self._catalog.add(datastore, image_id)
 
     """
     The following method should be used to check
@@ -482,6 +515,7 @@ class EsxImageManager(ImageManager):
             # The image is copied, presumably via some other concurrent
             # copy, so we move on.
             self._logger.info("Image %s already copied" % dest_id)
+            self._catalog.add(dest_datastore, dest_id)
             raise DiskAlreadyExistException("Image already exists")
 
         # Copy image to the tmp directory.
@@ -559,12 +593,19 @@ class EsxImageManager(ImageManager):
         :param datastore: datastore id
         :return: list of string, image id list
         """
+        return self._catalog.images(datastore)
+
+    def _list_images(self, datastore):
         image_ids = []
 
         # image_folder is /vmfs/volumes/${datastore}/images
         image_folder = os_datastore_path(datastore, IMAGE_FOLDER_NAME)
 
         if not os.path.exists(image_folder):
+            # The image folder is only created with the first image on the
+            # datastore.
+            if os.path.exists(os_datastore_path(datastore, "")):
+                return image_ids
             raise DatastoreNotFoundException()
 
         # prefix is the 2-digit prefix of image id
@@ -741,6 +782,7 @@ class EsxImageManager(ImageManager):
         dst_dir = os.path.join(gc_dir, rnd_uuid)
         os.makedirs(dst_dir)
         shutil.move(src_path, dst_dir)
+        self._catalog.remove(datastore_id, image_id)
 
     def _clean_gc_dir(self, datastore_id):
         """
@@ -1204,6 +1246,7 @@ class EsxImageManager(ImageManager):
                     os_datastore_path(datastore_id, GC_IMAGE_FOLDER),
                     image_id)
                 self._image_sweeper_rename(curdir, trash_dir)
+                self._catalog.remove(datastore_id, image_id)
             # Unlock
 
         # Delete image
@@ -0,0 +1,206 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import logging
+import threading
+
+from pyVmomi import vim
+
+
+# Hostd samples the host counters every 20 seconds, and keeps 180 samples
+# that span an hour.
+SAMPLE_INTERVAL = 20
+SAMPLE_HISTORY = 180
+
+
+class SampleWindow(object):
+    """Last samples of a counter.
+
+    The buffer keeps the running sum of the samples instead of the samples,
+    in a ring of capacity + 1 entries where entry i % (capacity + 1) is the
+    sum of the first i samples. The sum of the last n samples is the
+    difference of two entries, so averages over any window are O(1).
+    """
+
+    def __init__(self, capacity=SAMPLE_HISTORY):
+        self._capacity = capacity
+        self._sums = [0] * (capacity + 1)
+        # Number of samples added so far
+        self._count = 0
+
+    def add(self, value):
+        total = self._sum_at(self._count) + value
+        self._count += 1
+        self._sums[self._count % len(self._sums)] = total
+
+    def average(self, samples):
+        """Average of the last samples.
+
+        :param samples: number of samples to average, capped to the number
+                        of samples kept
+        :type samples: int
+        :return: the average, None if there is no sample
+        :rtype: int
+        """
+        samples = min(samples, self._count, self._capacity)
+        if samples <= 0:
+            return None
+        return (self._sum_at(self._count) -
+                self._sum_at(self._count - samples)) / samples
+
+    def __len__(self):
+        return min(self._count, self._capacity)
+
+    def _sum_at(self, count):
+        return self._sums[count % len(self._sums)]
+
+
+class PerfSampler(object):
+    """Samples host perf counters from the perf manager of hostd.
+
+    Each sample() only queries the samples taken by hostd since the last one
+    seen, and adds them to a SampleWindow per counter, so averages are served
+    from memory.
+
+    Counters are specified in the form of strings - <group>.<metric>. Their
+    ids are not well defined values, so they are looked up in the list of
+    all the counters by initialize().
+    """
+
+    def __init__(self, vim_client, counters, interval=SAMPLE_INTERVAL,
+                 history=SAMPLE_HISTORY):
+        self._logger = logging.getLogger(__name__)
+        self._vim_client = vim_client
+        self._interval = interval
+        self._history = history
+        self._lock = threading.Lock()
+        self._counters = list(counters)
+        # counter id -> counter name
+        self._ids = {}
+        # counter name -> SampleWindow
+        self._windows = {}
+        # Timestamp of the last sample, set by hostd
+        self._last_timestamp = None
+
+    @property
+    def interval(self):
+        return self._interval
+
+    def add_counter(self, counter):
+        """Track another counter. It is sampled once initialize() runs again.
+
+        :type counter: str
+        """
+        with self._lock:
+            if counter not in self._counters:
+                self._counters.append(counter)
+
+    def initialize(self):
+        """Look up the ids of the counters. Samples of the counters already
+        tracked are kept.
+        """
+        ids = {}
+        for c in self._vim_client.perf_manager.perfCounter:
+            counter = "%s.%s" % (c.groupInfo.key, c.nameInfo.key)
+            if counter in self._counters:
+                ids[c.key] = counter
+        with self._lock:
+            self._ids = ids
+            for counter in ids.itervalues():
+                if counter not in self._windows:
+                    self._windows[counter] = SampleWindow(self._history)
+            # New counters need the whole history
+            self._last_timestamp = None
+
+    def sample(self):
+        """Add the samples taken since the last call.
+
+        :return: number of new samples
+        :rtype: int
+        """
+        with self._lock:
+            ids = dict(self._ids)
+            last_timestamp = self._last_timestamp
+        if not ids:
+            return 0
+
+        query_spec = vim.PerfQuerySpec(
+            entity=self._vim_client.host_system,
+            intervalId=self._interval,
+            metricId=[vim.PerfMetricId(counterId=counter_id, instance="")
+                      for counter_id in ids],
+        )
+        if last_timestamp is None:
+            query_spec.maxSample = self._history
+        else:
+            # Only the samples after startTime are returned
+            query_spec.startTime = last_timestamp
+        stats = self._vim_client.perf_manager.QueryPerf([query_spec])
+
+        added = 0
+        with self._lock:
+            if self._last_timestamp != last_timestamp:
+                # Another sample() got there first
+                return 0
+            for stat in stats or []:
+                timestamps = [info.timestamp for info in stat.sampleInfo]
+                # Skip the samples that are already added
+                start = 0
+                while start < len(timestamps) and last_timestamp and \
+                        timestamps[start] <= last_timestamp:
+                    start += 1
+                for value in stat.value:
+                    window = self._windows.get(ids.get(value.id.counterId))
+                    if window is None:
+                        continue
+                    for v in value.value[start:]:
+                        window.add(int(v))
+                if len(timestamps) > start:
+                    added = max(added, len(timestamps) - start)
+                    self._last_timestamp = timestamps[-1]
+        self._logger.debug("Added %d perf samples" % added)
+        return added
+
+    def average(self, counter, time_delta):
+        """Average of a counter over the last time_delta seconds.
+
+        :type counter: str
+        :param time_delta: in seconds
+        :type time_delta: int
+        :return: the average, None if there is no sample
+        :rtype: int
+        """
+        with self._lock:
+            window = self._windows.get(counter)
+            if window is None:
+                return None
+            return window.average(self._samples(time_delta))
+
+    def averages(self, time_delta):
+        """Averages of all the counters with samples.
+
+        :param time_delta: in seconds
+        :type time_delta: int
+        :return: counter -> average
+        :rtype: dict
+        """
+        samples = self._samples(time_delta)
+        with self._lock:
+            results = {}
+            for counter, window in self._windows.iteritems():
+                average = window.average(samples)
+                if average is not None:
+                    results[counter] = average
+            return results
+
+    def _samples(self, time_delta):
+        return max(1, time_delta / self._interval)
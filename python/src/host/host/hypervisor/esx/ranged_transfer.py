@@ -0,0 +1,282 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import base64
+import hashlib
+import httplib
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import urlparse
+
+from concurrent.futures import ThreadPoolExecutor
+
+from common.file_util import atomic_write_file
+
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+DEFAULT_STREAMS = 4
+DEFAULT_RANGE_SIZE = 32 * 1024 * 1024
+RANGE_RETRIES = 3
+
+# Seconds a range connection may stay silent before the range is retried
+RANGE_TIMEOUT = 60
+
+
+class RangesNotSupported(Exception):
+    """The server doesn't serve byte ranges of the URL."""
+    pass
+
+
+class RangeDownloadError(Exception):
+    """A byte range couldn't be downloaded."""
+    pass
+
+
+class TransferStats(object):
+    """ Numbers of a transfer. """
+
+    def __init__(self, bytes, seconds, peak_buffered=0):
+        self.bytes = bytes
+        self.seconds = seconds
+        self.peak_buffered = peak_buffered
+
+    @property
+    def throughput(self):
+        """ Bytes per second. """
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes / self.seconds
+
+    def __str__(self):
+        return ("%d bytes in %.1fs (%.1f MB/s), peak buffer %d kB" %
+                (self.bytes, self.seconds, self.throughput / (1024 ** 2),
+                 self.peak_buffered / 1024))
+
+
+class Checkpoint(object):
+    """ Byte ranges of a download that are done, with their checksum.
+
+    The checkpoint is saved next to the downloaded file after each range, so
+    an interrupted download only fetches the ranges that are missing. Saved
+    ranges are only trusted if they were downloaded from the same source,
+    and the file still has the same checksum.
+    """
+
+    def __init__(self, path, source, size, range_size):
+        """
+        :param source: identity of the content downloaded, e.g. the URL and
+                       the ETag and Last-Modified headers of the response
+        :type source: list of str
+        """
+        self._path = path
+        self._source = source
+        self._size = size
+        self._range_size = range_size
+        self._lock = threading.Lock()
+        # range start -> md5 of the range
+        self._ranges = {}
+
+    def load(self):
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return
+        if data.get("source") == self._source and \
+                data.get("size") == self._size and \
+                data.get("range_size") == self._range_size:
+            self._ranges = dict((int(start), checksum) for start, checksum
+                                in data["ranges"].iteritems())
+
+    def is_done(self, file_path, start, end):
+        """ Check that a range is done and that the file has it. """
+        with self._lock:
+            checksum = self._ranges.get(start)
+        if checksum is None:
+            return False
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            return _md5(f, end - start) == checksum
+
+    def done(self, start, checksum):
+        with self._lock:
+            self._ranges[start] = checksum
+            with atomic_write_file(self._path) as f:
+                json.dump({"source": self._source,
+                           "size": self._size,
+                           "range_size": self._range_size,
+                           "ranges": self._ranges}, f)
+
+    def remove(self):
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+
+def _md5(f, length, chunk_size=65536):
+    md5 = hashlib.md5()
+    while length > 0:
+        data = f.read(min(chunk_size, length))
+        if not data:
+            break
+        md5.update(data)
+        length -= len(data)
+    return md5.hexdigest()
+
+
+class RangedDownloader(object):
+    """ Downloads a URL to a file over several connections.
+
+    The content is split in byte ranges of range_size, downloaded by up to
+    streams concurrent connections. A range that fails, or that doesn't
+    match the Content-MD5 sent by the server, is retried on a new
+    connection, so a dropped connection only costs the range it was on. The
+    ranges done are recorded in a Checkpoint so that downloading the same
+    URL to the same path again resumes where it stopped, unless the server
+    reports a different ETag or Last-Modified for it.
+    """
+
+    def __init__(self, streams=DEFAULT_STREAMS, range_size=DEFAULT_RANGE_SIZE,
+                 retries=RANGE_RETRIES, chunk_size=65536,
+                 timeout=RANGE_TIMEOUT):
+        self._logger = logging.getLogger(__name__)
+        self._streams = streams
+        self._range_size = range_size
+        self._retries = retries
+        self._chunk_size = chunk_size
+        self._timeout = timeout
+
+    def download(self, url, path, ticket=None):
+        """ Download url to path.
+
+        :rtype: TransferStats
+        :raise RangesNotSupported if the server doesn't serve byte ranges,
+               before anything is written.
+        :raise RangeDownloadError if a range still fails after the retries.
+               The ranges done are kept for the next attempt.
+        """
+        start_time = time.time()
+        size, validators = self._probe(url, ticket)
+
+        checkpoint = Checkpoint(path + CHECKPOINT_SUFFIX, [url] + validators,
+                                size, self._range_size)
+        if os.path.exists(path):
+            checkpoint.load()
+        with open(path, "ab") as f:
+            f.truncate(size)
+
+        ranges = [(start, min(start + self._range_size, size))
+                  for start in xrange(0, size, self._range_size)]
+        missing = [(start, end) for start, end in ranges
+                   if not checkpoint.is_done(path, start, end)]
+        self._logger.info("Downloading %d of %d ranges of %s" %
+                          (len(missing), len(ranges), url))
+
+        if missing:
+            executor = ThreadPoolExecutor(min(self._streams, len(missing)))
+            try:
+                futures = [executor.submit(self._download_range, url, ticket,
+                                           path, start, end, checkpoint)
+                           for start, end in missing]
+                for future in futures:
+                    # The other ranges go on, so their progress is saved
+                    future.result()
+            finally:
+                executor.shutdown(wait=True)
+        checkpoint.remove()
+
+        stats = TransferStats(sum(end - start for start, end in missing),
+                              time.time() - start_time)
+        self._logger.info("Downloaded %s: %s" % (url, stats))
+        return stats
+
+    def _request(self, url, ticket, range_header):
+        parsed = urlparse.urlsplit(url)
+        if parsed.scheme == "https":
+            conn = httplib.HTTPSConnection(parsed.netloc,
+                                           timeout=self._timeout)
+        else:
+            conn = httplib.HTTPConnection(parsed.netloc,
+                                          timeout=self._timeout)
+        selector = parsed.path
+        if parsed.query:
+            selector += "?" + parsed.query
+        conn.putrequest("GET", selector)
+        conn.putheader("Range", range_header)
+        if ticket:
+            conn.putheader("Cookie", "vmware_cgi_ticket=%s" % ticket)
+        conn.endheaders()
+        return conn, conn.getresponse()
+
+    def _probe(self, url, ticket):
+        """ Get the size of the content, and its ETag and Last-Modified. """
+        conn, resp = self._request(url, ticket, "bytes=0-0")
+        try:
+            content_range = resp.getheader("Content-Range") or ""
+            match = re.match(r"bytes 0-0/(\d+)$", content_range)
+            if resp.status != 206 or not match:
+                raise RangesNotSupported("%s: %d %s" % (url, resp.status,
+                                                        content_range))
+            validators = [resp.getheader("ETag") or "",
+                          resp.getheader("Last-Modified") or ""]
+            return int(match.group(1)), validators
+        finally:
+            conn.close()
+
+    def _download_range(self, url, ticket, path, start, end, checkpoint):
+        for attempt in xrange(self._retries):
+            try:
+                checksum = self._fetch_range(url, ticket, path, start, end)
+                checkpoint.done(start, checksum)
+                return
+            except (socket.error, httplib.HTTPException,
+                    RangeDownloadError), e:
+                self._logger.info("Range %d-%d of %s failed, attempt %d: %s" %
+                                  (start, end, url, attempt + 1, e))
+                error = e
+        raise RangeDownloadError("Range %d-%d of %s failed: %s" %
+                                 (start, end, url, error))
+
+    def _fetch_range(self, url, ticket, path, start, end):
+        conn, resp = self._request(url, ticket,
+                                   "bytes=%d-%d" % (start, end - 1))
+        try:
+            if resp.status != 206:
+                raise RangeDownloadError("HTTP %d %s" % (resp.status,
+                                                         resp.reason))
+            md5 = hashlib.md5()
+            length = 0
+            with open(path, "r+b") as f:
+                f.seek(start)
+                data = resp.read(self._chunk_size)
+                while data:
+                    length += len(data)
+                    if length > end - start:
+                        raise RangeDownloadError("Range too long")
+                    md5.update(data)
+                    f.write(data)
+                    data = resp.read(self._chunk_size)
+            if length != end - start:
+                raise RangeDownloadError("Got %d of %d bytes" %
+                                         (length, end - start))
+            expected = resp.getheader("Content-MD5")
+            if expected and base64.b64decode(expected) != md5.digest():
+                raise RangeDownloadError("Checksum mismatch")
+            return md5.hexdigest()
+        finally:
+            conn.close()
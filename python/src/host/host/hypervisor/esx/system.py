@@ -13,29 +13,19 @@
 """ESX host system."""
 
 import logging
-import threading
-import time
-from concurrent.futures import ThreadPoolExecutor
-import common
 
 from common.log import log_duration
+from host.hypervisor.datastore_manager import DatastoreNotFoundException
 from host.hypervisor.system import DatastoreInfo
 from host.hypervisor.system import MemoryInfo
 from host.hypervisor.system import System
 
-DATASTORE_INFO_CACHE_TTL = 60
-FETCH_TIMEOUT = 5
-
 
 class EsxSystem(System):
 
     def __init__(self, vim_client):
         self._logger = logging.getLogger(__name__)
-        self._lock = threading.RLock()
-        self._threadpool = common.services.get(ThreadPoolExecutor)
         self._vim_client = vim_client
-        self._datastore_info_cache = {}
-        self._pending_datastore_updates = {}
         self._num_physical_cpus = None
         self._total_vmusable_memory_mb = None
 
@@ -60,48 +50,46 @@ class EsxSystem(System):
     def datastore_info(self, datastore_id):
         """Returns the datastore info.
 
-        The backend call is expensive and sometimes takes in excess of 30
-        seconds to execute. This method uses a cache that is updated in the
-        background to reduce the latency as much as possible.
+        The capacity and free space of the datastores are kept up to date in
+        the vim client cache by the property collector updates, so hostd is
+        only queried for datastores the cache doesn't know yet.
         """
-        with self._lock:
-            if datastore_id in self._datastore_info_cache:
-                entry = self._datastore_info_cache[datastore_id]
-                if entry.is_stale(DATASTORE_INFO_CACHE_TTL):
-                    # update the datastore info in the background and return
-                    # the stale entry
-                    self._update_datastore_info(datastore_id)
-                self._logger.debug(
-                    "Using cached datastore info: %s" % datastore_id)
-                return entry.value
-            else:
-                future_result = self._update_datastore_info(datastore_id)
-
-        return future_result.result(FETCH_TIMEOUT)
-
-    def _update_datastore_info(self, datastore_id):
-        with self._lock:
-            if datastore_id in self._pending_datastore_updates:
-                return self._pending_datastore_updates[datastore_id]
-            else:
-                future_result = self._threadpool.submit(
-                    self._fetch_datastore_info, datastore_id)
-                self._pending_datastore_updates[datastore_id] = future_result
-                return future_result
+        return self.datastore_infos([datastore_id])[datastore_id]
 
     @log_duration
-    def _fetch_datastore_info(self, datastore_id):
+    def datastore_infos(self, datastore_ids):
+        """Returns the datastore info of several datastores.
+
+        The datastores missing from the cache are fetched in a single
+        property collector call.
+        """
         # XXX: datastore_id is a misnomer, the parameter is expected
         # to be a datastore name
-        self._logger.debug("Fetching fresh datastore info: %s" % datastore_id)
-        ds = self._vim_client.get_datastore(datastore_id).summary
-        total = float(ds.capacity) / (1024 ** 3)
-        free = float(ds.freeSpace) / (1024 ** 3)
-        result = DatastoreInfo(total, total - free)
-        with self._lock:
-            self._datastore_info_cache[datastore_id] = CacheEntry(result)
-            del self._pending_datastore_updates[datastore_id]
-        return result
+        spaces = {}
+        missing = []
+        for datastore_id in datastore_ids:
+            space = self._vim_client.get_datastore_space_in_cache(
+                datastore_id)
+            if space is None:
+                missing.append(datastore_id)
+            else:
+                spaces[datastore_id] = space
+
+        if missing:
+            self._logger.debug("Fetching datastore info: %s" % missing)
+            all_spaces = self._vim_client.get_datastore_spaces()
+            for datastore_id in missing:
+                if datastore_id not in all_spaces:
+                    raise DatastoreNotFoundException(
+                        "Datastore %s not found" % datastore_id)
+                spaces[datastore_id] = all_spaces[datastore_id]
+
+        infos = {}
+        for datastore_id, (capacity, free_space) in spaces.iteritems():
+            total = float(capacity) / (1024 ** 3)
+            free = float(free_space) / (1024 ** 3)
+            infos[datastore_id] = DatastoreInfo(total, total - free)
+        return infos
 
     def host_consumed_memory_mb(self):
         host_stats = self._vim_client.get_host_stats()
@@ -109,13 +97,3 @@ class EsxSystem(System):
             # Hostd has values in KB.
             return host_stats['mem.consumed'] / 1024
         return None
-
-
-class CacheEntry(object):
-
-    def __init__(self, value):
-        self.value = value
-        self.fetched = time.time()
-
-    def is_stale(self, ttl):
-        return time.time() - self.fetched > ttl
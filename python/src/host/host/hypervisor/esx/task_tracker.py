@@ -0,0 +1,122 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import logging
+import threading
+
+from concurrent.futures import Future
+
+from gen.agent.ttypes import TaskState
+
+
+class TaskFailed(Exception):
+    """A vim task failed without reporting an error."""
+    pass
+
+
+class TaskLost(Exception):
+    """A vim task was dropped by hostd before it finished."""
+    pass
+
+
+class TaskTracker(object):
+    """Tracks the state of vim tasks and hands out futures completed when the
+    tasks finish.
+
+    The state of the tasks comes from the property collector updates, so no
+    thread waits on a task: waiters block on the future, or register a done
+    callback that runs when the update completing the task is applied. The
+    callbacks run in the thread applying the updates, so they should be
+    quick.
+
+    A task can finish before anyone asks for its future, so the last state of
+    each task is kept until hostd drops the task.
+    """
+
+    def __init__(self):
+        self._logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # task moref id -> TaskCache
+        self._states = {}
+        # task moref id -> Future, for the tasks that are not done
+        self._futures = {}
+
+    def future(self, task_id):
+        """Get a future for a task.
+
+        :type task_id: str
+        :return: future set to the TaskCache of the task once it succeeds,
+                 or to the task error if it fails
+        :rtype: concurrent.futures.Future
+        """
+        with self._lock:
+            future = self._futures.get(task_id)
+            if future is not None:
+                return future
+            future = Future()
+            state = self._states.get(task_id)
+            if not self._is_done(state):
+                self._futures[task_id] = future
+                return future
+        self._complete(future, state)
+        return future
+
+    def update(self, task_id, state):
+        """Record the state of a task, and complete its future if it is done.
+
+        :type task_id: str
+        :type state: TaskCache
+        """
+        with self._lock:
+            self._states[task_id] = state
+            if not self._is_done(state):
+                return
+            future = self._futures.pop(task_id, None)
+        if future is not None:
+            self._complete(future, state)
+
+    def remove(self, task_id):
+        """Forget a task dropped by hostd.
+
+        :type task_id: str
+        """
+        with self._lock:
+            state = self._states.pop(task_id, None)
+            future = self._futures.pop(task_id, None)
+        if future is not None:
+            self._logger.warning("Task %s removed in state %s" %
+                                 (task_id, state))
+            future.set_exception(TaskLost("Task %s was removed before it "
+                                          "finished" % task_id))
+
+    def __contains__(self, task_id):
+        with self._lock:
+            return task_id in self._states
+
+    def __len__(self):
+        """Number of tasks with pending futures."""
+        with self._lock:
+            return len(self._futures)
+
+    @staticmethod
+    def _is_done(state):
+        return state is not None and \
+            state.state in (TaskState.error, TaskState.success)
+
+    @staticmethod
+    def _complete(future, state):
+        if state.state == TaskState.success:
+            future.set_result(state)
+        elif isinstance(state.error, BaseException):
+            future.set_exception(state.error)
+        else:
+            future.set_exception(TaskFailed(state.error or "No message"))
@@ -12,7 +12,6 @@
 
 """Wrapper around VIM API and Service Instance connection"""
 
-import copy
 import hashlib
 import httplib
 import logging
@@ -22,10 +21,10 @@ import threading
 import time
 import weakref
 
-from datetime import datetime
-from datetime import timedelta
+from concurrent import futures
 
 from common.blocking_dict import BlockingDict
+from common.blocking_dict import TimeoutError
 from common.cache import cached
 from common.lock import lock_with
 from common.log import log_duration_with
@@ -39,9 +38,16 @@ from pyVmomi import vim
 from pyVmomi import vmodl
 
 
+from host.hypervisor.resource_ledger import ResourceLedger
 from host.hypervisor.vm_manager import VmNotFoundException
+from host.hypervisor.vnc_port_index import VncPortIndex
 from host.hypervisor.esx import logging_wrappers
-from gen.agent.ttypes import VmCache, PowerState, TaskState
+from host.hypervisor.esx.perf_sampler import PerfSampler
+from host.hypervisor.esx.perf_sampler import SAMPLE_INTERVAL
+from host.hypervisor.esx.task_tracker import TaskTracker
+from host.hypervisor.esx.vm_cache import VmCacheSnapshot
+from host.hypervisor.esx.vm_cache import VmRecord
+from gen.agent.ttypes import PowerState, TaskState
 from gen.host.ttypes import HttpOp
 
 # constants from bora/vim/hostd/private/hostdCommon.h
@@ -57,6 +63,9 @@ VIM_NAMESPACE = "vim25/5.5"
 HOSTD_PORT = 443
 DEFAULT_TASK_TIMEOUT = 60 * 60  # one hour timeout
 
+# TODO(badhri): Should this be a config option?
+HOST_COUNTERS = ["mem.consumed", "rescpu.actav1"]
+
 
 # monkey patch to enable request logging
 connect.SoapStubAdapter = logging_wrappers.SoapStubAdapterWrapper
@@ -94,17 +103,26 @@ class VimClient(object):
 
     def __init__(self, host="localhost", user=None, pwd=None,
                  wait_timeout=10, min_interval=1, auto_sync=True,
-                 ticket=None, stats_interval=600, errback=None):
+                 ticket=None, stats_interval=SAMPLE_INTERVAL, errback=None):
         self._logger = logging.getLogger(__name__)
         self.host = host
         self.current_version = None
-        self._vm_cache = {}
+        # Current version of the vm cache. Only replaced while holding
+        # _vm_cache_lock, readers use it without locking.
+        self._vm_snapshot = VmCacheSnapshot()
+        self._vnc_ports = VncPortIndex()
+        # Memory and vCPUs of the valid VMs in the cache, keyed by moref id
+        self._vm_resources = ResourceLedger()
         self._vm_name_to_ref = BlockingDict()
-        self._host_stats = {}
+        self.perf_sampler = PerfSampler(self, HOST_COUNTERS)
         self._ds_name_properties = {}
+        # ds moref id -> (capacity, free space) in bytes
+        self._ds_space = {}
+        # ds name -> (capacity, free space), replaced on each change so it
+        # can be read without locking
+        self._ds_space_by_name = {}
         self._vm_cache_lock = threading.RLock()
-        self._host_cache_lock = threading.Lock()
-        self._task_cache = BlockingDict()
+        self._task_tracker = TaskTracker()
         self._task_counter_lock = threading.Lock()
         self._task_counter = 0
         self.filter = None
@@ -155,74 +173,18 @@ class VimClient(object):
 
     def initialize_host_counters(self):
         """ Initializes the the list of host perf counters that we are
-            interested in. The perf counters are specified in the form of
-            strings - <group>.<metric>. The ids for the counters are not well
-            defined values and the only way to get them is to read all the
-            counters and get the ids for the ones we are interested in.
+            interested in.
         """
-        # TODO(badhri): Should this be a config option?
-        host_counters = {
-            "mem.consumed": None,
-            "rescpu.actav1": None
-        }
-
-        self.id_to_counter_map = {}
-
-        # Initialize the perf counter ids.
-        for c in self.perf_manager.perfCounter:
-            counter = "%s.%s" % (c.groupInfo.key, c.nameInfo.key)
-            if counter in host_counters:
-                host_counters[counter] = c
-                self.id_to_counter_map[c.key] = counter
-
-        self.host_counters = [
-            vim.PerfMetricId(
-                counterId=_counter.key,
-                instance=""
-            )
-            for _counter in host_counters.values() if _counter
-        ]
-
-        # Samples are 20 seconds apart
-        self.stats_sample_interval = 20
+        self.perf_sampler.initialize()
 
     def get_perf_manager_stats(self, time_delta=3600):
-        """ Returns the host statistics by querying the perf manager on the
-            host for the configured performance counters.
+        """ Returns the host statistics averaged over time_delta, from the
+            samples of the configured performance counters in memory. The
+            samples are fetched from the perf manager by update_hosts_stats.
 
         :param time_delta [int]: in seconds
         """
-        # Get an time_delta worth of stats and summarize. These are
-        # stats are sampled by the performance manager every 20
-        # seconds. Hostd keeps 180 samples at the rate of 1 sample
-        # per 20 seconds, which results in samples that span an hour.
-        end_time = datetime.now()
-        start_time = end_time - timedelta(seconds=time_delta)
-        query_spec = [
-            vim.PerfQuerySpec(
-                entity=self.host_system,
-                intervalId=self.stats_sample_interval,
-                format='csv',
-                metricId=self.host_counters,
-                startTime=start_time,
-                endTime=end_time
-            )]
-        results = {}
-        stats = self.perf_manager.QueryPerf(query_spec)
-        if not stats:
-            return results
-
-        # Average the received stats. For now this implementation is only
-        # for consumed memory. If other stats are considered in future, the
-        # implementation might be per stat dependent.
-        for stat in stats:
-            values = stat.value
-            for value in values:
-                counter_id = value.id.counterId
-                counter_values = [int(i) for i in value.value.split(',')]
-                average = sum(counter_values) / len(counter_values)
-                results[self.id_to_counter_map[counter_id]] = average
-        return results
+        return self.perf_sampler.averages(time_delta)
 
     def connect_ticket(self, host, ticket):
         if ticket:
@@ -558,6 +520,35 @@ class VimClient(object):
         """
         return self.get_datastore_folder().childEntity
 
+    def get_datastore_space_in_cache(self, name):
+        """Get the capacity and free space of a datastore from cache. They
+        are kept up to date by the property collector updates.
+
+        :param name: datastore name
+        :type name: str
+        :return: (capacity, free space) in bytes, None if not in cache
+        :rtype: (long, long)
+        """
+        return self._ds_space_by_name.get(name)
+
+    @hostd_error_handler
+    def get_datastore_spaces(self):
+        """Get the capacity and free space of all the datastores from hostd,
+        in a single property collector call. Use get_datastore_space_in_cache
+        unless the cache is not filled yet.
+
+        :return: datastore name -> (capacity, free space) in bytes
+        :rtype: dict
+        """
+        filter_spec = self.datastore_filter_spec()
+        objects = self.property_collector.RetrieveContents([filter_spec])
+        spaces = {}
+        for object in objects:
+            properties = dict((p.name, p.val) for p in object.propSet)
+            spaces[properties["name"]] = (properties["summary.capacity"],
+                                          properties["summary.freeSpace"])
+        return spaces
+
     @hostd_error_handler
     def get_vms(self):
         """ Get VirtualMachine from hostd. Use get_vms_in_cache to have a
@@ -569,31 +560,73 @@ class VimClient(object):
         objects = self.property_collector.RetrieveContents([filter_spec])
         return [object.obj for object in objects]
 
-    @lock_with("_vm_cache_lock")
+    def get_vm_cache_snapshot(self):
+        """ Get the current version of the VM cache. It doesn't change, use
+        changes_since() on a later snapshot to find the VMs updated since.
+
+        :rtype: VmCacheSnapshot
+        """
+        return self._vm_snapshot
+
     def get_vms_in_cache(self):
         """ Get information of all VMs from cache.
 
-        :return: list of VmCache
+        :return: list of VmRecord
         """
-        return [copy.copy(vm) for vm in self._vm_cache.values()
-                if self._validate_vm(vm)]
+        return self._vm_snapshot.valid_vms()
+
+    def get_vm_resources_in_cache(self):
+        """ Get the resources configured for the VMs in cache, without
+        reading the cache. Only counts the VMs returned by get_vms_in_cache.
+
+        :return: (number of VMs, total memory in MB, total number of vCPUs)
+        :rtype: (int, int, int)
+        """
+        snapshot = self._vm_snapshot
+        return snapshot.count, snapshot.memory_mb, snapshot.cpu_count
+
+    def get_vnc_ports_in_cache(self):
+        """ Get the VNC ports used by the VMs in cache, plus the ports
+        allocated by allocate_vnc_port and not used yet.
+
+        :rtype: set of int
+        """
+        return self._vnc_ports.occupied()
+
+    def allocate_vnc_port(self):
+        """ Allocate a free VNC port for a new VM, without reading the VMs.
+        The port is reserved until the VM shows up in cache with it, or it is
+        released with release_vnc_port.
+
+        :return: the port, None if there is no free port
+        :rtype: int
+        """
+        return self._vnc_ports.allocate()
+
+    def release_vnc_port(self, port):
+        """ Release a VNC port allocated by allocate_vnc_port that was not
+        used.
+
+        :type port: int
+        """
+        self._vnc_ports.release(port)
 
-    @lock_with("_vm_cache_lock")
     def get_vm_in_cache(self, vm_id):
         """ Get information of a VM from cache. The vm state is not
         guaranteed to be up-to-date. Also only name and power_state is
         guaranteed to be not None.
 
-        :return: VmCache for the vm that is found
+        :return: VmRecord for the vm that is found
         :raise VmNotFoundException when vm is not found
         """
-        if vm_id not in self._vm_name_to_ref:
+        try:
+            ref = self._vm_name_to_ref[vm_id]
+        except KeyError:
             raise VmNotFoundException("VM '%s' not found on host." % vm_id)
 
-        ref = self._vm_name_to_ref[vm_id]
-        vm = self._vm_cache[ref]
-        if self._validate_vm(vm):
-            return copy.copy(vm)
+        vm = self._vm_snapshot.vms.get(ref)
+        if vm is not None and vm.valid:
+            return vm
         else:
             raise VmNotFoundException("VM '%s' not found on host." % vm_id)
 
@@ -663,50 +696,63 @@ class VimClient(object):
         """
         return self.vnic_manager.info.netConfig
 
-    @staticmethod
-    def _verify_task_done(task_cache):
-        if not task_cache:
-            return False
+    def task_future(self, vim_task):
+        """Get a future completed when a task finishes.
 
-        state = task_cache.state
-        if state == TaskState.error or state == TaskState.success:
-            return True
-        else:
-            return False
+        The future is completed by the cache sync thread, so no thread is
+        blocked while the task runs. Callers can wait on many tasks with
+        wait_for_tasks, or add done callbacks to the futures. Callbacks run
+        in the sync thread and must not block.
+
+        :type vim_task: vim.Task
+        :return: future set to the TaskCache of the task, or to the task
+                 error if it fails
+        :rtype: concurrent.futures.Future
+        """
+        if not self.auto_sync:
+            raise Exception("task_future only works when auto_sync=True")
+        return self._task_tracker.future(str(vim_task))
 
     @hostd_error_handler
     @log_duration_with(log_level="debug")
     def wait_for_task(self, vim_task, timeout=DEFAULT_TASK_TIMEOUT):
-        if not self.auto_sync:
-            raise Exception("wait_for_task only works when auto_sync=True")
-
-        self._task_counter_add()
+        return self.wait_for_tasks([vim_task], timeout)[0]
 
-        self._logger.debug("wait_for_task: {0} Number of current tasks: {1}".
-                           format(str(vim_task), self._task_counter_read()))
+    @hostd_error_handler
+    @log_duration_with(log_level="debug")
+    def wait_for_tasks(self, vim_tasks, timeout=DEFAULT_TASK_TIMEOUT):
+        """Wait for tasks to finish.
+
+        :type vim_tasks: list of vim.Task
+        :return: TaskCache of each task
+        :rtype: list of TaskCache
+        :raise TimeoutError when the tasks don't finish in time, or the error
+               of the first task that failed
+        """
+        task_futures = [self.task_future(vim_task) for vim_task in vim_tasks]
 
+        self._task_counter_add(len(task_futures))
+        self._logger.debug("wait_for_tasks: {0} Number of current tasks: {1}".
+                           format(map(str, vim_tasks),
+                                  self._task_counter_read()))
         try:
-            task_cache = self._task_cache.wait_until(
-                str(vim_task),
-                VimClient._verify_task_done,
-                timeout=timeout)
+            _, not_done = futures.wait(task_futures, timeout)
         finally:
-            self._task_counter_sub()
+            self._task_counter_sub(len(task_futures))
 
-        self._logger.debug("task(%s) finished with: %s" % (str(vim_task),
-                                                           str(task_cache)))
-        if task_cache.state == TaskState.error:
-            if not task_cache.error:
-                task_cache.error = "No message"
-            raise task_cache.error
-        else:
-            return task_cache
+        if not_done:
+            raise TimeoutError()
+        task_caches = [future.result() for future in task_futures]
+        self._logger.debug("tasks(%s) finished with: %s" %
+                           (map(str, vim_tasks), map(str, task_caches)))
+        return task_caches
 
     @hostd_error_handler
     @log_duration_with(log_level="debug")
     def spin_wait_for_task(self, vim_task):
         """Use pysdk's WaitForTask, which basically polling task status in a
-        loop.
+        loop. Prefer wait_for_task, which doesn't poll, unless the cache isn't
+        synced.
         """
         self._task_counter_add()
         self._logger.debug(
@@ -761,7 +807,7 @@ class VimClient(object):
         )
         property_spec = PC.PropertySpec(
             type=vim.Datastore,
-            pathSet=["name"]
+            pathSet=["name", "summary.capacity", "summary.freeSpace"]
         )
         object_spec = PC.ObjectSpec(
             obj=self.get_datastore_folder(),
@@ -846,9 +892,15 @@ class VimClient(object):
         return PC.FilterSpec(propSet=propSet, objectSet=objectSet)
 
     def _apply_ds_update(self, obj_update):
+        """Apply a datastore update to the cache.
+
+        :return: True if the datastores were added, removed or renamed. Space
+                 changes are frequent and don't count.
+        """
         ds_key = str(obj_update.obj)
         updated = False
         if obj_update.kind == "enter" or obj_update.kind == "modify":
+            capacity, free = self._ds_space.get(ds_key, (None, None))
             for change in obj_update.changeSet:
                 if change.name == "name":
                     ds_name = change.val
@@ -858,11 +910,21 @@ class VimClient(object):
                             self._ds_name_properties[ds_key] != ds_name):
                         updated = True
                     self._ds_name_properties[ds_key] = ds_name
+                elif change.name == "summary.capacity":
+                    capacity = change.val
+                elif change.name == "summary.freeSpace":
+                    free = change.val
+            self._ds_space[ds_key] = (capacity, free)
         elif obj_update.kind == "leave":
             self._logger.debug("cache update: remove ds ref %s" % ds_key)
+            self._ds_space.pop(ds_key, None)
             if ds_key in self._ds_name_properties:
                 del self._ds_name_properties[ds_key]
                 updated = True
+        self._ds_space_by_name = dict(
+            (name, self._ds_space[key])
+            for key, name in self._ds_name_properties.iteritems()
+            if None not in self._ds_space.get(key, (None,)))
         return updated
 
     @lock_with("_vm_cache_lock")
@@ -872,25 +934,26 @@ class VimClient(object):
 
         ds_updated = False
         nw_updated = False
-        vm_updated = False
+        # The next version of the vm cache is built from the changes in the
+        # update, then published at once.
+        vms = self._vm_snapshot.vms.evolver()
+        vms_changed = set()
         for filter in update.filterSet:
             for object in filter.objectSet:
                 # Update Vm cache
                 if isinstance(object.obj, vim.VirtualMachine):
                     if object.kind == "enter":
                         # Possible to have 2 enters for one object
-                        vm_updated = True
-                        self._add_or_modify_vm_cache(object)
+                        self._add_or_modify_vm_cache(vms, object)
                     elif object.kind == "leave":
-                        assert str(object.obj) in self._vm_cache, \
+                        assert str(object.obj) in vms, \
                             "%s not in cache for kind leave" % object.obj
-                        vm_updated = True
-                        self._remove_vm_cache(object)
+                        self._remove_vm_cache(vms, object)
                     elif object.kind == "modify":
-                        assert str(object.obj) in self._vm_cache, \
+                        assert str(object.obj) in vms, \
                             "%s not in cache for kind modify" % object.obj
-                        vm_updated = True
-                        self._add_or_modify_vm_cache(object)
+                        self._add_or_modify_vm_cache(vms, object)
+                    vms_changed.add(str(object.obj))
                 # Update task cache
                 elif isinstance(object.obj, vim.Task):
                     if object.kind == "enter":
@@ -907,6 +970,12 @@ class VimClient(object):
                     updated = self._apply_ds_update(object)
                     ds_updated = ds_updated or updated
 
+        vm_updated = bool(vms_changed)
+        if vm_updated:
+            self._vm_snapshot = self._vm_snapshot.next_version(
+                vms.persistent(), vms_changed, len(self._vm_resources),
+                self._vm_resources.memory_mb, self._vm_resources.cpu_count)
+
         # Notify listeners.
         for listener in self.update_listeners:
             if ds_updated:
@@ -923,14 +992,14 @@ class VimClient(object):
                     (listener.__class__.__name__))
                 listener.virtual_machines_updated()
 
-    def _add_or_modify_vm_cache(self, object):
+    def _add_or_modify_vm_cache(self, vms, object):
         # Type of object.obj is vim.VirtualMachine. str(object.obj) is moref
         # id, something like 'vim.VirtualMachine:1227'. moref id is the unique
         # representation of all objects in esx.
-        if str(object.obj) not in self._vm_cache:
-            vm = VmCache()
-        else:
-            vm = self._vm_cache[str(object.obj)]
+        # Records are shared with readers, so the changes are collected and
+        # applied to a new record.
+        vm = vms.get(str(object.obj)) or VmRecord()
+        fields = {}
 
         for change in object.changeSet:
             # We are not interested in ops other than assign.
@@ -945,43 +1014,70 @@ class VimClient(object):
                 continue
 
             if change.name == "name":
-                vm.name = change.val
-                self._logger.debug("cache update: add vm name %s" % vm.name)
+                fields["name"] = change.val
+                self._logger.debug("cache update: add vm name %s" %
+                                   change.val)
                 self._vm_name_to_ref[change.val] = str(object.obj)
             elif change.name == "runtime.powerState":
-                vm.power_state = PowerState._NAMES_TO_VALUES[change.val]
+                fields["power_state"] = \
+                    PowerState._NAMES_TO_VALUES[change.val]
             elif change.name == "config":
-                vm.memory_mb = change.val.hardware.memoryMB
-                vm.num_cpu = change.val.hardware.numCPU
+                fields["memory_mb"] = change.val.hardware.memoryMB
+                fields["num_cpu"] = change.val.hardware.numCPU
                 # files is an optional field, which could be None.
                 if change.val.files:
-                    vm.path = change.val.files.vmPathName
+                    fields["path"] = change.val.files.vmPathName
+                vnc_enabled = False
+                vnc_port = None
                 for e in change.val.extraConfig:
                     if e.key == "photon_controller.vminfo.tenant":
-                        vm.tenant_id = e.value
+                        fields["tenant_id"] = e.value
                     elif e.key == "photon_controller.vminfo.project":
-                        vm.project_id = e.value
+                        fields["project_id"] = e.value
+                    elif e.key == "RemoteDisplay.vnc.enabled":
+                        vnc_enabled = e.value.upper() == "TRUE"
+                    elif e.key == "RemoteDisplay.vnc.port":
+                        try:
+                            vnc_port = int(e.value)
+                        except ValueError:
+                            self._logger.warning(
+                                "Invalid VNC port %s of vm %s" %
+                                (e.value, str(object.obj)))
+                fields["vnc_port"] = vnc_port if vnc_enabled else None
             elif change.name == "layout.disk":
                 disks = []
                 for disk in change.val:
                     if disk.diskFile:
                         for disk_file in disk.diskFile:
                             disks.append(disk_file)
-                vm.disks = disks
+                fields["disks"] = disks
 
+        vm = vm.replace(**fields)
         self._logger.debug("cache update: update vm [%s] => %s" % (str(
             object.obj), vm))
-        if str(object.obj) not in self._vm_cache:
-            self._vm_cache[str(object.obj)] = vm
+        vms[str(object.obj)] = vm
+
+        # Vms in cache might include half updated record, e.g. with None
+        # memory_mb, for a short time window. They are not counted until
+        # they are valid.
+        if vm.valid:
+            self._vm_resources.update(str(object.obj),
+                                      memory_mb=vm.memory_mb or 0,
+                                      cpu_count=vm.num_cpu or 0)
+        else:
+            self._vm_resources.release(str(object.obj))
+        self._vnc_ports.update(str(object.obj), vm.vnc_port)
 
-    def _remove_vm_cache(self, object):
+    def _remove_vm_cache(self, vms, object):
         ref_id = str(object.obj)
-        assert ref_id in self._vm_cache, "%s not in cache" % ref_id
+        assert ref_id in vms, "%s not in cache" % ref_id
 
-        vm_cache = self._vm_cache[ref_id]
+        vm_cache = vms[ref_id]
         self._logger.debug("cache update: delete vm [%s] => %s" % (ref_id,
                                                                    vm_cache))
-        del self._vm_cache[ref_id]
+        del vms[ref_id]
+        self._vm_resources.release(ref_id)
+        self._vnc_ports.remove(ref_id)
         if vm_cache.name in self._vm_name_to_ref:
             # Only delete map in _vm_name_to_ref when it points to the right
             # ref_id. If it points to another ref_id, it means a new VM is
@@ -1005,24 +1101,16 @@ class VimClient(object):
         self._logger.debug("task cache update: update task [%s] => %s" %
                            (str(object.obj), task_cache))
 
-        self._task_cache[str(object.obj)] = task_cache
+        self._task_tracker.update(str(object.obj), task_cache)
 
     def _remove_task_cache(self, object):
-        assert str(object.obj) in self._task_cache, "%s not in cache" % str(
-            object.obj)
+        assert str(object.obj) in self._task_tracker, \
+            "%s not in cache" % str(object.obj)
 
-        self._logger.debug(
-            "task cache update: remove task [%s] => %s" %
-            (str(object.obj), self._task_cache[str(object.obj)]))
+        self._logger.debug("task cache update: remove task [%s]" %
+                           str(object.obj))
 
-        del self._task_cache[str(object.obj)]
-
-    def _validate_vm(self, vm):
-        try:
-            vm.validate()
-            return True
-        except:
-            return False
+        self._task_tracker.remove(str(object.obj))
 
     def _start_syncing_cache(self):
         self._logger.info("Start vim client sync vm cache thread")
@@ -1039,12 +1127,12 @@ class VimClient(object):
                 self.sync_thread.join()
 
     @lock_with("_task_counter_lock")
-    def _task_counter_add(self):
-        self._task_counter += 1
+    def _task_counter_add(self, count=1):
+        self._task_counter += count
 
     @lock_with("_task_counter_lock")
-    def _task_counter_sub(self):
-        self._task_counter -= 1
+    def _task_counter_sub(self, count=1):
+        self._task_counter -= count
 
     @lock_with("_task_counter_lock")
     def _task_counter_read(self):
@@ -1052,16 +1140,10 @@ class VimClient(object):
 
     @hostd_error_handler
     def update_hosts_stats(self):
-        stats = self.get_perf_manager_stats()
-        self._update_host_cache(stats)
+        self.perf_sampler.sample()
 
-    @lock_with("_host_cache_lock")
-    def _update_host_cache(self, stats):
-        self._host_stats = copy.copy(stats)
-
-    @lock_with("_host_cache_lock")
     def get_host_stats(self):
-        return copy.copy(self._host_stats)
+        return self.get_perf_manager_stats()
 
     def set_large_page_support(self, disable=False):
         """Disables large page support on the ESX hypervisor
@@ -1083,7 +1165,7 @@ class SyncVmCacheThread(threading.Thread):
     """ Periodically sync vm cache with remote esx server
     """
     def __init__(self, vim_client, wait_timeout=10, min_interval=1,
-                 stats_interval=600, errback=None):
+                 stats_interval=SAMPLE_INTERVAL, errback=None):
         super(SyncVmCacheThread, self).__init__()
         self._logger = logging.getLogger(__name__)
         self.setDaemon(True)
@@ -1157,26 +1239,6 @@ class SyncVmCacheThread(threading.Thread):
         return False
 
 
-class AsyncWaitForTask(threading.Thread):
-
-    """A class for waiting for a Vim task to finish in another thread.
-
-    Attributes:
-        task: The task to wait on.
-        _si: The service instance for the host.
-
-    """
-
-    def __init__(self, task, si):
-        super(AsyncWaitForTask, self).__init__()
-        self.task = task
-        self._si = si
-
-    def run(self):
-        """Wait for a task to finish.."""
-        task.WaitForTask(self.task, si=self._si)
-
-
 class AcquireCredentialsException(Exception):
     pass
 
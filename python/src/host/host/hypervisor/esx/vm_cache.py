@@ -0,0 +1,146 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+from common.persistent_map import PersistentMap
+
+
+# Number of versions a snapshot can report the changes since
+VM_CHANGE_HISTORY = 64
+
+
+class VmRecord(object):
+    """Cached information of a VM, with the same fields as VmCache.
+
+    Records are shared by all the snapshots and readers of the cache, so they
+    can't be changed once created. Use replace() to get an updated record.
+    """
+
+    FIELDS = ("name", "path", "power_state", "memory_mb", "num_cpu", "disks",
+              "tenant_id", "project_id", "vnc_port")
+    REQUIRED = FIELDS[:6]
+
+    __slots__ = FIELDS + ("valid",)
+
+    def __init__(self, name=None, path=None, power_state=None, memory_mb=None,
+                 num_cpu=None, disks=None, tenant_id=None, project_id=None,
+                 vnc_port=None):
+        if disks is not None:
+            disks = tuple(disks)
+        values = (name, path, power_state, memory_mb, num_cpu, disks,
+                  tenant_id, project_id, vnc_port)
+        for field, value in zip(self.FIELDS, values):
+            object.__setattr__(self, field, value)
+        # Records can be half updated, e.g. with None memory_mb, for a short
+        # time window after a VM is created.
+        object.__setattr__(self, "valid", all(
+            getattr(self, field) is not None for field in self.REQUIRED))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("VmRecord is immutable")
+
+    def replace(self, **changes):
+        """Get a copy of the record with some fields changed.
+
+        :rtype: VmRecord
+        """
+        fields = dict((field, getattr(self, field)) for field in self.FIELDS)
+        fields.update(changes)
+        return VmRecord(**fields)
+
+    def __eq__(self, other):
+        return (isinstance(other, VmRecord) and
+                all(getattr(self, field) == getattr(other, field)
+                    for field in self.FIELDS))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "VmRecord(%s)" % ", ".join(
+            "%s=%r" % (field, getattr(self, field)) for field in self.FIELDS)
+
+
+class VmCacheSnapshot(object):
+    """A version of the VM cache.
+
+    Snapshots never change, the cache publishes a new one each time it is
+    updated, so readers can keep a snapshot as long as they like without
+    locking. Each snapshot records the VMs changed by the last
+    VM_CHANGE_HISTORY versions, so a reader holding an older version can
+    find what changed since.
+    """
+
+    __slots__ = ("version", "vms", "count", "memory_mb", "cpu_count",
+                 "_history")
+
+    def __init__(self, version=0, vms=None, count=0, memory_mb=0,
+                 cpu_count=0, history=()):
+        """
+        :param version: version of the snapshot
+        :type version: int
+        :param vms: moref id -> VmRecord
+        :type vms: PersistentMap
+        :param count: number of valid VMs
+        :param memory_mb: memory of the valid VMs
+        :param cpu_count: vCPUs of the valid VMs
+        :param history: (version, frozenset of moref ids changed by the
+                        version) of the last versions, oldest first
+        :type history: tuple
+        """
+        self.version = version
+        self.vms = vms if vms is not None else PersistentMap()
+        self.count = count
+        self.memory_mb = memory_mb
+        self.cpu_count = cpu_count
+        self._history = history
+
+    def valid_vms(self):
+        """
+        :return: the VMs that have all their required fields
+        :rtype: list of VmRecord
+        """
+        return [vm for vm in self.vms.itervalues() if vm.valid]
+
+    def next_version(self, vms, changed, count, memory_mb, cpu_count):
+        """Get the next version of the snapshot.
+
+        :param vms: moref id -> VmRecord
+        :type vms: PersistentMap
+        :param changed: moref ids of the VMs added, changed or removed
+        :type changed: set of str
+        :rtype: VmCacheSnapshot
+        """
+        version = self.version + 1
+        history = self._history[-(VM_CHANGE_HISTORY - 1):] + \
+            ((version, frozenset(changed)),)
+        return VmCacheSnapshot(version, vms, count, memory_mb, cpu_count,
+                               history)
+
+    def changes_since(self, version):
+        """Get the VMs that changed after the given version.
+
+        :type version: int
+        :return: moref id -> VmRecord, or None if the VM was removed. None if
+                 the snapshot doesn't go back to the given version, in which
+                 case the caller has to read all the VMs again.
+        :rtype: dict
+        """
+        if version == self.version:
+            return {}
+        if version > self.version or not self._history or \
+                self._history[0][0] > version + 1:
+            return None
+        changed = set()
+        for change_version, refs in self._history:
+            if change_version > version:
+                changed.update(refs)
+        return dict((ref, self.vms.get(ref)) for ref in changed)
@@ -23,7 +23,6 @@ import threading
 
 from pyVmomi import vim
 
-from common.exclusive_set import DuplicatedValue
 from common.exclusive_set import ExclusiveSet
 from common.file_util import rm_rf
 from common.file_util import mkdir_p
@@ -489,18 +488,10 @@ class EsxVmManager(VmManager):
         return ids
 
     def get_used_memory_mb(self):
-        vms = self.vim_client.get_vms_in_cache()
-        if not vms:
+        count, memory, _ = self.vim_client.get_vm_resources_in_cache()
+        if count == 0:
             return 0
 
-        memory = 0
-        for vm in vms:
-            # Vms in cache might include half updated record, e.g. with
-            # None memory_mb, for a short time windows. Those Vms in cache
-            # could be excluded from total used memory.
-            if vm.memory_mb:
-                memory += vm.memory_mb
-
         # This indicates that no values were retrieved from the cache.
         if memory == 0:
             raise VmNotFoundException("No valid VMs were found")
@@ -512,15 +503,10 @@ class EsxVmManager(VmManager):
         Returns the total number of vCPUs across all VMs
         :return: number of vCPUs - int
         """
-        vms = self.vim_client.get_vms_in_cache()
-        if not vms:
+        count, _, cpu_count = self.vim_client.get_vm_resources_in_cache()
+        if count == 0:
             return 0
 
-        cpu_count = 0
-        for vm in vms:
-            if vm.num_cpu:
-                cpu_count += vm.num_cpu
-
         # This indicates that no values were retrieved from the cache.
         if cpu_count == 0:
             raise VmNotFoundException("No valid VMs were found")
@@ -870,25 +856,19 @@ class EsxVmManager(VmManager):
 
     @log_duration
     def get_occupied_vnc_ports(self):
-        vms = self.vim_client.get_vms()
-
+        # The ports are indexed from the vm cache, so there is no need to
+        # read the config of every vm from hostd.
         ports = ExclusiveSet()
-        for vm in vms:
-            if vm.config and vm.config.extraConfig:
-                enabled = False
-                port = None
-                for option in vm.config.extraConfig:
-                    if option.key == self.EXTRA_CONFIG_VNC_ENABLED:
-                        enabled = option.value.upper() == 'TRUE'
-                    elif option.key == self.EXTRA_CONFIG_VNC_PORT:
-                        port = int(option.value)
-                if enabled:
-                    try:
-                        ports.add(port)
-                    except DuplicatedValue:
-                        self._logger.warning("port %d already occupied" % port)
+        for port in self.vim_client.get_vnc_ports_in_cache():
+            ports.add(port)
         return ports
 
+    def allocate_vnc_port(self):
+        return self.vim_client.allocate_vnc_port()
+
+    def release_vnc_port(self, port):
+        self.vim_client.release_vnc_port(port)
+
     def get_mks_ticket(self, vm_id):
         vm = self.vim_client.get_vm(vm_id)
         if vm.runtime.powerState != 'poweredOn':
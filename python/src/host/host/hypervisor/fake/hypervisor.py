@@ -103,5 +103,14 @@ class FakeHypervisor(object):
                       manifest):
         pass
 
+    def start_image_upload(self, url, size):
+        return str(uuid.uuid4())
+
+    def write_image_data(self, upload_id, data, compressed):
+        pass
+
+    def finish_image_upload(self, upload_id, abort):
+        pass
+
     def set_memory_overcommit(self, memory_overcommit):
         pass
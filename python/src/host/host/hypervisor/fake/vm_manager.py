@@ -27,6 +27,8 @@ from host.hypervisor.vm_manager import VmManager
 from host.hypervisor.vm_manager import VmAlreadyExistException
 from host.hypervisor.vm_manager import VmNotFoundException
 from host.hypervisor.vm_manager import VmPowerStateException
+from host.hypervisor.vnc_port_index import VNC_PORT_MAX
+from host.hypervisor.vnc_port_index import VNC_PORT_MIN
 from random import Random
 
 
@@ -34,6 +36,7 @@ class FakeVmManager(VmManager):
     def __init__(self, hypervisor):
         self._resources = {}
         self._hypervisor = hypervisor
+        self._vnc_ports_allocated = set()
         self.update_listeners = set()
 
     def add_update_listener(self, listener):
@@ -337,6 +340,20 @@ class FakeVmManager(VmManager):
                     for vm in self._resources.values()
                     if vm.fake_vm_spec.vnc_enabled])
 
+    def allocate_vnc_port(self):
+        occupied = self.get_occupied_vnc_ports()
+        # Allocated ports taken by a vm are freed with the vm
+        self._vnc_ports_allocated -= occupied
+        occupied |= self._vnc_ports_allocated
+        for port in xrange(VNC_PORT_MIN, VNC_PORT_MAX + 1):
+            if port not in occupied:
+                self._vnc_ports_allocated.add(port)
+                return port
+        return None
+
+    def release_vnc_port(self, port):
+        self._vnc_ports_allocated.discard(port)
+
     def get_mks_ticket(self, vm_id):
         if self._get_vm(vm_id).state != 'on':
             raise OperationNotAllowedException()
@@ -165,3 +165,12 @@ class Hypervisor(object):
         return self.hypervisor.receive_image(image_id, datastore,
                                              imported_vm_name, metadata,
                                              manifest)
+
+    def start_image_upload(self, url, size):
+        return self.hypervisor.start_image_upload(url, size)
+
+    def write_image_data(self, upload_id, data, compressed):
+        return self.hypervisor.write_image_data(upload_id, data, compressed)
+
+    def finish_image_upload(self, upload_id, abort):
+        return self.hypervisor.finish_image_upload(upload_id, abort)
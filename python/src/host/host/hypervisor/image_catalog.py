@@ -0,0 +1,185 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import logging
+import threading
+
+
+class ImageCatalog(object):
+    """In-memory index of the images on each datastore.
+
+    The images of a datastore are listed with the loader the first time the
+    datastore is looked up, and the index is then kept current by the image
+    manager as it creates and deletes images. Datastores can be shared with
+    other hosts, so the index is only a hint: callers that need an image to
+    be there, e.g. to clone from it, still check the datastore, and refresh
+    relists the datastores to pick up changes made by other hosts.
+
+    Image sizes don't change once an image is created, so they are cached
+    by image id until the image is gone from every datastore.
+    """
+
+    def __init__(self, loader):
+        """
+        :param loader: function listing the image ids on a datastore, it
+                       raises if the datastore is not accessible
+        :type loader: function
+        """
+        self._logger = logging.getLogger(__name__)
+        self._loader = loader
+        self._lock = threading.Lock()
+
+        # datastore id -> set of image ids
+        self._images = {}
+        # datastore id -> number of changes since the datastore was loaded,
+        # a listing is dropped if the datastore changed while it was running.
+        self._versions = {}
+        # image id -> size in bytes
+        self._sizes = {}
+
+    def images(self, datastore):
+        """Get the images on a datastore.
+
+        :type datastore: str
+        :rtype: list of str
+        """
+        with self._lock:
+            images = self._images.get(datastore)
+            if images is not None:
+                return list(images)
+        return list(self.load(datastore))
+
+    def has_image(self, image_id, datastore):
+        """
+        :type image_id: str
+        :type datastore: str
+        :rtype: bool
+        """
+        with self._lock:
+            images = self._images.get(datastore)
+            if images is not None:
+                return image_id in images
+        return image_id in self.load(datastore)
+
+    def datastores_with_image(self, image_id, datastores):
+        """Get the datastores holding an image.
+
+        Datastores that can't be listed are skipped.
+
+        :type image_id: str
+        :type datastores: list of str
+        :rtype: list of str
+        """
+        result = []
+        for datastore in datastores:
+            try:
+                if self.has_image(image_id, datastore):
+                    result.append(datastore)
+            except Exception:
+                self._logger.warning("Failed to list images on %s" %
+                                     datastore, exc_info=True)
+        return result
+
+    def load(self, datastore):
+        """List the images on a datastore and replace what is indexed.
+
+        :type datastore: str
+        :return: the image ids on the datastore
+        :rtype: set of str
+        """
+        with self._lock:
+            version = self._versions.get(datastore)
+        images = set(self._loader(datastore))
+        with self._lock:
+            # An add or remove ran while listing, keep its result and pick up
+            # anything else on the next refresh.
+            if self._versions.get(datastore) == version:
+                self._images[datastore] = images
+                self._versions[datastore] = 0
+                self._prune_sizes()
+        return images
+
+    def refresh(self, datastores):
+        """Relist the images on the given datastores, and forget the
+        datastores that aren't in the list anymore.
+
+        :type datastores: list of str
+        """
+        with self._lock:
+            for datastore in set(self._images) - set(datastores):
+                del self._images[datastore]
+                del self._versions[datastore]
+        for datastore in datastores:
+            try:
+                self.load(datastore)
+            except Exception:
+                self._logger.warning("Failed to list images on %s" %
+                                     datastore, exc_info=True)
+                with self._lock:
+                    self._images.pop(datastore, None)
+                    self._versions.pop(datastore, None)
+
+    def add(self, datastore, image_id):
+        """Record an image created on a datastore.
+
+        :type datastore: str
+        :type image_id: str
+        """
+        with self._lock:
+            self._bump(datastore)
+            if datastore in self._images:
+                self._images[datastore].add(image_id)
+
+    def remove(self, datastore, image_id):
+        """Record an image deleted from a datastore.
+
+        :type datastore: str
+        :type image_id: str
+        """
+        with self._lock:
+            self._bump(datastore)
+            if datastore in self._images:
+                self._images[datastore].discard(image_id)
+            self._prune_sizes()
+
+    def size(self, image_id, get_size):
+        """Get the size of an image, calling get_size the first time.
+
+        :type image_id: str
+        :param get_size: function returning the size of the image
+        :type get_size: function
+        :rtype: int
+        """
+        with self._lock:
+            size = self._sizes.get(image_id)
+        if size is None:
+            size = get_size(image_id)
+            with self._lock:
+                self._sizes[image_id] = size
+        return size
+
+    def _bump(self, datastore):
+        if datastore in self._versions:
+            self._versions[datastore] += 1
+        else:
+            # Not loaded yet, but a listing may be running.
+            self._versions[datastore] = 1
+
+    def _prune_sizes(self):
+        if not self._sizes:
+            return
+        indexed = set()
+        for images in self._images.itervalues():
+            indexed.update(images)
+        for image_id in self._sizes.keys():
+            if image_id not in indexed:
+                del self._sizes[image_id]
@@ -44,6 +44,11 @@ class DirectoryNotFound(Exception):
     """
 
 
+class ImageUploadNotFound(Exception):
+    """ Exception thrown when no image upload is in progress with an id """
+    pass
+
+
 class ImageManager(object):
     """A class that wraps hypervisor specific image management.
 
@@ -71,6 +76,12 @@ class ImageManager(object):
             return []
         return [ds for ds in datastores if self.check_image(image_id, ds)]
 
+    def has_image(self, image_id, datastore_id):
+        """Check if an image is on a datastore, for callers that can do
+        with an answer that may be slightly out of date, e.g. placement.
+        """
+        return self.check_image(image_id, datastore_id)
+
     def image_metadata(self, image_id, datastores):
         for ds in datastores:
             if self.check_image(image_id, ds):
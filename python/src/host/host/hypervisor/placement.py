@@ -11,6 +11,7 @@
 # under the License.
 
 from common.equality import EqualityMixin
+from gen.scheduler.ttypes import HostSummary
 from gen.scheduler.ttypes import Score
 
 
@@ -43,3 +44,53 @@ class AgentPlacementScore(EqualityMixin):
     def __repr__(self):
         return "AgentPlacementScore(utilization=%d, transfer=%d)" % (
             self.utilization, self.transfer)
+
+
+class AgentResourceSummary(EqualityMixin):
+    """Summary of the resources available for placement on an agent.
+
+    Schedulers use it to rank agents without sending them place requests.
+    """
+
+    def __init__(self, total_memory_mb, used_memory_mb, total_cpu_count,
+                 used_cpu_count, datastore_free_gb, datastore_total_gb,
+                 image_ids, networks):
+        """Resource summary.
+
+        :type total_memory_mb: int, overcommitted
+        :type used_memory_mb: int, including reservations
+        :type total_cpu_count: int, overcommitted
+        :type used_cpu_count: int, including reservations
+        :type datastore_free_gb: dict of datastore id to int
+        :type datastore_total_gb: dict of datastore id to int
+        :type image_ids: set of str
+        :type networks: list of str
+        """
+        self.total_memory_mb = total_memory_mb
+        self.used_memory_mb = used_memory_mb
+        self.total_cpu_count = total_cpu_count
+        self.used_cpu_count = used_cpu_count
+        self.datastore_free_gb = datastore_free_gb
+        self.datastore_total_gb = datastore_total_gb
+        self.image_ids = image_ids
+        self.networks = networks
+
+    def to_thrift(self, agent_id, generation):
+        return HostSummary(agent_id=agent_id,
+                           generation=generation,
+                           total_memory_mb=int(self.total_memory_mb),
+                           used_memory_mb=int(self.used_memory_mb),
+                           total_cpu_count=int(self.total_cpu_count),
+                           used_cpu_count=int(self.used_cpu_count),
+                           datastore_free_gb=self.datastore_free_gb,
+                           datastore_total_gb=self.datastore_total_gb,
+                           image_ids=set(self.image_ids),
+                           networks=self.networks)
+
+    def __repr__(self):
+        return ("AgentResourceSummary(memory=%d/%d, cpu=%d/%d, "
+                "datastores=%s)" % (self.used_memory_mb,
+                                    self.total_memory_mb,
+                                    self.used_cpu_count,
+                                    self.total_cpu_count,
+                                    self.datastore_free_gb))
@@ -20,6 +20,7 @@ from common.log import log_duration
 from gen.resource.ttypes import ResourcePlacementType
 from gen.resource.ttypes import ResourceConstraintType
 from host.hypervisor.disk_placement_manager import BestEffortPlaceEngine
+from host.hypervisor.disk_placement_manager import BinPackingPlaceEngine
 from host.hypervisor.disk_placement_manager import DatastoreSelector
 from host.hypervisor.disk_placement_manager import DisksPlacement
 from host.hypervisor.disk_placement_manager import DiskUtil
@@ -27,6 +28,8 @@ from host.hypervisor.disk_placement_manager import ConstraintDiskPlaceEngine
 from host.hypervisor.disk_placement_manager import OptimalPlaceEngine
 from host.hypervisor.disk_placement_manager import PlaceResultCode
 from host.hypervisor.placement import AgentPlacementScore
+from host.hypervisor.placement import AgentResourceSummary
+from host.hypervisor.reservation_store import ReservationStore
 from host.hypervisor.resources import AgentResourcePlacement
 from host.hypervisor.vm_manager import VmNotFoundException
 
@@ -85,6 +88,107 @@ class PlacementOption(object):
         self.image_datastores = image_datastores
 
 
+class HostState(object):
+    """The host state that placement scores resources against.
+
+    Each value is read from the hypervisor the first time it is used and
+    then kept, so all the resources scored against one HostState see the
+    same state, and the state is read once however many are scored.
+    """
+
+    def __init__(self, placement_manager):
+        self._manager = placement_manager
+        self._values = {}
+
+    def _get(self, name, read):
+        if name not in self._values:
+            self._values[name] = read()
+        return self._values[name]
+
+    @property
+    def total_memory_mb(self):
+        return self._get("total_memory_mb",
+                         self._manager._system.total_vmusable_memory_mb)
+
+    @property
+    def consumed_memory_mb(self):
+        return self._get("consumed_memory_mb",
+                         self._manager._system.host_consumed_memory_mb)
+
+    @property
+    def used_memory_mb(self):
+        """Memory used by the VMs and held by reservations."""
+        return self._get("used_memory_mb",
+                         lambda: self._manager._used_memory_mb() +
+                         self._manager._memory_reserved())
+
+    @property
+    def cpu_count(self):
+        return self._get("cpu_count",
+                         self._manager._system.num_physical_cpus)
+
+    @property
+    def used_cpu_count(self):
+        """vCPUs configured on the VMs and held by reservations."""
+        return self._get("used_cpu_count",
+                         lambda: self._manager._configured_cpu_count() +
+                         self._manager._cpu_reserved())
+
+    @property
+    def storage_reserved_gb(self):
+        return self._get("storage_reserved_gb",
+                         self._manager._storage_reserved)
+
+    @property
+    def datastores(self):
+        return self._get("datastores", self._manager._placeable_datastores)
+
+    @property
+    def datastore_infos(self):
+        return self._get(
+            "datastore_infos",
+            lambda: self._manager._datastore_manager.datastore_infos(
+                self.datastores))
+
+    @property
+    def networks(self):
+        return self._get(
+            "networks",
+            self._manager._hypervisor.network_manager.get_vm_networks)
+
+    def reserve(self, vm, disks):
+        """Count resources as reserved in this state only.
+
+        The reservations of the placement manager are left alone, so other
+        placements don't see the resources.
+
+        :type vm: Vm
+        :type disks: list of Disk
+        """
+        manager = self._manager
+        storage_gb = manager._diskutil.disks_capacity_gb(disks)
+        if vm:
+            self._values["used_memory_mb"] = \
+                self.used_memory_mb + manager._vm_memory_mb(vm)
+            self._values["used_cpu_count"] = \
+                self.used_cpu_count + manager._vm_cpu_count(vm)
+            storage_gb += manager._diskutil.disks_capacity_gb(vm.disks)
+        self._values["storage_reserved_gb"] = \
+            self.storage_reserved_gb + storage_gb
+
+    def selector(self):
+        """Get a selector of the datastores, that the caller may change.
+
+        :rtype: DatastoreSelector
+        """
+        selector = self._get(
+            "selector",
+            lambda: DatastoreSelector.init_datastore_selector(
+                self._manager._datastore_manager, self.datastores,
+                self.datastore_infos))
+        return selector.copy()
+
+
 class PlacementManager(object):
     """PlacementManager handles resource placement and reservation."""
 
@@ -103,12 +207,19 @@ class PlacementManager(object):
     # Maximum score possible
     MAX_SCORE = 100
 
+    # Seconds before a reservation that is not consumed expires
+    RESERVATION_TTL = 300
+
+    # Kinds of reservations
+    VM = "vm"
+    DISKS = "disks"
+
     def __init__(self, hypervisor, option):
         self._logger = logging.getLogger(__name__)
         self._hypervisor = hypervisor
         self._option = option
-        self._reserved_vms = {}
-        self._reserved_disks = {}
+        # Reservations keyed by (VM, rid) and (DISKS, rid)
+        self._reservations = ReservationStore(self.RESERVATION_TTL)
         self._diskutil = DiskUtil()
         self._vm_manager = hypervisor.vm_manager
         self._image_manager = hypervisor.image_manager
@@ -120,6 +231,8 @@ class PlacementManager(object):
             self._datastore_manager, option)
         self._constrainted_placement = ConstraintDiskPlaceEngine(
             self._datastore_manager, option)
+        self._bin_packing_placement = BinPackingPlaceEngine(
+            self._datastore_manager, option)
 
     def reserve(self, vm, disks):
         """Reserve room for specified resources.
@@ -131,22 +244,36 @@ class PlacementManager(object):
         """
         rid = str(uuid.uuid4())
         if vm:
-            self._reserved_vms[rid] = vm
+            self._reservations.add(
+                (self.VM, rid), vm,
+                memory_mb=self._vm_memory_mb(vm),
+                cpu_count=self._vm_cpu_count(vm),
+                storage_gb=self._diskutil.disks_capacity_gb(vm.disks))
         if disks:
-            self._reserved_disks[rid] = disks
+            self._reservations.add(
+                (self.DISKS, rid), disks,
+                storage_gb=self._diskutil.disks_capacity_gb(disks))
         return rid
 
     def consume_disk_reservation(self, reservation_id):
-        return self._consume(self._reserved_disks, reservation_id)
+        return self._consume((self.DISKS, reservation_id))
 
     def consume_vm_reservation(self, reservation_id):
-        return self._consume(self._reserved_vms, reservation_id)
+        return self._consume((self.VM, reservation_id))
 
     def remove_disk_reservation(self, reservation_id):
-        return self._remove(self._reserved_disks, reservation_id)
+        self._reservations.remove((self.DISKS, reservation_id))
 
     def remove_vm_reservation(self, reservation_id):
-        return self._remove(self._reserved_vms, reservation_id)
+        self._reservations.remove((self.VM, reservation_id))
+
+    def reservation_stats(self):
+        """Get the number of live reservations, and how many were added,
+        consumed, expired and evicted.
+
+        :rtype: dict
+        """
+        return self._reservations.stats()
 
     @property
     def memory_overcommit(self):
@@ -172,16 +299,94 @@ class PlacementManager(object):
         :rtype: PlacementScore, Placement List
         :raises: ResourceConstraintException if can't place resources
         """
+        return self._place(HostState(self), vm, disks)
 
-        """Check if there are datastores for placing vm or disks """
-        if len(self._placeable_datastores()) == 0:
-            raise NoSuchResourceException(ResourceType.DATASTORE,
-                                          "No placeable datastores.")
+    def place_batch(self, resources):
+        """Place a batch of resources.
 
-        if vm:
-            return self._place_vm(vm)
-        elif disks:
-            return self._place_disks(disks)
+        Each resource is placed as if the resources placed before it had been
+        reserved, so that the scores of the later resources account for the
+        earlier ones. Those reservations are only made in the HostState of
+        the batch, the caller is expected to reserve the resources it picks.
+
+        :param resources: list of (Vm, list of Disk)
+        :return: one (PlacementScore, Placement List) tuple per resource, or
+                 the exception raised while placing the resource.
+        :rtype: list
+        """
+        state = HostState(self)
+        results = []
+        for vm, disks in resources:
+            try:
+                results.append(self._place(state, vm, disks))
+            except (NoSuchResourceException,
+                    NotEnoughMemoryResourceException,
+                    NotEnoughCpuResourceException,
+                    NotEnoughDatastoreCapacityException), e:
+                results.append(e)
+                continue
+            state.reserve(vm, disks)
+        return results
+
+    def evaluate(self, resources):
+        """Score alternative resources against the same host state.
+
+        Unlike place_batch, the resources are not placed on top of each
+        other, each one is scored as if it was the only one placed. The host
+        state is read once for all of them, so callers can compare e.g.
+        flavors at the cost of a single placement.
+
+        :param resources: list of (Vm, list of Disk)
+        :return: one (PlacementScore, Placement List) tuple per resource, or
+                 the exception raised while placing the resource.
+        :rtype: list
+        """
+        state = HostState(self)
+        results = []
+        for vm, disks in resources:
+            try:
+                results.append(self._place(state, vm, disks))
+            except (NoSuchResourceException,
+                    NotEnoughMemoryResourceException,
+                    NotEnoughCpuResourceException,
+                    NotEnoughDatastoreCapacityException), e:
+                results.append(e)
+        return results
+
+    def summary(self):
+        """Summarize the resources available for placement.
+
+        Uses the same inputs as the placement scores, so that a scheduler can
+        estimate the scores of this host without sending it place requests.
+
+        :rtype: AgentResourceSummary
+        """
+        total_memory = self._system.total_vmusable_memory_mb() * \
+            self._option.memory_overcommit
+        used_memory = self._used_memory_mb() + self._memory_reserved()
+        total_cpu = self._system.num_physical_cpus() * \
+            self._option.cpu_overcommit
+        used_cpu = self._configured_cpu_count() + self._cpu_reserved()
+
+        datastore_free = {}
+        datastore_total = {}
+        image_ids = set()
+        datastores = self._placeable_datastores()
+        infos = self._datastore_manager.datastore_infos(datastores)
+        for datastore_id in datastores:
+            info = infos[datastore_id]
+            datastore_free[datastore_id] = int(info.total - info.used)
+            datastore_total[datastore_id] = int(info.total)
+            try:
+                image_ids.update(self._image_manager.get_images(datastore_id))
+            except Exception:
+                self._logger.warning("Failed to get images on %s" %
+                                     datastore_id, exc_info=True)
+
+        networks = self._hypervisor.network_manager.get_vm_networks()
+        return AgentResourceSummary(total_memory, used_memory, total_cpu,
+                                    used_cpu, datastore_free, datastore_total,
+                                    image_ids, networks)
 
     def _extract_resource_constraints(self, constraints, resource_types):
         """ Extract ResourceConstraint with same resource_type
@@ -253,32 +458,44 @@ class PlacementManager(object):
                         constraint.values))
         return matched_resource
 
-    def _place_vm(self, vm):
+    def _place(self, state, vm, disks):
+        """Check if there are datastores for placing vm or disks """
+        if len(state.datastores) == 0:
+            raise NoSuchResourceException(ResourceType.DATASTORE,
+                                          "No placeable datastores.")
+
+        if vm:
+            return self._place_vm(state, vm)
+        elif disks:
+            return self._place_disks(state, disks)
+
+    def _place_vm(self, state, vm):
         utilization_score, placement_list = \
-            self._compute_vm_utilization_score(vm)
+            self._compute_vm_utilization_score(state, vm)
         transfer_score = self._transfer_score(vm, placement_list)
         placement_score = AgentPlacementScore(utilization_score,
                                               transfer_score)
 
-        resource_placement_list = self._pick_available_resources(vm)
+        resource_placement_list = self._pick_available_resources(state, vm)
         placement_list.extend(resource_placement_list)
 
         self._logger.debug("placement score: %s" % placement_score)
 
         return placement_score, placement_list
 
-    def _place_disks(self, disks):
+    def _place_disks(self, state, disks):
         utilization_score, placement_list = \
-            self._compute_disks_utilization_score(disks)
+            self._compute_disks_utilization_score(state, disks)
         transfer_score = self._score(0, False, ResourceType.TRANSFER)
         placement_score = AgentPlacementScore(utilization_score,
                                               transfer_score)
         self._logger.debug("placement score: %s" % placement_score)
         return placement_score, placement_list
 
-    def _pick_available_resources(self, vm):
+    def _pick_available_resources(self, state, vm):
         """ Pick host's resources that match vm's resource constraints.
 
+        :param state: HostState
         :param vm: Vm
         :rtype: Placement List
         :raise: NoSuchResourceException
@@ -295,8 +512,7 @@ class PlacementManager(object):
 
             # host available resources.
             host_available_resources = {
-                ResourceConstraintType.NETWORK:
-                set(self._hypervisor.network_manager.get_vm_networks())}
+                ResourceConstraintType.NETWORK: set(state.networks)}
 
             constraints = self._extract_resource_constraints(
                 vm.resource_constraints, extract_resources_type)
@@ -344,8 +560,8 @@ class PlacementManager(object):
         copy_size = 0
 
         for image in images:
-            if not self._image_manager.check_image(image.image.id,
-                                                   vm_placement.container_id):
+            if not self._image_manager.has_image(image.image.id,
+                                                 vm_placement.container_id):
                 try:
                     copy_size += self._image_manager.image_size(image.image.id)
                 except:
@@ -365,18 +581,18 @@ class PlacementManager(object):
     Compute utilization score for a vm, returns
     the minimum between the memory and storage score
     """
-    def _compute_vm_utilization_score(self, vm):
-        memory_score = self._compute_memory_score(vm)
-        cpu_score = self._compute_cpu_score(vm)
+    def _compute_vm_utilization_score(self, state, vm):
+        memory_score = self._compute_memory_score(state, vm)
+        cpu_score = self._compute_cpu_score(state, vm)
         storage_score, placement_list = \
-            self._compute_storage_score(vm.disks)
+            self._compute_storage_score(state, vm.disks)
 
         # If vm is not None, need to put vm placement in placement list
         if vm:
             if placement_list:
                 vm_datastore = placement_list[0].container_id
             else:
-                vm_datastore = self._optimal_datastore()
+                vm_datastore = self._optimal_datastore(state)
             vm_placement = AgentResourcePlacement(
                 AgentResourcePlacement.VM, vm.id, vm_datastore
             )
@@ -390,26 +606,21 @@ class PlacementManager(object):
     Compute utilization score when creating
     independent disks (outside a vm creation call)
     """
-    def _compute_disks_utilization_score(self, disks):
-        return self._compute_storage_score(disks)
+    def _compute_disks_utilization_score(self, state, disks):
+        return self._compute_storage_score(state, disks)
 
     """
     This method computes the memory score for this
     host. Used during VM creation.
     """
     @log_duration
-    def _compute_memory_score(self, vm):
-        total_memory = self._system.total_vmusable_memory_mb()
+    def _compute_memory_score(self, state, vm):
+        total_memory = state.total_memory_mb
         total_overcommited_memory = total_memory * \
             self._option.memory_overcommit
-        consumed_memory = self._system.host_consumed_memory_mb()
+        consumed_memory = state.consumed_memory_mb
 
-        try:
-            used_memory = self._vm_manager.get_used_memory_mb()
-        except VmNotFoundException:
-            used_memory = 0
-
-        used_memory += self._memory_reserved()
+        used_memory = state.used_memory_mb
         memory = self._vm_memory_mb(vm)
         self._logger.debug("memory: %d, used_memory: %d, "
                            "total_overcommited_memory: %d" %
@@ -447,19 +658,14 @@ class PlacementManager(object):
     host and finding their ratio.
     """
     @log_duration
-    def _compute_cpu_score(self, vm):
-        total_cpu_count = self._system.num_physical_cpus()
+    def _compute_cpu_score(self, state, vm):
+        total_cpu_count = state.cpu_count
         total_cpu_count *= self._option.cpu_overcommit
 
         if total_cpu_count is 0:
             return 0
 
-        try:
-            configured_cpu = self._vm_manager.get_configured_cpu_count()
-        except VmNotFoundException:
-            configured_cpu = 0
-
-        configured_cpu += self._cpu_reserved()
+        configured_cpu = state.used_cpu_count
         cpu = self._vm_cpu_count(vm)
         score = self._score((float(configured_cpu) + cpu) /
                             total_cpu_count, True, ResourceType.CPU)
@@ -476,16 +682,13 @@ class PlacementManager(object):
     is drastically reduced.
     """
 
-    def _compute_storage_score(self, disks):
+    def _compute_storage_score(self, state, disks):
         best_effort = False
 
         if not disks:
             return self.MAX_SCORE, []
 
-        selector = DatastoreSelector.init_datastore_selector(
-            self._datastore_manager, self._placeable_datastores())
-
-        disks_placement = DisksPlacement(disks, selector)
+        disks_placement = DisksPlacement(disks, state.selector())
         # Place constraint disks first
         place_result = self._constrainted_placement.place(disks_placement)
         if place_result.result == PlaceResultCode.NO_SUCH_RESOURCE:
@@ -503,10 +706,15 @@ class PlacementManager(object):
         if place_result.result == \
                 PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY:
             # If it doesn't work then try best effort
-            place_result = self._best_effort_placement.place(
-                place_result.disks_placement)
+            unplaced = place_result.disks_placement
+            place_result = self._best_effort_placement.place(unplaced)
             best_effort = True
 
+            # The disks may still fit with a tighter packing
+            if place_result.result == \
+                    PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY:
+                place_result = self._bin_packing_placement.place(unplaced)
+
         # Still NOT_ENOUGH_SYSTEM_RESOURCE then have to give up.
         if place_result.result == \
                 PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY:
@@ -517,7 +725,7 @@ class PlacementManager(object):
         # Count reserved storage
         free = place_result.disks_placement.selector.total_free_space()
         total = place_result.disks_placement.selector.total_space()
-        ratio = float(total-free+self._storage_reserved()) / total
+        ratio = float(total-free+state.storage_reserved_gb) / total
 
         # If we find an optimal data store (that contains the image needed)
         # and the the data stores will not cross the free space threshold,
@@ -551,20 +759,26 @@ class PlacementManager(object):
 
         return self.MAX_SCORE - int(round(inverse_ratio * 100))
 
+    def _used_memory_mb(self):
+        try:
+            return self._vm_manager.get_used_memory_mb()
+        except VmNotFoundException:
+            return 0
+
+    def _configured_cpu_count(self):
+        try:
+            return self._vm_manager.get_configured_cpu_count()
+        except VmNotFoundException:
+            return 0
+
     def _memory_reserved(self):
-        return sum(self._vm_memory_mb(val)
-                   for val in self._reserved_vms.values())
+        return self._reservations.memory_mb
 
     def _cpu_reserved(self):
-        return sum(self._vm_cpu_count(val)
-                   for val in self._reserved_vms.values())
+        return self._reservations.cpu_count
 
     def _storage_reserved(self):
-        score = sum(self._diskutil.disks_capacity_gb(disks)
-                    for disks in self._reserved_disks.values())
-        score += sum(self._diskutil.disks_capacity_gb(vm.disks)
-                     for vm in self._reserved_vms.values()
-                     if vm.disks)
+        score = self._reservations.storage_gb
         self._logger.debug("storage reserved score: %d" % score)
         return score
 
@@ -578,12 +792,12 @@ class PlacementManager(object):
                            (datastores, self._option.image_datastores))
         return datastores
 
-    def _optimal_datastore(self):
+    def _optimal_datastore(self, state):
         free = 0
         optimal = None
-        for datastore_id in self._placeable_datastores():
-            datastore_info = \
-                self._datastore_manager.datastore_info(datastore_id)
+        infos = state.datastore_infos
+        for datastore_id in state.datastores:
+            datastore_info = infos[datastore_id]
             if datastore_info.total - datastore_info.used > free:
                 optimal = datastore_id
         return optimal
@@ -596,14 +810,8 @@ class PlacementManager(object):
     def _vm_cpu_count(vm):
         return int(vm.flavor.cost["vm.cpu"].convert(Unit.COUNT))
 
-    @staticmethod
-    def _consume(resources, reservation_id):
-        if reservation_id not in resources:
+    def _consume(self, key):
+        resource = self._reservations.consume(key)
+        if resource is None:
             raise InvalidReservationException()
-        resource = resources[reservation_id]
         return resource
-
-    @staticmethod
-    def _remove(resources, reservation_id):
-        if reservation_id in resources:
-            del resources[reservation_id]
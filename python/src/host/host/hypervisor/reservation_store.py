@@ -0,0 +1,196 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import heapq
+import logging
+import threading
+import time
+
+from common.stats import Counters
+from host.hypervisor.resource_ledger import ResourceLedger
+
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_SIZE = 10000
+
+
+class _Reservation(object):
+
+    __slots__ = ("value", "expires")
+
+    def __init__(self, value, expires):
+        self.value = value
+        # None once consumed, consumed reservations don't expire
+        self.expires = expires
+
+
+class ReservationStore(object):
+    """Reservations that expire if they are not consumed in time.
+
+    A reservation holds resources in a ResourceLedger until it is removed.
+    If the caller never consumes it, e.g. because it died after reserving,
+    the reservation expires after ttl seconds and its resources are released.
+    Expired reservations are dropped whenever the store is accessed, so the
+    ledger totals never include them.
+
+    Consumed reservations no longer expire, since the operation consuming
+    them is in progress, and are removed by the caller once it is done. When
+    the store holds max_size reservations, the one closest to expiry is
+    evicted to make room for a new one.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param ttl: seconds before an unconsumed reservation expires
+        :type ttl: float
+        :param max_size: maximum number of reservations
+        :type max_size: int
+        """
+        self._logger = logging.getLogger(__name__)
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+
+        # key -> _Reservation
+        self._reservations = {}
+
+        # Heap of (expires, key). Entries of removed or consumed reservations
+        # are skipped when popped.
+        self._expiry = []
+
+        self._ledger = ResourceLedger()
+        self._counters = Counters()
+
+    def add(self, key, value, memory_mb=0, cpu_count=0, storage_gb=0):
+        """Add a reservation holding the given resources.
+
+        :type key: hashable
+        :param value: the reserved resource, returned by consume
+        :type memory_mb: int
+        :type cpu_count: int
+        :type storage_gb: int
+        """
+        now = time.time()
+        expires = now + self._ttl
+        with self._lock:
+            self._expire(now)
+            self._delete(key)
+            if len(self._reservations) >= self._max_size:
+                self._evict()
+            self._reservations[key] = _Reservation(value, expires)
+            heapq.heappush(self._expiry, (expires, key))
+            self._ledger.update(key, memory_mb=memory_mb,
+                                cpu_count=cpu_count, storage_gb=storage_gb)
+        self._counters.increment("added")
+
+    def consume(self, key):
+        """Get a reservation, and keep it until it is removed.
+
+        :type key: hashable
+        :return: the reserved resource, or None if the reservation doesn't
+                 exist or has expired
+        """
+        with self._lock:
+            self._expire(time.time())
+            reservation = self._reservations.get(key)
+            if reservation is None:
+                return None
+            if reservation.expires is not None:
+                reservation.expires = None
+                self._counters.increment("consumed")
+            return reservation.value
+
+    def remove(self, key):
+        """Remove a reservation and release its resources.
+
+        :type key: hashable
+        :return: the reserved resource, or None if it doesn't exist
+        """
+        with self._lock:
+            reservation = self._delete(key)
+            self._compact()
+        if reservation is None:
+            return None
+        return reservation.value
+
+    def expire(self):
+        """Drop the expired reservations."""
+        with self._lock:
+            self._expire(time.time())
+
+    @property
+    def memory_mb(self):
+        self.expire()
+        return self._ledger.memory_mb
+
+    @property
+    def cpu_count(self):
+        self.expire()
+        return self._ledger.cpu_count
+
+    @property
+    def storage_gb(self):
+        self.expire()
+        return self._ledger.storage_gb
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.time())
+            return len(self._reservations)
+
+    def stats(self):
+        """Get the number of live reservations, and how many were added,
+        consumed, expired and evicted.
+
+        :rtype: dict
+        """
+        stats = self._counters.snapshot()
+        stats["live"] = len(self)
+        return stats
+
+    def _expire(self, now):
+        expired = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, key = heapq.heappop(self._expiry)
+            reservation = self._reservations.get(key)
+            if reservation is not None and reservation.expires == expires:
+                self._delete(key)
+                expired += 1
+        if expired:
+            self._logger.info("Expired %d reservations", expired)
+            self._counters.increment("expired", expired)
+
+    def _evict(self):
+        while self._expiry:
+            expires, key = heapq.heappop(self._expiry)
+            reservation = self._reservations.get(key)
+            if reservation is not None and reservation.expires == expires:
+                self._logger.warning("Evicting reservation %s", key)
+                self._delete(key)
+                self._counters.increment("evicted")
+                return
+
+    def _delete(self, key):
+        reservation = self._reservations.pop(key, None)
+        if reservation is not None:
+            self._ledger.release(key)
+        return reservation
+
+    def _compact(self):
+        # Removed reservations leave their entries in the heap until they
+        # would have expired, rebuild it if they pile up.
+        if len(self._expiry) <= 2 * len(self._reservations) + 64:
+            return
+        self._expiry = [(r.expires, key)
+                        for key, r in self._reservations.iteritems()
+                        if r.expires is not None]
+        heapq.heapify(self._expiry)
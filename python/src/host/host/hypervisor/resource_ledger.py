@@ -0,0 +1,82 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import threading
+
+
+class ResourceLedger(object):
+    """Running totals of the resources held by a set of entries.
+
+    Each entry, e.g. a reservation or a VM, holds some memory, vCPUs and
+    storage. The totals are updated when entries are added, changed or
+    released, so reading them does not walk the entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (memory_mb, cpu_count, storage_gb)
+        self._entries = {}
+        self._memory_mb = 0
+        self._cpu_count = 0
+        self._storage_gb = 0
+
+    def update(self, key, memory_mb=0, cpu_count=0, storage_gb=0):
+        """Add an entry, or replace the resources held by an entry.
+
+        :type key: hashable
+        :type memory_mb: int
+        :type cpu_count: int
+        :type storage_gb: int
+        """
+        with self._lock:
+            self._release(key)
+            self._entries[key] = (memory_mb, cpu_count, storage_gb)
+            self._memory_mb += memory_mb
+            self._cpu_count += cpu_count
+            self._storage_gb += storage_gb
+
+    def release(self, key):
+        """Remove an entry. Unknown keys are ignored.
+
+        :type key: hashable
+        """
+        with self._lock:
+            self._release(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def memory_mb(self):
+        return self._memory_mb
+
+    @property
+    def cpu_count(self):
+        return self._cpu_count
+
+    @property
+    def storage_gb(self):
+        return self._storage_gb
+
+    def _release(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        memory_mb, cpu_count, storage_gb = entry
+        self._memory_mb -= memory_mb
+        self._cpu_count -= cpu_count
+        self._storage_gb -= storage_gb
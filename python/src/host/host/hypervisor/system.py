@@ -50,6 +50,15 @@ class System(object):
         """
         pass
 
+    def datastore_infos(self, datastore_ids):
+        """Datastore info of several datastores.
+
+        :type datastore_ids: list of str
+        :rtype: dict of datastore id to DatastoreInfo
+        """
+        return dict((datastore_id, self.datastore_info(datastore_id))
+                    for datastore_id in datastore_ids)
+
     @abc.abstractmethod
     def total_vmusable_memory_mb(self):
         """Total memory in MB that can be used to create Vms
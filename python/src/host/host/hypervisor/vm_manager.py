@@ -420,6 +420,22 @@ class VmManager(object):
         """
         pass
 
+    @abc.abstractmethod
+    def allocate_vnc_port(self):
+        """Allocate a free vnc port for a new vm. The port is not handed out
+        again until the vm using it is removed or it is released.
+        :return: int, the port or None if no port is free
+        """
+        pass
+
+    @abc.abstractmethod
+    def release_vnc_port(self, port):
+        """Release a port allocated by allocate_vnc_port that was not used,
+        e.g. because the vm creation failed.
+        :param port: int, the vnc port
+        """
+        pass
+
     @abc.abstractmethod
     def get_mks_ticket(self, vm_id):
         """Get mks ticket for a vm
@@ -0,0 +1,155 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import logging
+import threading
+import time
+
+
+VNC_PORT_MIN = 5900
+VNC_PORT_MAX = 5999
+
+# Seconds before a port allocated for a VM that never shows up is freed
+ALLOCATION_TTL = 600
+
+
+class VncPortIndex(object):
+    """Index of the VNC ports used by the VMs on the host.
+
+    The VM cache reports the port of each VM with VNC enabled. Ports handed
+    out by allocate() stay taken until a VM shows up with the port, the
+    caller releases it, or ALLOCATION_TTL passes, so concurrent VM creates
+    don't get the same port.
+
+    The ports in use are kept in a bitmap, an int with bit i set if port
+    min_port + i is used, so allocate() finds the lowest free port with a
+    few int operations instead of scanning the VMs.
+    """
+
+    def __init__(self, min_port=VNC_PORT_MIN, max_port=VNC_PORT_MAX,
+                 allocation_ttl=ALLOCATION_TTL):
+        self._logger = logging.getLogger(__name__)
+        self._min_port = min_port
+        self._max_port = max_port
+        self._allocation_ttl = allocation_ttl
+        self._lock = threading.Lock()
+
+        # VM key -> port
+        self._vm_ports = {}
+        # port -> number of VMs using it
+        self._port_vms = {}
+        # port -> time the allocation expires
+        self._allocated = {}
+        self._bitmap = 0
+
+    def update(self, key, port):
+        """Record the port of a VM.
+
+        :type key: hashable
+        :param port: the VNC port of the VM, None if VNC is not enabled
+        :type port: int
+        """
+        with self._lock:
+            if self._vm_ports.get(key) == port:
+                return
+            self._release_vm(key)
+            if port is None:
+                return
+            self._vm_ports[key] = port
+            if port in self._port_vms:
+                self._logger.warning("port %d already occupied" % port)
+            self._port_vms[port] = self._port_vms.get(port, 0) + 1
+            # The VM created with an allocated port took it
+            self._allocated.pop(port, None)
+            self._set(port)
+
+    def remove(self, key):
+        """Forget a VM.
+
+        :type key: hashable
+        """
+        with self._lock:
+            self._release_vm(key)
+
+    def occupied(self):
+        """
+        :return: the ports used by VMs or allocated
+        :rtype: set of int
+        """
+        with self._lock:
+            self._expire()
+            return set(self._port_vms) | set(self._allocated)
+
+    def allocate(self):
+        """Allocate the lowest free port.
+
+        :return: the port, or None if all the ports are taken
+        :rtype: int
+        """
+        with self._lock:
+            port = self._lowest_free()
+            if port is None and self._expire():
+                port = self._lowest_free()
+            if port is None:
+                return None
+            self._allocated[port] = time.time() + self._allocation_ttl
+            self._set(port)
+            return port
+
+    def release(self, port):
+        """Release an allocated port that was not used, e.g. because the VM
+        creation failed. Ports used by VMs are not affected.
+
+        :type port: int
+        """
+        with self._lock:
+            if self._allocated.pop(port, None) is not None:
+                self._clear(port)
+
+    def _lowest_free(self):
+        size = self._max_port - self._min_port + 1
+        free = ~self._bitmap & ((1 << size) - 1)
+        if not free:
+            return None
+        # free & -free isolates the lowest set bit, and bin() of it is "0b1"
+        # followed by its position in zeros
+        return self._min_port + len(bin(free & -free)) - 3
+
+    def _release_vm(self, key):
+        port = self._vm_ports.pop(key, None)
+        if port is None:
+            return
+        self._port_vms[port] -= 1
+        if self._port_vms[port] == 0:
+            del self._port_vms[port]
+            self._clear(port)
+
+    def _expire(self):
+        now = time.time()
+        expired = [port for port, expires in self._allocated.iteritems()
+                   if expires <= now]
+        for port in expired:
+            del self._allocated[port]
+            self._clear(port)
+        return expired
+
+    def _in_range(self, port):
+        return self._min_port <= port <= self._max_port
+
+    def _set(self, port):
+        if self._in_range(port):
+            self._bitmap |= 1 << (port - self._min_port)
+
+    def _clear(self, port):
+        if self._in_range(port) and port not in self._port_vms and \
+                port not in self._allocated:
+            self._bitmap &= ~(1 << (port - self._min_port))
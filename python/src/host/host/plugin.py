@@ -11,17 +11,23 @@
 # under the License.
 
 import common
+import logging
 
 from common.service_name import ServiceName
+from common.thread import Periodic
 from gen.host import Host
 from host.host_handler import HostHandler
 from host.hypervisor import hypervisor
 
+# Interval in seconds between the logs of the reservation stats.
+RESERVATION_STATS_INTERVAL = 300
+
 
 class HostPlugin(common.plugin.Plugin):
 
     def __init__(self):
         super(HostPlugin, self).__init__("Host")
+        self._logger = logging.getLogger(__name__)
 
     def init(self):
         # Load agent config and registrant
@@ -43,6 +49,13 @@ class HostPlugin(common.plugin.Plugin):
         # Register hypervisor in services
         common.services.register(ServiceName.HYPERVISOR, hv)
 
+        # Log the reservation stats periodically, started with the plugin.
+        self._placement_manager = hv.placement_manager
+        stats_logger = Periodic(self._log_reservation_stats,
+                                RESERVATION_STATS_INTERVAL)
+        stats_logger.daemon = True
+        self.add_backend_worker(stats_logger)
+
         # Create host handler
         host_handler = HostHandler(hv)
         common.services.register(Host.Iface, host_handler)
@@ -62,5 +75,9 @@ class HostPlugin(common.plugin.Plugin):
         )
         self.add_thrift_service(service)
 
+    def _log_reservation_stats(self):
+        self._logger.info("Reservation stats: %s",
+                          self._placement_manager.reservation_stats())
+
 
 plugin = HostPlugin()
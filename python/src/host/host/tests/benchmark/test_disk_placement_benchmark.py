@@ -0,0 +1,117 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+"""Benchmark of the disk place engines, filling the datastores of a host with
+many-disk VMs until one doesn't fit.
+
+Run with: make test BENCHMARK=1
+"""
+
+import copy
+import random
+import time
+import unittest
+
+from hamcrest import *  # noqa
+from mock import MagicMock
+
+from host.hypervisor.disk_placement_manager import BestEffortPlaceEngine
+from host.hypervisor.disk_placement_manager import BinPackingPlaceEngine
+from host.hypervisor.disk_placement_manager import DatastoreSelector
+from host.hypervisor.disk_placement_manager import DisksPlacement
+from host.hypervisor.disk_placement_manager import OptimalPlaceEngine
+from host.hypervisor.disk_placement_manager import PlaceResultCode
+from host.hypervisor.placement_manager import PlacementOption
+from host.hypervisor.resources import Disk
+
+
+DATASTORES = 16
+RUNS = 20
+
+
+class DiskPlacementBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        option = PlacementOption(1, 1, [])
+        self.optimal = OptimalPlaceEngine(MagicMock(), option)
+        self.best_effort = BestEffortPlaceEngine(MagicMock(), option)
+        self.bin_packing = BinPackingPlaceEngine(MagicMock(), option)
+
+    def _selector(self, rand):
+        selector = DatastoreSelector()
+        for i in range(DATASTORES):
+            size = rand.choice([512, 1024, 2048, 4096])
+            selector.add_datastore("ds_%d" % i, size, size)
+        return selector
+
+    def _disks(self, rand):
+        return [Disk("disk_%d" % i, capacity_gb=rand.choice([20, 50, 100,
+                                                             200, 500]))
+                for i in range(rand.randint(4, 12))]
+
+    def _fill(self, engine, seed):
+        """Place VMs until one doesn't fit.
+
+        :return: number of VMs placed, placement time and the fraction of the
+                 free space left outside of the biggest free datastore
+        """
+        rand = random.Random(seed)
+        selector = self._selector(rand)
+        placed = 0
+        elapsed = 0
+        while True:
+            placement = DisksPlacement(self._disks(rand), selector)
+            start = time.time()
+            result = self.optimal.place(placement)
+            if result.result != PlaceResultCode.OK:
+                result = engine.place(placement)
+            elapsed += time.time() - start
+            if result.result != PlaceResultCode.OK:
+                break
+            selector = result.disks_placement.selector
+            placed += 1
+
+        free = selector.total_free_space()
+        biggest = selector.free_space(selector.get_datastore())
+        return placed, elapsed / (placed + 1), 1 - float(biggest) / free
+
+    def test_fill_datastores(self):
+        print
+        results = {}
+        for name, engine in [("best_effort", self.best_effort),
+                             ("bin_packing", self.bin_packing)]:
+            runs = [self._fill(engine, seed) for seed in range(RUNS)]
+            results[name] = [sum(run[i] for run in runs) / float(RUNS)
+                             for i in range(3)]
+            print ("optimal+%-11s %6.1f VMs placed, %.3fms per placement, "
+                   "fragmentation %.3f" % ((name, results[name][0],
+                                            results[name][1] * 1000,
+                                            results[name][2])))
+
+        assert_that(results["bin_packing"][0],
+                    greater_than_or_equal_to(results["best_effort"][0]))
+
+    def test_copy(self):
+        rand = random.Random(0)
+        placement = DisksPlacement(self._disks(rand), self._selector(rand))
+        for name, copy_placement in [("deepcopy", copy.deepcopy),
+                                     ("copy on write",
+                                      DisksPlacement.copy)]:
+            start = time.time()
+            for _ in range(1000):
+                copy_placement(placement)
+            print ("%-13s %.1fus per placement copy" %
+                   (name, (time.time() - start) * 1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import os
+import threading
+import unittest
+import zlib
+
+from StringIO import StringIO
+from hamcrest import *  # noqa
+
+from host.hypervisor.esx.block_codec import BlockCodecError
+from host.hypervisor.esx.block_codec import BlockCompressor
+from host.hypervisor.esx.block_codec import BlockDecompressor
+from host.hypervisor.esx.block_codec import MAX_BLOCK_SIZE
+
+
+class TrickleReader(object):
+    """ Returns at most max_read bytes per read, like a socket. """
+
+    def __init__(self, data, max_read):
+        self._file = StringIO(data)
+        self._max_read = max_read
+
+    def read(self, size):
+        return self._file.read(min(size, self._max_read))
+
+
+class TestBlockCodec(unittest.TestCase):
+
+    def _round_trip(self, data, block_size=4096, max_read=100000):
+        compressor = BlockCompressor(block_size=block_size, workers=3)
+        blocks = list(compressor.blocks(TrickleReader(data, max_read)))
+        written = []
+        decompressor = BlockDecompressor(written.append, workers=3)
+        for block, compressed in blocks:
+            decompressor.write(block, compressed)
+        decompressor.close()
+        assert_that("".join(written) == data, is_(True))
+        return compressor.stats, decompressor.stats, blocks
+
+    def test_compressible(self):
+        data = "".join("line %d of the file\n" % i for i in xrange(10000))
+        stats, decode_stats, blocks = self._round_trip(data)
+
+        encoded = sum(len(block) for block, _ in blocks)
+        assert_that(stats.plain_bytes, is_(len(data)))
+        assert_that(stats.encoded_bytes, is_(encoded))
+        assert_that(stats.saved_bytes, greater_than(len(data) / 2))
+        assert_that(stats.blocks, is_((len(data) + 4095) / 4096))
+        assert_that(stats.raw_blocks, is_(0))
+        assert_that(decode_stats.plain_bytes, is_(len(data)))
+        assert_that(decode_stats.encoded_bytes, is_(encoded))
+
+    def test_incompressible_blocks_sent_raw(self):
+        # Random blocks between zero blocks
+        data = "".join((os.urandom(4096) if i % 2 else "\0" * 4096)
+                       for i in xrange(8))
+        stats, _, blocks = self._round_trip(data)
+
+        assert_that(stats.blocks, is_(8))
+        assert_that(stats.raw_blocks, is_(4))
+        assert_that([compressed for block, compressed in blocks],
+                    is_([True, False] * 4))
+        assert_that(stats.saved_bytes, greater_than(4 * 4000))
+
+    def test_short_reads(self):
+        data = os.urandom(3000) + "a" * 20000
+        _, _, blocks = self._round_trip(data, block_size=1024, max_read=7)
+        assert_that(blocks, has_length(23))
+
+    def test_empty(self):
+        stats, _, blocks = self._round_trip("")
+        assert_that(blocks, is_([]))
+        assert_that(stats.blocks, is_(0))
+
+    def test_decompressed_in_order(self):
+        # The first block is the slowest to write, the others are done first
+        written = []
+        first_written = threading.Event()
+
+        def sink(data):
+            written.append(data)
+            first_written.set()
+
+        decompressor = BlockDecompressor(sink, workers=2)
+        blocks = [str(i) * (1000 * (10 - i)) for i in xrange(10)]
+        for block in blocks:
+            decompressor.write(zlib.compress(block), True)
+        # No more than 2 * workers blocks are kept
+        assert_that(first_written.is_set(), is_(True))
+        decompressor.close()
+        assert_that(written, is_(blocks))
+
+    def test_corrupted(self):
+        decompressor = BlockDecompressor(lambda data: None)
+        self.assertRaises(BlockCodecError, decompressor.decompress,
+                          "x" * 10, True)
+
+        # Blocks can't decompress to more than MAX_BLOCK_SIZE
+        bomb = zlib.compress("\0" * (MAX_BLOCK_SIZE + 1))
+        self.assertRaises(BlockCodecError, decompressor.decompress, bomb,
+                          True)
+
+    def test_invalid_block_size(self):
+        self.assertRaises(ValueError, BlockCompressor, block_size=0)
+        self.assertRaises(ValueError, BlockCompressor,
+                          block_size=MAX_BLOCK_SIZE + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
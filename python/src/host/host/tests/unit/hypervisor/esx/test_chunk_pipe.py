@@ -0,0 +1,83 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import threading
+import unittest
+
+from hamcrest import *  # noqa
+
+from host.hypervisor.esx.chunk_pipe import ChunkPipe
+from host.hypervisor.esx.chunk_pipe import PipeClosed
+from host.hypervisor.esx.chunk_pipe import PipeError
+
+
+class TestChunkPipe(unittest.TestCase):
+
+    def test_read_write(self):
+        pipe = ChunkPipe(2)
+        pipe.write("abcd")
+        pipe.write("ef")
+        assert_that(pipe.read(3), is_("abc"))
+        assert_that(pipe.read(3), is_("d"))
+        pipe.close()
+        assert_that(pipe.read(3), is_("ef"))
+        assert_that(pipe.read(3), is_(""))
+        assert_that(pipe.bytes_written, is_(6))
+        assert_that(pipe.peak_buffered, is_(6))
+
+    def test_bounded(self):
+        pipe = ChunkPipe(2)
+        chunks = ["chunk%d" % i for i in xrange(100)]
+
+        def write():
+            for chunk in chunks:
+                pipe.write(chunk)
+            pipe.close()
+        writer = threading.Thread(target=write)
+        writer.start()
+
+        read = []
+        data = pipe.read(1024)
+        while data:
+            read.append(data)
+            data = pipe.read(1024)
+        writer.join()
+        assert_that(read, is_(chunks))
+        # never more than 2 chunks buffered
+        assert_that(pipe.peak_buffered, less_than_or_equal_to(14))
+
+    def test_writer_error(self):
+        pipe = ChunkPipe(2)
+        pipe.write("data")
+        pipe.close(error="connection reset")
+        assert_that(pipe.read(10), is_("data"))
+        self.assertRaises(PipeError, pipe.read, 10)
+
+    def test_reader_closed(self):
+        pipe = ChunkPipe(1)
+        pipe.write("data")
+        errors = []
+
+        def write():
+            try:
+                pipe.write("more")
+            except PipeClosed:
+                errors.append(True)
+        writer = threading.Thread(target=write)
+        writer.start()
+        pipe.close_reader()
+        writer.join(5)
+        assert_that(errors, is_([True]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -135,6 +135,31 @@ class TestEsxDatastoreManager(unittest.TestCase):
         ds_manager = EsxDatastoreManager(hypervisor, ds_list, image_ds)
         assert_that(ds_manager.initialized, is_(False))
 
+    @patch("os.mkdir")
+    def test_datastore_infos(self, mkdir_mock):
+        hypervisor = MagicMock()
+        dstags = MagicMock()
+        dstags.get.return_value = []
+        common.services.register(ServiceName.DATASTORE_TAGS, dstags)
+        hypervisor.vim_client.get_all_datastores.return_value = \
+            self.get_datastore_mock([
+                ["datastore1", "/vmfs/volumes/id-1", "VMFS", True],
+                ["datastore2", "/vmfs/volumes/id-2", "VMFS", True],
+            ])
+        hypervisor.system.datastore_infos.side_effect = lambda names: dict(
+            (name, "info-%s" % name) for name in names)
+        ds_manager = EsxDatastoreManager(
+            hypervisor, ["datastore1", "datastore2"], [])
+
+        infos = ds_manager.datastore_infos(["id-1", "id-2"])
+        assert_that(infos, is_({"id-1": "info-datastore1",
+                                "id-2": "info-datastore2"}))
+        # Fetched at once
+        datastore_infos = hypervisor.system.datastore_infos
+        assert_that(datastore_infos.call_count, is_(1))
+        assert_that(datastore_infos.call_args[0][0],
+                    contains_inanyorder("datastore1", "datastore2"))
+
     @patch("os.mkdir")
     def test_multiple_image_datastores(self, mkdir_mock):
         """Test that datastore manager works with multiple image datastores."""
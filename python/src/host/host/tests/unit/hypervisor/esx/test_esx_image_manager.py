@@ -30,6 +30,7 @@ from common.service_name import ServiceName
 from gen.resource.ttypes import DatastoreType
 from gen.resource.ttypes import ImageReplication
 from gen.resource.ttypes import ImageType
+from host.hypervisor.datastore_manager import DatastoreNotFoundException
 from host.hypervisor.disk_manager import DiskAlreadyExistException
 from host.hypervisor.esx.folder import IMAGE_FOLDER_NAME
 from host.hypervisor.esx.folder import TMP_IMAGE_FOLDER_NAME
@@ -361,6 +362,49 @@ class TestEsxImageManager(unittest.TestCase):
         src_path.assert_called_once_with("ds1", "foo", IMAGE_FOLDER_NAME)
         dst_path.assert_called_once_with("ds1", GC_IMAGE_FOLDER)
 
+    @patch.object(EsxImageManager, "_list_images")
+    @patch.object(EsxImageManager, "_check_image_repair", return_value=False)
+    @patch.object(EsxImageManager, "_get_datastore_type",
+                  return_value=DatastoreType.EXT3)
+    @patch("host.hypervisor.esx.image_manager.FileBackedLock")
+    @patch("host.hypervisor.esx.image_manager.mkdir_p")
+    @patch("os.makedirs")
+    @patch("shutil.move")
+    def test_image_catalog(self, _mv_dir, _makedirs, _mkdir_p, _flock,
+                           _get_ds_type, _check_image_repair, _list_images):
+        _list_images.return_value = ["foo"]
+        image_manager = EsxImageManager(self.vim_client, self.ds_manager)
+
+        assert_that(image_manager.get_images("ds1"), contains("foo"))
+        assert_that(image_manager.has_image("foo", "ds1"), is_(True))
+        assert_that(image_manager.datastores_with_image("foo", ["ds1"]),
+                    contains("ds1"))
+        _list_images.assert_called_once_with("ds1")
+
+        # moving an image in and out of the image folder updates the catalog
+        image_manager._move_image("bar", "ds1", "/vmfs/volumes/ds1/tmp")
+        assert_that(image_manager.get_images("ds1"),
+                    contains_inanyorder("foo", "bar"))
+        with patch("os.path.exists", return_value=True):
+            image_manager._gc_image_dir("ds1", "foo")
+        assert_that(image_manager.get_images("ds1"), contains("bar"))
+        assert_that(_list_images.call_count, is_(1))
+
+        # refresh relists the datastores
+        self.ds_manager.get_datastores.return_value = [MagicMock(id="ds1")]
+        image_manager.refresh_images()
+        assert_that(image_manager.get_images("ds1"), contains("foo"))
+
+    @patch("os.path.exists")
+    def test_list_images_without_image_folder(self, _exists):
+        # The datastore is there, but no image was created on it yet
+        _exists.side_effect = lambda path: path == "/vmfs/volumes/ds1/"
+        assert_that(self.image_manager.get_images("ds1"), is_([]))
+        assert_that(self.image_manager.has_image("foo", "ds1"), is_(False))
+
+        self.assertRaises(DatastoreNotFoundException,
+                          self.image_manager.get_images, "ds2")
+
     def test_image_path(self):
         image_path = "/vmfs/volumes/ds/images/tt/ttylinux/ttylinux.vmdk"
         ds = self.image_manager.get_datastore_id_from_path(image_path)
@@ -0,0 +1,54 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+from mock import MagicMock
+
+from host.hypervisor.datastore_manager import DatastoreNotFoundException
+from host.hypervisor.esx.system import EsxSystem
+
+
+class TestEsxSystem(unittest.TestCase):
+
+    def setUp(self):
+        self.vim_client = MagicMock()
+        self.cached = {"ds1": (10 * 1024 ** 3, 4 * 1024 ** 3)}
+        self.vim_client.get_datastore_space_in_cache.side_effect = \
+            self.cached.get
+        self.vim_client.get_datastore_spaces.return_value = {
+            "ds1": (10 * 1024 ** 3, 4 * 1024 ** 3),
+            "ds2": (20 * 1024 ** 3, 5 * 1024 ** 3),
+            "ds3": (30 * 1024 ** 3, 6 * 1024 ** 3)}
+        self.system = EsxSystem(self.vim_client)
+
+    def test_datastore_info_from_cache(self):
+        info = self.system.datastore_info("ds1")
+        assert_that(info.total, is_(10.0))
+        assert_that(info.used, is_(6.0))
+        assert_that(self.vim_client.get_datastore_spaces.called, is_(False))
+
+    def test_datastore_infos_fetch_missing_at_once(self):
+        infos = self.system.datastore_infos(["ds1", "ds2", "ds3"])
+        assert_that(infos.keys(), contains_inanyorder("ds1", "ds2", "ds3"))
+        assert_that(infos["ds3"].total, is_(30.0))
+        assert_that(infos["ds3"].used, is_(24.0))
+        assert_that(self.vim_client.get_datastore_spaces.call_count, is_(1))
+
+    def test_datastore_info_not_found(self):
+        self.assertRaises(DatastoreNotFoundException,
+                          self.system.datastore_info, "ds4")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,9 +22,11 @@ from nose_parameterized import parameterized
 from hamcrest import *  # noqa
 from pyVmomi import vim
 
+from common import services
 from common.kind import Flavor
 from common.kind import QuotaLineItem
 from common.kind import Unit
+from common.service_name import ServiceName
 from gen.agent.ttypes import VmCache
 from gen.host.ttypes import ConnectedStatus
 from gen.host.ttypes import VmNetworkInfo
@@ -420,14 +422,25 @@ class TestEsxVmManager(unittest.TestCase):
         self.vm_manager.add_disk(spec, "ds1", "vm_foo", info)
 
     def test_used_memory(self):
-        self.vm_manager.vim_client.get_vms_in_cache = MagicMock(return_value=[
-            VmCache(memory_mb=1024),
-            VmCache(),
-            VmCache(memory_mb=2048)
-        ])
+        self.vm_manager.vim_client.get_vm_resources_in_cache = MagicMock(
+            return_value=(2, 2048 + 1024, 3))
 
         memory = self.vm_manager.get_used_memory_mb()
         self.assertEqual(memory, 2048 + 1024)
+        self.assertEqual(self.vm_manager.get_configured_cpu_count(), 3)
+
+    def test_used_memory_no_vms(self):
+        self.vm_manager.vim_client.get_vm_resources_in_cache = MagicMock(
+            return_value=(0, 0, 0))
+        self.assertEqual(self.vm_manager.get_used_memory_mb(), 0)
+        self.assertEqual(self.vm_manager.get_configured_cpu_count(), 0)
+
+        self.vm_manager.vim_client.get_vm_resources_in_cache = MagicMock(
+            return_value=(1, 0, 0))
+        self.assertRaises(VmNotFoundException,
+                          self.vm_manager.get_used_memory_mb)
+        self.assertRaises(VmNotFoundException,
+                          self.vm_manager.get_configured_cpu_count)
 
     def atest_remove_vm_disk(self):
         """Test removing VM disk"""
@@ -728,22 +741,12 @@ class TestEsxVmManager(unittest.TestCase):
         assert_that(len(resources[0].disks), equal_to(2))
         assert_that(len(resources[1].disks), equal_to(3))
 
-    @patch.object(VimClient, "get_vms")
-    def test_get_occupied_vnc_ports(self, get_vms):
-        get_vms.return_value = [self._create_vm_mock(5900),
-                                self._create_vm_mock(5901)]
+    @patch.object(VimClient, "get_vnc_ports_in_cache")
+    def test_get_occupied_vnc_ports(self, get_vnc_ports):
+        get_vnc_ports.return_value = set([5900, 5901])
         ports = self.vm_manager.get_occupied_vnc_ports()
         assert_that(ports, contains_inanyorder(5900, 5901))
 
-    def _create_vm_mock(self, vnc_port):
-        vm = MagicMock()
-        vm.config.extraConfig = []
-        vm.config.extraConfig.append(
-            vim.OptionValue(key="RemoteDisplay.vnc.port", value=str(vnc_port)))
-        vm.config.extraConfig.append(
-            vim.OptionValue(key="RemoteDisplay.vnc.enabled", value="True"))
-        return vm
-
 
 class ImageScannerTestCase(unittest.TestCase):
     DATASTORE_ID = "DS01"
@@ -764,6 +767,7 @@ class ImageScannerTestCase(unittest.TestCase):
         # Set up test files
         self.base_dir = os.path.dirname(__file__)
         self.test_dir = os.path.join(self.base_dir, "../../test_files")
+        services.register(ServiceName.AGENT_CONFIG, MagicMock())
         self.image_manager = EsxImageManager(MagicMock(), MagicMock())
         self.image_scanner = DatastoreImageScanner(self.image_manager,
                                                    self.vm_manager,
@@ -10,10 +10,17 @@
 # License for then specific language governing permissions and limitations
 # under the License.
 
+import logging
+import mmap
+import os
+import tempfile
 import unittest
 import uuid
+import zlib
 
+from StringIO import StringIO
 from hamcrest import *  # noqa
+from mock import ANY
 from mock import MagicMock
 from mock import patch
 from nose_parameterized import parameterized
@@ -21,12 +28,22 @@ from nose_parameterized import parameterized
 from common import services
 from common.service_name import ServiceName
 from gen.host import Host
+from gen.host.ttypes import FinishImageUploadResponse
+from gen.host.ttypes import ImageUploadResultCode
 from gen.host.ttypes import ReceiveImageResultCode
 from gen.host.ttypes import ServiceTicketRequest
 from gen.host.ttypes import ServiceTicketResultCode
 from gen.host.ttypes import ServiceType
+from gen.host.ttypes import StartImageUploadResponse
+from gen.host.ttypes import WriteImageDataResponse
+from host.hypervisor.esx.block_codec import BlockCompressor
+from host.hypervisor.esx.http_disk_transfer import CHUNK_SIZE
 from host.hypervisor.esx.http_disk_transfer import HttpNfcTransferer
+from host.hypervisor.esx.http_disk_transfer import TransferException
+from host.hypervisor.esx.http_disk_transfer import UPLOAD_IDLE_TIMEOUT
+from host.hypervisor.esx.ranged_transfer import RangesNotSupported
 from host.hypervisor.esx.vim_client import VimClient
+from host.hypervisor.image_manager import ImageUploadNotFound
 
 
 class TestHttpTransfer(unittest.TestCase):
@@ -249,6 +266,7 @@ class TestHttpTransfer(unittest.TestCase):
         to_url_mock = MagicMock()
         import_spec_mock = MagicMock()
         xferer = self.http_transferer
+        xferer._streaming = False
 
         file_contents = ["fake_metadata", "fake_manifest"]
 
@@ -297,3 +315,298 @@ class TestHttpTransfer(unittest.TestCase):
             expected_tmp_file, to_url_mock)
         write_lease_mock.Complete.assert_called_once_with()
         mock_unlink.assert_called_once_with(expected_tmp_file)
+
+    @patch("__builtin__.open")
+    def test_send_image_to_host_streaming(self, mock_open):
+        read_lease_mock = MagicMock()
+        write_lease_mock = MagicMock()
+        agent_conn_mock = MagicMock()
+        xferer = self.http_transferer
+
+        mock_open().__enter__().read.return_value = "fake"
+        xferer._get_image_stream_from_shadow_vm = MagicMock(
+            return_value=(read_lease_mock, "from_url"))
+        xferer.download_file = MagicMock()
+        xferer._get_remote_connections = MagicMock(
+            return_value=(agent_conn_mock, MagicMock()))
+        xferer._create_import_vm_spec = MagicMock()
+        xferer._get_url_from_import_vm = MagicMock(
+            return_value=(write_lease_mock, "to_url"))
+        xferer.transfer_stream = MagicMock()
+        agent_conn_mock.receive_image.return_value.result = \
+            ReceiveImageResultCode.OK
+
+        xferer.send_image_to_host("image_id", "image_ds", None,
+                                  "destination_ds", "mock_host", 8835)
+
+        # No intermediate file
+        assert_that(xferer.download_file.called, is_(False))
+        xferer.transfer_stream.assert_called_once_with("from_url", "to_url")
+        read_lease_mock.Complete.assert_called_once_with()
+        write_lease_mock.Complete.assert_called_once_with()
+
+    def test_transfer_stream(self):
+        data = "x" * (CHUNK_SIZE * 3 + 10)
+        src = StringIO(data)
+        src.getheader = MagicMock(return_value=None)
+        xferer = self.http_transferer
+        xferer.get_download_stream = MagicMock(return_value=src)
+        uploaded = []
+
+        def upload_stream(source, size, url, ticket):
+            assert_that(size, none())
+            chunk = source.read(CHUNK_SIZE)
+            while chunk:
+                uploaded.append(chunk)
+                chunk = source.read(CHUNK_SIZE)
+        xferer.upload_stream = MagicMock(side_effect=upload_stream)
+
+        stats = xferer.transfer_stream("from_url", "to_url", buffer_chunks=2)
+
+        assert_that("".join(uploaded), equal_to(data))
+        assert_that(stats.bytes, equal_to(len(data)))
+        assert_that(stats.peak_buffered,
+                    less_than_or_equal_to(2 * CHUNK_SIZE))
+
+    def _mock_upload_stream(self, xferer, fail=False):
+        uploaded = []
+
+        def upload_stream(source, size, url, ticket):
+            chunk = source.read(CHUNK_SIZE)
+            while chunk:
+                if fail:
+                    raise Exception("Connection reset")
+                uploaded.append(chunk)
+                chunk = source.read(CHUNK_SIZE)
+        xferer.upload_stream = MagicMock(side_effect=upload_stream)
+        return uploaded
+
+    def test_block_upload(self):
+        data = "".join("line %d\n" % i for i in xrange(50000))
+        xferer = self.http_transferer
+        uploaded = self._mock_upload_stream(xferer)
+        compressor = BlockCompressor(block_size=4096)
+
+        upload_id = xferer.start_upload("to_url", len(data))
+        for block, compressed in compressor.blocks(StringIO(data)):
+            xferer.write_upload(upload_id, block, compressed)
+        stats = xferer.finish_upload(upload_id)
+
+        assert_that("".join(uploaded) == data, is_(True))
+        xferer.upload_stream.assert_called_once_with(
+            ANY, len(data), "to_url", None)
+        assert_that(stats.plain_bytes, is_(len(data)))
+        assert_that(stats.encoded_bytes,
+                    is_(compressor.stats.encoded_bytes))
+        # The upload is gone
+        self.assertRaises(ImageUploadNotFound, xferer.write_upload,
+                          upload_id, "x", False)
+        self.assertRaises(ImageUploadNotFound, xferer.finish_upload,
+                          upload_id)
+
+    def test_block_upload_failed(self):
+        xferer = self.http_transferer
+        self._mock_upload_stream(xferer, fail=True)
+
+        upload_id = xferer.start_upload("to_url")
+        upload = xferer._uploads[upload_id]
+        xferer.write_upload(upload_id, "x" * 100, False)
+        upload.thread.join()
+        # Blocks are refused once the upload failed
+        self.assertRaises(TransferException, xferer.write_upload,
+                          upload_id, "x", False)
+        self.assertRaises(TransferException, xferer.finish_upload, upload_id)
+
+    def test_block_upload_abort(self):
+        xferer = self.http_transferer
+        self._mock_upload_stream(xferer)
+
+        upload_id = xferer.start_upload("to_url")
+        upload = xferer._uploads[upload_id]
+        xferer.write_upload(upload_id, zlib.compress("abc"), True)
+        xferer.finish_upload(upload_id, abort=True)
+
+        # The upload stream ends with an error instead of completing
+        assert_that(upload.thread.is_alive(), is_(False))
+        assert_that(upload.error, is_("Upload aborted"))
+        assert_that(xferer._uploads, is_({}))
+
+    @patch("host.hypervisor.esx.http_disk_transfer.time")
+    def test_abort_idle_uploads(self, time_mock):
+        xferer = self.http_transferer
+        self._mock_upload_stream(xferer)
+        time_mock.time.return_value = 1000.0
+        idle_id = xferer.start_upload("to_url")
+        time_mock.time.return_value = 1000.0 + UPLOAD_IDLE_TIMEOUT
+        active_id = xferer.start_upload("to_url")
+        time_mock.time.return_value = 1001.0 + UPLOAD_IDLE_TIMEOUT
+
+        xferer.start_upload("to_url")
+
+        assert_that(xferer._uploads, is_not(has_key(idle_id)))
+        assert_that(xferer._uploads, has_key(active_id))
+        for upload_id in xferer._uploads.keys():
+            xferer.finish_upload(upload_id, abort=True)
+
+    def _agent_client_for(self, destination):
+        """ Agent client calling the upload methods of destination. """
+        agent_client = MagicMock()
+
+        def start(request):
+            upload_id = destination.start_upload(request.url, request.size)
+            return StartImageUploadResponse(ImageUploadResultCode.OK,
+                                            upload_id=upload_id)
+
+        def write(request):
+            destination.write_upload(request.upload_id, request.data,
+                                     request.compressed)
+            return WriteImageDataResponse(ImageUploadResultCode.OK)
+
+        def finish(request):
+            destination.finish_upload(request.upload_id, request.abort)
+            return FinishImageUploadResponse(ImageUploadResultCode.OK)
+
+        agent_client.start_image_upload.side_effect = start
+        agent_client.write_image_data.side_effect = write
+        agent_client.finish_image_upload.side_effect = finish
+        return agent_client
+
+    @patch("host.hypervisor.esx.vm_config.GetEnv")
+    def test_upload_through_agent(self, _get_env):
+        data = "".join("line %d\n" % i for i in xrange(50000))
+        src = StringIO(data)
+        src.getheader = MagicMock(return_value=str(len(data)))
+        xferer = HttpNfcTransferer(self.vim_client, self.image_datastores,
+                                   compression_level=1,
+                                   compression_block_size=8192)
+        xferer.get_download_stream = MagicMock(return_value=src)
+        destination = HttpNfcTransferer(self.vim_client,
+                                        self.image_datastores)
+        uploaded = self._mock_upload_stream(destination)
+        agent_client = self._agent_client_for(destination)
+
+        stats = xferer._upload_through_agent(agent_client, "from_url", None,
+                                             "to_url")
+
+        assert_that("".join(uploaded) == data, is_(True))
+        destination.upload_stream.assert_called_once_with(
+            ANY, len(data), "to_url", None)
+        assert_that(stats.plain_bytes, is_(len(data)))
+        assert_that(stats.saved_bytes, greater_than(len(data) / 2))
+        assert_that(agent_client.write_image_data.call_count,
+                    is_((len(data) + 8191) / 8192))
+        # Only the blocks aren't logged
+        assert_that(agent_client.request_log_level, is_(logging.INFO))
+
+    @patch("host.hypervisor.esx.vm_config.GetEnv")
+    def test_upload_through_agent_failed(self, _get_env):
+        src = StringIO("x" * 10000)
+        src.getheader = MagicMock(return_value=None)
+        xferer = HttpNfcTransferer(self.vim_client, self.image_datastores,
+                                   compression_level=1,
+                                   compression_block_size=1000)
+        xferer.get_download_stream = MagicMock(return_value=src)
+        destination = HttpNfcTransferer(self.vim_client,
+                                        self.image_datastores)
+        self._mock_upload_stream(destination)
+        agent_client = self._agent_client_for(destination)
+        agent_client.write_image_data.side_effect = None
+        agent_client.write_image_data.return_value = WriteImageDataResponse(
+            ImageUploadResultCode.SYSTEM_ERROR, "Disk full")
+
+        self.assertRaises(TransferException, xferer._upload_through_agent,
+                          agent_client, "from_url", None, "to_url")
+
+        # The upload is aborted at the destination
+        request = agent_client.finish_image_upload.call_args[0][0]
+        assert_that(request.abort, is_(True))
+        assert_that(destination._uploads, is_({}))
+
+    @patch("httplib.HTTPConnection")
+    def test_upload_stream_chunked(self, conn_cls):
+        conn = conn_cls.return_value
+        conn.getresponse.return_value.status = 200
+
+        self.http_transferer.upload_stream(StringIO("abc"), None,
+                                           "http://host/path", None)
+
+        conn.putheader.assert_any_call("Transfer-Encoding", "chunked")
+        sent = "".join(c[0][0] for c in conn.send.call_args_list)
+        assert_that(sent, equal_to("3\r\nabc\r\n0\r\n\r\n"))
+
+    def _upload_temp_file(self, conn_cls, data, url="http://host/path"):
+        conn = conn_cls.return_value
+        conn.getresponse.return_value.status = 200
+        conn.sock.gettimeout.return_value = None
+        # The buffers sent point to the file mapping, that is closed after
+        conn.sock.sent = []
+        conn.sock.sendall.side_effect = lambda buf: \
+            conn.sock.sent.append(str(buf))
+        fd, path = tempfile.mkstemp()
+        try:
+            os.write(fd, data)
+            os.close(fd)
+            self.http_transferer.upload_file(path, url)
+        finally:
+            os.unlink(path)
+        conn.putheader.assert_any_call("Content-Length", len(data))
+        return conn
+
+    @patch("host.hypervisor.esx.http_disk_transfer.sendfile")
+    @patch("httplib.HTTPConnection")
+    def test_upload_file_sendfile(self, conn_cls, sendfile):
+        self.http_transferer._upload_buffer_size = 1000
+        sendfile.side_effect = lambda out_fd, in_fd, offset, count: count
+
+        conn = self._upload_temp_file(conn_cls, "x" * 2500)
+
+        assert_that(conn.send.called, is_(False))
+        offsets = [(c[0][2], c[0][3]) for c in sendfile.call_args_list]
+        assert_that(offsets, equal_to([(0, 1000), (1000, 1000),
+                                       (2000, 500)]))
+        assert_that(sendfile.call_args[0][0], is_(conn.sock.fileno()))
+
+    @patch("host.hypervisor.esx.http_disk_transfer.sendfile", None)
+    @patch("httplib.HTTPConnection")
+    def test_upload_file_mmap(self, conn_cls):
+        self.http_transferer._upload_buffer_size = 5000
+        data = os.urandom(3 * mmap.ALLOCATIONGRANULARITY + 100)
+
+        with patch("mmap.mmap", wraps=mmap.mmap) as mmap_cls:
+            conn = self._upload_temp_file(conn_cls, data)
+
+        assert_that(conn.send.called, is_(False))
+        sent = conn.sock.sent
+        assert_that([len(s) for s in sent],
+                    equal_to([5000, 5000, len(data) - 10000]))
+        assert_that("".join(sent) == data, is_(True))
+        # Only a window of the file is mapped at a time
+        for args, kwargs in mmap_cls.call_args_list:
+            assert_that(args[1], less_than_or_equal_to(
+                5000 + mmap.ALLOCATIONGRANULARITY))
+            assert_that(kwargs["offset"] % mmap.ALLOCATIONGRANULARITY,
+                        is_(0))
+
+    @patch("host.hypervisor.esx.http_disk_transfer.sendfile")
+    @patch("httplib.HTTPSConnection")
+    def test_upload_file_tls(self, conn_cls, sendfile):
+        conn = self._upload_temp_file(conn_cls, "x" * 10,
+                                      url="https://host/path")
+
+        # Read and sent through the TLS connection
+        conn.send.assert_called_once_with("x" * 10)
+        assert_that(sendfile.called, is_(False))
+        assert_that(conn.sock.sendall.called, is_(False))
+
+    @patch("__builtin__.open")
+    def test_download_file_without_ranges(self, mock_open):
+        xferer = self.http_transferer
+        xferer._ranged_downloader = MagicMock()
+        xferer._ranged_downloader.download.side_effect = RangesNotSupported
+        xferer.get_download_stream = MagicMock(return_value=StringIO("abc"))
+
+        xferer.download_file("from_url", "/tmp/path")
+
+        # Falls back to a single stream
+        xferer.get_download_stream.assert_called_once_with("from_url", None)
+        mock_open().__enter__().write.assert_called_once_with("abc")
@@ -0,0 +1,134 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from datetime import datetime
+from datetime import timedelta
+from hamcrest import *  # noqa
+from mock import MagicMock
+from pyVmomi import vim
+
+from host.hypervisor.esx.perf_sampler import PerfSampler
+from host.hypervisor.esx.perf_sampler import SampleWindow
+
+
+class TestSampleWindow(unittest.TestCase):
+
+    def test_average(self):
+        window = SampleWindow(4)
+        assert_that(window.average(1), none())
+        window.add(2)
+        window.add(4)
+        assert_that(window.average(1), is_(4))
+        assert_that(window.average(10), is_(3))
+
+        # old samples are dropped
+        for value in [6, 8, 10, 12]:
+            window.add(value)
+        assert_that(len(window), is_(4))
+        assert_that(window.average(4), is_(9))
+        assert_that(window.average(2), is_(11))
+
+
+class TestPerfSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.vim_client = MagicMock()
+        self.vim_client.host_system = vim.HostSystem("ha-host")
+        perf_manager = self.vim_client.perf_manager
+        perf_manager.perfCounter = [self._counter(1, "mem", "consumed"),
+                                    self._counter(2, "rescpu", "actav1"),
+                                    self._counter(3, "cpu", "usage")]
+        perf_manager.QueryPerf.side_effect = self._query
+        self.start = datetime(2015, 1, 1)
+        # counter id -> values, one per 20 seconds from self.start
+        self.samples = {1: [], 2: [], 3: []}
+        self.sampler = PerfSampler(self.vim_client,
+                                   ["mem.consumed", "rescpu.actav1"],
+                                   history=10)
+        self.sampler.initialize()
+
+    def _counter(self, key, group, name):
+        counter = MagicMock()
+        counter.key = key
+        counter.groupInfo.key = group
+        counter.nameInfo.key = name
+        return counter
+
+    def _timestamp(self, i):
+        return self.start + timedelta(seconds=20 * i)
+
+    def _query(self, specs):
+        spec = specs[0]
+        count = len(self.samples[1])
+        indexes = range(count)
+        if spec.startTime:
+            indexes = [i for i in indexes
+                       if self._timestamp(i) > spec.startTime]
+        if spec.maxSample:
+            indexes = indexes[-spec.maxSample:]
+        if not indexes:
+            return []
+        stat = MagicMock()
+        stat.sampleInfo = [MagicMock(timestamp=self._timestamp(i))
+                           for i in indexes]
+        stat.value = []
+        for metric in spec.metricId:
+            value = MagicMock()
+            value.id.counterId = metric.counterId
+            value.value = [self.samples[metric.counterId][i]
+                           for i in indexes]
+            stat.value.append(value)
+        return [stat]
+
+    def _add_samples(self, count):
+        for i in xrange(count):
+            self.samples[1].append(1024 * len(self.samples[1]))
+            self.samples[2].append(10)
+            self.samples[3].append(0)
+
+    def test_sample(self):
+        assert_that(self.sampler.sample(), is_(0))
+        assert_that(self.sampler.averages(3600), is_({}))
+
+        # the first query only gets the samples kept
+        self._add_samples(15)
+        assert_that(self.sampler.sample(), is_(10))
+        spec = self.vim_client.perf_manager.QueryPerf.call_args[0][0][0]
+        assert_that(spec.maxSample, is_(10))
+        assert_that(self.sampler.averages(3600),
+                    is_({"mem.consumed": 9 * 1024 + 512, "rescpu.actav1": 10}))
+
+        # later queries only get the new samples
+        self._add_samples(2)
+        assert_that(self.sampler.sample(), is_(2))
+        spec = self.vim_client.perf_manager.QueryPerf.call_args[0][0][0]
+        assert_that(spec.startTime, is_(self._timestamp(14)))
+        assert_that(self.sampler.average("mem.consumed", 20), is_(16 * 1024))
+        assert_that(self.sampler.average("mem.consumed", 40),
+                    is_(15 * 1024 + 512))
+        assert_that(self.sampler.sample(), is_(0))
+        assert_that(self.sampler.average("cpu.usage", 20), none())
+
+    def test_add_counter(self):
+        self._add_samples(3)
+        self.sampler.sample()
+        self.sampler.add_counter("cpu.usage")
+        self.sampler.initialize()
+        self.sampler.sample()
+        assert_that(self.sampler.averages(60),
+                    has_entries("cpu.usage", 0, "rescpu.actav1", 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import base64
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from SocketServer import ThreadingMixIn
+from hamcrest import *  # noqa
+
+from host.hypervisor.esx.ranged_transfer import CHECKPOINT_SUFFIX
+from host.hypervisor.esx.ranged_transfer import RangedDownloader
+from host.hypervisor.esx.ranged_transfer import RangeDownloadError
+from host.hypervisor.esx.ranged_transfer import RangesNotSupported
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """ Serves server.content, with byte ranges if server.ranges is set. """
+
+    def do_GET(self):
+        server = self.server
+        content = server.content
+        match = re.match(r"bytes=(\d+)-(\d+)$",
+                         self.headers.getheader("Range") or "")
+        if not server.ranges or not match:
+            self.send_response(200)
+            self.send_header("Content-Length", len(content))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+
+        start, end = int(match.group(1)), int(match.group(2)) + 1
+        with server.lock:
+            server.requests.append(start)
+            fail = server.failures.get(start, 0)
+            if fail:
+                server.failures[start] = fail - 1
+            stall = server.stalls.get(start, 0)
+            if stall:
+                server.stalls[start] = stall - 1
+        if stall:
+            # Keep the connection open without answering
+            server.released.wait(10)
+            return
+        data = content[start:end]
+        self.send_response(206)
+        self.send_header("Content-Range", "bytes %d-%d/%d" %
+                         (start, end - 1, len(content)))
+        self.send_header("Content-Length", len(data))
+        self.send_header("Content-MD5",
+                         base64.b64encode(hashlib.md5(data).digest()))
+        self.send_header("ETag", server.etag)
+        self.end_headers()
+        if fail:
+            # Drop the connection half way
+            self.wfile.write(data[:len(data) / 2])
+            return
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RangeServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, content):
+        HTTPServer.__init__(self, ("localhost", 0), RangeHandler)
+        self.content = content
+        self.ranges = True
+        self.lock = threading.Lock()
+        self.etag = '"1"'
+        # range start -> number of times to fail it
+        self.failures = {}
+        # range start -> number of times to leave it unanswered
+        self.stalls = {}
+        self.released = threading.Event()
+        # range starts requested, except the size probe
+        self.requests = []
+
+
+class TestRangedDownloader(unittest.TestCase):
+
+    def setUp(self):
+        self.content = os.urandom(10 * 1000 + 10)
+        self.server = RangeServer(self.content)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://localhost:%d/file" % self.server.server_port
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "file")
+        self.downloader = RangedDownloader(streams=4, range_size=1000,
+                                           retries=2, chunk_size=256,
+                                           timeout=0.5)
+
+    def tearDown(self):
+        self.server.released.set()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def _ranges_requested(self):
+        # The size probe asks for bytes 0-0
+        return sorted(start for start in self.server.requests[1:])
+
+    def test_download(self):
+        stats = self.downloader.download(self.url, self.path)
+        assert_that(self._read() == self.content, is_(True))
+        assert_that(stats.bytes, is_(len(self.content)))
+        assert_that(self._ranges_requested(), is_(range(0, 11000, 1000)))
+        assert_that(os.path.exists(self.path + CHECKPOINT_SUFFIX), is_(False))
+
+    def test_retry_dropped_range(self):
+        self.server.failures = {2000: 1}
+        self.downloader.download(self.url, self.path)
+        assert_that(self._read() == self.content, is_(True))
+        assert_that(self._ranges_requested().count(2000), is_(2))
+
+    def test_resume(self):
+        # Range 3000 fails more than the retries
+        self.server.failures = {3000: 2}
+        self.assertRaises(RangeDownloadError, self.downloader.download,
+                          self.url, self.path)
+        assert_that(os.path.exists(self.path + CHECKPOINT_SUFFIX), is_(True))
+
+        # Only the missing range, and the range that is corrupted on disk,
+        # are downloaded again
+        with open(self.path, "r+b") as f:
+            f.seek(5000)
+            f.write("corrupted")
+        self.server.requests = []
+        stats = self.downloader.download(self.url, self.path)
+        assert_that(self._read() == self.content, is_(True))
+        assert_that(self._ranges_requested(), is_([3000, 5000]))
+        assert_that(stats.bytes, is_(2000))
+
+    def test_retry_stalled_range(self):
+        self.server.stalls = {4000: 1}
+        self.downloader.download(self.url, self.path)
+        assert_that(self._read() == self.content, is_(True))
+        assert_that(self._ranges_requested().count(4000), is_(2))
+
+    def _interrupt(self):
+        """ Leave a checkpoint with all the ranges but 3000. """
+        self.server.failures = {3000: 2}
+        self.assertRaises(RangeDownloadError, self.downloader.download,
+                          self.url, self.path)
+        self.server.requests = []
+
+    def test_resume_changed_content(self):
+        self._interrupt()
+
+        # Content of the same size, with another ETag
+        self.content = os.urandom(len(self.content))
+        self.server.content = self.content
+        self.server.etag = '"2"'
+        self.downloader.download(self.url, self.path)
+        assert_that(self._read() == self.content, is_(True))
+        assert_that(self._ranges_requested(), is_(range(0, 11000, 1000)))
+
+    def test_resume_other_url(self):
+        self._interrupt()
+
+        self.downloader.download(self.url + "2", self.path)
+        assert_that(self._ranges_requested(), is_(range(0, 11000, 1000)))
+
+    def test_ranges_not_supported(self):
+        self.server.ranges = False
+        self.assertRaises(RangesNotSupported, self.downloader.download,
+                          self.url, self.path)
+        assert_that(os.path.exists(self.path), is_(False))
+
+
+if __name__ == '__main__':
+    unittest.main()
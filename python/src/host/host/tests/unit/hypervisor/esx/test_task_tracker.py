@@ -0,0 +1,83 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from concurrent import futures
+from hamcrest import *  # noqa
+from mock import MagicMock
+
+from gen.agent.ttypes import TaskCache
+from gen.agent.ttypes import TaskState
+from host.hypervisor.esx.task_tracker import TaskFailed
+from host.hypervisor.esx.task_tracker import TaskLost
+from host.hypervisor.esx.task_tracker import TaskTracker
+
+
+class TestTaskTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = TaskTracker()
+
+    def test_complete(self):
+        future = self.tracker.future("task1")
+        callback = MagicMock()
+        future.add_done_callback(callback)
+        assert_that(self.tracker.future("task1"), same_instance(future))
+        assert_that(len(self.tracker), is_(1))
+
+        self.tracker.update("task1", TaskCache(state=TaskState.running))
+        assert_that(future.done(), is_(False))
+
+        state = TaskCache(state=TaskState.success)
+        self.tracker.update("task1", state)
+        assert_that(future.result(0), is_(state))
+        callback.assert_called_once_with(future)
+        assert_that(len(self.tracker), is_(0))
+
+    def test_done_before_future(self):
+        state = TaskCache(state=TaskState.success)
+        self.tracker.update("task1", state)
+        assert_that(self.tracker.future("task1").result(0), is_(state))
+
+    def test_error(self):
+        error = ValueError("failed")
+        self.tracker.update("task1", TaskCache(state=TaskState.error,
+                                               error=error))
+        assert_that(self.tracker.future("task1").exception(0),
+                    same_instance(error))
+
+        future = self.tracker.future("task2")
+        self.tracker.update("task2", TaskCache(state=TaskState.error))
+        assert_that(future.exception(0), instance_of(TaskFailed))
+
+    def test_remove(self):
+        future = self.tracker.future("task1")
+        self.tracker.update("task1", TaskCache(state=TaskState.running))
+        assert_that("task1" in self.tracker, is_(True))
+
+        self.tracker.remove("task1")
+        assert_that("task1" in self.tracker, is_(False))
+        assert_that(future.exception(0), instance_of(TaskLost))
+
+    def test_wait_many(self):
+        task_futures = [self.tracker.future("task%d" % i) for i in range(10)]
+        for i in range(9):
+            self.tracker.update("task%d" % i,
+                                TaskCache(state=TaskState.success))
+        done, not_done = futures.wait(task_futures, 0)
+        assert_that(not_done, contains(task_futures[9]))
+        assert_that(done, has_length(9))
+
+
+if __name__ == '__main__':
+    unittest.main()
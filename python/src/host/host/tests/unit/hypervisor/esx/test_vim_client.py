@@ -134,13 +134,18 @@ class TestVimClient(unittest.TestCase):
                 files=vim.vm.FileInfo(
                     vmPathName="[datastore2] agent4/agent4.vmx"),
                 hardware=vim.vm.VirtualHardware(
-                    memoryMB=4096
+                    memoryMB=4096,
+                    numCPU=2
                 ),
                 extraConfig=[
                     vim.option.OptionValue(
                         key='photon_controller.vminfo.tenant', value='t1'),
                     vim.option.OptionValue(
-                        key='photon_controller.vminfo.project', value='p1')
+                        key='photon_controller.vminfo.project', value='p1'),
+                    vim.option.OptionValue(
+                        key='RemoteDisplay.vnc.enabled', value='True'),
+                    vim.option.OptionValue(
+                        key='RemoteDisplay.vnc.port', value='5900')
                 ]
             )
         ))
@@ -169,6 +174,13 @@ class TestVimClient(unittest.TestCase):
         assert_that(vms[0].power_state, is_(PowerState.poweredOff))
         assert_that(len(vms[0].disks), is_(2))
         assert_that(vms[0].disks, contains_inanyorder("disk1", "disk2"))
+        assert_that(vim_client.get_vm_resources_in_cache(),
+                    is_((1, 4096, 2)))
+        snapshot = vim_client.get_vm_cache_snapshot()
+        assert_that(snapshot.version, is_(1))
+        assert_that(vms[0].vnc_port, is_(5900))
+        assert_that(vim_client.get_vnc_ports_in_cache(), contains(5900))
+        assert_that(vim_client.allocate_vnc_port(), is_(5901))
 
         # Test retrieving VM moref
         vm_obj = vim_client.get_vm_obj_in_cache("agent4")
@@ -213,6 +225,15 @@ class TestVimClient(unittest.TestCase):
         assert_that(vms[0].power_state, is_(PowerState.poweredOn))
         assert_that(len(vms[0].disks), is_(2))
         assert_that(vms[0].disks, contains_inanyorder("disk3", "disk4"))
+        assert_that(vim_client.get_vm_resources_in_cache(),
+                    is_((1, 4096, 2)))
+
+        # The earlier snapshot is unchanged, and the new one has the changes
+        assert_that(snapshot.valid_vms()[0].power_state,
+                    is_(PowerState.poweredOff))
+        changes = vim_client.get_vm_cache_snapshot().changes_since(
+            snapshot.version)
+        assert_that(changes.values(), contains(vms[0]))
 
         # Test leave
         update.version = "3"
@@ -225,6 +246,88 @@ class TestVimClient(unittest.TestCase):
         vms = vim_client.get_vms_in_cache()
         assert_that(vim_client.current_version, is_("3"))
         assert_that(len(vms), is_(0))
+        assert_that(vim_client.get_vm_resources_in_cache(),
+                    is_((0, 0, 0)))
+        assert_that(vim_client.get_vnc_ports_in_cache(), contains(5901))
+
+    @patch.object(VimClient, "filter_spec")
+    @patch("pysdk.connect.Connect")
+    def test_update_cache_invalid_vnc_port(self, connect_mock, spec_mock):
+        vim_client = VimClient("esx.local", "root", "password",
+                               auto_sync=False)
+        update = vmodl.query.PropertyCollector.UpdateSet(version="1")
+        filter = vmodl.query.PropertyCollector.FilterUpdate()
+        update.filterSet.append(filter)
+        object_update = vmodl.query.PropertyCollector.ObjectUpdate(
+            kind="enter",
+            obj=vim.VirtualMachine("vim.VirtualMachine:9"),
+        )
+        filter.objectSet.append(object_update)
+        object_update.changeSet.append(vmodl.query.PropertyCollector.Change(
+            name="config",
+            op="assign",
+            val=vim.vm.ConfigInfo(
+                hardware=vim.vm.VirtualHardware(memoryMB=1024, numCPU=1),
+                extraConfig=[
+                    vim.option.OptionValue(
+                        key='RemoteDisplay.vnc.enabled', value='True'),
+                    vim.option.OptionValue(
+                        key='RemoteDisplay.vnc.port', value='bad')
+                ]
+            )
+        ))
+        vim_client.property_collector.WaitForUpdatesEx.return_value = update
+
+        vim_client.update_cache()
+
+        # The update is applied, without a VNC port
+        assert_that(vim_client.current_version, is_("1"))
+        vms = list(vim_client.get_vm_cache_snapshot().vms.itervalues())
+        assert_that(len(vms), is_(1))
+        assert_that(vms[0].memory_mb, is_(1024))
+        assert_that(vms[0].vnc_port, is_(None))
+        assert_that(vim_client.get_vnc_ports_in_cache(), is_(empty()))
+
+    @patch.object(VimClient, "filter_spec")
+    @patch("pysdk.connect.Connect")
+    def test_update_datastore_cache(self, connect_mock, spec_mock):
+        vim_client = VimClient("esx.local", "root", "password",
+                               auto_sync=False)
+        listener = MagicMock()
+        vim_client.add_update_listener(listener)
+        listener.reset_mock()
+
+        def update_ds(version, kind, changes):
+            update = vmodl.query.PropertyCollector.UpdateSet(version=version)
+            filter = vmodl.query.PropertyCollector.FilterUpdate()
+            update.filterSet.append(filter)
+            object_update = vmodl.query.PropertyCollector.ObjectUpdate(
+                kind=kind, obj=vim.Datastore("datastore-1"))
+            filter.objectSet.append(object_update)
+            for name, val in changes:
+                object_update.changeSet.append(
+                    vmodl.query.PropertyCollector.Change(
+                        name=name, op="assign", val=val))
+            vim_client.property_collector.WaitForUpdatesEx.return_value = \
+                update
+            vim_client.update_cache()
+
+        update_ds("1", "enter", [("name", "ds1"),
+                                 ("summary.capacity", 100L),
+                                 ("summary.freeSpace", 40L)])
+        assert_that(vim_client.get_datastore_space_in_cache("ds1"),
+                    is_((100L, 40L)))
+        assert_that(listener.datastores_updated.call_count, is_(1))
+
+        # Space changes are cached without notifying the listeners
+        update_ds("2", "modify", [("summary.freeSpace", 30L)])
+        assert_that(vim_client.get_datastore_space_in_cache("ds1"),
+                    is_((100L, 30L)))
+        assert_that(listener.datastores_updated.call_count, is_(1))
+
+        update_ds("3", "leave", [])
+        assert_that(vim_client.get_datastore_space_in_cache("ds1"), none())
+        assert_that(listener.datastores_updated.call_count, is_(2))
 
     @patch.object(VimClient, "update_hosts_stats")
     @patch.object(VimClient, "update_cache")
@@ -388,15 +491,13 @@ class TestVimClient(unittest.TestCase):
     @patch('host.hypervisor.esx.vim_client.VimClient.perf_manager',
            new_callable=PropertyMock)
     @patch("pyVmomi.vim.PerfQuerySpec")
-    @patch.object(VimClient, "_update_host_cache")
     @patch.object(VimClient, "update_cache")
     @patch.object(VimClient, "vm_filter_spec")
     @patch("pysdk.connect.Connect")
     @patch("pysdk.connect.Disconnect")
-    def test_update_host_cache_in_thread(self, disconnect_mock, connect_mock,
+    def test_update_host_stats_in_thread(self, disconnect_mock, connect_mock,
                                          spec_mock, update_mock,
-                                         update_host_mock, query_spec_mock,
-                                         perf_manager_mock,
+                                         query_spec_mock, perf_manager_mock,
                                          prop_collector_mock):
 
         # Test Values.
@@ -406,12 +507,12 @@ class TestVimClient(unittest.TestCase):
         counter.key = 65613
 
         n = 5
-        statValues = ','.join([str(x) for x in range(1, n+1)])
         statAverage = sum(range(1, n+1)) / len(range(1, n+1))
         stat = MagicMock()
+        stat.sampleInfo = [MagicMock(timestamp=x) for x in range(1, n+1)]
         stat.value = [MagicMock()]
         stat.value[0].id.counterId = 65613
-        stat.value[0].value = statValues
+        stat.value[0].value = range(1, n+1)
 
         # Mock the Vim APIs.
         pc_return_mock = MagicMock({'WaitForUpdatesEx.return_value': {}})
@@ -439,16 +540,19 @@ class TestVimClient(unittest.TestCase):
         vim_client.disconnect(wait=True)
         assert_that(disconnect_mock.called, is_(True))
 
-        # Verify that update_host_mock is called atleast once and is called
-        # less number of times than update_mock.
-        assert_that(update_host_mock.call_count, is_not(0),
-                    "VimClient.update_host_mock is not called repeatedly")
-        assert_that(update_host_mock.call_count,
+        # Verify that the perf manager is queried atleast once and less
+        # number of times than update_mock.
+        query_perf = pm_return_mock.QueryPerf
+        assert_that(query_perf.call_count, is_not(0),
+                    "QueryPerf is not called repeatedly")
+        assert_that(query_perf.call_count,
                     less_than(update_mock.call_count))
 
-        host_stats = update_host_mock.call_args_list
-        for host in host_stats:
-            assert_that(host[0][0]['mem.consumed'], equal_to(statAverage))
+        # Samples returned again by later queries are not counted twice
+        host_stats = vim_client.get_host_stats()
+        assert_that(host_stats['mem.consumed'], equal_to(statAverage))
+        assert_that(len(vim_client.perf_sampler._windows['mem.consumed']),
+                    equal_to(n))
 
 if __name__ == '__main__':
     unittest.main()
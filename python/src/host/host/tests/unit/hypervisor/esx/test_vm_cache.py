@@ -0,0 +1,66 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+
+from host.hypervisor.esx.vm_cache import VM_CHANGE_HISTORY
+from host.hypervisor.esx.vm_cache import VmCacheSnapshot
+from host.hypervisor.esx.vm_cache import VmRecord
+
+
+class TestVmCache(unittest.TestCase):
+
+    def test_record(self):
+        vm = VmRecord(name="vm1", power_state=0, memory_mb=1024)
+        assert_that(vm.valid, is_(False))
+        self.assertRaises(AttributeError, setattr, vm, "name", "vm2")
+
+        vm2 = vm.replace(path="[ds1] vm1/vm1.vmx", num_cpu=1,
+                         disks=["disk1"])
+        assert_that(vm2.valid, is_(True))
+        assert_that(vm2.name, is_("vm1"))
+        assert_that(vm2.disks, is_(("disk1",)))
+        assert_that(vm.path, is_(None))
+        assert_that(vm2, is_(vm2.replace()))
+        assert_that(vm2, is_not(vm))
+
+    def test_changes_since(self):
+        vm1 = VmRecord(name="vm1")
+        vm2 = VmRecord(name="vm2")
+        s0 = VmCacheSnapshot()
+        s1 = s0.next_version(s0.vms.set("1", vm1), ["1"], 0, 0, 0)
+        s2 = s1.next_version(s1.vms.set("2", vm2), ["2"], 0, 0, 0)
+        s3 = s2.next_version(s2.vms.remove("1"), ["1"], 0, 0, 0)
+
+        assert_that(s3.version, is_(3))
+        assert_that(s3.changes_since(3), is_({}))
+        assert_that(s3.changes_since(2), is_({"1": None}))
+        assert_that(s3.changes_since(1), is_({"1": None, "2": vm2}))
+        assert_that(s3.changes_since(0), is_({"1": None, "2": vm2}))
+        assert_that(s2.changes_since(3), is_(None))
+
+        # older snapshots don't change
+        assert_that(s1.vms.values(), contains(vm1))
+        assert_that(s0.changes_since(0), is_({}))
+
+        # the history only goes back VM_CHANGE_HISTORY versions
+        snapshot = s3
+        for _ in range(VM_CHANGE_HISTORY):
+            snapshot = snapshot.next_version(snapshot.vms, ["2"], 0, 0, 0)
+        assert_that(snapshot.changes_since(3), is_({"2": vm2}))
+        assert_that(snapshot.changes_since(2), is_(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
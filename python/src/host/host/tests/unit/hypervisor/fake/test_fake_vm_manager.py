@@ -50,6 +50,12 @@ class TestFakeVmManager(unittest.TestCase):
         assert_that(len(ports), equal_to(len(expected)))
         assert_that(len(ports), equal_to(len(expected.union(ports))))
 
+        port = vmm.allocate_vnc_port()
+        assert_that(port, equal_to(5905))
+        assert_that(vmm.allocate_vnc_port(), equal_to(5906))
+        vmm.release_vnc_port(port)
+        assert_that(vmm.allocate_vnc_port(), equal_to(5905))
+
     def test_vminfo(self):
         vmm = Fvm(MagicMock())
         vm_id = str(uuid.uuid4())
@@ -28,9 +28,11 @@ from common.state import State
 from gen.resource.ttypes import ResourceConstraintType
 from gen.resource.ttypes import ResourceConstraint
 from host.hypervisor.disk_placement_manager import BestEffortPlaceEngine
+from host.hypervisor.disk_placement_manager import BinPackingPlaceEngine
 from host.hypervisor.disk_placement_manager import DatastoreSelector
 from host.hypervisor.disk_placement_manager import DisksPlacement
 from host.hypervisor.disk_placement_manager import DiskUtil
+from host.hypervisor.disk_placement_manager import NotEnoughSpaceException
 from host.hypervisor.disk_placement_manager import ConstraintDiskPlaceEngine
 from host.hypervisor.disk_placement_manager import OptimalPlaceEngine
 from host.hypervisor.disk_placement_manager import PlaceResultCode
@@ -74,6 +76,9 @@ class TestDiskPlacementManager(unittest.TestCase):
                 raise Exception
             return ds_map[datastore_id]
         ds_mgr.datastore_info.side_effect = fake_datastore_info
+        ds_mgr.datastore_infos.side_effect = lambda datastore_ids: dict(
+            (datastore_id, fake_datastore_info(datastore_id))
+            for datastore_id in datastore_ids)
 
         return ds_mgr
 
@@ -169,6 +174,106 @@ class TestDiskPlacementManager(unittest.TestCase):
                 assert_that(placement_list[i].container_id,
                             equal_to(place))
 
+    @parameterized.expand([
+        (PlaceResultCode.OK, [], []),
+        (PlaceResultCode.OK, [20, 15, 15], ["ds2", "ds3", "ds3"]),
+        (PlaceResultCode.OK, [5, 8, 25], ["ds3", "ds1", "ds3"]),
+        (PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY, [31], []),
+        (PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY, [25, 25], [])])
+    def test_bin_packing_place_engine(self, result, disk_sizes, places):
+        image_datastore = "ds1"
+        image_datastores = [{"name": image_datastore,
+                             "used_for_vms": True}]
+        option = PlacementOption(1, 1, image_datastores)
+        ds_map = {image_datastore: DatastoreInfo(10, 0),
+                  "ds2": DatastoreInfo(20, 0),
+                  "ds3": DatastoreInfo(30, 0)}
+        ds_mgr = self.create_datastore_manager(ds_map, image_datastore)
+        engine = BinPackingPlaceEngine(ds_mgr, option)
+        ds = engine.placeable_datastores()
+        selector = DatastoreSelector.init_datastore_selector(ds_mgr, ds)
+        disks_placement = DisksPlacement(self.create_disks(disk_sizes),
+                                         selector)
+
+        place_result = engine.place(disks_placement)
+        assert_that(place_result.result, equal_to(result))
+
+        # The original placement is left untouched
+        assert_that(disks_placement.placement_list, is_(empty()))
+        assert_that(selector.total_free_space(), is_(60))
+
+        # Disks are placed from the biggest to the smallest
+        if place_result.result == PlaceResultCode.OK:
+            assert_that([p.container_id for p in
+                         place_result.disks_placement.placement_list],
+                        equal_to(places))
+            assert_that(place_result.disks_placement.selector.
+                        total_free_space(), is_(60 - sum(disk_sizes)))
+
+    def test_bin_packing_when_best_effort_fails(self):
+        option = PlacementOption(1, 1, [])
+        ds_map = {"ds1": DatastoreInfo(20, 0),
+                  "ds2": DatastoreInfo(30, 0)}
+        ds_mgr = self.create_datastore_manager(ds_map, "image_ds")
+        selector = DatastoreSelector.init_datastore_selector(
+            ds_mgr, ds_map.keys())
+        disks_placement = DisksPlacement(self.create_disks([20, 15, 15]),
+                                         selector)
+
+        place_result = BestEffortPlaceEngine(ds_mgr, option).place(
+            disks_placement)
+        assert_that(place_result.result,
+                    equal_to(PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY))
+
+        place_result = BinPackingPlaceEngine(ds_mgr, option).place(
+            disks_placement)
+        assert_that(place_result.result, equal_to(PlaceResultCode.OK))
+        assert_that([p.container_id for p in
+                     place_result.disks_placement.placement_list],
+                    contains("ds1", "ds2", "ds2"))
+
+    def test_datastore_selector(self):
+        selector = DatastoreSelector()
+        selector.add_datastore("ds1", 10, 10)
+        selector.add_datastore("ds2", 20, 40)
+        selector.add_datastore("ds3", 15, 20)
+        assert_that(selector.get_datastore(), is_("ds2"))
+        assert_that(selector.total_free_space(), is_(45))
+        assert_that(selector.total_space(), is_(70))
+
+        selector.consume_datastore_space("ds2", 12)
+        assert_that(selector.get_datastore(), is_("ds3"))
+        assert_that(selector.free_space("ds2"), is_(8))
+        assert_that(selector.ratio(), equal_to(37.0 / 70))
+        self.assertRaises(NotEnoughSpaceException,
+                          selector.consume_datastore_space, "ds2", 9)
+
+        for _ in range(100):
+            selector.consume_datastore_space("ds3", 0)
+        assert_that(len(selector._heap), less_than(30))
+        assert_that(selector.get_datastore(), is_("ds3"))
+
+    def test_datastore_selector_copy(self):
+        selector = DatastoreSelector()
+        selector.add_datastore("ds1", 10, 10)
+        selector.add_datastore("ds2", 20, 20)
+
+        copy = selector.copy()
+        copy.consume_datastore_space("ds2", 15)
+        assert_that(copy.get_datastore(), is_("ds1"))
+        assert_that(copy.total_free_space(), is_(15))
+
+        # The original selector is unchanged
+        assert_that(selector.get_datastore(), is_("ds2"))
+        assert_that(selector.free_space("ds2"), is_(20))
+        assert_that(selector.total_free_space(), is_(30))
+
+        # and so is the copy when the original changes
+        other = selector.copy()
+        selector.consume_datastore_space("ds1", 10)
+        assert_that(other.free_space("ds1"), is_(10))
+        assert_that(other.get_datastore(), is_("ds2"))
+
     def test_constraint_place_engine(self):
         # Create constraint place engine
         image_datastore = "ds1"
@@ -0,0 +1,104 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+from mock import MagicMock
+
+from host.hypervisor.image_catalog import ImageCatalog
+
+
+class TestImageCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.datastores = {"ds1": ["image1", "image2"], "ds2": ["image1"]}
+        self.loader = MagicMock(side_effect=self._list)
+        self.catalog = ImageCatalog(self.loader)
+
+    def _list(self, datastore):
+        if datastore not in self.datastores:
+            raise Exception("Datastore %s not found" % datastore)
+        return list(self.datastores[datastore])
+
+    def test_lookups_list_once(self):
+        assert_that(self.catalog.images("ds1"),
+                    contains_inanyorder("image1", "image2"))
+        assert_that(self.catalog.has_image("image2", "ds1"), is_(True))
+        assert_that(self.catalog.has_image("image2", "ds2"), is_(False))
+        assert_that(self.catalog.datastores_with_image(
+            "image1", ["ds1", "ds2", "ds3"]), contains("ds1", "ds2"))
+        assert_that(self.loader.call_count, is_(3))
+
+        # ds1 and ds2 are indexed, ds3 is listed again since it failed
+        self.catalog.datastores_with_image("image1", ["ds1", "ds2", "ds3"])
+        assert_that(self.loader.call_count, is_(4))
+        self.assertRaises(Exception, self.catalog.images, "ds3")
+
+    def test_add_remove(self):
+        self.catalog.images("ds1")
+        self.catalog.add("ds1", "image3")
+        self.catalog.remove("ds1", "image1")
+        assert_that(self.catalog.images("ds1"),
+                    contains_inanyorder("image2", "image3"))
+
+        # changes to datastores that are not indexed yet are listed later
+        self.datastores["ds2"].append("image3")
+        self.catalog.add("ds2", "image3")
+        assert_that(self.catalog.has_image("image3", "ds2"), is_(True))
+
+    def test_change_while_listing(self):
+        def list_and_add(datastore):
+            images = self._list(datastore)
+            self.catalog.add(datastore, "image3")
+            return images
+        self.loader.side_effect = list_and_add
+
+        # the listing raced with an add so it is not kept
+        assert_that(self.catalog.has_image("image1", "ds1"), is_(True))
+        assert_that(self.catalog._images, is_({}))
+
+        self.loader.side_effect = self._list
+        self.datastores["ds1"].append("image3")
+        assert_that(self.catalog.has_image("image3", "ds1"), is_(True))
+        assert_that(self.catalog._images, has_key("ds1"))
+
+    def test_refresh(self):
+        self.catalog.images("ds1")
+        self.catalog.images("ds2")
+
+        # images created by other hosts show up after a refresh
+        self.datastores["ds1"].append("image3")
+        assert_that(self.catalog.has_image("image3", "ds1"), is_(False))
+        self.catalog.refresh(["ds1", "ds3"])
+        assert_that(self.catalog.has_image("image3", "ds1"), is_(True))
+        assert_that(self.catalog._images.keys(), contains("ds1"))
+
+    def test_size(self):
+        self.catalog.images("ds1")
+        self.catalog.images("ds2")
+        get_size = MagicMock(return_value=1024)
+        assert_that(self.catalog.size("image1", get_size), is_(1024))
+        assert_that(self.catalog.size("image1", get_size), is_(1024))
+        assert_that(get_size.call_count, is_(1))
+
+        # the size is kept until the image is gone from every datastore
+        self.catalog.remove("ds1", "image1")
+        self.catalog.size("image1", get_size)
+        assert_that(get_size.call_count, is_(1))
+        self.catalog.remove("ds2", "image1")
+        self.catalog.size("image1", get_size)
+        assert_that(get_size.call_count, is_(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@ import uuid
 
 from hamcrest import *  # noqa
 from mock import MagicMock
+from mock import patch
 from nose.tools import raises
 from nose_parameterized import parameterized
 
@@ -24,7 +25,9 @@ from common.kind import Unit
 from gen.resource.ttypes import Datastore
 from gen.resource.ttypes import ResourceConstraintType
 from gen.resource.ttypes import ResourceConstraint
+from host.hypervisor.image_catalog import ImageCatalog
 from host.hypervisor.placement_manager import AgentPlacementScore
+from host.hypervisor.placement_manager import InvalidReservationException
 from host.hypervisor.placement_manager import PlacementManager
 from host.hypervisor.placement_manager import PlacementOption
 from host.hypervisor.placement_manager import NoSuchResourceException
@@ -106,6 +109,47 @@ class TestPlacementManager(unittest.TestCase):
         score, placement_list = manager.place(vm, None)
         assert_that(score, is_(AgentPlacementScore(*expected)))
 
+    def test_place_batch(self):
+        manager = PMBuilder().build()
+        vms = [Vm(new_id(), self._vm_flavor_gb(20), State.STOPPED, None)
+               for _ in range(4)]
+
+        # The batch is placed without reservations other placements see
+        with patch.object(manager._reservations, "add") as add:
+            results = manager.place_batch([(vm, None) for vm in vms])
+        assert_that(add.called, is_(False))
+
+        # memory score 1-20k/64k, 1-40k/64k, 1-60k/64k, then out of memory
+        assert_that([score for score, _ in results[:3]], contains(
+            AgentPlacementScore(69, 100), AgentPlacementScore(37, 100),
+            AgentPlacementScore(6, 100)))
+        assert_that(results[3],
+                    instance_of(NotEnoughMemoryResourceException))
+
+        assert_that(manager._memory_reserved(), is_(0))
+
+    def test_evaluate(self):
+        manager = PMBuilder().build()
+        disk = Disk(new_id(), DISK_FLAVOR, False, True, 1024)
+        vms = [Vm(new_id(), self._vm_flavor_gb(memory), State.STOPPED, None)
+               for memory in [20, 64, 40]]
+        for vm in vms:
+            vm.disks = [disk]
+
+        results = manager.evaluate([(vm, None) for vm in vms] +
+                                   [(None, [disk])])
+        # each vm is scored on its own, 1-20k/64k, out of memory, 1-40k/64k
+        assert_that(results[0][0], is_(AgentPlacementScore(69, 100)))
+        assert_that(results[1], instance_of(NotEnoughMemoryResourceException))
+        assert_that(results[2][0], is_(AgentPlacementScore(37, 100)))
+        assert_that(results[3][1], has_length(1))
+
+        # the host state is read once for all the resources
+        system = manager._system
+        assert_that(system.total_vmusable_memory_mb.call_count, is_(1))
+        assert_that(system.num_physical_cpus.call_count, is_(1))
+        assert_that(manager._memory_reserved(), is_(0))
+
     @raises(NotEnoughCpuResourceException)
     def test_place_cpu_constraint(self):
         disk1 = Disk(new_id(), DISK_FLAVOR, True, True, 1024)
@@ -196,6 +240,61 @@ class TestPlacementManager(unittest.TestCase):
                     equal_to(0))
         manager.remove_disk_reservation(rid)
 
+    @patch("time.time")
+    def test_reservation_expires(self, time_fn):
+        manager = PMBuilder().build()
+        disk = Disk(new_id(), DISK_FLAVOR, True, True, 1024)
+        vm = Vm(new_id(), VM_FLAVOR, State.STARTED)
+
+        time_fn.return_value = 100
+        expired = manager.reserve(vm, [disk])
+        consumed = manager.reserve(vm, None)
+        manager.consume_vm_reservation(consumed)
+
+        time_fn.return_value = 100 + manager.RESERVATION_TTL
+        assert_that(manager._memory_reserved(),
+                    equal_to(manager._vm_memory_mb(vm)))
+        assert_that(manager._storage_reserved(), equal_to(0))
+        self.assertRaises(InvalidReservationException,
+                          manager.consume_vm_reservation, expired)
+        self.assertRaises(InvalidReservationException,
+                          manager.consume_disk_reservation, expired)
+        assert_that(manager.consume_vm_reservation(consumed), is_(vm))
+        assert_that(manager.reservation_stats(), has_entries(
+            live=1, added=3, consumed=1, expired=2))
+
+    def test_summary(self):
+        ds_map = {"datastore_id_1": (DatastoreInfo(8 * 1024, 1024), set()),
+                  "datastore_id_2": (DatastoreInfo(4 * 1024, 0), set())}
+        manager = PMBuilder(ds_map=ds_map, mem_overcommit=2.0,
+                            cpu_overcommit=4.0, vm_networks=["net1"]).build()
+        manager._vm_manager.get_used_memory_mb.return_value = 1024
+        manager._vm_manager.get_configured_cpu_count.return_value = 2
+        manager._image_manager.get_images.side_effect = \
+            lambda ds: {"datastore_id_1": ["image_1"],
+                        "datastore_id_2": ["image_1", "image_2"]}[ds]
+
+        disk = Disk(new_id(), DISK_FLAVOR, True, True, 512)
+        vm = Vm(new_id(), VM_FLAVOR, State.STOPPED)
+        manager.reserve(vm, [disk])
+
+        summary = manager.summary()
+        assert_that(summary.total_memory_mb, is_(128 * 1024))
+        assert_that(summary.used_memory_mb, is_(3 * 1024))
+        assert_that(summary.total_cpu_count, is_(4))
+        assert_that(summary.used_cpu_count, is_(3))
+        assert_that(summary.datastore_free_gb, is_(
+            {"datastore_id_1": 7 * 1024, "datastore_id_2": 4 * 1024}))
+        assert_that(summary.datastore_total_gb, is_(
+            {"datastore_id_1": 8 * 1024, "datastore_id_2": 4 * 1024}))
+        assert_that(summary.image_ids, is_(set(["image_1", "image_2"])))
+        assert_that(summary.networks, is_(["net1"]))
+
+        thrift_summary = summary.to_thrift("agent_1", 5)
+        assert_that(thrift_summary.agent_id, is_("agent_1"))
+        assert_that(thrift_summary.generation, is_(5))
+        thrift_summary.validate()
+
     def test_place_vm_no_disks(self):
         manager = PMBuilder().build()
         vm = Vm(new_id(), VM_FLAVOR,
@@ -278,6 +377,23 @@ class TestPlacementManager(unittest.TestCase):
         assert_that(score.transfer, is_(expected))
         assert_that(placement_list, has_length(2))  # vm and disk
 
+    def test_transfer_score_datastore_without_image_folder(self):
+        # The images of a datastore that has no image folder yet are listed
+        # as empty, so placement only applies the copy penalty.
+        list_images = MagicMock(return_value=[])
+        manager = PMBuilder(image_size=512 << 20).build()
+        manager._image_manager.has_image = ImageCatalog(list_images).has_image
+        image = DiskImage("disk_image", DiskImage.COPY_ON_WRITE)
+        disk = Disk(new_id(), DISK_FLAVOR, False, True, 1024, image)
+        vm = Vm(new_id(), VM_FLAVOR, State.STOPPED, None, None, [disk])
+
+        for _ in xrange(2):
+            score, placement_list = manager.place(vm, None)
+            assert_that(score.transfer, is_(50))
+
+        # The empty listing is kept
+        list_images.assert_called_once_with("datastore_id_1")
+
     def test_place_vm_in_no_image_datastore(self):
         ds_map = {"datastore_id_1": (DatastoreInfo(8 * 1024, 0), set([])),
                   "datastore_id_2": (DatastoreInfo(8 * 1024, 0), set([])),
@@ -460,6 +576,22 @@ class TestPlacementManager(unittest.TestCase):
         assert_that(placement_list[base_index + 3].
                     container_id, is_("datastore_id_2"))
 
+    def test_place_disks_bin_packing(self):
+        ds_map = {"datastore_id_1": (DatastoreInfo(20, 0), set([])),
+                  "datastore_id_2": (DatastoreInfo(40, 0), set([])),
+                  "datastore_id_3": (DatastoreInfo(5, 0), set([]))}
+        manager = PMBuilder(ds_map=ds_map).build()
+        disks = [Disk(new_id(), DISK_FLAVOR, True, True, capacity)
+                 for capacity in [15, 20, 10, 15]]
+
+        # Best effort runs out of space, the disks only fit packed tightly
+        score, placement_list = manager.place(None, disks)
+        placements = dict((placement.resource_id, placement.container_id)
+                          for placement in placement_list)
+        assert_that([placements[disk.id] for disk in disks], contains(
+            "datastore_id_2", "datastore_id_1", "datastore_id_2",
+            "datastore_id_2"))
+
     @parameterized.expand([
         [True],
         [False]
@@ -817,6 +949,7 @@ class PMBuilder(object):
         hypervisor.datastore_manager.get_datastore_ids.return_value = \
             self.ds_map.keys()
         hypervisor.datastore_manager.datastore_info = self.datastore_info
+        hypervisor.datastore_manager.datastore_infos = self.datastore_infos
         hypervisor.datastore_manager.normalize.side_effect = self.normalize
         hypervisor.datastore_manager.get_datastores.return_value = \
             [Datastore(id=ds_id, tags=self.ds_map[ds_id][1])
@@ -833,7 +966,7 @@ class PMBuilder(object):
         hypervisor.image_manager = MagicMock()
         hypervisor.image_manager.get_image_id_from_disks.return_value = \
             self.image_id
-        hypervisor.image_manager.check_image = self.check_image
+        hypervisor.image_manager.has_image = self.has_image
         hypervisor.image_manager.image_size.return_value = self.image_size
 
         hypervisor.vm_manager = MagicMock()
@@ -844,6 +977,10 @@ class PMBuilder(object):
                                            self.image_datastores)
         return PlacementManager(hypervisor, placement_option)
 
+    def datastore_infos(self, datastore_ids):
+        return dict((datastore_id, self.datastore_info(datastore_id))
+                    for datastore_id in datastore_ids)
+
     def datastore_info(self, datastore_id):
         if datastore_id not in self.ds_map.keys():
             self._logger.warning("Datastore (%s) not connected" %
@@ -851,7 +988,7 @@ class PMBuilder(object):
             raise Exception
         return self.ds_map[datastore_id][0]
 
-    def check_image(self, image_id, datastore_id):
+    def has_image(self, image_id, datastore_id):
         if datastore_id in self.ds_with_image:
             return True
         else:
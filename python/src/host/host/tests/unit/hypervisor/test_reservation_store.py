@@ -0,0 +1,105 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+from mock import patch
+
+from host.hypervisor.reservation_store import ReservationStore
+
+
+class TestReservationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = patch("time.time")
+        self.time = self.patcher.start()
+        self.time.return_value = 100
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_add_consume_remove(self):
+        store = ReservationStore(ttl=10)
+        store.add("r1", "vm1", memory_mb=1024, cpu_count=2, storage_gb=10)
+        store.add("r2", "vm2", memory_mb=512, cpu_count=1)
+        assert_that(store.memory_mb, is_(1536))
+        assert_that(store.cpu_count, is_(3))
+        assert_that(store.storage_gb, is_(10))
+
+        assert_that(store.consume("r1"), is_("vm1"))
+        assert_that(store.consume("r1"), is_("vm1"))
+        assert_that(store.consume("r3"), is_(none()))
+
+        assert_that(store.remove("r1"), is_("vm1"))
+        assert_that(store.remove("r1"), is_(none()))
+        assert_that(store.consume("r1"), is_(none()))
+        assert_that(store.memory_mb, is_(512))
+        assert_that(store.storage_gb, is_(0))
+
+        assert_that(store.stats(), has_entries(
+            live=1, added=2, consumed=1))
+
+    def test_expire(self):
+        store = ReservationStore(ttl=10)
+        store.add("r1", "vm1", memory_mb=1024)
+        self.time.return_value = 105
+        store.add("r2", "vm2", memory_mb=512)
+        store.add("r3", "vm3", memory_mb=256)
+        store.consume("r3")
+
+        # r1 drops out of the totals as soon as it expires
+        self.time.return_value = 110
+        assert_that(store.memory_mb, is_(768))
+        assert_that(store.consume("r1"), is_(none()))
+
+        # consumed reservations don't expire
+        self.time.return_value = 200
+        assert_that(store.memory_mb, is_(256))
+        assert_that(store.consume("r3"), is_("vm3"))
+        assert_that(store.stats(), has_entries(live=1, expired=2))
+
+    def test_readd_renews_expiry(self):
+        store = ReservationStore(ttl=10)
+        store.add("r1", "vm1", memory_mb=1024)
+        self.time.return_value = 105
+        store.add("r1", "vm1", memory_mb=2048)
+        assert_that(store.memory_mb, is_(2048))
+
+        self.time.return_value = 112
+        assert_that(store.consume("r1"), is_("vm1"))
+        assert_that(store.stats(), has_entries(live=1))
+
+    def test_max_size(self):
+        store = ReservationStore(ttl=10, max_size=2)
+        store.add("r1", "vm1", memory_mb=1)
+        self.time.return_value = 101
+        store.add("r2", "vm2", memory_mb=2)
+        store.add("r3", "vm3", memory_mb=4)
+
+        # the reservation closest to expiry is evicted
+        assert_that(len(store), is_(2))
+        assert_that(store.consume("r1"), is_(none()))
+        assert_that(store.memory_mb, is_(6))
+        assert_that(store.stats(), has_entries(evicted=1))
+
+    def test_compact(self):
+        store = ReservationStore(ttl=10)
+        for i in range(1000):
+            store.add(i, "vm", memory_mb=1)
+            store.remove(i)
+        assert_that(len(store._expiry), less_than(100))
+        assert_that(store.memory_mb, is_(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
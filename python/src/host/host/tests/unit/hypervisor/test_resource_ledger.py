@@ -0,0 +1,55 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+
+from host.hypervisor.resource_ledger import ResourceLedger
+
+
+class TestResourceLedger(unittest.TestCase):
+
+    def _totals(self, ledger):
+        return (ledger.memory_mb, ledger.cpu_count, ledger.storage_gb)
+
+    def test_update_and_release(self):
+        ledger = ResourceLedger()
+        assert_that(self._totals(ledger), is_((0, 0, 0)))
+
+        ledger.update("a", memory_mb=1024, cpu_count=2, storage_gb=10)
+        ledger.update("b", memory_mb=512, cpu_count=1)
+        assert_that(self._totals(ledger), is_((1536, 3, 10)))
+        assert_that(len(ledger), is_(2))
+        assert_that("a" in ledger, is_(True))
+
+        # updating an entry replaces what it held
+        ledger.update("a", memory_mb=2048, cpu_count=4)
+        assert_that(self._totals(ledger), is_((2560, 5, 0)))
+        assert_that(len(ledger), is_(2))
+
+        ledger.release("a")
+        assert_that(self._totals(ledger), is_((512, 1, 0)))
+        assert_that("a" in ledger, is_(False))
+
+        # unknown entries are ignored
+        ledger.release("a")
+        ledger.release("c")
+        assert_that(self._totals(ledger), is_((512, 1, 0)))
+
+        ledger.release("b")
+        assert_that(self._totals(ledger), is_((0, 0, 0)))
+        assert_that(len(ledger), is_(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
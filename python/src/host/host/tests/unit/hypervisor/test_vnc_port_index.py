@@ -0,0 +1,87 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+from mock import patch
+
+from host.hypervisor.vnc_port_index import VncPortIndex
+
+
+class TestVncPortIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = VncPortIndex(5900, 5903, allocation_ttl=10)
+
+    def test_update(self):
+        self.index.update("vm1", 5900)
+        self.index.update("vm2", 5902)
+        self.index.update("vm3", None)
+        self.index.update("vm4", 6000)
+        assert_that(self.index.occupied(),
+                    contains_inanyorder(5900, 5902, 6000))
+
+        # port change, and vnc disabled
+        self.index.update("vm1", 5901)
+        self.index.update("vm2", None)
+        self.index.remove("vm4")
+        self.index.remove("vm5")
+        assert_that(self.index.occupied(), contains_inanyorder(5901))
+
+    def test_shared_port(self):
+        self.index.update("vm1", 5900)
+        self.index.update("vm2", 5900)
+        self.index.remove("vm1")
+        assert_that(self.index.occupied(), contains(5900))
+        assert_that(self.index.allocate(), is_(5901))
+        self.index.remove("vm2")
+        assert_that(self.index.allocate(), is_(5900))
+
+    def test_allocate(self):
+        self.index.update("vm1", 5901)
+        assert_that(self.index.allocate(), is_(5900))
+        assert_that(self.index.allocate(), is_(5902))
+        assert_that(self.index.allocate(), is_(5903))
+        assert_that(self.index.allocate(), none())
+
+        # unused port is released
+        self.index.release(5902)
+        assert_that(self.index.occupied(),
+                    contains_inanyorder(5900, 5901, 5903))
+        # releasing a port used by a vm has no effect
+        self.index.release(5901)
+        assert_that(self.index.allocate(), is_(5902))
+        assert_that(self.index.allocate(), none())
+
+    def test_allocated_port_taken_by_vm(self):
+        port = self.index.allocate()
+        self.index.update("vm1", port)
+        self.index.release(port)
+        assert_that(self.index.occupied(), contains(port))
+        self.index.remove("vm1")
+        assert_that(self.index.occupied(), empty())
+
+    @patch("host.hypervisor.vnc_port_index.time.time")
+    def test_allocation_expires(self, time):
+        time.return_value = 100
+        for _ in range(4):
+            self.index.allocate()
+        assert_that(self.index.allocate(), none())
+
+        time.return_value = 110
+        assert_that(self.index.allocate(), is_(5900))
+        assert_that(self.index.occupied(), contains(5900))
+
+
+if __name__ == '__main__':
+    unittest.main()
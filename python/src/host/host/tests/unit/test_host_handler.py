@@ -68,6 +68,7 @@ from gen.host.ttypes import GetResourcesResultCode
 from gen.host.ttypes import HostMode
 from gen.host.ttypes import ImageInfoRequest
 from gen.host.ttypes import ImageInfoResultCode
+from gen.host.ttypes import ImageUploadResultCode
 from gen.host.ttypes import PowerVmOpRequest
 from gen.host.ttypes import PowerVmOpResultCode
 from gen.host.ttypes import RegisterVmRequest
@@ -82,6 +83,7 @@ from gen.host.ttypes import StopImageOperationResultCode
 from gen.common.ttypes import ServerAddress
 from gen.host.ttypes import VmDiskOpResultCode
 from gen.host.ttypes import VmDisksDetachRequest
+from gen.host.ttypes import WriteImageDataRequest
 from gen.resource.ttypes import Datastore
 from gen.resource.ttypes import DatastoreType
 from gen.resource.ttypes import Disk
@@ -101,6 +103,9 @@ from gen.roles.ttypes import Roles
 from gen.roles.ttypes import SchedulerRole
 from gen.scheduler.ttypes import ConfigureRequest
 from gen.scheduler.ttypes import ConfigureResultCode
+from gen.scheduler.ttypes import HostSummaryRequest
+from gen.scheduler.ttypes import HostSummaryResultCode
+from gen.scheduler.ttypes import PlaceBatchRequest
 from gen.scheduler.ttypes import PlaceRequest
 from gen.scheduler.ttypes import PlaceResultCode
 from gen.scheduler.ttypes import Score
@@ -110,9 +115,13 @@ from host.hypervisor.disk_manager import DiskAlreadyExistException
 from host.hypervisor.hypervisor import Hypervisor
 from host.hypervisor.image_manager import ImageNotFoundException
 from host.hypervisor.image_manager import ImageInUse
+from host.hypervisor.image_manager import ImageUploadNotFound
 from host.hypervisor.image_manager import InvalidImageState
+from host.hypervisor.placement import AgentResourceSummary
 from host.hypervisor.placement_manager import InvalidReservationException
 from host.hypervisor.placement_manager import NoSuchResourceException
+from host.hypervisor.placement_manager import \
+    NotEnoughMemoryResourceException
 from host.hypervisor.vm_manager import DiskNotFoundException
 from host.hypervisor.vm_manager import IsoNotAttachedException
 from host.hypervisor.vm_manager import VmAlreadyExistException
@@ -287,6 +296,47 @@ class HostHandlerTestCase(unittest.TestCase):
         response = handler.place(request)
         assert_that(response.result, is_(PlaceResultCode.INVALID_STATE))
 
+    def test_place_batch(self):
+        handler = HostHandler(MagicMock())
+        handler.hypervisor.placement_manager.place_batch.return_value = [
+            (Score(90, 100), []), NotEnoughMemoryResourceException()]
+
+        request = PlaceBatchRequest(resources=[
+            Resource(self._sample_vm(), []), Resource(self._sample_vm(), [])])
+        response = handler.place_batch(request)
+        assert_that(response.result,
+                    is_(PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE))
+        assert_that(response.responses, has_length(2))
+        assert_that(response.responses[0].result, is_(PlaceResultCode.OK))
+        assert_that(response.responses[0].score, is_(Score(90, 100)))
+        assert_that(response.responses[1].result,
+                    is_(PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE))
+
+        common.services.get(ServiceName.MODE).set_mode(MODE.MAINTENANCE)
+        response = handler.place_batch(request)
+        assert_that(response.result, is_(PlaceResultCode.INVALID_STATE))
+
+    def test_evaluate_placement(self):
+        handler = HostHandler(MagicMock())
+        handler.hypervisor.placement_manager.evaluate.return_value = [
+            NotEnoughMemoryResourceException(), (Score(90, 100), [])]
+
+        request = PlaceBatchRequest(resources=[
+            Resource(self._sample_vm(), []), Resource(self._sample_vm(), [])])
+        response = handler.evaluate_placement(request)
+        assert_that(response.result, is_(PlaceResultCode.OK))
+        assert_that(response.responses, has_length(2))
+        assert_that(response.responses[0].result,
+                    is_(PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE))
+        assert_that(response.responses[1].result, is_(PlaceResultCode.OK))
+        assert_that(response.responses[1].score, is_(Score(90, 100)))
+        assert_that(handler.hypervisor.placement_manager.place_batch.called,
+                    is_(False))
+
+        common.services.get(ServiceName.MODE).set_mode(MODE.MAINTENANCE)
+        response = handler.evaluate_placement(request)
+        assert_that(response.result, is_(PlaceResultCode.INVALID_STATE))
+
     def test_place_resource_constraint(self):
         handler = HostHandler(MagicMock())
         request = PlaceRequest(resource=Resource(self._sample_vm(), []))
@@ -296,6 +346,27 @@ class HostHandlerTestCase(unittest.TestCase):
         response = handler.place(request)
         assert_that(response.result, is_(PlaceResultCode.NO_SUCH_RESOURCE))
 
+    def test_summary(self):
+        handler = HostHandler(MagicMock())
+        handler._generation = 3
+        summary = AgentResourceSummary(1024, 512, 8, 2, {"ds1": 10},
+                                       {"ds1": 20}, set(["image1"]), [])
+        handler.hypervisor.placement_manager.summary.return_value = summary
+        handler.hypervisor.vm_manager.get_resource_ids.return_value = ["vm1"]
+
+        response = handler.summary(HostSummaryRequest())
+        assert_that(response.result, is_(HostSummaryResultCode.OK))
+        assert_that(response.summary.agent_id, is_(handler._agent_id))
+        assert_that(response.summary.generation, is_(3))
+        assert_that(response.summary.used_memory_mb, is_(512))
+        assert_that(response.summary.vm_ids, contains("vm1"))
+
+        common.services.get(ServiceName.MODE).set_mode(
+            MODE.MAINTENANCE)
+        response = handler.summary(HostSummaryRequest())
+        assert_that(response.result,
+                    is_(HostSummaryResultCode.INVALID_STATE))
+
     def test_reserve_vm(self):
         disk_ids = ["disk_id_1", "disk_id_2", "disk_id_3"]
         datastore_ids = ["datastore_1", "datastore_2", "datastore_3"]
@@ -1229,6 +1300,29 @@ class HostHandlerTestCase(unittest.TestCase):
         assert_that(result.result is
                     StopImageOperationResultCode.DATASTORE_NOT_FOUND)
 
+    def test_write_image_data(self):
+        handler = HostHandler(MagicMock())
+        request = WriteImageDataRequest(upload_id="upload_id", data="abc",
+                                        compressed=False)
+
+        response = handler.write_image_data(request)
+        assert_that(response.result, equal_to(ImageUploadResultCode.OK))
+        handler.hypervisor.write_image_data.assert_called_once_with(
+            "upload_id", "abc", False)
+
+        handler.hypervisor.write_image_data.side_effect = \
+            ImageUploadNotFound("upload_id")
+        response = handler.write_image_data(request)
+        assert_that(response.result,
+                    equal_to(ImageUploadResultCode.UPLOAD_NOT_FOUND))
+
+        handler.hypervisor.write_image_data.side_effect = \
+            Exception("Upload failed")
+        response = handler.write_image_data(request)
+        assert_that(response.result,
+                    equal_to(ImageUploadResultCode.SYSTEM_ERROR))
+        assert_that(response.error, equal_to("Upload failed"))
+
     def test_start_image_sweep(self):
         """Test touch image timestamp against mock"""
         handler = HostHandler(MagicMock())
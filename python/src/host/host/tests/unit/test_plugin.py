@@ -0,0 +1,55 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+from mock import MagicMock
+from mock import patch
+
+import common.plugin
+from common.service_name import ServiceName
+from common.thread import Periodic
+from host.plugin import HostPlugin
+from host.plugin import RESERVATION_STATS_INTERVAL
+
+
+class TestHostPlugin(unittest.TestCase):
+
+    def setUp(self):
+        common.services.register(ServiceName.AGENT_CONFIG, MagicMock())
+        common.services.register(ServiceName.REGISTRANT, MagicMock())
+
+    def tearDown(self):
+        common.services.reset()
+
+    @patch("host.plugin.hypervisor.Hypervisor")
+    def test_log_reservation_stats(self, hypervisor_class):
+        hv = hypervisor_class.return_value
+        hv.placement_manager.reservation_stats.return_value = {"live": 2}
+        plugin = HostPlugin()
+        plugin.init()
+
+        # Started with the plugin
+        assert_that(plugin.backend_workers, has_length(1))
+        stats_logger = list(plugin.backend_workers)[0]
+        assert_that(stats_logger, instance_of(Periodic))
+        assert_that(stats_logger.daemon, is_(True))
+        assert_that(stats_logger._interval_secs,
+                    is_(RESERVATION_STATS_INTERVAL))
+
+        with patch.object(plugin, "_logger") as logger:
+            stats_logger._periodic_fn()
+        assert_that(logger.info.call_args[0][1], is_({"live": 2}))
+
+if __name__ == '__main__':
+    unittest.main()
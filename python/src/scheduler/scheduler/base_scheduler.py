@@ -12,7 +12,14 @@
 
 import abc
 
+import concurrent.futures
+
 from gen.resource.ttypes import ResourceConstraint
+from gen.scheduler.ttypes import FindResultCode
+from gen.scheduler.ttypes import PlaceBatchResponse
+from gen.scheduler.ttypes import PlaceRequest
+from gen.scheduler.ttypes import PlaceResultCode
+from scheduler.constraint_index import ConstraintIndex
 
 
 class InvalidScheduler(Exception):
@@ -41,11 +48,88 @@ class BaseScheduler(object):
         """
         pass
 
+    def place_batch(self, request):
+        """Place a batch of resources.
+
+        Places the resources one at a time, schedulers that can do better
+        override this.
+
+        :type request: PlaceBatchRequest
+        :rtype: PlaceBatchResponse
+        """
+        responses = []
+        for resource in request.resources:
+            responses.append(self.place(PlaceRequest(
+                resource=resource,
+                scheduler_id=request.scheduler_id,
+                rootSchedulerParams=request.rootSchedulerParams,
+                leafSchedulerParams=request.leafSchedulerParams,
+                tracing_info=request.tracing_info)))
+        return self._batch_response(responses)
+
     @abc.abstractmethod
     def cleanup(self):
         """ Cleanup as part of a scheduler demotion """
         pass
 
+    @staticmethod
+    def _batch_response(responses):
+        """Build a batch response from the per resource responses.
+
+        :type responses: list of PlaceResponse
+        :rtype: PlaceBatchResponse
+        """
+        for response in responses:
+            if response.result != PlaceResultCode.OK:
+                return PlaceBatchResponse(response.result, response.error,
+                                          responses)
+        return PlaceBatchResponse(PlaceResultCode.OK, responses=responses)
+
+    @staticmethod
+    def _find_timeout(request, default):
+        """Get the time budget of a find request, in seconds.
+
+        :type request: FindRequest
+        :param default: budget used when the request doesn't carry one
+        :rtype: float
+        """
+        if request.params is not None and request.params.timeout:
+            return request.params.timeout / 1000.0
+        return default
+
+    def _first_found(self, futures, timeout):
+        """Wait for the first successful find response.
+
+        Returns as soon as a child finds the resource, so the answer doesn't
+        wait for the slowest child. The futures still pending are cancelled
+        and their responses are ignored.
+
+        :type futures: list of Future
+        :param timeout: max time to wait, in seconds
+        :rtype: FindResponse or None if no child found the resource
+        """
+        found = None
+        received = 0
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout):
+                received += 1
+                try:
+                    response = future.result()
+                except Exception, e:
+                    self._logger.info("Find failed: %s", e)
+                    continue
+                if response.result == FindResultCode.OK:
+                    found = response
+                    break
+        except concurrent.futures.TimeoutError:
+            pass
+
+        for future in futures:
+            future.cancel()
+        self._logger.info("Find responses received: %d, pending: %d",
+                          received, len(futures) - received)
+        return found
+
     def _coalesce_resources(self, children):
         """Coalesce resources by resource type.
 
@@ -72,6 +156,17 @@ class BaseScheduler(object):
                 child_info.constraints.append(
                     ResourceConstraint(constraint_type, list(values)))
 
+    def _index_constraints(self, children):
+        """Build the constraint index used to filter children on placement.
+
+        Must be called after _coalesce_resources, and again every time the
+        list of children changes.
+
+        :param children: list of ChildInfo
+        :rtype: ConstraintIndex
+        """
+        return ConstraintIndex(children)
+
     def _collect_constraints(self, resource):
         """ Get resource constraints from placement request's resource
 
@@ -17,6 +17,8 @@ import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 
 import common
+from common.photon_thrift.encoded_request import EncodedRequest
+from gen.scheduler.ttypes import FindParams
 from gen.scheduler.ttypes import FindResponse
 from gen.scheduler.ttypes import FindResultCode
 from gen.scheduler.ttypes import PlaceResponse
@@ -33,6 +35,7 @@ from scheduler.strategy.random_subset_strategy import RandomSubsetStrategy
 # Leaf Schedulers
 
 FIND_TIMEOUT = 40
+FIND_CHILD_TIMEOUT_RATIO = 0.75
 
 INITIAL_PLACE_TIMEOUT = 4
 PLACE_TIMEOUT = 16
@@ -60,6 +63,7 @@ class BranchScheduler(BaseScheduler):
                                                     MIN_PLACE_FAN_OUT)
         self._scheduler_id = scheduler_id
         self._schedulers = []
+        self._constraint_index = self._index_constraints(self._schedulers)
         self._scorer = DefaultScorer(ut_ratio)
         self._threadpool = None
         self._scheduler_client = None
@@ -86,6 +90,7 @@ class BranchScheduler(BaseScheduler):
             self._schedulers.append(ChildInfo.from_thrift(scheduler))
 
         self._coalesce_resources(self._schedulers)
+        self._constraint_index = self._index_constraints(self._schedulers)
 
     def find(self, request):
         """Find the specified resource.
@@ -93,23 +98,26 @@ class BranchScheduler(BaseScheduler):
         :type request: FindRequest
         :rtype: FindResponse
         """
+        timeout = self._find_timeout(request, FIND_TIMEOUT)
+
+        # Leave the children part of the budget, so their answers get here
+        # before this scheduler gives up on them.
+        child_request = copy.copy(request)
+        child_request.params = FindParams(
+            int(timeout * FIND_CHILD_TIMEOUT_RATIO * 1000))
+        encoded = EncodedRequest(child_request, "scheduler_id")
+
         futures = []
         for scheduler in self._schedulers:
             future = self._threadpool.submit(
                 self._find_worker, scheduler.address, scheduler.port,
-                scheduler.id, copy.deepcopy(request))
+                scheduler.id, encoded.copy(scheduler.id), timeout)
             futures.append(future)
 
-        done, not_done = concurrent.futures.wait(futures, timeout=FIND_TIMEOUT)
-        self._logger.info("Find responses received: %d, timed out: %d",
-                          len(done), len(not_done))
-
-        for future in done:
-            response = future.result()
-            if response.result == FindResultCode.OK:
-                return response
-
-        return FindResponse(FindResultCode.NOT_FOUND)
+        response = self._first_found(futures, timeout)
+        if response is None:
+            return FindResponse(FindResultCode.NOT_FOUND)
+        return response
 
     def place(self, request):
         """Place the specified resources.
@@ -145,11 +153,12 @@ class BranchScheduler(BaseScheduler):
             return PlaceResponse(PlaceResultCode.SYSTEM_ERROR)
 
     def _execute_placement(self, schedulers, request):
+        encoded = EncodedRequest(request, "scheduler_id")
         futures = []
         for scheduler in schedulers:
             future = self._threadpool.submit(
                 self._place_worker, scheduler.address, scheduler.port,
-                scheduler.id, copy.deepcopy(request))
+                scheduler.id, encoded.copy(scheduler.id))
             futures.append(future)
 
         done, not_done = concurrent.futures.wait(
@@ -168,23 +177,27 @@ class BranchScheduler(BaseScheduler):
         return done
 
     def _placement_schedulers(self, request, constraints):
-        return self._place_strategy.filter_child(self._schedulers,
+        index = self._constraint_index
+        return self._place_strategy.filter_child(index.children,
                                                  request,
-                                                 constraints)
+                                                 constraints,
+                                                 index=index)
 
-    def _find_worker(self, address, port, scheduler_id, request):
+    def _find_worker(self, address, port, scheduler_id, request,
+                     client_timeout=FIND_TIMEOUT):
         """Invokes Scheduler.find on a single scheduler.
 
         :type address: str
         :type port: str
         :type scheduler_id: str
         :type request: FindRequest
+        :type client_timeout: float
         :rtype: FindResponse
         """
         request.scheduler_id = scheduler_id
         client = self._scheduler_client
         with client.connect(address, port, scheduler_id,
-                            client_timeout=FIND_TIMEOUT) as client:
+                            client_timeout=client_timeout) as client:
             return client.find(request)
 
     def _place_worker(self, address, port, scheduler_id, request):
@@ -198,7 +211,7 @@ class BranchScheduler(BaseScheduler):
         """
         request.scheduler_id = scheduler_id
         client = self._scheduler_client
-        with client.connect(scheduler_id, address, port,
+        with client.connect(address, port, scheduler_id,
                             client_timeout=PLACE_TIMEOUT) as client:
             return client.place(request)
 
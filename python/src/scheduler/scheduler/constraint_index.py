@@ -0,0 +1,97 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+
+class ConstraintIndex(object):
+    """Inverted index from resource constraint values to children.
+
+    Children are identified by their position in the list the index was
+    built from, and sets of children are represented as bitsets (python
+    longs), so matching a request's constraints only takes a few bitwise
+    operations per constraint value, independent of the number of children.
+
+    The index must be rebuilt whenever the list of children changes.
+    """
+
+    def __init__(self, children):
+        """
+        :param children: list of ChildInfo with coalesced resource constraints
+        """
+        self._children = children
+        self._all = (1 << len(children)) - 1
+
+        # constraint type -> constraint value -> bitset of children
+        self._index = {}
+        for position, child in enumerate(children):
+            if not child.constraints:
+                continue
+            bit = 1 << position
+            for constraint in child.constraints:
+                values = self._index.setdefault(constraint.type, {})
+                for value in constraint.values:
+                    values[value] = values.get(value, 0) | bit
+
+    @property
+    def children(self):
+        return self._children
+
+    def match(self, constraints):
+        """Get the children satisfying all the constraints.
+
+        A positive constraint is satisfied by a child having at least one of
+        the constraint values. A negative constraint is satisfied by a child
+        having at least one value of the constraint type that is not in the
+        constraint values.
+
+        :param constraints: list of ResourceConstraint
+        :rtype: long, bitset of child positions
+        """
+        result = self._all
+        for constraint in constraints:
+            if not result:
+                break
+            values = self._index.get(constraint.type, {})
+            matched = 0
+            if not constraint.negative:
+                for value in constraint.values:
+                    matched |= values.get(value, 0)
+            else:
+                excluded = set(constraint.values)
+                for value, children in values.iteritems():
+                    if value not in excluded:
+                        matched |= children
+            result &= matched
+        return result
+
+    def filter(self, constraints):
+        """Get the children satisfying all the constraints.
+
+        :param constraints: list of ResourceConstraint
+        :rtype: list of ChildInfo
+        """
+        return [self._children[i]
+                for i in self.positions(self.match(constraints))]
+
+    @staticmethod
+    def positions(bitset):
+        """Get the positions of the bits set in a bitset.
+
+        :type bitset: long
+        :rtype: list of int
+        """
+        positions = []
+        while bitset:
+            lowest = bitset & -bitset
+            # bin(lowest) is "0b1" followed by the position in zeros
+            positions.append(len(bin(lowest)) - 3)
+            bitset ^= lowest
+        return positions
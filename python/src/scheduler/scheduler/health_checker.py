@@ -13,52 +13,91 @@
 import logging
 import threading
 import time
+
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
 from agent.agent_control_client import AgentControlClient
 from common.photon_thrift import StaticServerSet
 from common.photon_thrift.client import Client
+from common.stats import LatencyStats
+from common.thread import Periodic
 from gen.agent.ttypes import PingRequest
 from gen.chairman import Chairman
 from gen.chairman.ttypes import ReportMissingRequest
 from gen.chairman.ttypes import ReportMissingResultCode
 from gen.chairman.ttypes import ReportResurrectedRequest
 from gen.chairman.ttypes import ReportResurrectedResultCode
+from gen.scheduler.ttypes import HostSummaryRequest
+from gen.scheduler.ttypes import HostSummaryResultCode
+from scheduler.scheduler_client import SchedulerClient
+
+
+# Max number of children pinged in parallel.
+HEARTBEAT_PARALLELISM = 16
+
+# Number of ping round trip times kept per child.
+RTT_WINDOW_SIZE = 64
+
+# Interval in seconds between the logs of the ping round trip times.
+RTT_STATS_INTERVAL = 300
 
 
 class HealthChecker(object):
     """Monitors a set of children by periodically sending PingRequest.
 
     This class runs two threads, heartbeater and reporter. The heartbeater
-    thread periodically sends PingRequest to children and updates sequence
-    number and timestamp of the last successful ping for each child. The
-    reporter thread periodically checks the timestamp/sequence number and
-    reports resurrected and missing children to chairman.
+    thread periodically sends PingRequest to children in parallel and updates
+    sequence number, timestamp and round trip time of the last successful
+    ping for each child. The reporter thread periodically checks the
+    timestamp/sequence number and reports resurrected and missing children to
+    chairman. The round trip times are logged every RTT_STATS_INTERVAL
+    seconds.
+
+    If a summary listener is given, the heartbeater also fetches the resource
+    summary of each child that answered the ping, and passes it to the
+    listener.
     """
 
-    def __init__(self, scheduler_id, children, agent_config):
+    def __init__(self, scheduler_id, children, agent_config,
+                 summary_listener=None):
         """
         Args:
             scheduler_id: id of this scheduler
             children: map from server id to ServerAddress
             agent_config: AgentConfig object
+            summary_listener: callable taking a HostSummary, or None
         """
         self._logger = logging.getLogger(__name__)
         self._stop = threading.Event()
         self._scheduler_id = scheduler_id
         self._children = children
         self._config = agent_config
+        self._summary_listener = summary_listener
 
         # keep track of reported children
         self._resurrected_children = set()
         self._missing_children = set()
 
+        self._lock = threading.Lock()
         self._seqnum = 0
         self._last_update = {}
+        self._rtt = {}
         for child in self._children:
             self._last_update[child] = (self._seqnum, time.time())
+            self._rtt[child] = LatencyStats(RTT_WINDOW_SIZE)
+
+        # child id -> future of the heartbeat in flight
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(
+            max(1, min(len(self._children), HEARTBEAT_PARALLELISM)))
         self._heartbeater = threading.Thread(target=HealthChecker.heartbeat,
                                              args=(self,))
         self._reporter = threading.Thread(target=HealthChecker.report,
                                           args=(self,))
+        self._stats_logger = Periodic(self._log_rtt_stats,
+                                      RTT_STATS_INTERVAL)
+        self._stats_logger.daemon = True
 
     @property
     def get_missing_hosts(self):
@@ -67,14 +106,57 @@ class HealthChecker(object):
     def start(self):
         self._heartbeater.start()
         self._reporter.start()
+        self._stats_logger.start()
 
     def stop(self):
         self._stop.set()
         self._heartbeater.join()
         self._reporter.join()
+        self._stats_logger.stop()
+        self._executor.shutdown(wait=False)
+
+    def get_rtt(self, child):
+        """Get the round trip times of the successful pings to a child.
+
+        :type child: str
+        :rtype: LatencyStats or None if child is unknown
+        """
+        return self._rtt.get(child)
+
+    def _log_rtt_stats(self):
+        stats = dict((child, rtt.snapshot())
+                     for child, rtt in self._rtt.iteritems())
+        self._logger.info("Ping round trip times of scheduler %s: %s",
+                          self._scheduler_id, stats)
 
     def _send_heartbeat(self):
+        """Ping all the children in parallel.
+
+        Waits at most heartbeat_interval_sec for the pings to complete.
+        Children whose previous ping is still in flight are skipped, so that
+        slow children don't pile up pings.
+        """
+        seqnum = self._seqnum + 1
+        futures = []
         for id, address in self._children.iteritems():
+            with self._lock:
+                if id in self._pending:
+                    self._logger.debug("Ping to %s still in flight" % id)
+                    continue
+                future = self._executor.submit(self._heartbeat_child, id,
+                                               address, seqnum)
+                self._pending[id] = future
+            futures.append(future)
+
+        done, not_done = concurrent.futures.wait(
+            futures, timeout=self._config.heartbeat_interval_sec)
+        if not_done:
+            self._logger.info("%d pings still in flight" % len(not_done))
+        self._seqnum = seqnum
+
+    def _heartbeat_child(self, id, address, seqnum):
+        try:
+            start = time.time()
             try:
                 client = AgentControlClient()
                 timeout_sec = self._config.thrift_timeout_sec
@@ -82,25 +164,50 @@ class HealthChecker(object):
                                     timeout_sec) as thrift_client:
                     request = PingRequest()
                     request.scheduler_id = self._scheduler_id
-                    request.sequence_number = self._seqnum + 1
+                    request.sequence_number = seqnum
                     thrift_client.request_log_level = logging.DEBUG
                     thrift_client.ping(request)
-                    self._last_update[id] = (self._seqnum + 1, time.time())
+                now = time.time()
+                self._rtt[id].record(now - start)
+                with self._lock:
+                    self._last_update[id] = (seqnum, now)
             except Exception, ex:
                 self._logger.warn("Failed to ping %s: %s" % (address, ex))
+                return
+
+            if self._summary_listener:
+                self._fetch_summary(id, address)
+        finally:
+            with self._lock:
+                self._pending.pop(id, None)
 
-        self._seqnum += 1
+    def _fetch_summary(self, id, address):
+        try:
+            client = SchedulerClient()
+            timeout_sec = self._config.thrift_timeout_sec
+            with client.connect(address.host, address.port, id,
+                                timeout_sec) as thrift_client:
+                thrift_client.request_log_level = logging.DEBUG
+                response = thrift_client.host_summary(HostSummaryRequest())
+            if response.result == HostSummaryResultCode.OK:
+                self._summary_listener(response.summary)
+            else:
+                self._logger.debug("No summary from %s: %s" %
+                                   (address, response.error))
+        except Exception, ex:
+            self._logger.warn("Failed to get summary from %s: %s" %
+                              (address, ex))
 
     def heartbeat(self):
         """Ping children in a loop.
 
-        Send ping requests to children serially with an interval specified
-        by heartbeat_interval_sec, and maintain a timestamp of the last
-        successful ping for each child.
+        Send ping requests to children in parallel with an interval
+        specified by heartbeat_interval_sec, and maintain a timestamp of the
+        last successful ping for each child.
 
-        Note that the actual interval might be longer than the specified
-        interval if it takes a long time to send ping to all the children.
-        This method keeps track of the sequence number of the last successful
+        A ping that takes longer than the interval doesn't delay the next
+        round, the child is skipped until its ping completes. This method
+        keeps track of the sequence number of the last successful
         ping for each host. The reporter thread does not consider a child
         dead if the sequence number of the last successful ping is the same
         as the current sequence number.
@@ -121,7 +228,9 @@ class HealthChecker(object):
         now = time.time()
         active_children = set()
         inactive_children = set()
-        for child, (seq, timestamp) in self._last_update.iteritems():
+        with self._lock:
+            last_update = self._last_update.items()
+        for child, (seq, timestamp) in last_update:
             if now - timestamp > timeout and seq < self._seqnum:
                 inactive_children.add(child)
             else:
@@ -0,0 +1,204 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import logging
+import threading
+import time
+
+from common.kind import Unit
+from gen.scheduler.ttypes import Score
+from host.hypervisor.disk_placement_manager import DiskUtil
+from host.hypervisor.placement_manager import PlacementManager
+from host.hypervisor.resources import Disk
+from host.hypervisor.resources import Vm
+
+
+class HostSummaryCache(object):
+    """Latest resource summaries reported by the children of a scheduler.
+
+    Summaries older than max_age seconds are ignored, so a child that stops
+    reporting falls back to being treated as an unknown child.
+    """
+
+    def __init__(self, max_age):
+        """
+        :param max_age: max age of a usable summary, in seconds
+        :type max_age: float
+        """
+        self._lock = threading.Lock()
+        self._max_age = max_age
+
+        # agent id -> (HostSummary, time the summary was received)
+        self._summaries = {}
+
+    @property
+    def max_age(self):
+        return self._max_age
+
+    @max_age.setter
+    def max_age(self, value):
+        self._max_age = value
+
+    def update(self, summary):
+        """
+        :type summary: HostSummary
+        """
+        with self._lock:
+            self._summaries[summary.agent_id] = (summary, time.time())
+
+    def invalidate(self, agent_id):
+        """Forget the summary of a child, until it reports a new one."""
+        with self._lock:
+            self._summaries.pop(agent_id, None)
+
+    def retain(self, agent_ids):
+        """Forget the summaries of the children not in agent_ids."""
+        agent_ids = set(agent_ids)
+        with self._lock:
+            for agent_id in self._summaries.keys():
+                if agent_id not in agent_ids:
+                    del self._summaries[agent_id]
+
+    def get(self, agent_id):
+        """
+        :type agent_id: str
+        :rtype: HostSummary or None if there is no recent summary
+        """
+        with self._lock:
+            entry = self._summaries.get(agent_id)
+        if entry is None or time.time() - entry[1] > self._max_age:
+            return None
+        return entry[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._summaries)
+
+
+class SummaryRanker(object):
+    """Ranks children by the placement score estimated from their summaries.
+
+    The estimate follows the PlacementManager score computation, using the
+    inputs reported in the summary. It ignores the host's consumed memory and
+    the size of the images to copy, so it is only used to pick the children
+    that receive a place request, and never to place the resources.
+    """
+
+    def __init__(self, scorer):
+        """
+        :param scorer: DefaultScorer used to combine utilization and transfer
+        """
+        self._logger = logging.getLogger(__name__)
+        self._scorer = scorer
+        self._diskutil = DiskUtil()
+
+    def rank(self, children, request, summaries):
+        """Rank children by their estimated score.
+
+        :type children: list of ChildInfo
+        :type request: PlaceRequest
+        :type summaries: HostSummaryCache
+        :return: children that can fit the request, best first, and the
+                 children without a recent summary.
+        :rtype: (list of ChildInfo, list of ChildInfo)
+        """
+        demand = self._demand(request.resource)
+        if demand is None:
+            return [], list(children)
+
+        scored = []
+        unknown = []
+        for child in children:
+            summary = summaries.get(child.id)
+            if summary is None:
+                unknown.append(child)
+                continue
+            score = self.estimate(summary, *demand)
+            if score is not None:
+                scored.append((self._scorer.score_formula(score), child))
+
+        scored.sort(key=lambda entry: entry[0], reverse=True)
+        return [child for _, child in scored], unknown
+
+    def estimate(self, summary, memory_mb, cpu_count, disk_gb, image_ids):
+        """Estimate the placement score of a host.
+
+        :type summary: HostSummary
+        :type memory_mb: int
+        :type cpu_count: int
+        :type disk_gb: int
+        :type image_ids: list of str
+        :rtype: Score or None if the host can't fit the request
+        """
+        memory = self._utilization(summary.used_memory_mb + memory_mb,
+                                   summary.total_memory_mb)
+        cpu = self._utilization(summary.used_cpu_count + cpu_count,
+                                summary.total_cpu_count)
+        if memory is None or cpu is None:
+            return None
+
+        storage = PlacementManager.MAX_SCORE
+        if disk_gb:
+            free = sum((summary.datastore_free_gb or {}).values())
+            total = sum((summary.datastore_total_gb or {}).values())
+            if total == 0 or disk_gb > free:
+                return None
+            ratio = float(total - free + disk_gb) / total
+            if ratio > PlacementManager.MAX_USAGE:
+                return None
+            if ratio >= PlacementManager.FREESPACE_THRESHOLD:
+                storage = self._score(ratio)
+
+        transfer = PlacementManager.MAX_SCORE
+        present = summary.image_ids or set()
+        if any(image_id not in present for image_id in image_ids):
+            transfer = 0
+
+        return Score(min(memory, cpu, storage), transfer)
+
+    def _demand(self, resource):
+        """Get the memory, cpu, disk and images requested by a resource.
+
+        :type resource: Resource
+        :rtype: (int, int, int, list of str) or None if unknown
+        """
+        memory_mb = 0
+        cpu_count = 0
+        disks = []
+        try:
+            if resource.vm:
+                vm = Vm.from_thrift(resource.vm)
+                memory_mb = int(
+                    vm.flavor.cost["vm.memory"].convert(Unit.MB))
+                cpu_count = int(vm.flavor.cost["vm.cpu"].convert(Unit.COUNT))
+                disks = vm.disks
+            elif resource.disks:
+                disks = [Disk.from_thrift(disk) for disk in resource.disks]
+        except (AttributeError, KeyError, TypeError, ValueError), e:
+            self._logger.info("Can't estimate resource demand: %s" % e)
+            return None
+
+        image_ids = [disk.image.id for disk in disks if disk.image]
+        return (memory_mb, cpu_count, self._diskutil.disks_capacity_gb(disks),
+                image_ids)
+
+    def _utilization(self, used, total):
+        if total <= 0:
+            return None
+        ratio = float(used) / total
+        if ratio > PlacementManager.MAX_USAGE:
+            return None
+        return self._score(ratio)
+
+    @staticmethod
+    def _score(ratio):
+        return PlacementManager.MAX_SCORE - int(round(ratio * 100))
@@ -11,35 +11,57 @@
 # under the License.
 
 import logging
+import math
+import random
 import threading
+import time
 
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 
 import common
 from common.lock import locked
+from common.photon_thrift.encoded_request import EncodedRequest
 from common.count_up_down_latch import CountUpDownLatch
 from common.photon_thrift.decorators import log_request
 from common.service_name import ServiceName
+from common.stats import Counters
+from common.stats import LatencyStats
+from common.thread import Periodic
 from enum import Enum
 from gen.common.ttypes import ServerAddress
 from gen.scheduler.ttypes import FindResponse
 from gen.scheduler.ttypes import FindResultCode
+from gen.scheduler.ttypes import PlaceExecutionMode
+from gen.scheduler.ttypes import PlaceRequest
 from gen.scheduler.ttypes import PlaceResponse
 from gen.scheduler.ttypes import PlaceResultCode
 from host.hypervisor.resources import ChildInfo
 from scheduler.base_scheduler import BaseScheduler
 from scheduler.base_scheduler import InvalidScheduler
 from scheduler.health_checker import HealthChecker
+from scheduler.host_summary import HostSummaryCache
+from scheduler.host_summary import SummaryRanker
+from scheduler.location_cache import LocationCache
 from scheduler.scheduler_client import SchedulerClient
 from scheduler.strategy.default_scorer import DefaultScorer
+from scheduler.strategy.latency_aware_strategy import LatencyAwareStrategy
 from scheduler.strategy.random_subset_strategy import RandomSubsetStrategy
+from scheduler.strategy.random_subset_strategy import ScoringHelper
 
 from common.log import log_duration
 
 
 FIND_TIMEOUT = 30
 
+# Timeout of a find request sent to the agent a resource location is cached
+# for, before falling back to asking all the agents.
+CACHED_FIND_TIMEOUT = 5
+
+# Smallest client timeout of a find request sent to an agent. A zero timeout
+# would mean no timeout at all to the thrift client.
+MIN_FIND_TIMEOUT = 0.1
+
 INITIAL_PLACE_TIMEOUT = 4
 SERIAL_PLACE_TIMEOUT = 1
 PLACE_TIMEOUT = 8
@@ -47,6 +69,40 @@ MIN_PLACE_FAN_OUT = 2
 MAX_PLACE_FAN_OUT = 4
 PLACE_FAN_OUT_RATIO = 0.15
 
+# Hedged placement: maximum number of spare children that can receive a
+# backup place request, and the minimum number of place RPC latency samples
+# needed before their p95 is trusted as the hedge delay.
+MAX_PLACE_SPARES = 2
+MIN_HEDGE_SAMPLES = 20
+
+# Cached score placement: number of best ranked children that receive a place
+# request to confirm the placement, and the max age of a child's resource
+# summary when there is no health checker to derive it from.
+CACHED_SCORE_FAN_OUT = 2
+HOST_SUMMARY_MAX_AGE = 60
+
+# Batch placement: max number of resources of a batch assigned to the same
+# host. All the responses of a host carry the same generation and every
+# reservation bumps it, so this is half the generation gap allowed by the
+# host on reserve (HostHandler.GENERATION_GAP), which leaves the other half
+# to reservations of other placements made meanwhile.
+MAX_BATCH_PER_HOST = 5
+
+# Interval in seconds between the logs of the placement stats.
+PLACEMENT_STATS_INTERVAL = 300
+
+# Result of a placement no child could satisfy, most relevant first.
+PLACE_FAILURES = [PlaceResultCode.NOT_ENOUGH_CPU_RESOURCE,
+                  PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE,
+                  PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY,
+                  PlaceResultCode.NO_SUCH_RESOURCE]
+
+# Strategies picking the children that receive a place request, by name.
+PLACE_STRATEGIES = {
+    "random": RandomSubsetStrategy,
+    "latency_aware": LatencyAwareStrategy,
+}
+
 
 # Legal configuration states for the leaf scheduler object.
 ConfigStates = Enum('ConfigStates', 'UNINITIALIZED INITIALIZED')
@@ -55,24 +111,42 @@ ConfigStates = Enum('ConfigStates', 'UNINITIALIZED INITIALIZED')
 class LeafScheduler(BaseScheduler):
     """Leaf scheduler manages child hosts."""
 
-    def __init__(self, scheduler_id, ut_ratio, enable_health_checker=True):
+    def __init__(self, scheduler_id, ut_ratio, enable_health_checker=True,
+                 place_strategy="random"):
         """Create a new leaf scheduler.
 
         :param scheduler_id: scheduler id
         :type scheduler_id: str
         :type enable_health_checker: enables health checking of children.
+        :param place_strategy: name of the strategy picking the children
+                               that receive a place request, see
+                               PLACE_STRATEGIES
+        :type place_strategy: str
         """
         self._logger = logging.getLogger(__name__)
         self._logger.info("Creating leaf scheduler: %s" % scheduler_id)
+        if place_strategy not in PLACE_STRATEGIES:
+            raise ValueError("Unknown place strategy: %s" % place_strategy)
         self.lock = threading.RLock()
         self._latch = CountUpDownLatch()
-        self._place_strategy = RandomSubsetStrategy(PLACE_FAN_OUT_RATIO,
-                                                    MIN_PLACE_FAN_OUT,
-                                                    MAX_PLACE_FAN_OUT)
+        self._place_strategy = PLACE_STRATEGIES[place_strategy](
+            PLACE_FAN_OUT_RATIO, MIN_PLACE_FAN_OUT, MAX_PLACE_FAN_OUT)
         self._scheduler_id = scheduler_id
         self._hosts = []
+        self._hosts_by_id = {}
+        self._constraint_index = self._index_constraints(self._hosts)
+        self._ut_ratio = ut_ratio
         self._scorer = DefaultScorer(ut_ratio)
+        self._host_summaries = HostSummaryCache(HOST_SUMMARY_MAX_AGE)
+        self._summary_ranker = SummaryRanker(self._scorer)
+        self._locations = LocationCache()
         self._threadpool = None
+        self._place_rpc_latency = LatencyStats()
+        self._place_latency = dict(
+            (mode, LatencyStats())
+            for mode in PlaceExecutionMode._VALUES_TO_NAMES)
+        self._place_counters = Counters()
+        self._stats_logger = None
         self._initialize_services(scheduler_id)
         self._health_checker = None
         self._enable_health_checker = enable_health_checker
@@ -97,6 +171,11 @@ class LeafScheduler(BaseScheduler):
             self._hosts.append(ChildInfo.from_thrift(host))
 
         self._coalesce_resources(self._hosts)
+        self._constraint_index = self._index_constraints(self._hosts)
+        self._hosts_by_id = dict((host.id, host) for host in self._hosts)
+        self._host_summaries.retain(self._hosts_by_id)
+        self._locations.retain(self._hosts_by_id)
+        self._place_strategy.retain(self._hosts_by_id)
 
         if self._health_checker:
             self._health_checker.stop()
@@ -105,11 +184,47 @@ class LeafScheduler(BaseScheduler):
             agent_config = common.services.get(ServiceName.AGENT_CONFIG)
             children = dict((host.id, ServerAddress(host.address, host.port))
                             for host in self._hosts)
-            self._health_checker = HealthChecker(self._scheduler_id, children,
-                                                 agent_config)
+            self._host_summaries.max_age = \
+                agent_config.heartbeat_interval_sec * \
+                agent_config.heartbeat_timeout_factor
+            self._health_checker = HealthChecker(
+                self._scheduler_id, children, agent_config,
+                summary_listener=self._on_host_summary)
             self._health_checker.start()
+        if self._stats_logger is None:
+            self._stats_logger = Periodic(self._log_placement_stats,
+                                          PLACEMENT_STATS_INTERVAL)
+            self._stats_logger.daemon = True
+            self._stats_logger.start()
         self._configured = ConfigStates.INITIALIZED
 
+    @locked
+    def _get_constraint_index(self):
+        """
+        Get the constraint index for the current set of hosts. The index
+        keeps a reference to the host list it was built from, which is never
+        modified after configure, so it can be used without the lock.
+        :rtype: ConstraintIndex
+        """
+        return self._constraint_index
+
+    @locked
+    def _get_host(self, host_id):
+        """
+        :type host_id: str
+        :rtype: ChildInfo or None if the host is not a child
+        """
+        return self._hosts_by_id.get(host_id)
+
+    def _on_host_summary(self, summary):
+        """Called by the health checker with each child's summary.
+
+        :type summary: HostSummary
+        """
+        self._host_summaries.update(summary)
+        if summary.vm_ids is not None:
+            self._locations.update_vms(summary.agent_id, summary.vm_ids)
+
     @locked
     def _get_hosts(self):
         """
@@ -152,23 +267,76 @@ class LeafScheduler(BaseScheduler):
         # Host service only has a single scheduler
         request.scheduler_id = None
 
+        deadline = time.time() + self._find_timeout(request, FIND_TIMEOUT)
+
+        response = self._find_cached(request, deadline)
+        if response is not None:
+            return response
+
+        timeout = deadline - time.time()
+        if timeout <= 0:
+            self._place_counters.increment("find_deadline_exceeded")
+            return FindResponse(FindResultCode.NOT_FOUND)
+        timeout = max(timeout, MIN_FIND_TIMEOUT)
+        encoded = EncodedRequest(request).copy()
         futures = []
         for agent in self._get_hosts():
             future = self._threadpool.submit(
                 self._find_worker, agent.address, agent.port,
-                agent.id, request)
+                agent.id, encoded, timeout)
             futures.append(future)
 
-        done, not_done = concurrent.futures.wait(futures, timeout=FIND_TIMEOUT)
-        self._logger.info("Find responses received: %d, timed out: %d",
-                          len(done), len(not_done))
+        response = self._first_found(futures, timeout)
+        if response is None:
+            return FindResponse(FindResultCode.NOT_FOUND)
 
-        for future in done:
-            response = future.result()
-            if response.result == FindResultCode.OK:
-                return response
+        self._locations.update(request.locator, response.agent_id)
+        return response
+
+    def _find_cached(self, request, deadline):
+        """Ask the agent the resource location is cached for.
+
+        :type request: FindRequest
+        :param deadline: time the find must be answered by
+        :type deadline: float
+        :rtype: FindResponse or None if the location is unknown or stale
+        """
+        agent_id = self._locations.get(request.locator)
+        if agent_id is None:
+            self._place_counters.increment("find_cache_misses")
+            return None
+
+        timeout = self._cached_find_timeout(deadline)
+        if timeout is None:
+            # Out of time, the cached location isn't known to be stale
+            return None
+
+        agent = self._get_host(agent_id)
+        if agent is not None:
+            try:
+                response = self._find_worker(agent.address, agent.port,
+                                             agent.id, request, timeout)
+                if response.result == FindResultCode.OK:
+                    self._place_counters.increment("find_cache_hits")
+                    return response
+            except Exception, e:
+                self._logger.info("Find on cached agent %s failed: %s",
+                                  agent_id, e)
 
-        return FindResponse(FindResultCode.NOT_FOUND)
+        self._place_counters.increment("find_cache_stale")
+        self._locations.invalidate(request.locator)
+        return None
+
+    @staticmethod
+    def _cached_find_timeout(deadline):
+        """Get the timeout of the find sent to the cached agent.
+
+        :rtype: float or None if the find is out of time
+        """
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        return max(min(CACHED_FIND_TIMEOUT, remaining), MIN_FIND_TIMEOUT)
 
     @mark_pending
     def place(self, request):
@@ -183,37 +351,34 @@ class LeafScheduler(BaseScheduler):
 
         request.scheduler_id = None
 
+        mode = self._execution_mode(request)
         constraints = self._collect_constraints(request.resource)
-        selected = self._placement_hosts(request, constraints)
+        if mode == PlaceExecutionMode.HEDGED:
+            selected, spares = self._placement_hosts_with_spares(
+                request, constraints)
+        elif mode == PlaceExecutionMode.CACHED_SCORE:
+            selected = self._placement_hosts_by_summary(request, constraints)
+            spares = []
+        else:
+            selected = self._placement_hosts(request, constraints)
+            spares = []
         if len(selected) == 0:
             return PlaceResponse(PlaceResultCode.NO_SUCH_RESOURCE)
 
         selected = self._filter_missing_hosts(selected)
-        done = self._execute_placement(selected, request)
+        spares = self._filter_missing_hosts(spares)
+        done = self._execute_placement(selected, request, mode, spares)
 
         responses = []
-        no_such_resource = False
-        not_enough_memory_resource = False
-        not_enough_cpu_resource = False
-        not_enough_datastore_capacity = False
+        failures = set()
 
         for future in done:
             try:
                 response = future.result()
                 if response.result == PlaceResultCode.OK:
                     responses.append(response)
-                elif response.result == \
-                        PlaceResultCode.NOT_ENOUGH_CPU_RESOURCE:
-                    not_enough_cpu_resource = True
-                elif response.result == \
-                        PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE:
-                    not_enough_memory_resource = True
-                elif response.result == \
-                        PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY:
-                    not_enough_datastore_capacity = True
-                elif response.result == \
-                        PlaceResultCode.NO_SUCH_RESOURCE:
-                    no_such_resource = True
+                else:
+                    failures.add(response.result)
             except Exception, e:
                 self._logger.warning(
                     "Caught exception while sending "
@@ -222,17 +387,131 @@ class LeafScheduler(BaseScheduler):
         best_response = self._scorer.score(responses)
 
         if best_response is not None:
+            self._locations.update_resource(request.resource,
+                                            best_response.agent_id)
+            if mode == PlaceExecutionMode.CACHED_SCORE:
+                # The chosen host is about to get a reservation, so its
+                # summary is outdated until it reports again.
+                self._host_summaries.invalidate(best_response.agent_id)
             return best_response
-        elif not_enough_cpu_resource:
-            return PlaceResponse(PlaceResultCode.NOT_ENOUGH_CPU_RESOURCE)
-        elif not_enough_memory_resource:
-            return PlaceResponse(PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE)
-        elif not_enough_datastore_capacity:
-            return PlaceResponse(PlaceResultCode.NOT_ENOUGH_DATASTORE_CAPACITY)
-        elif no_such_resource:
-            return PlaceResponse(PlaceResultCode.NO_SUCH_RESOURCE)
-        else:
-            return PlaceResponse(PlaceResultCode.SYSTEM_ERROR)
+        return self._failure_response(failures)
+
+    @mark_pending
+    def place_batch(self, request):
+        """Place a batch of resources, spreading them across hosts.
+
+        Every selected host places the whole batch, each resource as if the
+        ones before it had been reserved on the host. The resources are then
+        assigned one at a time to the host with the best score given the
+        resources already assigned to it.
+
+        :type request: PlaceBatchRequest
+        :rtype: PlaceBatchResponse
+        :raise: InvalidScheduler
+        """
+        if self._configured == ConfigStates.UNINITIALIZED:
+            raise InvalidScheduler()
+
+        request.scheduler_id = None
+        count = len(request.resources)
+        if count == 0:
+            return self._batch_response([])
+
+        constraints = set()
+        for resource in request.resources:
+            constraints.update(self._collect_constraints(resource))
+        place_request = PlaceRequest(
+            resource=request.resources[0],
+            leafSchedulerParams=request.leafSchedulerParams)
+
+        # Make sure there are enough hosts to take the whole batch.
+        min_hosts = int(math.ceil(float(count) / MAX_BATCH_PER_HOST))
+        index = self._get_constraint_index()
+        selected, spares = self._place_strategy.filter_child_with_spares(
+            index.children, place_request, list(constraints), min_hosts,
+            index=index)
+        selected = (selected + spares)[:max(len(selected), min_hosts)]
+        selected = self._filter_missing_hosts(selected)
+        if len(selected) == 0:
+            return self._batch_response(
+                [PlaceResponse(PlaceResultCode.NO_SUCH_RESOURCE)
+                 for _ in range(count)])
+
+        encoded = EncodedRequest(request).copy()
+        futures = [self._threadpool.submit(self._place_batch_worker,
+                                           agent.address, agent.port,
+                                           agent.id, encoded)
+                   for agent in selected]
+        done, not_done = concurrent.futures.wait(
+            futures, timeout=self._place_timeout(place_request))
+        self._logger.info("Batch place responses received: %d, "
+                          "timed out: %d", len(done), len(not_done))
+
+        host_responses = []
+        for future in done:
+            try:
+                response = future.result()
+            except Exception, e:
+                self._logger.warning(
+                    "Caught exception while sending "
+                    "batch place request: %s", str(e))
+                continue
+            if response.responses and len(response.responses) == count:
+                host_responses.append(response.responses)
+
+        return self._batch_response(self._spread_batch(host_responses,
+                                                       count))
+
+    def _spread_batch(self, host_responses, count):
+        """Assign each resource of a batch to a host.
+
+        The k-th response of a host scores the host as if k resources had
+        already been placed on it, so it is used to rank the host once k
+        resources are assigned to it.
+
+        :param host_responses: list of per host list of PlaceResponse
+        :param count: number of resources in the batch
+        :rtype: list of PlaceResponse
+        """
+        assigned = [0] * len(host_responses)
+        capacity = [min(MAX_BATCH_PER_HOST,
+                        len([r for r in responses
+                             if r.result == PlaceResultCode.OK]))
+                    for responses in host_responses]
+
+        placed = []
+        for i in range(count):
+            best = None
+            failures = set()
+            for host, responses in enumerate(host_responses):
+                if responses[i].result != PlaceResultCode.OK:
+                    failures.add(responses[i].result)
+                    continue
+                if assigned[host] >= capacity[host]:
+                    continue
+                projected = responses[assigned[host]]
+                if projected.result != PlaceResultCode.OK:
+                    projected = responses[i]
+                score = self._scorer.score_formula(projected.score)
+                if best is None or score > best[0]:
+                    best = (score, host)
+
+            if best is None:
+                placed.append(self._failure_response(failures))
+            else:
+                assigned[best[1]] += 1
+                placed.append(host_responses[best[1]][i])
+        return placed
+
+    def _failure_response(self, failures):
+        """
+        :param failures: set of PlaceResultCode returned by children
+        :rtype: PlaceResponse
+        """
+        for result in PLACE_FAILURES:
+            if result in failures:
+                return PlaceResponse(result)
+        return PlaceResponse(PlaceResultCode.SYSTEM_ERROR)
 
     def _filter_missing_hosts(self, selected_hosts):
         if self._health_checker is None:
@@ -242,8 +521,53 @@ class LeafScheduler(BaseScheduler):
                           if host.id not in missing]
         return filtered_hosts
 
-    def _execute_placement(self, agents, request):
-        return self._execute_placement_serial(agents, request)
+    def get_placement_stats(self):
+        """Get latency percentiles for each placement execution mode.
+
+        :rtype: dict
+        """
+        stats = {}
+        for mode, latency in self._place_latency.iteritems():
+            name = PlaceExecutionMode._VALUES_TO_NAMES[mode]
+            stats[name] = latency.snapshot()
+        stats["rpc"] = self._place_rpc_latency.snapshot()
+        stats["counters"] = self._place_counters.snapshot()
+        return stats
+
+    def _log_placement_stats(self):
+        self._logger.info("Placement stats of leaf scheduler %s: %s",
+                          self._scheduler_id, self.get_placement_stats())
+
+    def _execution_mode(self, request):
+        params = request.leafSchedulerParams
+        if params is None:
+            return PlaceExecutionMode.SERIAL
+        if params.executionMode not in PlaceExecutionMode._VALUES_TO_NAMES:
+            return PlaceExecutionMode.SERIAL
+        return params.executionMode
+
+    def _execute_placement(self, agents, request,
+                           mode=PlaceExecutionMode.SERIAL, spares=None):
+        if spares is None:
+            spares = []
+        start = time.time()
+        # All the agents get the same request, serialize it only once.
+        request = EncodedRequest(request).copy()
+        try:
+            if mode == PlaceExecutionMode.HEDGED:
+                return self._execute_placement_hedged(agents, spares,
+                                                      request)
+            elif mode in (PlaceExecutionMode.CONCURRENT,
+                          PlaceExecutionMode.CACHED_SCORE):
+                return self._execute_placement_concurrent(agents, request)
+            else:
+                return self._execute_placement_serial(agents, request)
+        finally:
+            latency = self._place_latency[mode]
+            latency.record(time.time() - start)
+            self._logger.debug("%s placement latency: %s",
+                               PlaceExecutionMode._VALUES_TO_NAMES[mode],
+                               latency.snapshot())
 
     def _execute_placement_concurrent(self, agents, request):
         futures = []
@@ -268,6 +592,105 @@ class LeafScheduler(BaseScheduler):
 
         return done
 
+    @log_duration
+    def _execute_placement_hedged(self, agents, spares, request):
+        """Send place requests to all the agents in parallel.
+
+        Stops waiting as soon as enough OK responses are in the top score
+        deviation band. If that doesn't happen before the p95 place latency
+        has elapsed, or all the agents have responded without enough OK
+        responses, backup requests are sent to the spare agents.
+
+        :type agents: list of ChildInfo
+        :type spares: list of ChildInfo
+        :type request: PlaceRequest
+        :rtype: list of completed futures
+        """
+        start = time.time()
+        deadline = start + self._place_timeout(request)
+        hedge_time = start + self._hedge_delay()
+        min_ok = self._min_ok_responses(request, len(agents))
+        spares = list(spares)
+
+        futures = [self._submit_place(agent, request) for agent in agents]
+        pending = set(futures)
+        ok_responses = []
+
+        while pending:
+            now = time.time()
+            if now >= deadline:
+                break
+
+            if spares:
+                wake_up = min(hedge_time, deadline)
+            else:
+                wake_up = deadline
+
+            done, pending = concurrent.futures.wait(
+                pending, timeout=max(wake_up - now, 0),
+                return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None and \
+                        future.result().result == PlaceResultCode.OK:
+                    ok_responses.append(future.result())
+
+            if len(ok_responses) >= min_ok:
+                top = ScoringHelper(ok_responses, self._ut_ratio).get_top_k()
+                if len(top) >= min_ok:
+                    self._place_counters.increment("early_terminations")
+                    break
+
+            if spares and (not pending or time.time() >= hedge_time):
+                backups = spares[:max(len(pending),
+                                      min_ok - len(ok_responses))]
+                spares = []
+                self._logger.info("Sending hedged place requests to: [%s]",
+                                  ",".join(agent.id for agent in backups))
+                self._place_counters.increment("hedged_requests",
+                                               len(backups))
+                for agent in backups:
+                    future = self._submit_place(agent, request)
+                    futures.append(future)
+                    pending.add(future)
+
+        done = [f for f in futures if f.done()]
+        self._logger.info("Hedged place responses received: %d, OK: %d, "
+                          "timed out: %d", len(done), len(ok_responses),
+                          len(futures) - len(done))
+        return done
+
+    def _submit_place(self, agent, request):
+        return self._threadpool.submit(
+            self._place_worker, agent.address, agent.port,
+            agent.id, request)
+
+    def _place_timeout(self, request):
+        params = request.leafSchedulerParams
+        if params is not None and params.timeout:
+            return params.timeout / 1000.0
+        return PLACE_TIMEOUT
+
+    def _hedge_delay(self):
+        """Time to wait before sending backup place requests.
+
+        Uses the p95 latency of place RPCs once there are enough samples.
+        """
+        if self._place_rpc_latency.count < MIN_HEDGE_SAMPLES:
+            return SERIAL_PLACE_TIMEOUT
+        return self._place_rpc_latency.percentile(95)
+
+    def _min_ok_responses(self, request, fanout):
+        params = request.leafSchedulerParams
+        min_ok = MIN_PLACE_FAN_OUT
+        if params is not None:
+            if params.fastPlaceResponseMinCount is not None:
+                min_ok = params.fastPlaceResponseMinCount
+            if params.fastPlaceResponseRatio is not None:
+                min_ok = max(min_ok, int(math.ceil(
+                    params.fastPlaceResponseRatio * fanout)))
+        return max(min(min_ok, fanout), 1)
+
     @log_duration
     def _execute_placement_serial(self, agents, request):
         futures = []
@@ -290,9 +713,46 @@ class LeafScheduler(BaseScheduler):
         return futures
 
     def _placement_hosts(self, request, constraints):
-        return self._place_strategy.filter_child(self._get_hosts(),
+        index = self._get_constraint_index()
+        return self._place_strategy.filter_child(index.children,
                                                  request,
-                                                 constraints)
+                                                 constraints,
+                                                 index=index)
+
+    def _placement_hosts_with_spares(self, request, constraints):
+        index = self._get_constraint_index()
+        return self._place_strategy.filter_child_with_spares(
+            index.children, request, constraints, MAX_PLACE_SPARES,
+            index=index)
+
+    def _placement_hosts_by_summary(self, request, constraints):
+        """Select the children with the best estimated scores.
+
+        Children without a recent summary are only selected to make up for
+        a lack of ranked children. Falls back to the random subset strategy
+        if no child could be ranked.
+        """
+        index = self._get_constraint_index()
+        if constraints:
+            candidates = index.filter(constraints)
+        else:
+            candidates = index.children
+        candidates = self._filter_missing_hosts(candidates)
+
+        ranked, unknown = self._summary_ranker.rank(
+            candidates, request, self._host_summaries)
+        if not ranked:
+            self._place_counters.increment("cached_score_fallbacks")
+            return self._placement_hosts(request, constraints)
+
+        selected = ranked[:CACHED_SCORE_FAN_OUT]
+        if len(selected) < CACHED_SCORE_FAN_OUT and unknown:
+            selected += random.sample(
+                unknown, min(len(unknown),
+                             CACHED_SCORE_FAN_OUT - len(selected)))
+        self._logger.info("Selected by cached score: [%s]",
+                          ",".join(child.id for child in selected))
+        return selected
 
     def _find_worker(self, address, port, agent_id, request,
                      client_timeout=FIND_TIMEOUT):
@@ -319,9 +779,32 @@ class LeafScheduler(BaseScheduler):
         :type request: PlaceRequest
         :rtype: PlaceResponse
         """
+        start = time.time()
+        failed = True
+        try:
+            with self._scheduler_client.connect(address, port, agent_id,
+                                                client_timeout) as client:
+                response = client.host_place(request)
+            failed = response.result == PlaceResultCode.SYSTEM_ERROR
+            return response
+        finally:
+            latency = time.time() - start
+            self._place_rpc_latency.record(latency)
+            self._place_strategy.record_response(agent_id, latency, failed)
+
+    def _place_batch_worker(self, address, port, agent_id, request,
+                            client_timeout=PLACE_TIMEOUT):
+        """Invokes Host.place_batch on a single agent.
+
+        :type address: str
+        :type port: int
+        :type agent_id: str
+        :type request: PlaceBatchRequest
+        :rtype: PlaceBatchResponse
+        """
         with self._scheduler_client.connect(address, port, agent_id,
                                             client_timeout) as client:
-            return client.host_place(request)
+            return client.host_place_batch(request)
 
     def cleanup(self):
         """ Sets the configured flag to be false.
@@ -337,5 +820,8 @@ class LeafScheduler(BaseScheduler):
         self._latch.await()
         if self._health_checker:
             self._health_checker.stop()
+        if self._stats_logger:
+            self._stats_logger.stop()
+            self._stats_logger = None
         self._logger.info("Cleaned up leaf scheduler")
         self._configured = ConfigStates.UNINITIALIZED
@@ -0,0 +1,165 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import collections
+import itertools
+import threading
+
+
+DEFAULT_MAX_SIZE = 100000
+
+VM = "vm"
+DISK = "disk"
+
+
+class LocationCache(object):
+    """Maps VM and disk ids to the agent that owns them.
+
+    Entries are hints: a VM or disk may have moved or been deleted since it
+    was cached, so callers must check the cached agent's answer and
+    invalidate the entry if it is wrong. The least recently used entries are
+    evicted once the cache holds max_size entries.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self._lock = threading.Lock()
+        self._max_size = max_size
+
+        # (kind, id) -> (agent id, stamp of the last access)
+        self._locations = {}
+
+        # (stamp, (kind, id)) of the accesses, oldest first. An access is
+        # stale once the entry was accessed again or deleted.
+        self._accesses = collections.deque()
+        self._stamps = itertools.count()
+
+        # agent id -> set of (kind, id)
+        self._by_agent = collections.defaultdict(set)
+
+    def get(self, locator):
+        """
+        :type locator: Locator
+        :rtype: str, agent id or None
+        """
+        key = self._key(locator)
+        with self._lock:
+            entry = self._locations.get(key)
+            if entry is None:
+                return None
+            self._touch(key, entry[0])
+            return entry[0]
+
+    def update(self, locator, agent_id):
+        """
+        :type locator: Locator
+        :type agent_id: str
+        """
+        key = self._key(locator)
+        if key is not None:
+            with self._lock:
+                self._set(key, agent_id)
+
+    def update_resource(self, resource, agent_id):
+        """Cache the location of a placed resource.
+
+        :type resource: Resource
+        :type agent_id: str
+        """
+        keys = []
+        if resource.vm:
+            keys.append((VM, resource.vm.id))
+            keys.extend((DISK, disk.id) for disk in resource.vm.disks or [])
+        keys.extend((DISK, disk.id) for disk in resource.disks or [])
+        with self._lock:
+            for key in keys:
+                self._set(key, agent_id)
+
+    def update_vms(self, agent_id, vm_ids):
+        """Replace the VMs cached for an agent with the VMs it reported.
+
+        :type agent_id: str
+        :type vm_ids: list of str
+        """
+        keys = set((VM, vm_id) for vm_id in vm_ids)
+        with self._lock:
+            for key in self._by_agent.get(agent_id, set()).copy():
+                if key[0] == VM and key not in keys:
+                    self._delete(key)
+            for key in keys:
+                self._set(key, agent_id)
+
+    def invalidate(self, locator):
+        """
+        :type locator: Locator
+        """
+        key = self._key(locator)
+        with self._lock:
+            self._delete(key)
+
+    def retain(self, agent_ids):
+        """Forget the locations on the agents not in agent_ids.
+
+        :type agent_ids: iterable of str
+        """
+        agent_ids = set(agent_ids)
+        with self._lock:
+            for agent_id in self._by_agent.keys():
+                if agent_id not in agent_ids:
+                    for key in self._by_agent[agent_id].copy():
+                        self._delete(key)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._locations)
+
+    def _set(self, key, agent_id):
+        self._delete(key)
+        self._touch(key, agent_id)
+        self._by_agent[agent_id].add(key)
+        while len(self._locations) > self._max_size:
+            self._delete(self._least_recently_used())
+
+    def _touch(self, key, agent_id):
+        stamp = next(self._stamps)
+        self._locations[key] = (agent_id, stamp)
+        self._accesses.append((stamp, key))
+        # Drop the stale accesses once they outnumber the entries
+        if len(self._accesses) > 2 * len(self._locations) + 16:
+            self._accesses = collections.deque(sorted(
+                (entry[1], k) for k, entry in self._locations.iteritems()))
+
+    def _least_recently_used(self):
+        while True:
+            stamp, key = self._accesses.popleft()
+            entry = self._locations.get(key)
+            if entry is not None and entry[1] == stamp:
+                return key
+
+    def _delete(self, key):
+        entry = self._locations.pop(key, None)
+        if entry is None:
+            return
+        agent_id = entry[0]
+        keys = self._by_agent[agent_id]
+        keys.discard(key)
+        if not keys:
+            del self._by_agent[agent_id]
+
+    @staticmethod
+    def _key(locator):
+        if locator is None:
+            return None
+        elif locator.vm:
+            return (VM, locator.vm.id)
+        elif locator.disk:
+            return (DISK, locator.disk.id)
+        return None
@@ -21,6 +21,7 @@ from gen.roles.ttypes import SchedulerRole  # noqa needed for docstring
 from gen.scheduler import Scheduler
 from gen.scheduler.ttypes import FindResponse
 from gen.scheduler.ttypes import FindResultCode
+from gen.scheduler.ttypes import PlaceBatchResponse
 from gen.scheduler.ttypes import PlaceResponse
 from gen.scheduler.ttypes import PlaceResultCode
 from scheduler.base_scheduler import InvalidScheduler
@@ -28,14 +29,16 @@ from scheduler.branch_scheduler import BranchScheduler
 from scheduler.leaf_scheduler import LeafScheduler
 
 
-# TODO(mmutsuzaki) move HostHandler.{find,place} code here.
+# TODO(mmutsuzaki) move HostHandler.{find,place,place_batch,summary} code
+# here.
 class SchedulerHandler(Scheduler.Iface):
 
-    def __init__(self, ut_ratio=9):
+    def __init__(self, ut_ratio=9, place_strategy="random"):
         self._logger = logging.getLogger(__name__)
         self._schedulers = {}
         self._lock = threading.Lock()
         self.ut_ratio = ut_ratio
+        self.place_strategy = place_strategy
 
     def configure(self, scheduler_roles, enable_health_checker=True):
         """Configure the scheduler service.
@@ -54,9 +57,9 @@ class SchedulerHandler(Scheduler.Iface):
                         raise ValueError("can't have schedulers and hosts")
 
                     # Leaf Scheduler
-                    scheduler = self._create_scheduler(role.id, LeafScheduler,
-                                                       enable_health_checker,
-                                                       self.ut_ratio)
+                    scheduler = self._create_scheduler(
+                        role.id, LeafScheduler, enable_health_checker,
+                        self.ut_ratio, place_strategy=self.place_strategy)
                     scheduler.configure(role.host_children)
                 elif role.scheduler_children:
                     # Branch Scheduler
@@ -111,6 +114,21 @@ class SchedulerHandler(Scheduler.Iface):
             return PlaceResponse(
                 PlaceResultCode.INVALID_SCHEDULER)
 
+    @log_request
+    @error_handler(PlaceBatchResponse, PlaceResultCode)
+    def place_batch(self, request):
+        """Place a batch of resources.
+
+        :type request: PlaceBatchRequest
+        :rtype: PlaceBatchResponse
+        """
+        try:
+            scheduler = self._get_scheduler(request.scheduler_id)
+            return scheduler.place_batch(request)
+        except InvalidScheduler:
+            return PlaceBatchResponse(
+                PlaceResultCode.INVALID_SCHEDULER)
+
     def host_find(self, request):
         """Handles a host_find request.
 
@@ -129,6 +147,24 @@ class SchedulerHandler(Scheduler.Iface):
         host_handler = common.services.get(Host.Iface)
         return host_handler.place(request)
 
+    def host_place_batch(self, request):
+        """Handles a host_place_batch request.
+
+        This is a wrapper to call HostHandler.place_batch in the scheduler
+        threadpool instead of the host threadpool.
+        """
+        host_handler = common.services.get(Host.Iface)
+        return host_handler.place_batch(request)
+
+    def host_summary(self, request):
+        """Handles a host_summary request.
+
+        This is a wrapper to call HostHandler.summary in the scheduler
+        threadpool instead of the host threadpool.
+        """
+        host_handler = common.services.get(Host.Iface)
+        return host_handler.summary(request)
+
     def _get_scheduler(self, scheduler_id):
         """Returns a scheduler for the given id.
 
@@ -144,12 +180,13 @@ class SchedulerHandler(Scheduler.Iface):
         return scheduler
 
     def _create_scheduler(self, scheduler_id, scheduler_type,
-                          enable_health_checker, ut_ratio):
+                          enable_health_checker, ut_ratio, **kwargs):
         """ Create a new scheduler
         :type scheduler_id: str
         :type scheduler_type: class
         :type enable_health_checker: bool
+        :param kwargs: scheduler type specific arguments
         :rtype: BranchScheduler or LeafScheduler
         """
         return scheduler_type(scheduler_id, ut_ratio,
-                              enable_health_checker)
+                              enable_health_checker, **kwargs)
@@ -0,0 +1,124 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import random
+import threading
+import time
+
+from scheduler.strategy.random_subset_strategy import RandomSubsetStrategy
+
+
+# Number of children sampled for each fan-out slot.
+DEFAULT_CHOICES = 2
+
+# Weight of the newest sample in the latency and error averages.
+DEFAULT_DECAY = 0.2
+
+# Time after which the cost of a child that hasn't been picked is halved, so
+# children that were slow once are tried again eventually.
+DEFAULT_HALF_LIFE = 60.0
+
+# How much a 100% error rate multiplies the cost of a child.
+ERROR_PENALTY = 10.0
+
+# Minimum latency recorded for a failed request, so children that fail fast
+# don't look fast.
+ERROR_LATENCY = 1.0
+
+
+class LatencyAwareStrategy(RandomSubsetStrategy):
+    """This strategy picks the children to pass the placement message down
+       with the power of d choices: every fan-out slot goes to the cheapest
+       of d children sampled at random.
+
+       The cost of a child is an exponentially weighted average of its
+       response latency, inflated by its error rate. Sampling keeps the
+       selection random, so requests don't all herd onto the fastest child,
+       while slow and failing children lose most of the draws.
+    """
+
+    def __init__(self, fanout_ratio, min_fanout, max_fanout=None,
+                 choices=DEFAULT_CHOICES, decay=DEFAULT_DECAY,
+                 half_life=DEFAULT_HALF_LIFE):
+        """Constructor
+
+           :type fanout_ratio: double (0,1]
+           :type min_fanout: int, >= 1
+           :type choices: int, >= 1
+           :type decay: double (0,1]
+           :param half_life: seconds, see DEFAULT_HALF_LIFE
+        """
+        super(LatencyAwareStrategy, self).__init__(fanout_ratio, min_fanout,
+                                                   max_fanout)
+        self._choices = choices
+        self._decay = decay
+        self._half_life = half_life
+        self._lock = threading.Lock()
+
+        # child id -> [latency, error rate, time of the last response]
+        self._stats = {}
+
+    def record_response(self, child_id, latency, failed=False):
+        error = 0.0
+        if failed:
+            error = 1.0
+            latency = max(latency, ERROR_LATENCY)
+        now = time.time()
+        with self._lock:
+            stats = self._stats.get(child_id)
+            if stats is None:
+                self._stats[child_id] = [latency, error, now]
+                return
+            stats[0] += self._decay * (latency - stats[0])
+            stats[1] += self._decay * (error - stats[1])
+            stats[2] = now
+
+    def cost(self, child_id):
+        """Get the current cost of a child, 0 if it never responded.
+
+        :type child_id: str
+        :rtype: float
+        """
+        with self._lock:
+            return self._cost(child_id, time.time())
+
+    def retain(self, child_ids):
+        child_ids = set(child_ids)
+        with self._lock:
+            for child_id in self._stats.keys():
+                if child_id not in child_ids:
+                    del self._stats[child_id]
+
+    def _select(self, children, fanout_size, spare_count):
+        now = time.time()
+        with self._lock:
+            costs = dict((child.id, self._cost(child.id, now))
+                         for child in children)
+
+        remaining = list(children)
+        selected = []
+        while remaining and len(selected) < fanout_size + spare_count:
+            sample = random.sample(xrange(len(remaining)),
+                                   min(self._choices, len(remaining)))
+            best = min(sample, key=lambda i: costs[remaining[i].id])
+            selected.append(remaining[best])
+            remaining[best] = remaining[-1]
+            remaining.pop()
+        return selected[:fanout_size], selected[fanout_size:]
+
+    def _cost(self, child_id, now):
+        stats = self._stats.get(child_id)
+        if stats is None:
+            return 0.0
+        latency, error_rate, updated = stats
+        weight = 0.5 ** (max(now - updated, 0) / self._half_life)
+        return weight * latency * (1 + ERROR_PENALTY * error_rate)
@@ -90,14 +90,31 @@ class RandomSubsetStrategy(Strategy):
         self.max_fanout = max_fanout
         self._logger = logging.getLogger(__name__)
 
-    def filter_child(self, children, request, constraints=[]):
+    def filter_child(self, children, request, constraints=[], index=None):
         """filter hosts with acquired resource constraints.
 
         :param children: list of ChildInfo with coalesced resource constraints
         :param request: PlaceRequest
         :param constraints: request's resource constraints
+        :param index: optional ConstraintIndex built from children
         :rtype: list of ChildInfo
         """
+        selected, _ = self.filter_child_with_spares(children, request,
+                                                    constraints, index=index)
+        return selected
+
+    def filter_child_with_spares(self, children, request, constraints=[],
+                                 spare_count=0, index=None):
+        """filter hosts with acquired resource constraints, and also return
+        up to spare_count other matching hosts that were not selected.
+
+        :param children: list of ChildInfo with coalesced resource constraints
+        :param request: PlaceRequest
+        :param constraints: request's resource constraints
+        :param spare_count: maximum number of spare children to return
+        :param index: optional ConstraintIndex built from children
+        :rtype: tuple of (list of ChildInfo, list of ChildInfo)
+        """
         place_params = self._get_place_params(request)
         fanout_size = int(
             math.ceil(len(children) * place_params.fanoutRatio))
@@ -107,6 +124,11 @@ class RandomSubsetStrategy(Strategy):
 
         if len(constraints) == 0:
             result = children[:]
+        elif index is not None:
+            result = index.filter(constraints)
+            self._logger.info(
+                "Scheduler, found [%s] children with constraints: [%s]",
+                [child.id for child in result], constraints)
         else:
             result = [child for child in children
                       if self._satisfy(child, constraints)]
@@ -114,11 +136,22 @@ class RandomSubsetStrategy(Strategy):
                 "Scheduler, found [%s] children with constraints: [%s]",
                 [child.id for child in result], constraints)
 
-        random.shuffle(result)
-        result = result[:fanout_size]
+        result, spares = self._select(result, fanout_size, spare_count)
         self._logger.debug("Fanning out %d children to: [%s]", fanout_size,
                            ",".join(str(child.id) for child in result))
-        return result
+        return result, spares
+
+    def _select(self, children, fanout_size, spare_count):
+        """Pick the children to fan out to among the matching children.
+
+        :param children: list of ChildInfo satisfying the constraints
+        :param fanout_size: number of children to select
+        :param spare_count: maximum number of spare children to return
+        :rtype: tuple of (list of ChildInfo, list of ChildInfo)
+        """
+        random.shuffle(children)
+        return (children[:fanout_size],
+                children[fanout_size:fanout_size + spare_count])
 
     def _satisfy(self, child, constraints):
         """Check if child satisfies constrains
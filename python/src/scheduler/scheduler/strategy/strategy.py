@@ -29,3 +29,22 @@ class Strategy(object):
            :rtype: list of str, selected child scheduler/host ids
         """
         pass
+
+    def record_response(self, child_id, latency, failed=False):
+        """Record how a child handled a request passed down to it.
+
+        Does nothing by default. Strategies that adapt to the children's
+        responsiveness override it.
+
+        :param child_id: child scheduler/host id
+        :param latency: time the child took to respond, in seconds
+        :param failed: whether the request failed
+        """
+        pass
+
+    def retain(self, child_ids):
+        """Forget what was recorded about the children not in child_ids.
+
+        :param child_ids: iterable of child scheduler/host ids
+        """
+        pass
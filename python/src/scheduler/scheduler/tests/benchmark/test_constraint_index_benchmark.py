@@ -0,0 +1,93 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+"""Micro-benchmark of RandomSubsetStrategy.filter_child with and without
+the constraint index.
+
+Run with: make test BENCHMARK=1
+"""
+
+import random
+import time
+import unittest
+
+from hamcrest import *  # noqa
+
+from gen.resource.ttypes import ResourceConstraint
+from gen.resource.ttypes import ResourceConstraintType
+from gen.scheduler.ttypes import PlaceRequest
+from host.hypervisor.resources import ChildInfo
+from scheduler.constraint_index import ConstraintIndex
+from scheduler.strategy.random_subset_strategy import RandomSubsetStrategy
+
+
+ITERATIONS = 200
+TYPES = [ResourceConstraintType.DATASTORE,
+         ResourceConstraintType.DATASTORE_TAG,
+         ResourceConstraintType.NETWORK]
+
+
+class ConstraintIndexBenchmark(unittest.TestCase):
+
+    def _children(self, count, values_per_type):
+        children = []
+        for i in range(count):
+            constraints = []
+            for t in TYPES:
+                values = random.sample(range(values_per_type * 4),
+                                       values_per_type)
+                constraints.append(ResourceConstraint(
+                    t, ["v%d" % j for j in values]))
+            children.append(ChildInfo("child_%d" % i, "addr_%d" % i, 8835,
+                                      constraints))
+        return children
+
+    def _constraints(self, values_per_type):
+        return [ResourceConstraint(t, ["v%d" % random.randrange(
+                    values_per_type * 4)], random.random() < 0.2)
+                for t in random.sample(TYPES, 2)]
+
+    def _run(self, strategy, children, requests, index):
+        start = time.time()
+        for constraints in requests:
+            strategy.filter_child(children, PlaceRequest(), constraints,
+                                  index=index)
+        return (time.time() - start) / len(requests)
+
+    def test_filter_child(self):
+        random.seed(0)
+        strategy = RandomSubsetStrategy(0.15, 2, 4)
+        print
+        for count, values_per_type in [(100, 10), (500, 20), (1000, 50)]:
+            children = self._children(count, values_per_type)
+            requests = [self._constraints(values_per_type)
+                        for _ in range(ITERATIONS)]
+
+            start = time.time()
+            index = ConstraintIndex(children)
+            build = time.time() - start
+
+            for constraints in requests[:10]:
+                expected = [child for child in children
+                            if strategy._satisfy(child, constraints)]
+                assert_that(index.filter(constraints), is_(expected))
+
+            linear = self._run(strategy, children, requests, None)
+            indexed = self._run(strategy, children, requests, index)
+            print ("%4d children, %2d values/type: build %.2fms, "
+                   "filter_child %.3fms -> %.3fms (%.1fx)" %
+                   (count, values_per_type, build * 1000, linear * 1000,
+                    indexed * 1000, linear / indexed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+"""Micro-benchmark of a place request fan-out, copying and serializing the
+request for every child versus serializing it once with EncodedRequest.
+
+Run with: make test BENCHMARK=1
+"""
+
+import copy
+import time
+import unittest
+
+from hamcrest import *  # noqa
+
+from common.photon_thrift.encoded_request import EncodedRequest
+from gen.flavors.ttypes import Flavor
+from gen.flavors.ttypes import QuotaLineItem
+from gen.flavors.ttypes import QuotaUnit
+from gen.resource.ttypes import CloneType
+from gen.resource.ttypes import Disk
+from gen.resource.ttypes import DiskImage
+from gen.resource.ttypes import Resource
+from gen.resource.ttypes import ResourceConstraint
+from gen.resource.ttypes import ResourceConstraintType
+from gen.resource.ttypes import State
+from gen.resource.ttypes import Vm
+from gen.scheduler.Scheduler import place_args
+from gen.scheduler.ttypes import PlaceRequest
+from pthrift.multiplex import TMultiplexedProtocol
+from thrift.protocol import TCompactProtocol
+from thrift.transport import TTransport
+
+
+ITERATIONS = 20
+
+
+def place_request():
+    flavor = Flavor(name="vm", cost=[
+        QuotaLineItem("vm.memory", "2", QuotaUnit.GB),
+        QuotaLineItem("vm.cpu", "1", QuotaUnit.COUNT)])
+    disks = [Disk(id="disk_%d" % i, flavor="disk", persistent=True,
+                  new_disk=i > 0, capacity_gb=20,
+                  image=DiskImage("image", CloneType.COPY_ON_WRITE))
+             for i in range(4)]
+    constraints = [
+        ResourceConstraint(ResourceConstraintType.DATASTORE_TAG, ["shared"]),
+        ResourceConstraint(ResourceConstraintType.NETWORK,
+                           ["net_%d" % i for i in range(4)])]
+    vm = Vm(id="vm", flavor="vm", state=State.STOPPED, flavor_info=flavor,
+            disks=disks, resource_constraints=constraints)
+    return PlaceRequest(resource=Resource(vm=vm))
+
+
+def send(request):
+    buf = TTransport.TMemoryBuffer()
+    protocol = TMultiplexedProtocol(TCompactProtocol.TCompactProtocol(buf),
+                                    "Scheduler")
+    protocol.writeMessageBegin("place", 1, 0)
+    place_args(request=request).write(protocol)
+    protocol.writeMessageEnd()
+    return buf.getvalue()
+
+
+class EncodedRequestBenchmark(unittest.TestCase):
+
+    def _deep_copy(self, request, children):
+        for child in children:
+            child_request = copy.deepcopy(request)
+            child_request.scheduler_id = child
+            send(child_request)
+
+    def _encoded(self, request, children):
+        encoded = EncodedRequest(request, "scheduler_id")
+        for child in children:
+            send(encoded.copy(child))
+
+    def _run(self, fan_out, request, children):
+        start = time.time()
+        for _ in range(ITERATIONS):
+            fan_out(request, children)
+        return (time.time() - start) / ITERATIONS
+
+    def test_fan_out(self):
+        request = place_request()
+        encoded = EncodedRequest(request, "scheduler_id")
+        expected = copy.deepcopy(request)
+        expected.scheduler_id = "child_0"
+        assert_that(send(encoded.copy("child_0")), is_(send(expected)))
+
+        print
+        for count in [10, 100, 500]:
+            children = ["child_%d" % i for i in range(count)]
+            deep_copy = self._run(self._deep_copy, request, children)
+            encoded = self._run(self._encoded, request, children)
+            print ("%3d children: deepcopy+serialize %.2fms -> "
+                   "serialize once %.2fms (%.1fx)" %
+                   (count, deep_copy * 1000, encoded * 1000,
+                    deep_copy / encoded))
+
+
+if __name__ == '__main__':
+    unittest.main()
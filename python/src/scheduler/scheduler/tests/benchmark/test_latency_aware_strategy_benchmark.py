@@ -0,0 +1,110 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+"""Simulation of the place fan-out latency with RandomSubsetStrategy and
+LatencyAwareStrategy.
+
+Each simulated place request fans out like LeafScheduler.place and completes
+when the slowest selected host responds. A few hosts are slow or failing, and
+the slow set changes halfway through the run.
+
+Run with: make test BENCHMARK=1
+"""
+
+import random
+import unittest
+
+from hamcrest import *  # noqa
+
+from gen.scheduler.ttypes import PlaceRequest
+from host.hypervisor.resources import ChildInfo
+from scheduler.leaf_scheduler import MAX_PLACE_FAN_OUT
+from scheduler.leaf_scheduler import MIN_PLACE_FAN_OUT
+from scheduler.leaf_scheduler import PLACE_FAN_OUT_RATIO
+from scheduler.leaf_scheduler import PLACE_TIMEOUT
+from scheduler.strategy.latency_aware_strategy import LatencyAwareStrategy
+from scheduler.strategy.random_subset_strategy import RandomSubsetStrategy
+
+
+HOSTS = 64
+REQUESTS = 20000
+SLOW_HOSTS = 6
+FAILING_HOSTS = 2
+
+
+class Cluster(object):
+
+    def __init__(self):
+        self.slow = set()
+        self.failing = set(random.sample(range(HOSTS), FAILING_HOSTS))
+
+    def shuffle_slow_hosts(self):
+        healthy = [i for i in range(HOSTS) if i not in self.failing]
+        self.slow = set(random.sample(healthy, SLOW_HOSTS))
+
+    def respond(self, host):
+        """Returns the latency of a place request, and whether it failed."""
+        if host in self.failing:
+            return random.uniform(0.001, 0.005), True
+        latency = random.lognormvariate(-4, 0.5)  # ~20ms
+        if host in self.slow:
+            latency *= 20
+        return min(latency, PLACE_TIMEOUT), False
+
+
+class LatencyAwareStrategyBenchmark(unittest.TestCase):
+
+    def _simulate(self, strategy):
+        random.seed(0)
+        cluster = Cluster()
+        children = [ChildInfo(str(i), "addr_%d" % i, 8835)
+                    for i in range(HOSTS)]
+        latencies = []
+        failures = 0
+        for i in range(REQUESTS):
+            if i % (REQUESTS / 2) == 0:
+                cluster.shuffle_slow_hosts()
+            selected = strategy.filter_child(children, PlaceRequest())
+            slowest = 0
+            for child in selected:
+                latency, failed = cluster.respond(int(child.id))
+                strategy.record_response(child.id, latency, failed)
+                slowest = max(slowest, latency)
+                failures += failed
+            latencies.append(slowest)
+
+        latencies.sort()
+        return (latencies[len(latencies) / 2],
+                latencies[int(len(latencies) * 0.99)],
+                float(failures) / REQUESTS)
+
+    def test_fan_out_latency(self):
+        print
+        results = {}
+        for name, strategy_class in [("random", RandomSubsetStrategy),
+                                     ("latency_aware", LatencyAwareStrategy)]:
+            strategy = strategy_class(PLACE_FAN_OUT_RATIO, MIN_PLACE_FAN_OUT,
+                                      MAX_PLACE_FAN_OUT)
+            results[name] = self._simulate(strategy)
+            print ("%-14s p50 %6.1fms, p99 %6.1fms, failed responses per "
+                   "request %.3f" % ((name, results[name][0] * 1000,
+                                      results[name][1] * 1000,
+                                      results[name][2])))
+
+        assert_that(results["latency_aware"][1],
+                    less_than(results["random"][1]))
+        assert_that(results["latency_aware"][2],
+                    less_than(results["random"][2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
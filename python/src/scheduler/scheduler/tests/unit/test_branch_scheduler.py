@@ -10,9 +10,11 @@
 # License for then specific language governing permissions and limitations
 # under the License.
 
+import threading
 import unittest
 
 from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError
 from hamcrest import *  # noqa
 from mock import MagicMock
 from mock import patch
@@ -26,6 +28,7 @@ from gen.resource.ttypes import ResourceConstraintType
 from gen.resource.ttypes import Vm
 from gen.roles.ttypes import ChildInfo
 from gen.scheduler import Scheduler
+from gen.scheduler.ttypes import FindParams
 from gen.scheduler.ttypes import FindRequest
 from gen.scheduler.ttypes import FindResponse
 from gen.scheduler.ttypes import FindResultCode
@@ -67,7 +70,8 @@ class BranchSchedulerTestCase(unittest.TestCase):
         scheduler.configure([ChildInfo(id="bar", address="bar")])
         scheduler.find(FindRequest())
 
-        client.find.assert_called_with(FindRequest(scheduler_id="bar"))
+        client.find.assert_called_with(FindRequest(
+            scheduler_id="bar", params=FindParams(30000)))
 
     @patch("common.photon_thrift.rpc_client.DirectClient")
     def test_find_resource_found(self, client_class):
@@ -112,8 +116,49 @@ class BranchSchedulerTestCase(unittest.TestCase):
         assert_that(response.result, is_(FindResultCode.NOT_FOUND))
 
     @patch("common.photon_thrift.rpc_client.DirectClient")
-    @patch("concurrent.futures.wait")
-    def test_find_timeout(self, wait_fn, client_class):
+    def test_find_returns_first_found(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        # bar doesn't answer until baz's response has been returned
+        released = threading.Event()
+        bar_client = MagicMock()
+        bar_client.find.side_effect = lambda request: released.wait(10)
+        self._clients["bar"] = bar_client
+
+        baz_response = FindResponse(FindResultCode.OK)
+        baz_client = MagicMock()
+        baz_client.find.return_value = baz_response
+        self._clients["baz"] = baz_client
+
+        scheduler = BranchScheduler("foo", 9)
+        scheduler.configure([ChildInfo(id="bar", address="bar"),
+                             ChildInfo(id="baz", address="baz")])
+
+        try:
+            response = scheduler.find(FindRequest())
+            assert_that(response, is_(same_instance(baz_response)))
+            assert_that(released.is_set(), is_(False))
+        finally:
+            released.set()
+
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_find_splits_timeout(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        client = MagicMock()
+        client.find.return_value = FindResponse(FindResultCode.NOT_FOUND)
+        self._clients["bar"] = client
+
+        scheduler = BranchScheduler("foo", 9)
+        scheduler.configure([ChildInfo(id="bar", address="bar")])
+        scheduler.find(FindRequest(params=FindParams(8000)))
+
+        client.find.assert_called_with(FindRequest(
+            scheduler_id="bar", params=FindParams(6000)))
+
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    @patch("concurrent.futures.as_completed")
+    def test_find_timeout(self, as_completed_fn, client_class):
         client_class.side_effect = self.create_fake_client
 
         client = MagicMock()
@@ -124,7 +169,7 @@ class BranchSchedulerTestCase(unittest.TestCase):
         scheduler = BranchScheduler("foo", 9)
         scheduler.configure([ChildInfo(id="baz", address="baz")])
 
-        wait_fn.return_value = set(), set()
+        as_completed_fn.side_effect = TimeoutError()
 
         response = scheduler.find(FindRequest())
         assert_that(response.result, is_(FindResultCode.NOT_FOUND))
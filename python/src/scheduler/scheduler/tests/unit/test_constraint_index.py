@@ -0,0 +1,109 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import random
+import unittest
+
+from hamcrest import *  # noqa
+
+from gen.resource.ttypes import ResourceConstraint
+from gen.resource.ttypes import ResourceConstraintType
+from host.hypervisor.resources import ChildInfo
+from scheduler.constraint_index import ConstraintIndex
+from scheduler.strategy.random_subset_strategy import RandomSubsetStrategy
+
+
+class ConstraintIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.child_1 = ChildInfo("child_1", "1.1.1.1", 8835, [
+            ResourceConstraint(ResourceConstraintType.DATASTORE,
+                               ["ds1", "ds2"]),
+            ResourceConstraint(ResourceConstraintType.NETWORK, ["net1"])])
+        self.child_2 = ChildInfo("child_2", "1.1.1.2", 8835, [
+            ResourceConstraint(ResourceConstraintType.DATASTORE, ["ds2"])])
+        self.child_3 = ChildInfo("child_3", "1.1.1.3", 8835, None)
+        self.index = ConstraintIndex(
+            [self.child_1, self.child_2, self.child_3])
+
+    def test_no_constraints(self):
+        assert_that(self.index.filter([]), contains(
+            self.child_1, self.child_2, self.child_3))
+
+    def test_positive(self):
+        constraints = [ResourceConstraint(ResourceConstraintType.DATASTORE,
+                                          ["ds1", "ds3"])]
+        assert_that(self.index.filter(constraints), contains(self.child_1))
+
+        constraints = [ResourceConstraint(ResourceConstraintType.DATASTORE,
+                                          ["ds2"])]
+        assert_that(self.index.filter(constraints),
+                    contains(self.child_1, self.child_2))
+
+    def test_and(self):
+        constraints = [
+            ResourceConstraint(ResourceConstraintType.DATASTORE, ["ds2"]),
+            ResourceConstraint(ResourceConstraintType.NETWORK, ["net1"])]
+        assert_that(self.index.filter(constraints), contains(self.child_1))
+
+        constraints = [
+            ResourceConstraint(ResourceConstraintType.DATASTORE, ["ds2"]),
+            ResourceConstraint(ResourceConstraintType.HOST, ["host1"])]
+        assert_that(self.index.filter(constraints), is_(empty()))
+
+    def test_negative(self):
+        constraints = [ResourceConstraint(ResourceConstraintType.DATASTORE,
+                                          ["ds2"], True)]
+        assert_that(self.index.filter(constraints), contains(self.child_1))
+
+        constraints = [ResourceConstraint(ResourceConstraintType.DATASTORE,
+                                          ["ds1", "ds2"], True)]
+        assert_that(self.index.filter(constraints), is_(empty()))
+
+        # children without the constraint type never match
+        constraints = [ResourceConstraint(ResourceConstraintType.HOST,
+                                          ["host1"], True)]
+        assert_that(self.index.filter(constraints), is_(empty()))
+
+    def test_positions(self):
+        assert_that(ConstraintIndex.positions(0), is_(empty()))
+        assert_that(ConstraintIndex.positions(0b1010), contains(1, 3))
+        assert_that(ConstraintIndex.positions(1 << 200), contains(200))
+
+    def test_same_as_strategy(self):
+        random.seed(0)
+        types = [ResourceConstraintType.DATASTORE,
+                 ResourceConstraintType.NETWORK]
+        values = ["v%d" % i for i in range(8)]
+        children = []
+        for i in range(50):
+            constraints = [
+                ResourceConstraint(t, random.sample(values, 2))
+                for t in types if random.random() < 0.8]
+            children.append(ChildInfo("child_%d" % i, "addr", 8835,
+                                      constraints))
+        index = ConstraintIndex(children)
+        strategy = RandomSubsetStrategy(1.0, 1)
+
+        for _ in range(100):
+            constraints = [
+                ResourceConstraint(random.choice(types),
+                                   random.sample(values, 3),
+                                   random.random() < 0.3)
+                for _ in range(random.randint(1, 2))]
+            expected = [child for child in children
+                        if strategy._satisfy(child, constraints)]
+            assert_that(index.filter(constraints), is_(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,6 +12,7 @@
 
 import common
 import tempfile
+import threading
 import unittest
 
 from agent.agent import AgentConfig
@@ -22,6 +23,10 @@ from gen.chairman.ttypes import ReportMissingResponse
 from gen.chairman.ttypes import ReportResurrectedRequest
 from gen.chairman.ttypes import ReportResurrectedResponse
 from gen.common.ttypes import ServerAddress
+from gen.scheduler import Scheduler
+from gen.scheduler.ttypes import HostSummary
+from gen.scheduler.ttypes import HostSummaryResponse
+from gen.scheduler.ttypes import HostSummaryResultCode
 from hamcrest import *  # noqa
 from mock import MagicMock
 from mock import patch
@@ -49,9 +54,11 @@ class HealthCheckerTestCase(unittest.TestCase):
         health_checker.start()
         self.assertTrue(health_checker._heartbeater.is_alive())
         self.assertTrue(health_checker._reporter.is_alive())
+        self.assertTrue(health_checker._stats_logger.is_alive())
         health_checker.stop()
         self.assertFalse(health_checker._heartbeater.is_alive())
         self.assertFalse(health_checker._reporter.is_alive())
+        self.assertTrue(health_checker._stats_logger.stopped())
 
     @patch("time.time")
     @patch("common.photon_thrift.rpc_client.DirectClient")
@@ -102,6 +109,89 @@ class HealthCheckerTestCase(unittest.TestCase):
         self.assertEquals(health_checker._last_update["bar"], (2, 20.0))
         self.assertEquals(health_checker._last_update["baz"], (3, 30.0))
 
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_heartbeat_parallel(self, client_class):
+        """Test that a slow child doesn't delay the pings to the others."""
+        client_class.side_effect = self.create_fake_client
+        released = threading.Event()
+        slow_client = MagicMock()
+        slow_client.ping.side_effect = lambda request: released.wait(5)
+        fast_client = MagicMock()
+        self._clients["slow"] = slow_client
+        self._clients["fast"] = fast_client
+
+        conf = MagicMock()
+        conf.heartbeat_interval_sec = 0.1
+        conf.thrift_timeout_sec = 5
+        children = {"slow": ServerAddress("slow", 1234),
+                    "fast": ServerAddress("fast", 1234)}
+        health_checker = HealthChecker("id", children, conf)
+
+        health_checker._send_heartbeat()
+        self.assertEquals(health_checker._seqnum, 1)
+        self.assertEquals(health_checker._last_update["fast"][0], 1)
+        self.assertEquals(health_checker._last_update["slow"][0], 0)
+        assert_that(health_checker.get_rtt("fast").count, is_(1))
+        assert_that(health_checker.get_rtt("slow").count, is_(0))
+
+        # the ping to the slow child is still in flight, so it's skipped
+        health_checker._send_heartbeat()
+        assert_that(slow_client.ping.call_count, is_(1))
+        assert_that(fast_client.ping.call_count, is_(2))
+
+        released.set()
+        health_checker._executor.shutdown(wait=True)
+        self.assertEquals(health_checker._last_update["slow"][0], 1)
+        assert_that(health_checker.get_rtt("slow").count, is_(1))
+
+    def test_log_rtt_stats(self):
+        children = {"bar": ServerAddress("bar", 1234),
+                    "baz": ServerAddress("baz", 1234)}
+        health_checker = HealthChecker("id", children, self.conf)
+        health_checker.get_rtt("bar").record(0.5)
+
+        with patch.object(health_checker, "_logger") as logger:
+            health_checker._log_rtt_stats()
+
+        stats = logger.info.call_args[0][2]
+        assert_that(stats["bar"]["count"], is_(1))
+        assert_that(stats["bar"]["p50"], is_(0.5))
+        assert_that(stats["baz"]["count"], is_(0))
+
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_heartbeat_summary(self, client_class):
+        """Test that summaries are fetched from the children that answered
+           the ping."""
+        agent_clients = {"bar": MagicMock(), "baz": MagicMock()}
+        agent_clients["baz"].ping.side_effect = Exception()
+        scheduler_client = MagicMock()
+        summary = HostSummary(agent_id="bar")
+        scheduler_client.host_summary.return_value = HostSummaryResponse(
+            HostSummaryResultCode.OK, summary=summary)
+
+        def create_client(service_name, client_class, host, port,
+                          client_timeout):
+            if service_name == "Scheduler":
+                assert_that(host, is_("bar"))
+                return scheduler_client
+            return agent_clients[host]
+
+        client_class.side_effect = create_client
+        common.services.register(Scheduler.Iface, MagicMock())
+        listener = MagicMock()
+        children = {"bar": ServerAddress("bar", 1234),
+                    "baz": ServerAddress("baz", 1234)}
+        health_checker = HealthChecker("id", children, self.conf,
+                                       summary_listener=listener)
+        health_checker._send_heartbeat()
+        listener.assert_called_once_with(summary)
+
+        # failing to get a summary doesn't fail the heartbeat
+        scheduler_client.host_summary.side_effect = Exception()
+        health_checker._send_heartbeat()
+        assert_that(listener.call_count, is_(1))
+        self.assertEquals(health_checker._last_update["bar"][0], 2)
+
     @patch("scheduler.health_checker.Client")
     @patch("time.time")
     @patch("common.photon_thrift.rpc_client.DirectClient")
@@ -0,0 +1,156 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+from mock import patch
+
+from gen.flavors.ttypes import Flavor
+from gen.flavors.ttypes import QuotaLineItem
+from gen.flavors.ttypes import QuotaUnit
+from gen.resource.ttypes import CloneType
+from gen.resource.ttypes import Disk
+from gen.resource.ttypes import DiskImage
+from gen.resource.ttypes import Resource
+from gen.resource.ttypes import State
+from gen.resource.ttypes import Vm
+from gen.scheduler.ttypes import HostSummary
+from gen.scheduler.ttypes import PlaceRequest
+from gen.scheduler.ttypes import Score
+from host.hypervisor.resources import ChildInfo
+from scheduler.host_summary import HostSummaryCache
+from scheduler.host_summary import SummaryRanker
+from scheduler.strategy.default_scorer import DefaultScorer
+
+
+def summary(agent_id, used_memory_mb=0, used_cpu_count=0, free_gb=1000,
+            image_ids=None):
+    return HostSummary(agent_id=agent_id, generation=1,
+                       total_memory_mb=16 * 1024,
+                       used_memory_mb=used_memory_mb,
+                       total_cpu_count=16,
+                       used_cpu_count=used_cpu_count,
+                       datastore_free_gb={"ds1": free_gb},
+                       datastore_total_gb={"ds1": 1000},
+                       image_ids=set(image_ids or []),
+                       networks=[])
+
+
+def place_request(memory_gb=2, cpu=1, disk_gb=10, image_id=None):
+    disk = Disk(id="disk", flavor="default", persistent=True, new_disk=True,
+                capacity_gb=disk_gb)
+    if image_id:
+        disk.image = DiskImage(image_id, CloneType.COPY_ON_WRITE)
+    flavor = Flavor(name="default", cost=[
+        QuotaLineItem("vm.memory", str(memory_gb), QuotaUnit.GB),
+        QuotaLineItem("vm.cpu", str(cpu), QuotaUnit.COUNT)])
+    vm = Vm(id="vm", flavor="default", state=State.STOPPED, disks=[disk],
+            flavor_info=flavor)
+    return PlaceRequest(resource=Resource(vm=vm))
+
+
+class HostSummaryCacheTestCase(unittest.TestCase):
+
+    @patch("time.time")
+    def test_max_age(self, time_fn):
+        cache = HostSummaryCache(10)
+        time_fn.return_value = 100
+        cache.update(summary("host1"))
+        assert_that(cache.get("host1").agent_id, is_("host1"))
+
+        time_fn.return_value = 111
+        assert_that(cache.get("host1"), is_(none()))
+        assert_that(cache.get("host2"), is_(none()))
+
+    def test_invalidate_and_retain(self):
+        cache = HostSummaryCache(10)
+        for agent_id in ["host1", "host2", "host3"]:
+            cache.update(summary(agent_id))
+
+        cache.invalidate("host1")
+        assert_that(cache.get("host1"), is_(none()))
+        assert_that(len(cache), is_(2))
+
+        cache.retain(["host2"])
+        assert_that(cache.get("host2"), is_(not_none()))
+        assert_that(cache.get("host3"), is_(none()))
+        assert_that(len(cache), is_(1))
+
+
+class SummaryRankerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ranker = SummaryRanker(DefaultScorer(9))
+
+    def test_estimate(self):
+        # memory: 1 - (4k + 2k) / 16k
+        score = self.ranker.estimate(summary("host1", used_memory_mb=4096),
+                                     2048, 1, 10, [])
+        assert_that(score, is_(Score(62, 100)))
+
+        # cpu: 1 - (7 + 1) / 16
+        score = self.ranker.estimate(summary("host1", used_cpu_count=7),
+                                     2048, 1, 10, [])
+        assert_that(score, is_(Score(50, 100)))
+
+        # storage above the free space threshold: 1 - (850 + 10) / 1000
+        score = self.ranker.estimate(summary("host1", free_gb=150),
+                                     0, 0, 10, [])
+        assert_that(score, is_(Score(14, 100)))
+
+        # missing image
+        score = self.ranker.estimate(summary("host1", image_ids=["image1"]),
+                                     0, 0, 0, ["image1", "image2"])
+        assert_that(score, is_(Score(100, 0)))
+
+    def test_estimate_does_not_fit(self):
+        assert_that(self.ranker.estimate(
+            summary("host1", used_memory_mb=15 * 1024), 1024, 1, 10, []),
+            is_(none()))
+        assert_that(self.ranker.estimate(
+            summary("host1", used_cpu_count=16), 1024, 1, 10, []),
+            is_(none()))
+        assert_that(self.ranker.estimate(
+            summary("host1", free_gb=5), 1024, 1, 10, []),
+            is_(none()))
+
+    def test_rank(self):
+        cache = HostSummaryCache(10)
+        cache.update(summary("host1", used_memory_mb=8 * 1024))
+        cache.update(summary("host2", used_memory_mb=1024))
+        cache.update(summary("host3", used_memory_mb=1024,
+                             image_ids=["image1"]))
+        cache.update(summary("host4", used_memory_mb=15 * 1024))
+        children = [ChildInfo(agent_id, "address", 8835)
+                    for agent_id in ["host1", "host2", "host3", "host4",
+                                     "host5"]]
+
+        ranked, unknown = self.ranker.rank(
+            children, place_request(image_id="image1"), cache)
+        assert_that([child.id for child in ranked],
+                    contains("host3", "host2", "host1"))
+        assert_that([child.id for child in unknown], contains("host5"))
+
+    def test_rank_unknown_demand(self):
+        cache = HostSummaryCache(10)
+        cache.update(summary("host1"))
+        children = [ChildInfo("host1", "address", 8835)]
+
+        ranked, unknown = self.ranker.rank(
+            children, PlaceRequest(resource=Resource(vm=Vm())), cache)
+        assert_that(ranked, is_(empty()))
+        assert_that(unknown, is_(children))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import random
+import unittest
+
+from hamcrest import *  # noqa
+from mock import patch
+
+from gen.resource.ttypes import ResourceConstraint
+from gen.resource.ttypes import ResourceConstraintType
+from gen.scheduler.ttypes import PlaceRequest
+from host.hypervisor.resources import ChildInfo
+from scheduler.strategy.latency_aware_strategy import LatencyAwareStrategy
+
+
+class LatencyAwareStrategyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.children = [ChildInfo("child_%d" % i, "1.1.1.%d" % i, 8835)
+                         for i in range(10)]
+        self.request = PlaceRequest()
+
+    @patch("time.time")
+    def test_cost(self, time_fn):
+        time_fn.return_value = 100
+        strategy = LatencyAwareStrategy(0.5, 2, decay=0.5, half_life=10)
+        assert_that(strategy.cost("child_0"), is_(0.0))
+
+        strategy.record_response("child_0", 0.2)
+        strategy.record_response("child_0", 0.4)
+        assert_that(strategy.cost("child_0"), close_to(0.3, 0.0001))
+
+        # the error rate is now 50%, and the failure counts as 1s
+        strategy.record_response("child_0", 0.1, failed=True)
+        assert_that(strategy.cost("child_0"), close_to(0.65 * 6, 0.0001))
+
+        # halved every half life without responses
+        time_fn.return_value = 120
+        assert_that(strategy.cost("child_0"), close_to(0.65 * 6 / 4, 0.0001))
+
+        strategy.retain(["child_1"])
+        assert_that(strategy.cost("child_0"), is_(0.0))
+
+    def test_prefers_fast_children(self):
+        strategy = LatencyAwareStrategy(0.2, 2)
+        for child in self.children[:5]:
+            strategy.record_response(child.id, 1.0)
+        for child in self.children[5:]:
+            strategy.record_response(child.id, 0.01)
+
+        picks = {}
+        for _ in range(1000):
+            for child in strategy.filter_child(self.children, self.request):
+                picks[child.id] = picks.get(child.id, 0) + 1
+
+        slow = sum(picks.get(child.id, 0) for child in self.children[:5])
+        fast = sum(picks.get(child.id, 0) for child in self.children[5:])
+        assert_that(slow + fast, is_(2000))
+        assert_that(fast, greater_than(slow * 3))
+
+        # still randomized among the fast children
+        for child in self.children[5:]:
+            assert_that(picks[child.id], greater_than(200))
+
+    def test_filter_child_with_spares(self):
+        strategy = LatencyAwareStrategy(0.2, 2)
+        selected, spares = strategy.filter_child_with_spares(
+            self.children, self.request, spare_count=3)
+        assert_that(selected, has_length(2))
+        assert_that(spares, has_length(3))
+        assert_that(set(selected + spares), has_length(5))
+
+        selected, spares = strategy.filter_child_with_spares(
+            self.children[:3], self.request, spare_count=3)
+        assert_that(selected, has_length(2))
+        assert_that(spares, has_length(1))
+
+    def test_constraints(self):
+        child = ChildInfo("child_ds", "1.1.1.1", 8835, [
+            ResourceConstraint(ResourceConstraintType.DATASTORE, ["ds1"])])
+        constraints = [
+            ResourceConstraint(ResourceConstraintType.DATASTORE, ["ds1"])]
+        strategy = LatencyAwareStrategy(0.5, 2)
+        assert_that(strategy.filter_child(self.children + [child],
+                                          self.request, constraints),
+                    contains(child))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,9 +10,11 @@
 # License for then specific language governing permissions and limitations
 # under the License.
 
+import itertools
 import threading
 import unittest
 
+import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 from hamcrest import *  # noqa
 from mock import MagicMock
@@ -21,16 +23,26 @@ from mock import patch
 import common
 from common.service_name import ServiceName
 from common.photon_thrift.client import TimeoutError
+from gen.flavors.ttypes import Flavor
+from gen.flavors.ttypes import QuotaLineItem
+from gen.flavors.ttypes import QuotaUnit
 from gen.resource.ttypes import Disk
+from gen.resource.ttypes import Locator
 from gen.resource.ttypes import Resource
 from gen.resource.ttypes import ResourceConstraint
 from gen.resource.ttypes import ResourceConstraintType
+from gen.resource.ttypes import State
 from gen.resource.ttypes import Vm
+from gen.resource.ttypes import VmLocator
 from gen.roles.ttypes import ChildInfo
 from gen.scheduler import Scheduler
 from gen.scheduler.ttypes import FindRequest
 from gen.scheduler.ttypes import FindResponse
 from gen.scheduler.ttypes import FindResultCode
+from gen.scheduler.ttypes import HostSummary
+from gen.scheduler.ttypes import PlaceBatchRequest
+from gen.scheduler.ttypes import PlaceBatchResponse
+from gen.scheduler.ttypes import PlaceExecutionMode
 from gen.scheduler.ttypes import PlaceRequest
 from gen.scheduler.ttypes import PlaceResponse
 from gen.scheduler.ttypes import PlaceResultCode
@@ -97,7 +109,7 @@ class LeafSchedulerTestCase(unittest.TestCase):
         scheduler.configure([ChildInfo(id="bar", address="bar"),
                              ChildInfo(id="baz", address="baz")])
 
-        response = scheduler.find(self._place_request())
+        response = scheduler.find(self._find_request())
         assert_that(response, is_(same_instance(baz_response)))
 
     @patch("common.photon_thrift.rpc_client.DirectClient")
@@ -118,12 +130,38 @@ class LeafSchedulerTestCase(unittest.TestCase):
         scheduler.configure([ChildInfo(id="bar", address="bar"),
                              ChildInfo(id="baz", address="baz")])
 
-        response = scheduler.find(self._place_request())
+        response = scheduler.find(self._find_request())
         assert_that(response.result, is_(FindResultCode.NOT_FOUND))
 
     @patch("common.photon_thrift.rpc_client.DirectClient")
-    @patch("concurrent.futures.wait")
-    def test_find_timeout(self, wait_fn, client_class):
+    def test_find_returns_first_found(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        # bar doesn't answer until baz's response has been returned
+        released = threading.Event()
+        bar_client = MagicMock()
+        bar_client.host_find.side_effect = lambda request: released.wait(10)
+        self._clients["bar"] = bar_client
+
+        baz_response = FindResponse(FindResultCode.OK, agent_id="baz")
+        baz_client = MagicMock()
+        baz_client.host_find.return_value = baz_response
+        self._clients["baz"] = baz_client
+
+        scheduler = LeafScheduler("foo", 9, False)
+        scheduler.configure([ChildInfo(id="bar", address="bar"),
+                             ChildInfo(id="baz", address="baz")])
+
+        try:
+            response = scheduler.find(self._find_request())
+            assert_that(response, is_(same_instance(baz_response)))
+            assert_that(released.is_set(), is_(False))
+        finally:
+            released.set()
+
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    @patch("concurrent.futures.as_completed")
+    def test_find_timeout(self, as_completed_fn, client_class):
         client_class.side_effect = self.create_fake_client
 
         client = MagicMock()
@@ -134,15 +172,80 @@ class LeafSchedulerTestCase(unittest.TestCase):
         scheduler = LeafScheduler("foo", 9, False)
         scheduler.configure([ChildInfo(id="baz", address="baz")])
 
-        wait_fn.return_value = set(), set()
+        as_completed_fn.side_effect = concurrent.futures.TimeoutError()
 
-        response = scheduler.find(self._place_request())
+        response = scheduler.find(self._find_request())
         assert_that(response.result, is_(FindResultCode.NOT_FOUND))
 
         # must shutdown to join the futures since the patch lifecycle
         # ends when this method returns
         self._threadpool.shutdown()
 
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_find_cached(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        bar_client = MagicMock()
+        bar_client.host_find.return_value = FindResponse(
+            FindResultCode.NOT_FOUND)
+        self._clients["bar"] = bar_client
+
+        baz_client = MagicMock()
+        baz_client.host_find.return_value = FindResponse(
+            FindResultCode.OK, agent_id="baz")
+        self._clients["baz"] = baz_client
+
+        scheduler = LeafScheduler("foo", 9, False)
+        scheduler.configure([ChildInfo(id="bar", address="bar"),
+                             ChildInfo(id="baz", address="baz")])
+
+        # the first find broadcasts and caches the location
+        response = scheduler.find(self._find_request())
+        assert_that(response.agent_id, is_("baz"))
+        assert_that(bar_client.host_find.call_count, is_(1))
+        assert_that(baz_client.host_find.call_count, is_(1))
+
+        # the second find only asks the cached agent
+        response = scheduler.find(self._find_request())
+        assert_that(response.agent_id, is_("baz"))
+        assert_that(bar_client.host_find.call_count, is_(1))
+        assert_that(baz_client.host_find.call_count, is_(2))
+
+        # the VM moved, so the stale entry falls back to the broadcast
+        bar_client.host_find.return_value = FindResponse(
+            FindResultCode.OK, agent_id="bar")
+        baz_client.host_find.return_value = FindResponse(
+            FindResultCode.NOT_FOUND)
+        response = scheduler.find(self._find_request())
+        assert_that(response.agent_id, is_("bar"))
+        assert_that(bar_client.host_find.call_count, is_(2))
+        assert_that(baz_client.host_find.call_count, is_(4))
+
+    @patch("scheduler.leaf_scheduler.time")
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_find_out_of_time(self, client_class, time_mod):
+        client_class.side_effect = self.create_fake_client
+
+        client = MagicMock()
+        client.host_find.return_value = FindResponse(FindResultCode.OK,
+                                                     agent_id="baz")
+        self._clients["baz"] = client
+
+        scheduler = LeafScheduler("foo", 9, False)
+        scheduler.configure([ChildInfo(id="baz", address="baz")])
+        request = self._find_request()
+        scheduler._locations.update(request.locator, "baz")
+
+        # The budget is used up once the deadline is set
+        time_mod.time.side_effect = itertools.chain([100],
+                                                    itertools.repeat(200))
+        response = scheduler.find(request)
+
+        # Nothing is sent without a timeout, and the location stays cached
+        assert_that(response.result, is_(FindResultCode.NOT_FOUND))
+        assert_that(client.host_find.called, is_(False))
+        assert_that(scheduler._locations.get(request.locator), is_("baz"))
+
     @patch("common.photon_thrift.rpc_client.DirectClient")
     def test_place_clears_scheduler_id(self, client_class):
         client_class.side_effect = self.create_fake_client
@@ -197,6 +300,37 @@ class LeafSchedulerTestCase(unittest.TestCase):
         response = scheduler.place(self._place_request())
         assert_that(response, is_(same_instance(baz_response)))
 
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_place_latency_aware(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        bar_client = MagicMock()
+        bar_client.host_place.return_value = PlaceResponse(
+            PlaceResultCode.SYSTEM_ERROR)
+        self._clients["bar"] = bar_client
+
+        baz_client = MagicMock()
+        baz_response = PlaceResponse(PlaceResultCode.OK, agent_id="baz",
+                                     score=Score(30, 80))
+        baz_client.host_place.return_value = baz_response
+        self._clients["baz"] = baz_client
+
+        scheduler = LeafScheduler("foo", 9, False,
+                                  place_strategy="latency_aware")
+        scheduler.configure([ChildInfo(id="bar", address="bar"),
+                             ChildInfo(id="baz", address="baz")])
+
+        response = scheduler.place(self._place_request())
+        assert_that(response, is_(same_instance(baz_response)))
+
+        # the failed host is charged at least the error latency
+        strategy = scheduler._place_strategy
+        assert_that(strategy.cost("bar"),
+                    greater_than(strategy.cost("baz") * 10))
+
+        self.assertRaises(ValueError, LeafScheduler, "foo", 9, False,
+                          place_strategy="fastest")
+
     @patch("common.photon_thrift.rpc_client.DirectClient")
     @patch("scheduler.leaf_scheduler.HealthChecker")
     def test_place_res_with_missing(self, health_checker, client_class):
@@ -409,6 +543,199 @@ class LeafSchedulerTestCase(unittest.TestCase):
         # ends when this method returns
         self._threadpool.shutdown()
 
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_place_hedged(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        scheduler = self._create_scheduler_with_hosts("sched", 8)
+
+        request = self._place_request_with_params(0.5, 2, 4)
+        request.leafSchedulerParams.executionMode = PlaceExecutionMode.HEDGED
+        response = scheduler.place(request)
+        assert_that(response.result, is_(PlaceResultCode.OK))
+
+        stats = scheduler.get_placement_stats()
+        assert_that(stats["HEDGED"]["count"], is_(1))
+        assert_that(stats["SERIAL"]["count"], is_(0))
+
+    @patch("scheduler.leaf_scheduler.Periodic")
+    def test_log_placement_stats(self, periodic_class):
+        scheduler = LeafScheduler("foo", 9, False)
+        scheduler.configure([ChildInfo(id="bar", address="bar")])
+        scheduler.configure([ChildInfo(id="baz", address="baz")])
+
+        # Reconfiguring keeps the same logging thread
+        assert_that(periodic_class.call_count, is_(1))
+        log_stats = periodic_class.call_args[0][0]
+        stats_logger = periodic_class.return_value
+        assert_that(stats_logger.start.call_count, is_(1))
+
+        with patch.object(scheduler, "_logger") as logger:
+            log_stats()
+        stats = logger.info.call_args[0][2]
+        assert_that(stats["SERIAL"]["count"], is_(0))
+        assert_that(stats, has_key("rpc"))
+
+        scheduler.cleanup()
+        stats_logger.stop.assert_called_once_with()
+
+    @patch("scheduler.leaf_scheduler.SERIAL_PLACE_TIMEOUT", 0.1)
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    @patch("random.shuffle")
+    def test_place_hedged_backup_request(self, shuffle, client_class):
+        client_class.side_effect = self.create_fake_client
+        shuffle.side_effect = self.fake_shuffle(
+            [ChildInfo(id="bar", address="bar"),
+             ChildInfo(id="baz", address="baz")])
+        slow_response_sent = threading.Event()
+
+        def slow_place(request):
+            slow_response_sent.wait(5)
+            return PlaceResponse(PlaceResultCode.OK, agent_id="bar",
+                                 score=Score(5, 90))
+
+        bar_client = MagicMock()
+        bar_client.host_place.side_effect = slow_place
+        self._clients["bar"] = bar_client
+
+        baz_client = MagicMock()
+        baz_response = PlaceResponse(PlaceResultCode.OK, agent_id="baz",
+                                     score=Score(30, 80))
+        baz_client.host_place.return_value = baz_response
+        self._clients["baz"] = baz_client
+
+        scheduler = LeafScheduler("foo", 9, False)
+        scheduler.configure([ChildInfo(id="bar", address="bar"),
+                             ChildInfo(id="baz", address="baz")])
+
+        request = self._place_request_with_params(0.1, 1, 1)
+        request.leafSchedulerParams.executionMode = PlaceExecutionMode.HEDGED
+        response = scheduler.place(request)
+        slow_response_sent.set()
+
+        assert_that(response, is_(same_instance(baz_response)))
+        counters = scheduler.get_placement_stats()["counters"]
+        assert_that(counters["hedged_requests"], is_(1))
+
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_place_cached_score(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        scheduler = self._create_scheduler_with_hosts("sched", 4)
+        used_memory = {"id_sched_host_0": 12 * 1024,
+                       "id_sched_host_1": 2 * 1024,
+                       "id_sched_host_2": 8 * 1024,
+                       "id_sched_host_3": 15 * 1024}
+        for agent_id, used_memory_mb in used_memory.iteritems():
+            scheduler._host_summaries.update(HostSummary(
+                agent_id=agent_id, generation=1,
+                total_memory_mb=16 * 1024, used_memory_mb=used_memory_mb,
+                total_cpu_count=16, used_cpu_count=0))
+
+        request = self._place_request_with_params(1.0, 4, 4)
+        request.resource = Resource(Vm(
+            id="vm", flavor="default", state=State.STOPPED,
+            flavor_info=Flavor(name="default", cost=[
+                QuotaLineItem("vm.memory", "1", QuotaUnit.GB),
+                QuotaLineItem("vm.cpu", "1", QuotaUnit.COUNT)])))
+        request.leafSchedulerParams.executionMode = \
+            PlaceExecutionMode.CACHED_SCORE
+        response = scheduler.place(request)
+        assert_that(response.result, is_(PlaceResultCode.OK))
+
+        # only the two best ranked hosts are asked to confirm
+        placed = [host for host in range(4) if self._clients[
+            "address_sched_host_%d" % host].host_place.called]
+        assert_that(placed, contains_inanyorder(1, 2))
+
+        # the chosen host's summary is outdated by the placement
+        assert_that(scheduler._host_summaries.get(response.agent_id),
+                    is_(none()))
+        stats = scheduler.get_placement_stats()
+        assert_that(stats["CACHED_SCORE"]["count"], is_(1))
+
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_place_cached_score_fallback(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        scheduler = self._create_scheduler_with_hosts("sched", 4)
+        request = self._place_request_with_params(0.5, 2, 2)
+        request.leafSchedulerParams.executionMode = \
+            PlaceExecutionMode.CACHED_SCORE
+        response = scheduler.place(request)
+        assert_that(response.result, is_(PlaceResultCode.OK))
+
+        counters = scheduler.get_placement_stats()["counters"]
+        assert_that(counters["cached_score_fallbacks"], is_(1))
+
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_place_batch_spread(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        def batch_response(agent_id, utilizations):
+            responses = [PlaceResponse(PlaceResultCode.OK, agent_id=agent_id,
+                                       score=Score(utilization, 100))
+                         for utilization in utilizations]
+            return PlaceBatchResponse(PlaceResultCode.OK,
+                                      responses=responses)
+
+        bar_client = MagicMock()
+        bar_client.host_place_batch.return_value = batch_response(
+            "bar", [90, 80, 70])
+        self._clients["bar"] = bar_client
+        baz_client = MagicMock()
+        baz_client.host_place_batch.return_value = batch_response(
+            "baz", [85, 60, 40])
+        self._clients["baz"] = baz_client
+
+        scheduler = LeafScheduler("foo", 9, False)
+        scheduler.configure([ChildInfo(id="bar", address="bar"),
+                             ChildInfo(id="baz", address="baz")])
+
+        request = PlaceBatchRequest(
+            resources=[Resource(Vm(), [Disk()]) for _ in range(3)],
+            leafSchedulerParams=self._place_request_with_params(
+                1.0, 2, 2).leafSchedulerParams)
+        response = scheduler.place_batch(request)
+
+        assert_that(response.result, is_(PlaceResultCode.OK))
+        # bar 90 > baz 85, then baz 85 > bar 80, then bar 80 > baz 60
+        assert_that([r.agent_id for r in response.responses],
+                    contains("bar", "baz", "bar"))
+        assert_that([r.score.utilization for r in response.responses],
+                    contains(90, 60, 70))
+
+    @patch("scheduler.leaf_scheduler.MAX_BATCH_PER_HOST", 2)
+    @patch("common.photon_thrift.rpc_client.DirectClient")
+    def test_place_batch_capacity(self, client_class):
+        client_class.side_effect = self.create_fake_client
+
+        client = MagicMock()
+        client.host_place_batch.return_value = PlaceBatchResponse(
+            PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE, responses=[
+                PlaceResponse(PlaceResultCode.OK, agent_id="bar",
+                              score=Score(90, 100)),
+                PlaceResponse(PlaceResultCode.OK, agent_id="bar",
+                              score=Score(80, 100)),
+                PlaceResponse(PlaceResultCode.OK, agent_id="bar",
+                              score=Score(70, 100)),
+                PlaceResponse(PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE)])
+        self._clients["bar"] = client
+
+        scheduler = LeafScheduler("foo", 9, False)
+        scheduler.configure([ChildInfo(id="bar", address="bar")])
+
+        request = PlaceBatchRequest(
+            resources=[Resource(Vm(), [Disk()]) for _ in range(4)])
+        response = scheduler.place_batch(request)
+
+        # only MAX_BATCH_PER_HOST resources are assigned to the host
+        assert_that([r.result for r in response.responses], contains(
+            PlaceResultCode.OK, PlaceResultCode.OK,
+            PlaceResultCode.SYSTEM_ERROR,
+            PlaceResultCode.NOT_ENOUGH_MEMORY_RESOURCE))
+        assert_that(response.result, is_(PlaceResultCode.SYSTEM_ERROR))
+
     @patch("common.photon_thrift.rpc_client.DirectClient")
     def test_place_exception(self, client_class):
         client_class.side_effect = self.create_fake_client
@@ -444,6 +771,9 @@ class LeafSchedulerTestCase(unittest.TestCase):
             value.extend(shuffled)
         return f
 
+    def _find_request(self, vm_id="vm_id"):
+        return FindRequest(locator=Locator(vm=VmLocator(vm_id)))
+
     def _place_request(self):
         return PlaceRequest(resource=Resource(Vm(), [Disk()]))
 
@@ -0,0 +1,117 @@
+# Copyright 2015 VMware, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License.  You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, without
+# warranties or conditions of any kind, EITHER EXPRESS OR IMPLIED.  See the
+# License for then specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hamcrest import *  # noqa
+
+from gen.resource.ttypes import Disk
+from gen.resource.ttypes import DiskLocator
+from gen.resource.ttypes import Locator
+from gen.resource.ttypes import Resource
+from gen.resource.ttypes import Vm
+from gen.resource.ttypes import VmLocator
+from scheduler.location_cache import LocationCache
+
+
+def vm(vm_id):
+    return Locator(vm=VmLocator(vm_id))
+
+
+def disk(disk_id):
+    return Locator(disk=DiskLocator(disk_id))
+
+
+class LocationCacheTestCase(unittest.TestCase):
+
+    def test_update(self):
+        cache = LocationCache()
+        cache.update(vm("vm1"), "host1")
+        cache.update(disk("disk1"), "host2")
+        assert_that(cache.get(vm("vm1")), is_("host1"))
+        assert_that(cache.get(disk("disk1")), is_("host2"))
+        assert_that(cache.get(vm("disk1")), is_(none()))
+        assert_that(cache.get(Locator()), is_(none()))
+
+        cache.update(vm("vm1"), "host3")
+        assert_that(cache.get(vm("vm1")), is_("host3"))
+
+        cache.invalidate(vm("vm1"))
+        assert_that(cache.get(vm("vm1")), is_(none()))
+        assert_that(len(cache), is_(1))
+
+    def test_least_recently_used(self):
+        cache = LocationCache(max_size=2)
+        cache.update(vm("vm1"), "host1")
+        cache.update(vm("vm2"), "host1")
+        cache.get(vm("vm1"))
+        cache.update(vm("vm3"), "host1")
+
+        assert_that(cache.get(vm("vm1")), is_("host1"))
+        assert_that(cache.get(vm("vm2")), is_(none()))
+        assert_that(cache.get(vm("vm3")), is_("host1"))
+        assert_that(len(cache), is_(2))
+
+    def test_least_recently_used_many_accesses(self):
+        cache = LocationCache(max_size=3)
+        for i in range(3):
+            cache.update(vm("vm%d" % i), "host1")
+        # Enough accesses to drop the stale ones, vm1 being the oldest
+        for _ in range(100):
+            cache.get(vm("vm0"))
+            cache.get(vm("vm2"))
+        assert_that(len(cache._accesses), less_than(30))
+
+        cache.update(vm("vm3"), "host1")
+        assert_that(cache.get(vm("vm1")), is_(none()))
+        cache.update(vm("vm4"), "host1")
+        assert_that(cache.get(vm("vm0")), is_(none()))
+        assert_that(cache.get(vm("vm2")), is_("host1"))
+
+    def test_update_resource(self):
+        cache = LocationCache()
+        resource = Resource(vm=Vm(id="vm1", disks=[Disk(id="disk1")]),
+                            disks=[Disk(id="disk2")])
+        cache.update_resource(resource, "host1")
+        assert_that(cache.get(vm("vm1")), is_("host1"))
+        assert_that(cache.get(disk("disk1")), is_("host1"))
+        assert_that(cache.get(disk("disk2")), is_("host1"))
+
+    def test_update_vms(self):
+        cache = LocationCache()
+        cache.update(vm("vm1"), "host1")
+        cache.update(vm("vm2"), "host1")
+        cache.update(disk("disk1"), "host1")
+
+        cache.update_vms("host1", ["vm2", "vm3"])
+        assert_that(cache.get(vm("vm1")), is_(none()))
+        assert_that(cache.get(vm("vm2")), is_("host1"))
+        assert_that(cache.get(vm("vm3")), is_("host1"))
+        assert_that(cache.get(disk("disk1")), is_("host1"))
+
+        # vm3 moved to host2
+        cache.update_vms("host2", ["vm3"])
+        cache.update_vms("host1", ["vm2"])
+        assert_that(cache.get(vm("vm3")), is_("host2"))
+
+    def test_retain(self):
+        cache = LocationCache()
+        cache.update(vm("vm1"), "host1")
+        cache.update(vm("vm2"), "host2")
+        cache.retain(["host2"])
+        assert_that(cache.get(vm("vm1")), is_(none()))
+        assert_that(cache.get(vm("vm2")), is_("host2"))
+        assert_that(len(cache), is_(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
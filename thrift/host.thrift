@@ -658,6 +658,62 @@ struct ReceiveImageResponse {
   2: optional string error
 }
 
+// Image upload
+// A host transferring an image with compression sends the disk to the agent
+// of the destination host in blocks, which the agent decompresses and uploads
+// to the import url of the image on its host.
+enum ImageUploadResultCode {
+  OK = 0
+  // Catch all error.
+  SYSTEM_ERROR = 1
+  // No upload in progress has the given id.
+  UPLOAD_NOT_FOUND = 2
+}
+
+struct StartImageUploadRequest {
+  // The url to upload the disk to.
+  1: required string url
+
+  // The size of the disk, if known.
+  2: optional i64 size
+
+  99: optional tracing.TracingInfo tracing_info
+}
+struct StartImageUploadResponse {
+  1: required ImageUploadResultCode result
+  2: optional string error
+  3: optional string upload_id
+}
+
+struct WriteImageDataRequest {
+  1: required string upload_id
+
+  // The next block of the disk.
+  2: required binary data
+
+  // Whether the block is compressed with zlib.
+  3: required bool compressed
+
+  99: optional tracing.TracingInfo tracing_info
+}
+struct WriteImageDataResponse {
+  1: required ImageUploadResultCode result
+  2: optional string error
+}
+
+struct FinishImageUploadRequest {
+  1: required string upload_id
+
+  // Stop the upload instead of completing it.
+  2: optional bool abort
+
+  99: optional tracing.TracingInfo tracing_info
+}
+struct FinishImageUploadResponse {
+  1: required ImageUploadResultCode result
+  2: optional string error
+}
+
 // Create Image
 struct CreateImageRequest {
   // The ID of the Image.
@@ -1113,6 +1169,9 @@ service Host {
 
   TransferImageResponse transfer_image(1: TransferImageRequest request)
   ReceiveImageResponse receive_image(1: ReceiveImageRequest request)
+  StartImageUploadResponse start_image_upload(1: StartImageUploadRequest request)
+  WriteImageDataResponse write_image_data(1: WriteImageDataRequest request)
+  FinishImageUploadResponse finish_image_upload(1: FinishImageUploadRequest request)
 
   /**
    * Image scan/sweep
@@ -1142,6 +1201,12 @@ service Host {
   HttpTicketResponse get_http_ticket(1: HttpTicketRequest request)
 
   scheduler.PlaceResponse place(1: scheduler.PlaceRequest request)
+  scheduler.PlaceBatchResponse place_batch(1: scheduler.PlaceBatchRequest request)
+  // Score each resource on its own against one read of the host state, e.g.
+  // to compare flavors. Nothing is reserved and the result is OK unless the
+  // host can't evaluate the request, the per resource results are in the
+  // responses.
+  scheduler.PlaceBatchResponse evaluate_placement(1: scheduler.PlaceBatchRequest request)
   scheduler.FindResponse find(1: scheduler.FindRequest request)
 
   /* API to delete a directory.
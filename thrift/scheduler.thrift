@@ -19,6 +19,25 @@ include 'roles.thrift'
 include 'server_address.thrift'
 include 'tracing.thrift'
 
+// How a leaf scheduler sends place requests to its children
+enum PlaceExecutionMode {
+  // Send place requests to the selected children one at a time
+  SERIAL = 0
+
+  // Send place requests to all the selected children in parallel
+  CONCURRENT = 1
+
+  // Same as CONCURRENT, but stop waiting as soon as enough good responses
+  // are received, and send backup requests to spare children when the
+  // responses are slower than usual.
+  HEDGED = 2
+
+  // Rank the children using the resource summaries they report to the
+  // scheduler, and only send place requests to the best ranked children to
+  // confirm the placement.
+  CACHED_SCORE = 3
+}
+
 // Place parameters
 // send the scheduler parameters along with the request
 // this allows changing the scheduler behavior without
@@ -32,6 +51,7 @@ struct PlaceParams {
   5: required double fastPlaceResponseTimeoutRatio
   6: required double fastPlaceResponseRatio
   7: required i32 fastPlaceResponseMinCount
+  8: optional PlaceExecutionMode executionMode
 }
 
 // Same as above for find
@@ -110,6 +130,27 @@ struct PlaceResponse {
   99: optional tracing.TracingInfo tracing_info
 }
 
+// Place a batch of resources. Each resource is placed as if the resources
+// before it in the batch had been reserved on the same host.
+struct PlaceBatchRequest {
+  1: required list<resource.Resource> resources
+  2: optional string scheduler_id
+  3: optional PlaceParams rootSchedulerParams
+  4: optional PlaceParams leafSchedulerParams
+  99: optional tracing.TracingInfo tracing_info
+}
+
+struct PlaceBatchResponse {
+  // OK if all the resources are placed, otherwise the result of the first
+  // resource that could not be placed
+  1: required PlaceResultCode result
+
+  2: optional string error
+
+  // One response per resource, in the order of the request
+  3: optional list<PlaceResponse> responses
+}
+
 // Find a resource
 struct FindRequest {
   1: required resource.Locator locator
@@ -158,16 +199,68 @@ struct FindResponse {
   6: optional server_address.ServerAddress address
 }
 
+// Summary of the resources available for placement on a host
+struct HostSummaryRequest {
+  99: optional tracing.TracingInfo tracing_info
+}
+
+enum HostSummaryResultCode {
+  OK = 0
+  SYSTEM_ERROR = 1
+
+  // Host in invalid state, for example, Maintenance mode.
+  INVALID_STATE = 2
+}
+
+struct HostSummary {
+  1: required string agent_id
+
+  // Generation of the host's reservations when the summary was taken
+  2: required i32 generation
+
+  // Memory in MB, after applying the memory overcommit ratio. Used memory
+  // includes reserved VMs.
+  3: required i64 total_memory_mb
+  4: required i64 used_memory_mb
+
+  // Number of CPUs, after applying the CPU overcommit ratio. Used CPUs
+  // include reserved VMs.
+  5: required i32 total_cpu_count
+  6: required i32 used_cpu_count
+
+  // Placeable datastore id -> capacity in GB
+  7: optional map<string, i64> datastore_free_gb
+  8: optional map<string, i64> datastore_total_gb
+
+  // Ids of the images present on the placeable datastores
+  9: optional set<string> image_ids
+
+  // VM networks
+  10: optional list<string> networks
+
+  // Ids of the VMs on the host
+  11: optional list<string> vm_ids
+}
+
+struct HostSummaryResponse {
+  1: required HostSummaryResultCode result
+  2: optional string error
+  3: optional HostSummary summary
+}
+
 // Scheduler service
 service Scheduler {
   PlaceResponse place(1: PlaceRequest request)
+  PlaceBatchResponse place_batch(1: PlaceBatchRequest request)
   FindResponse find(1: FindRequest request)
 
   // place/find handlers for hosts. These methods are in the Scheduler service
   // as opposed to the Host service to avoid getting stuck behind slow create_vm
   // requests.
   PlaceResponse host_place(1: PlaceRequest request)
+  PlaceBatchResponse host_place_batch(1: PlaceBatchRequest request)
   FindResponse host_find(1: FindRequest request)
+  HostSummaryResponse host_summary(1: HostSummaryRequest request)
 }
 
 // Configure host and root scheduler